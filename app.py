@@ -1,12 +1,17 @@
+import asyncio
 import json
 import json as json_module
 import os
 import time
+import threading
 import shutil
+import hashlib
+import logging
 import traceback
 from datetime import datetime
 import random
 import requests
+import httpx
 import random
 from dotenv import load_dotenv
 # Charger les variables d'environnement depuis .env
@@ -36,6 +41,38 @@ port = int(os.environ.get("PORT", 7860))  # 7860 par défaut pour local
 # AJOUTER CES IMPORTS PERSONNALISES
 from unified_recipe_generator_v2_with_batch import UnifiedRecipeGeneratorV2, RecipeFormatter
 from fromage_theme import create_fromage_theme, minimal_css
+from fromage_matcher import KeywordMatcher, get_matcher
+from recipe_cache import GenerationCache, generation_cache
+from recipe_index import SORT_KEYS, dynamic_recipe_index, get_history_index
+from recipe_compactor import get_compactor, history_compactor, kb_compactor
+from recipe_stats import NON_SPECIFIE, RecipeStats, get_stats
+from recipe_store import get_store
+from fromage_logging import get_logger, redact
+from fromage_tracing import set_attribute, span, traced
+from fromage_lanes import LaneBusy, event_options, in_lane, max_threads as lane_max_threads
+from fromage_ratelimit import ENGINE_MAX_WAIT, PROVIDER_MAX_WAIT, get_rate_limiter
+from fromage_singleflight import coalesce
+from fromage_query_plan import SearchPlan, search_plan
+from fromage_async import http_client, run_sync
+from fromage_llm import build_registry, ollama_has_model, ollama_host
+from fromage_metrics import (
+    CHAT_SECONDS, GENERATION_SECONDS, HF_UPLOAD_SECONDS, KIE_TASK_SECONDS,
+    LLM_PROVIDER_ERRORS, LLM_PROVIDER_SECONDS, SEARCH_ENGINE_RESULTS, SEARCH_ENGINE_SECONDS,
+    mount_metrics, record_cache, start_metrics_server, timed,
+)
+
+logger = get_logger("app")
+
+# ===== CLÉS DE COALESCENCE (single-flight) =====
+def _search_flight_key(agent, ingredients, cheese_type, max_results=6, plan=None):
+    """Même recherche quels que soient l'ordre, la casse et les espaces des ingrédients"""
+    normalized = sorted({i.strip().lower() for i in str(ingredients or "").split(",") if i.strip()})
+    return (tuple(normalized), str(cheese_type or "").strip().lower(), max_results)
+
+
+def _image_flight_key(agent, description, style, size="1024x1024"):
+    return (" ".join(str(description or "").lower().split()), style, size)
+
 
 # ===== FONCTION UTILITAIRE =====
 def nettoyer_titre(titre):
@@ -49,13 +86,36 @@ def nettoyer_titre(titre):
 
 
 # ===== VARIABLES GLOBALES =====
+# Données partagées en lecture seule (identiques pour tous les utilisateurs).
+# L'état propre à chaque utilisateur (recipe_map, stats visibles) vit dans des
+# gr.State de create_interface : plusieurs sessions peuvent tourner en parallèle.
 fallback_cache = None
-recipe_map = {}
-STATS_CACHE = {'visible': False, 'html': None}
-stats_visible = False
+reference_stats = None  # Agrégats des recettes de référence (liste statique, calculés une fois)
+_reference_lock = threading.Lock()
 DYNAMIC_HYBRID_AVAILABLE = True  
 
 
+def get_reference_recipes(source_agent):
+    """Recettes de référence (liste statique partagée, construite une seule fois)"""
+    global fallback_cache
+    if fallback_cache is None:
+        with _reference_lock:
+            if fallback_cache is None:
+                fallback_cache = source_agent._get_absolute_fallback("", "", 1000)
+    return fallback_cache
+
+
+def get_reference_stats(source_agent):
+    """Agrégats des recettes de référence (construits une seule fois)"""
+    global reference_stats
+    if reference_stats is None:
+        recipes = get_reference_recipes(source_agent)
+        with _reference_lock:
+            if reference_stats is None:
+                reference_stats = RecipeStats.from_records(recipes)
+    return reference_stats
+
+
 class AgentFromagerHF:
     """Agent fromager avec persistance HF Dataset"""
 
@@ -164,19 +224,10 @@ class AgentFromagerHF:
 
         # ===== SOLUTIONS LOCALES =====
 
-        # OLLAMA (local)
-        self.ollama_url = "http://localhost:11434/api/generate"
-        self.ollama_model = "qwen2.5:7b"  # Meilleur que llama2 pour le français
-
-        try:
-            response = requests.post(
-                self.ollama_url,
-                json={"model": self.ollama_model, "prompt": "test", "stream": False},
-                timeout=2,
-            )
-            self.ollama_enabled = response.status_code == 200
-        except:
-            self.ollama_enabled = False
+        # OLLAMA (local) : sonde légère, le modèle est préchargé en arrière-plan plus bas
+        self.ollama_url = ollama_host()
+        self.ollama_model = os.environ.get("OLLAMA_MODEL", "qwen2.5:7b")  # Meilleur que llama2 pour le français
+        self.ollama_enabled = self._test_ollama_connection()
 
         if self.ollama_enabled:
             print(f"✅ Ollama: CONNECTÉ ({self.ollama_model})")
@@ -205,6 +256,12 @@ class AgentFromagerHF:
         # FALLBACK LOCAL (TOUJOURS DISPONIBLE)
         print("✅ Base de connaissances: PRÊTE (fallback intelligent)")
 
+        # Registre des fournisseurs LLM (actifs selon les attributs *_enabled ci-dessus)
+        self.llm_registry = build_registry(self)
+        if self.ollama_enabled:
+            # Chargement à froid hors du chemin des requêtes, puis modèle gardé en mémoire
+            self.llm_registry.get("ollama").preload_in_background()
+
         # ===== RÉSUMÉ DES OPTIONS DISPONIBLES =====
         print("\n" + "=" * 50)
         print("🎯 OPTIONS DISPONIBLES (par ordre de priorité)")
@@ -240,8 +297,7 @@ class AgentFromagerHF:
         # Charger l'historique depuis HF au démarrage
         self._download_history_from_hf()
 
-        # Charger l'historique en mémoire
-        self.history = self._load_history()
+        # L'historique n'est pas gardé en mémoire : self.history relit le stockage
 
         # Configuration de retry pour les requêtes HTTP
         self._setup_retry_session()
@@ -328,18 +384,6 @@ class AgentFromagerHF:
         self.http.mount("https://", adapter)
         self.http.mount("http://", adapter)
 
-    def _test_ollama_connection(self):
-        """Teste la connexion à Ollama (local)"""
-        try:
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json={"model": "llama2", "prompt": "test", "stream": False},
-                timeout=3,
-            )
-            return response.status_code == 200
-        except:
-            return False
-
     def generate_llm_recipes():
         from llm_recipe_generator import generate_complete_knowledge_base
         
@@ -352,7 +396,13 @@ class AgentFromagerHF:
       
 
     def generate_cheese_image_kie(self, description, style, size="1024x1024"):
-        
+        """Façade synchrone de generate_cheese_image_kie_async"""
+        return run_sync(self.generate_cheese_image_kie_async(description, style, size))
+
+    @traced("image.kie")
+    @coalesce("image", _image_flight_key)
+    async def generate_cheese_image_kie_async(self, description, style, size="1024x1024"):
+        """Image KIE : création de la tâche puis polling, sans bloquer de thread pendant l'attente"""
         API_CREATE_URL = "https://api.kie.ai/api/v1/jobs/createTask"
         API_STATUS_URL = "https://api.kie.ai/api/v1/jobs/recordInfo"
 
@@ -363,18 +413,25 @@ class AgentFromagerHF:
         }
         headers = {"Authorization": f"Bearer {self.API_KEY}", "Content-Type": "application/json"}
 
+        client = http_client()
+
         # Création
-        response = requests.post(self.API_CREATE_URL, json=payload, headers=headers)
-        data = response.json()
+        task_start = time.perf_counter()
+        with span("image.kie.create"):
+            response = await client.post(self.API_CREATE_URL, json=payload, headers=headers)
+            data = response.json()
         
         if data.get("code") != 200:
+            KIE_TASK_SECONDS.observe(time.perf_counter() - task_start, outcome="create_error")
             return f"❌ Création KO: {data}", None
 
         task_id = data["data"]["taskId"]
 
         # Polling (structure KIE CONFIRMÉE)
+        set_attribute("task_id", task_id)
         for i in range(30):
-            resp = requests.get(self.API_STATUS_URL, params={"taskId": task_id}, headers=headers)
+            set_attribute("poll_attempts", i + 1)
+            resp = await client.get(self.API_STATUS_URL, params={"taskId": task_id}, headers=headers)
             result = resp.json()
             
             if result.get("code") == 200 and "data" in result:
@@ -382,7 +439,7 @@ class AgentFromagerHF:
                 state = task_data.get("state")
                 
                 if state in ("waiting", "queuing", "generating"):
-                    time.sleep(5)
+                    await asyncio.sleep(5)
                     continue
                     
                 if state == "success":
@@ -393,14 +450,18 @@ class AgentFromagerHF:
                     
                     if urls:
                         image_url = urls[0]  # Première image
-                        image_resp = requests.get(image_url)
+                        with span("image.download", url=image_url):
+                            image_resp = await client.get(image_url)
                         img = Image.open(BytesIO(image_resp.content))
+                        KIE_TASK_SECONDS.observe(time.perf_counter() - task_start, outcome="success")
                         return f"✅ {prompt[:30]}... 🧀", img
                     
+                KIE_TASK_SECONDS.observe(time.perf_counter() - task_start, outcome=state or "unknown")
                 return f"❌ {state}: {task_data}", None
             
-            time.sleep(5)
+            await asyncio.sleep(5)
 
+        KIE_TASK_SECONDS.observe(time.perf_counter() - task_start, outcome="timeout")
         return "⏰ Timeout 150s", None
 
     # ============================================================================
@@ -514,34 +575,43 @@ class AgentFromagerHF:
         
         
     def search_web_recipes(
-            self, ingredients: str, cheese_type: str, max_results: int = 6
+            self, ingredients: str, cheese_type: str, max_results: int = 6, plan: SearchPlan = None
+    ) -> list:
+            """Façade synchrone de search_web_recipes_async"""
+            return run_sync(self.search_web_recipes_async(ingredients, cheese_type, max_results, plan=plan))
+
+    @traced("search.web")
+    @coalesce("search", _search_flight_key)
+    async def search_web_recipes_async(
+            self, ingredients: str, cheese_type: str, max_results: int = 6, plan: SearchPlan = None
     ) -> list:
-            """Recherche hybride DYNAMIQUE : Web scraping + LLM"""
-        
-            print("\n" + "="*60)
-            print("🔍 RECHERCHE HYBRIDE DYNAMIQUE")
-            print("="*60)
-            print(f"📝 Ingrédients: {ingredients}")
-            print(f"🧀 Type: {cheese_type}")
-            print(f"🔢 Résultats demandés: {max_results}")
+            """Recherche hybride DYNAMIQUE : Web scraping + LLM (plan : recherche canonique de la requête)"""
+        
+            logger.info("RECHERCHE HYBRIDE DYNAMIQUE")
+            logger.info("Ingrédients: %s", ingredients)
+            logger.info("Type: %s", cheese_type)
+            logger.info("Résultats demandés: %s", max_results)
             
             # ===== PRIORITÉ 1 : SYSTÈME HYBRIDE =====
             if globals().get('DYNAMIC_HYBRID_AVAILABLE', False):
                 try:
-                    print("\n🎯 Activation du système hybride dynamique...")
+                    logger.info("Activation du système hybride dynamique...")
                     
                     # ===== ÉTAPE 1 : SCRAPING WEB (PRIORITAIRE) =====
-                    print("🌐 Phase 1 : Scraping web...")
-                    scraped_recipes = self._search_web_recipes_classic(
+                    logger.info("Phase 1 : Scraping web...")
+                    scraped_recipes = await self._search_web_recipes_classic_async(
                         ingredients=ingredients,
                         cheese_type=cheese_type,
-                        max_results=max_results
+                        max_results=max_results,
+                        plan=plan
                     )
                     
-                    print(f"✅ Scraping terminé : {len(scraped_recipes)} recettes trouvées")
+                    logger.info("Scraping terminé : %s recettes trouvées", len(scraped_recipes))
 
                     # ===== NOUVEAU : SAUVEGARDER LES RECETTES SCRAPÉES =====
-                    self._save_scraped_recipes_to_unified_history(
+                    # Écriture verrouillée du fichier : hors de la boucle asyncio
+                    await asyncio.to_thread(
+                        self._save_scraped_recipes_to_unified_history,
                         scraped_recipes, 
                         ingredients, 
                         cheese_type
@@ -553,20 +623,23 @@ class AgentFromagerHF:
                     
                     # Compter les recettes scrapées (avec URL)
                     real_scraped = [r for r in scraped_recipes if r.get('url') and r.get('source_type') == 'scraped']
-                    print(f"   📊 Dont {len(real_scraped)} vraiment scrapées du web")
+                    logger.debug("Dont %s vraiment scrapées du web", len(real_scraped))
                     
                     # ===== ÉTAPE 2 : COMPLÉTER AVEC IA SI BESOIN =====
                     if len(scraped_recipes) < max_results:
                         needed = max_results - len(scraped_recipes)
-                        print(f"🤖 Phase 2 : Génération IA pour {needed} recettes manquantes...")
+                        logger.info("Phase 2 : Génération IA pour %s recettes manquantes...", needed)
                         
+                        # Générateur synchrone (LLM via les façades) : dans un thread
                         generator = UnifiedRecipeGeneratorV2(self)
-                        recipe_data = generator.generate_recipe(
+                        recipe_data = await asyncio.to_thread(
+                            generator.generate_recipe,
                             ingredients=ingredients.split(','),
                             cheese_type=cheese_type,
                             creativity=1,
                             profile="🧀 Amateur",
-                            constraints=""
+                            constraints="",
+                            plan=plan
                         )
                         
                         if recipe_data:
@@ -574,60 +647,37 @@ class AgentFromagerHF:
                             recipe_data['source_type'] = 'generated'
                             recipe_data['url'] = None
                             scraped_recipes.append(recipe_data)
-                            print(f"✅ Ajout d'1 recette générée par IA")
+                            logger.info("Ajout d'1 recette générée par IA")
                     
-                    print(f"🎯 TOTAL : {len(scraped_recipes)} recettes (scraping + IA)")
+                    logger.info("TOTAL : %s recettes (scraping + IA)", len(scraped_recipes))
                     return scraped_recipes
                     
                 except Exception as e:
-                    print(f"❌ Erreur système hybride: {e}")
+                    logger.warning("Erreur système hybride: %s", e)
                     import traceback
                     traceback.print_exc()
                     # Continuer avec le fallback classique
             else:
-                print("⚠️ Système hybride non disponible, utilisation méthode classique")
+                logger.warning("Système hybride non disponible, utilisation méthode classique")
 
             
             # ===== PRIORITÉ 2 : FALLBACK CLASSIQUE =====
-            print("\n🔄 Fallback sur recherche classique...")
-            return self._search_web_recipes_classic(ingredients, cheese_type, max_results)
+            logger.info("Fallback sur recherche classique...")
+            return await self._search_web_recipes_classic_async(ingredients, cheese_type, max_results, plan=plan)
 
     def _save_scraped_recipes_to_unified_history(self, recipes, ingredients, cheese_type):
         """Sauvegarde les recettes scrapées dans unified_recipes_history.json"""
-        import os
         from datetime import datetime
         
         history_file = "unified_recipes_history.json"
         
-        # Charger l'historique existant
-        if os.path.exists(history_file):
-            with open(history_file, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-        else:
-            history = []
-        
-        saved_count = 0
+        new_entries = []
         
         # Ajouter chaque recette scrapée
         for recipe in recipes:
             # Vérifier que c'est bien une recette scrapée (avec URL)
             if recipe.get('url') and recipe.get('source_type') == 'scraped':
                 
-                recipe_url = recipe['url']
-                
-                # ===== VÉRIFICATION AMÉLIORÉE DES DOUBLONS =====
-                # Vérifier par URL ET par titre
-                is_duplicate = any(
-                    (h.get('url') == recipe_url) or 
-                    (h.get('title') == recipe.get('title') and h.get('url') == recipe_url)
-                    for h in history
-                )
-                
-                if is_duplicate:
-                    print(f"⏭️  Doublon ignoré: {recipe.get('title', '')[:50]}")
-                    continue
-                # ===== FIN VÉRIFICATION =====
-                
                 # Créer l'entrée pour l'historique
                 history_entry = {
                     'title': recipe.get('title', 'Recette sans titre'),
@@ -646,139 +696,137 @@ class AgentFromagerHF:
                     'score': recipe.get('score', 7),
                 }
                 
-                history.append(history_entry)
-                saved_count += 1
-                print(f"💾 Sauvegardé: {history_entry['title'][:50]}")
-        
-        # Sauvegarder dans le fichier
+                new_entries.append(history_entry)
+        
+        # ===== DOUBLONS (URL, puis titre + date) vérifiés sous le verrou du stockage =====
+        # La vérification et l'insertion forment une seule écriture atomique
+        saved = get_compactor(history_file).append_unique(
+            new_entries, unique_by=lambda entry: entry.get('url')
+        ) if new_entries else []
+        for entry in saved:
+            logger.info("Sauvegardé: %s", entry['title'][:50])
+        saved_count = len(saved)
+        
+        if len(new_entries) > saved_count:
+            logger.info("%s doublon(s) ignoré(s)", len(new_entries) - saved_count)
         if saved_count > 0:
-            with open(history_file, 'w', encoding='utf-8') as f:
-                json.dump(history, f, indent=2, ensure_ascii=False)
-            
-            print(f"✅ {saved_count} nouvelle(s) recette(s) scrapée(s) sauvegardée(s)")
+            logger.info("%s nouvelle(s) recette(s) scrapée(s) sauvegardée(s)", saved_count)
         else:
-            print(f"ℹ️  Aucune nouvelle recette à sauvegarder (toutes déjà présentes)")
-
-    # ===== FONCTION PRINCIPALE MISE À JOUR =====
-    def _search_web_recipes_classic(
-        self, ingredients: str, cheese_type: str, max_results: int = 6
-    ) -> list:
-        """Recherche web - GARANTIT au moins 6 résultats"""
+            logger.info("Aucune nouvelle recette à sauvegarder (toutes déjà présentes)")
 
-        all_recipes = []
-        min_required = max_results  # On veut AU MOINS 6 résultats
+    def _run_search_engines(self, query: str, min_required: int) -> list:
+        """Façade synchrone de _run_search_engines_async"""
+        return run_sync(self._run_search_engines_async(query, min_required))
 
+    async def _query_engine_async(self, engine_name, engine_func, query, min_required, **attributes) -> list:
+        """Un moteur de la cascade, mesuré et tracé ; [] en cas d'échec"""
         try:
-            from urllib.parse import quote
-            from bs4 import BeautifulSoup
-            import time
-            import random
+            phase = f" ({attributes['phase']})" if "phase" in attributes else ""
+            logger.debug("%s%s...", engine_name, phase)
+            with span("search.engine", engine=engine_name, **attributes) as engine_span, \
+                    SEARCH_ENGINE_SECONDS.time(engine=engine_name):
+                recipes = await engine_func(query, min_required)
+                engine_span.set("results", len(recipes or []))
+            SEARCH_ENGINE_RESULTS.inc(len(recipes or []), engine=engine_name)
+            return recipes or []
+        except Exception as e:
+            logger.warning("%s échoué: %s", engine_name, e)
+            return []
 
-            # ===== CONSTRUCTION INTELLIGENTE DE LA REQUÊTE =====
-            # Toujours inclure "fromage"
-            if cheese_type and cheese_type not in ["Laissez l'IA choisir ou pas !", "Laissez l'IA choisir ou pas !"]:
-                # Si type spécifique, l'utiliser
-                query = f"recette fromage {cheese_type} {ingredients}"
-            else:
-                # Sinon, juste "recette fromage" + ingrédients
-                query = f"recette fromage {ingredients}"
-            
-            # Nettoyer la requête (enlever virgules, etc.)
-            query = query.replace(',', ' ')
+    def _merge_engine_results(self, all_recipes: list, recipes: list):
+        """Ajoute les résultats d'un moteur (doublons d'URL ignorés)"""
+        if not recipes:
+            return
+        for recipe in recipes:
+            norm_url = self._normalize_url(recipe["url"])
+            if norm_url not in [
+                self._normalize_url(r["url"]) for r in all_recipes
+            ]:
+                all_recipes.append(recipe)
 
-            print(f"🔍 Recherche garantie: {query} (minimum {min_required} résultats)")
+        logger.debug("%s nouveaux, total: %s", len(recipes), len(all_recipes))
 
-            # ===== PHASE 1: MOTEURS PRINCIPAUX (rapides) =====
-            primary_engines = [
-                ("Google", self._search_google),
-                # ("Bing", self._search_bing),
-                ("Ecosia", self._search_ecosia),
-            ]
+    @traced("search.engines")
+    async def _run_search_engines_async(self, query: str, min_required: int) -> list:
+        """Cascade de moteurs pour une requête canonique (résultats bruts, dédoublonnés par URL)"""
+        all_recipes = []
 
-            for engine_name, engine_func in primary_engines:
-                if len(all_recipes) >= min_required * 2:  # On veut du choix
-                    break
+        # ===== PHASE 1: MOTEURS PRINCIPAUX (rapides, interrogés en parallèle) =====
+        primary_engines = [
+            ("Google", self._search_google_async),
+            # ("Bing", self._search_bing),
+            ("Ecosia", self._search_ecosia_async),
+        ]
 
-                try:
-                    print(f"  🔎 {engine_name}...")
-                    recipes = engine_func(query, min_required)
-
-                    if recipes:
-                        # Ajouter avec vérification des doublons
-                        for recipe in recipes:
-                            norm_url = self._normalize_url(recipe["url"])
-                            if norm_url not in [
-                                self._normalize_url(r["url"]) for r in all_recipes
-                            ]:
-                                all_recipes.append(recipe)
-
-                        print(
-                            f"    ✅ {len(recipes)} nouveaux, total: {len(all_recipes)}"
-                        )
+        # Google plafonne à min_required résultats : Ecosia était de toute façon toujours consulté
+        primary_results = await asyncio.gather(*(
+            self._query_engine_async(engine_name, engine_func, query, min_required)
+            for engine_name, engine_func in primary_engines
+        ))
+        for recipes in primary_results:
+            self._merge_engine_results(all_recipes, recipes)
 
-                    time.sleep(random.uniform(1, 1.5))
+        # Assez de choix : les moteurs secondaires ne sont pas sollicités
+        if len(all_recipes) >= min_required:
+            return all_recipes
 
-                except Exception as e:
-                    print(f"    ⚠️ {engine_name} échoué: {e}")
-                    continue
+        logger.warning("Seulement %s résultats, Phase 2...", len(all_recipes))
 
-            # ===== PHASE 2: VÉRIFICATION SI ON A ASSEZ =====
-            if len(all_recipes) >= min_required:
-                # On a assez, on trie et on retourne les meilleurs
-                unique_recipes = self._deduplicate_recipes(all_recipes)
-                unique_recipes.sort(key=lambda x: x.get("score", 0), reverse=True)
-                final = unique_recipes[:min_required]
-                print(f"🎯 Phase 1 suffisante: {len(final)} résultats uniques")
-                return final
+        secondary_engines = [
+            # ("Qwant", self._search_qwant),
+            ("DuckDuckGo Lite", self._search_simple_ddg_async),
+            # ("Yandex", self._search_yandex),
+        ]
 
-            # ===== PHASE 3: MOTEURS SECONDAIRES (si besoin) =====
-            print(f"⚠️ Seulement {len(all_recipes)} résultats, Phase 2...")
+        for engine_name, engine_func in secondary_engines:
+            if len(all_recipes) >= min_required * 2:
+                break
 
-            secondary_engines = [
-                # ("Qwant", self._search_qwant),
-                ("DuckDuckGo Lite", self._search_simple_ddg),
-                # ("Yandex", self._search_yandex),
-            ]
+            recipes = await self._query_engine_async(
+                engine_name, engine_func, query, min_required, phase="secondaire"
+            )
+            self._merge_engine_results(all_recipes, recipes)
 
-            for engine_name, engine_func in secondary_engines:
-                if len(all_recipes) >= min_required * 2:
-                    break
+        return all_recipes
 
-                try:
-                    print(f"  🔎 {engine_name} (secondaire)...")
-                    recipes = engine_func(query, min_required)
-
-                    if recipes:
-                        for recipe in recipes:
-                            norm_url = self._normalize_url(recipe["url"])
-                            if norm_url not in [
-                                self._normalize_url(r["url"]) for r in all_recipes
-                            ]:
-                                all_recipes.append(recipe)
-
-                        print(
-                            f"    ✅ {len(recipes)} nouveaux, total: {len(all_recipes)}"
-                        )
+    def planned_search_urls(self, ingredients, cheese_type, plan: SearchPlan = None) -> list:
+        """URLs de la recherche canonique (partagées avec l'onglet des résultats web)"""
+        return search_plan(ingredients, cheese_type, plan).urls(self._run_search_engines)
 
-                    time.sleep(random.uniform(0.8, 1.2))
+    # ===== FONCTION PRINCIPALE MISE À JOUR =====
+    def _search_web_recipes_classic(
+        self, ingredients: str, cheese_type: str, max_results: int = 6, plan: SearchPlan = None
+    ) -> list:
+        """Façade synchrone de _search_web_recipes_classic_async"""
+        return run_sync(self._search_web_recipes_classic_async(ingredients, cheese_type, max_results, plan))
 
-                except Exception as e:
-                    print(f"    ⚠️ {engine_name} échoué: {e}")
-                    continue
+    @traced("search.classic")
+    async def _search_web_recipes_classic_async(
+        self, ingredients: str, cheese_type: str, max_results: int = 6, plan: SearchPlan = None
+    ) -> list:
+        """Recherche web - GARANTIT au moins 6 résultats"""
+
+        min_required = max_results  # On veut AU MOINS 6 résultats
+
+        try:
+            # ===== RECHERCHE CANONIQUE (plan partagé avec la génération) =====
+            plan = search_plan(ingredients, cheese_type, plan)
+            logger.info("Recherche garantie: %s (minimum %s résultats)", plan.query, min_required)
+            all_recipes = await plan.results_async(self._run_search_engines_async)
 
             # ===== PHASE 4: GARANTIE MINIMUM =====
-            print(f"📊 Après Phase 2: {len(all_recipes)} résultats")
+            logger.info("Après Phase 2: %s résultats", len(all_recipes))
 
             if len(all_recipes) >= min_required:
                 # On a assez maintenant
                 unique_recipes = self._deduplicate_recipes(all_recipes)
                 unique_recipes.sort(key=lambda x: x.get("score", 0), reverse=True)
                 final = unique_recipes[:min_required]
-                print(f"🎯 Suffisant après Phase 2: {len(final)} résultats")
+                logger.info("Suffisant après Phase 2: %s résultats", len(final))
                 return final
 
             # ===== PHASE 5: BACKUP HYBRIDE (force d'avoir 6 résultats) =====
-            print(f"🚨 BACKUP: Seulement {len(all_recipes)} résultats, on complète...")
+            logger.info("BACKUP: Seulement %s résultats, on complète...", len(all_recipes))
 
             # 1. D'abord les résultats web qu'on a
             final_recipes = self._deduplicate_recipes(all_recipes)
@@ -786,7 +834,7 @@ class AgentFromagerHF:
             # 2. Ensuite le fallback enrichi
             needed = min_required - len(final_recipes)
             if needed > 0:
-                print(f"   📥 Besoin de {needed} résultats supplémentaires")
+                logger.debug("Besoin de %s résultats supplémentaires", needed)
 
                 # Fallback statique
                 fallback = self._get_enriched_fallback_recipes(
@@ -804,15 +852,11 @@ class AgentFromagerHF:
                     ]:
                         final_recipes.append(recipe)
 
-                print(
-                    f"   ✅ Ajouté {len(final_recipes) - len(all_recipes)} du fallback"
-                )
+                logger.debug("Ajouté %s du fallback", len(final_recipes) - len(all_recipes))
 
             # 3. Si TOUJOURS pas assez, on génère des recettes "similaires"
             if len(final_recipes) < min_required:
-                print(
-                    f"   🚨 CRITIQUE: Encore {min_required - len(final_recipes)} manquants"
-                )
+                logger.debug("CRITIQUE: Encore %s manquants", min_required - len(final_recipes))
                 generated = self._generate_similar_recipes(
                     ingredients, cheese_type, min_required - len(final_recipes)
                 )
@@ -822,13 +866,11 @@ class AgentFromagerHF:
             final_recipes = final_recipes[:min_required]
             final_recipes.sort(key=lambda x: x.get("score", 0), reverse=True)
 
-            print(
-                f"🎯 FINAL: Garanti {len(final_recipes)} résultats (dont {len(all_recipes)} du web)"
-            )
+            logger.info("FINAL: Garanti %s résultats (dont %s du web)", len(final_recipes), len(all_recipes))
             return final_recipes
 
         except Exception as e:
-            print(f"❌ Erreur recherche garantie: {e}")
+            logger.warning("Erreur recherche garantie: %s", e)
             import traceback
 
             traceback.print_exc()
@@ -858,7 +900,7 @@ class AgentFromagerHF:
 
     def _generate_similar_recipes(self, ingredients, cheese_type, count):
             """Génère des recettes similaires basées sur la base de connaissances"""
-            print(f"   🧠 Génération de {count} recettes similaires...")
+            logger.debug("Génération de %s recettes similaires...", count)
 
             similar_recipes = []
             base_url = "https://fromage-maison.com/recettes/"
@@ -942,19 +984,18 @@ class AgentFromagerHF:
         
         import os
         
-        print(f"🚨 FALLBACK ABSOLU activé pour {min_required} résultats")
+        logger.info("FALLBACK ABSOLU activé pour %s résultats", min_required)
         
         # ===== ESSAYER D'ABORD LA BASE ENRICHIE =====
         enriched_file = "complete_knowledge_base.json"
         
-        if os.path.exists(enriched_file):
-            print("📚 Chargement de la base enrichie...")
+        if get_store().version(enriched_file) is not None or os.path.exists(enriched_file):
+            logger.info("Chargement de la base enrichie...")
             try:
-                with open(enriched_file, 'r', encoding='utf-8') as f:
-                    enriched_recipes = json.load(f)
+                enriched_recipes = get_store().read(enriched_file)
                 
                 if enriched_recipes and len(enriched_recipes) > 0:
-                    print(f"✅ Base enrichie chargée : {len(enriched_recipes)} recettes")
+                    logger.info("Base enrichie chargée : %s recettes", len(enriched_recipes))
                     
                     # Détecter le type de lait demandé
                     lait_demande = self._detect_lait_from_ingredients(ingredients)
@@ -965,7 +1006,7 @@ class AgentFromagerHF:
                     if lait_demande:
                         filtered = [r for r in enriched_recipes if r.get('lait') == lait_demande]
                         if filtered:
-                            print(f"   🎯 {len(filtered)} recettes pour lait de {lait_demande}")
+                            logger.debug("%s recettes pour lait de %s", len(filtered), lait_demande)
                             # Trier par score
                             sorted_recipes = sorted(filtered, key=lambda x: x.get('score', 0), reverse=True)
                             selected_recipes = sorted_recipes[:min_required]
@@ -973,7 +1014,7 @@ class AgentFromagerHF:
                     # Si pas assez de recettes avec le lait demandé, compléter avec d'autres
                     if len(selected_recipes) < min_required:
                         needed = min_required - len(selected_recipes)
-                        print(f"   📥 Besoin de {needed} recettes supplémentaires")
+                        logger.debug("Besoin de %s recettes supplémentaires", needed)
                         
                         # Prendre les meilleures recettes qui ne sont pas déjà sélectionnées
                         already_selected_urls = {r.get('url', '') for r in selected_recipes}
@@ -984,20 +1025,20 @@ class AgentFromagerHF:
                         selected_recipes.extend(sorted_remaining[:needed])
                     
                     if len(selected_recipes) >= min_required:
-                        print(f"✅ Retour de {len(selected_recipes)} recettes depuis la base enrichie")
+                        logger.info("Retour de %s recettes depuis la base enrichie", len(selected_recipes))
                         return selected_recipes[:min_required]
                         
             except Exception as e:
-                print(f"⚠️ Erreur chargement base enrichie: {e}")
-                print("   → Fallback sur base classique")
+                logger.warning("Erreur chargement base enrichie: %s", e)
+                logger.debug("Fallback sur base classique")
         
         # ===== SI PAS DE BASE ENRICHIE, UTILISER L'ANCIEN SYSTÈME =====
-        print("📋 Utilisation de la base classique (statique)")
+        logger.info("Utilisation de la base classique (statique)")
         
         # Détecter le type de lait demandé (si spécifié)
         lait_demande = self._detect_lait_from_ingredients(ingredients)
         if lait_demande:
-            print(f"   🥛 Lait demandé détecté: {lait_demande}")
+            logger.debug("Lait demandé détecté: %s", lait_demande)
 
         # ===== 1. BASE DE RECETTES NEUTRES =====
         neutral_recipes = [
@@ -1137,12 +1178,12 @@ class AgentFromagerHF:
         selected_recipes = []
 
         if lait_demande and lait_demande in lait_specific_recipes:
-            print(f"   🎯 Sélection spécifique pour lait de {lait_demande}")
+            logger.debug("Sélection spécifique pour lait de %s", lait_demande)
             selected_recipes = lait_specific_recipes[lait_demande][:min_required]
 
         if len(selected_recipes) < min_required:
             needed = min_required - len(selected_recipes)
-            print(f"   📥 Besoin de {needed} recettes supplémentaires (neutres)")
+            logger.debug("Besoin de %s recettes supplémentaires (neutres)", needed)
 
             for recipe in neutral_recipes:
                 if len(selected_recipes) >= min_required:
@@ -1162,7 +1203,7 @@ class AgentFromagerHF:
                     selected_recipes.append(recipe)
 
         if len(selected_recipes) < min_required:
-            print(f"   🚨 Dernier recours: {min_required - len(selected_recipes)} manquants")
+            logger.debug("Dernier recours: %s manquants", min_required - len(selected_recipes))
 
             ultra_neutral = [
                 {
@@ -1190,7 +1231,7 @@ class AgentFromagerHF:
 
         selected_recipes = selected_recipes[:min_required]
 
-        print(f"✅ Fallback: {len(selected_recipes)} résultats")
+        logger.info("Fallback: %s résultats", len(selected_recipes))
 
         return selected_recipes
     
@@ -1199,85 +1240,43 @@ class AgentFromagerHF:
         if not ingredients:
             return None
 
-        ingredients_lower = ingredients.lower()
-
-        # Mots-clés pour chaque type de lait
-        lait_patterns = {
-            "brebis": [
-                "brebis",
-                "mouton",
-                "ovin",
-                "sheep",
-                "manchego",
-                "pecorino",
-                "roquefort",
-            ],
-            "chèvre": [
-                "chèvre",
-                "chevre",
-                "caprin",
-                "goat",
-                "crottin",
-                "sainte-maure",
-                "bûche",
-            ],
-            "vache": [
-                "vache",
-                "bovin",
-                "cow",
-                "lait de vache",
-                "camembert",
-                "brie",
-                "comté",
-            ],
-            "bufflonne": ["bufflonne", "buffle", "buffalo", "mozzarella di bufala"],
-        }
-
-        # Priorité aux patterns les plus spécifiques
-        for lait_type, patterns in lait_patterns.items():
-            for pattern in patterns:
-                if pattern in ingredients_lower:
-                    return lait_type
-
-        # Vérifier "lait de X"
-        if "lait de brebis" in ingredients_lower:
-            return "brebis"
-        elif (
-            "lait de chèvre" in ingredients_lower
-            or "lait de chevre" in ingredients_lower
-        ):
-            return "chèvre"
-        elif "lait de vache" in ingredients_lower:
-            return "vache"
-
+        # Un seul passage : mots de lait + fromages typiques (roquefort, crottin...),
+        # un seul ordre de priorité pour les deux (brebis > chèvre > vache > bufflonne)
+        hits = get_matcher(self.knowledge_base).scan(ingredients)
+        found = set(hits.labels("lait")) | set(hits.labels("lait_indice"))
+        for lait in ["brebis", "chèvre", "vache", "bufflonne"]:
+            if lait in found:
+                return lait
         return None
 
         # ===== FONCTIONS AUXILIAIRES =====
-
     def search_web_recipes_fallback(self, ingredients, cheese_type, max_results=6):
         """Fallback robuste avec différentes stratégies"""
-        print("🔄 Activation du mode fallback")
+        logger.info("Activation du mode fallback")
 
         try:
             # Stratégie 1: Recherche très simple
             simple_results = self._search_simple(ingredients, cheese_type, max_results)
             if simple_results:
-                print(f"✅ Fallback simple: {len(simple_results)} résultats")
+                logger.info("Fallback simple: %s résultats", len(simple_results))
                 return simple_results
 
             # Stratégie 2: Retourner des recettes statiques de la base
-            print("⚠️ Utilisation de la base statique")
+            logger.warning("Utilisation de la base statique")
             return self._get_static_fallback_recipes(ingredients, cheese_type)
 
         except Exception as e:
-            print(f"❌ Erreur fallback: {e}")
+            logger.warning("Erreur fallback: %s", e)
             return []
 
     def _search_simple(self, ingredients, cheese_type, max_results):
+        """Façade synchrone de _search_simple_async"""
+        return run_sync(self._search_simple_async(ingredients, cheese_type, max_results))
+
+    async def _search_simple_async(self, ingredients, cheese_type, max_results):
         """Recherche HTML très simple"""
         try:
             from urllib.parse import quote
-            import requests
 
             query = f"fromage {ingredients} recette"
             url = f"https://duckduckgo.com/html/?q={quote(query)}&kl=fr-fr"
@@ -1286,7 +1285,11 @@ class AgentFromagerHF:
                 "User-Agent": "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)"
             }
 
-            response = requests.get(url, headers=headers, timeout=15)
+            # Même point d'entrée que _try_duckduckgo_html : même seau partagé
+            if not await get_rate_limiter().acquire_async("engine:ddg_html", max_wait=ENGINE_MAX_WAIT):
+                return []
+            response = await http_client().get(url, headers=headers, timeout=15)
+            get_rate_limiter().observe("engine:ddg_html", response)
 
             if response.status_code == 200:
                 from bs4 import BeautifulSoup
@@ -1328,7 +1331,7 @@ class AgentFromagerHF:
 
                 return recipes
         except Exception as e:
-            print(f"⚠️ Erreur recherche simple: {e}")
+            logger.warning("Erreur recherche simple: %s", e)
 
         return []
 
@@ -1985,7 +1988,7 @@ class AgentFromagerHF:
     def _download_history_from_hf(self):
         """Télécharge l'historique depuis HF Dataset"""
         if not self.api:
-            print("⚠️  Pas de token HF - historique local uniquement")
+            logger.warning("Pas de token HF - historique local uniquement")
             return
 
         try:
@@ -2002,19 +2005,21 @@ class AgentFromagerHF:
             with open(self.recipes_file, "w", encoding="utf-8") as dst:
                 json.dump(history, dst, indent=2, ensure_ascii=False)
 
-            print(f"✅ Historique chargé : {len(history)} recettes")
+            logger.info("Historique chargé : %s recettes", len(history))
 
         except Exception as e:
-            print(f"ℹ️  Pas d'historique existant: {e}")
+            logger.info("Pas d'historique existant: %s", e)
             with open(self.recipes_file, "w", encoding="utf-8") as f:
                 json.dump([], f)
 
+    @traced("hf.upload")
     def _upload_history_to_hf(self):
         """Upload l'historique vers HF Dataset"""
         if not self.api:
-            print("⚠️  Pas de token HF - sauvegarde locale uniquement")
+            logger.warning("Pas de token HF - sauvegarde locale uniquement")
             return False
 
+        upload_start = time.perf_counter()
         try:
             self.api.upload_file(
                 path_or_fileobj=self.recipes_file,
@@ -2023,10 +2028,12 @@ class AgentFromagerHF:
                 repo_type="dataset",
                 commit_message=f"Update: {datetime.now().strftime('%Y-%m-%d %H:%M')}",
             )
-            print("✅ Historique synchronisé avec HF")
+            HF_UPLOAD_SECONDS.observe(time.perf_counter() - upload_start, outcome="success")
+            logger.info("Historique synchronisé avec HF")
             return True
         except Exception as e:
-            print(f"❌ Erreur upload HF: {e}")
+            HF_UPLOAD_SECONDS.observe(time.perf_counter() - upload_start, outcome="error")
+            logger.warning("Erreur upload HF: %s", e)
             return False
 
     def get_history(self):
@@ -2037,7 +2044,7 @@ class AgentFromagerHF:
                     return json.load(f)
             return []
         except Exception as e:
-            print(f"❌ Erreur get_history: {e}")
+            logger.warning("Erreur get_history: %s", e)
             return []
         
         # DOUBLON A RECONFIRMER
@@ -2287,7 +2294,7 @@ class AgentFromagerHF:
         #         return False
         
     def clean_all_duplicates(self):
-        """Nettoie les doublons - SANS REGEX UNICODE"""
+        """Nettoie les doublons (compaction atomique de l'historique unifié)"""
         import os
     
         
@@ -2296,91 +2303,59 @@ class AgentFromagerHF:
         if not os.path.exists(history_file):
             return "❌ Fichier manquant"
         
-        with open(history_file, 'r', encoding='utf-8') as f:
-            all_recipes = json.load(f)
-        
-        # NORMALISATION SIMPLE (sans regex unicode)
-        def simple_clean(title):
-            # Enlève les emojis courants manuellement
-            emojis = "🤖🧪📅📋🥛🐄🧀✨🎉📊🔍🗑️✅❌"
-            for emoji in emojis:
-                title = title.replace(emoji, "")
-            # Nettoie espaces + casse
-            title = " ".join(title.split()).lower().strip()
-            return title
-        
-        seen = set()
-        cleaned = []
-        
-        for r in all_recipes:
-            title_raw = r.get('title', '')
-            title_clean = simple_clean(title_raw)
-            
-            # Date simple (16 premiers caractères)
-            date = r.get('generated_at') or r.get('date_creation') or r.get('date', '')
-            date_key = date[:16] if len(date) >= 16 else date
-            
-            key = f"{title_clean}|{date_key}"
-            
-            if key not in seen:
-                cleaned.append(r)
-                seen.add(key)
-        
-        # Sauvegarde
-        with open(history_file, 'w', encoding='utf-8') as f:
-            json.dump(cleaned, f, ensure_ascii=False, indent=2)
+        before, after = get_compactor(history_file).compact()
         
-        removed = len(all_recipes) - len(cleaned)
+        removed = before - after
         return f"""✅ **DOUBLONS SUPPRIMÉS !**
 
-    Avant: {len(all_recipes)} recettes
-    Après: {len(cleaned)} recettes
+    Avant: {before} recettes
+    Après: {after} recettes
     **Supprimés: {removed}** 🎉"""
 
         
     def _extract_cheese_name(self, recipe):
         """Extrait le nom du fromage de la recette"""
         import re
-        print("🆕 NOUVELLE VERSION _extract_cheese_name appelée")
+        logger.debug("NOUVELLE VERSION _extract_cheese_name appelée")
         
         recipe_lines = recipe.split("\n")
-        print(f"📊 Nombre de lignes: {len(recipe_lines)}")
+        logger.debug("Nombre de lignes: %s", len(recipe_lines))
         
         # Le titre est TOUJOURS à la ligne 2
         if len(recipe_lines) > 2:
             title_line = recipe_lines[2]
-            print(f"🔍 Ligne [2]: {repr(title_line)}")
+            logger.debug("Ligne [2]: %s", repr(title_line))
             
             if "║" in title_line:
                 # Nettoyer : enlever ║
                 name = title_line.replace("║", "").strip()
-                print(f"  Après suppression ║: {repr(name)}")
+                logger.debug("Après suppression ║: %s", repr(name))
                 
                 # Enlever TOUS les emojis (y compris 📋)
                 name = re.sub(r'[\U0001F300-\U0001F9FF]', '', name).strip()
-                print(f"  Après suppression emojis: {repr(name)}")
+                logger.debug("Après suppression emojis: %s", repr(name))
                 
                 # ===== MODIFICATION ICI : Enlever le code (#...) =====
                 name = re.sub(r'\s*\(#\d+\)\s*$', '', name).strip()
-                print(f"  Après suppression code: {repr(name)}")
+                logger.debug("Après suppression code: %s", repr(name))
                 # ===== FIN MODIFICATION =====
                 
-                print(f"  Longueur: {len(name)}")
-                print(f"  Contient '(' dans name nettoyé: {('(' in name)}")
-                print(f"  Contient 'Profil:': {('Profil:' in name)}")
+                logger.debug("Longueur: %s", len(name))
+                logger.debug("Contient '(' dans name nettoyé: %s", '(' in name)
+                logger.debug("Contient 'Profil:': %s", 'Profil:' in name)
                 
                 # ===== CHANGEMENT : vérifier dans 'name' au lieu de 'title_line' =====
                 if name and len(name) > 3 and "(" not in name and "Profil:" not in name:
-                    print(f"✅ Titre extrait ligne [2]: '{name}'")
+                    logger.debug("Titre extrait ligne [2]: '%s'", name)
                     return name
                 else:
-                    print(f"❌ Conditions non remplies")
+                    logger.debug("Conditions non remplies")
             else:
-                print(f"❌ Pas de ║ dans la ligne")
+                logger.debug("Pas de ║ dans la ligne")
         else:
-            print(f"❌ Pas assez de lignes")
+            logger.debug("Pas assez de lignes")
         
-        print("⚠️ Titre par défaut utilisé")
+        logger.debug("Titre par défaut utilisé")
         return "Fromage personnalisé"
     
     def get_knowledge_summary(self):
@@ -2645,9 +2620,6 @@ class AgentFromagerHF:
             with open(self.recipes_file, "w", encoding="utf-8") as f:
                 json.dump([], f)
 
-            # ✅ AJOUTER CETTE LIGNE
-            self.history = []
-
             if self.api:
                 self._upload_history_to_hf()
                 return "✅ Historique effacé (local + HF) !"
@@ -2675,8 +2647,6 @@ class AgentFromagerHF:
         lait_detecte = self._detect_lait_from_ingredients(ingredients)
 
         # 2. Extraire les aromates principaux
-        ing_list = [i.strip().lower() for i in ingredients.split(",")]
-        aromates = []
         aromates_list = [
             "thym",
             "romarin",
@@ -2687,11 +2657,12 @@ class AgentFromagerHF:
             "cumin",
             "herbes",
         ]
-
-        for ing in ing_list:
-            for aromate in aromates_list:
-                if aromate in ing:
-                    aromates.append(aromate)
+        # Par ingrédient, dans l'ordre de la liste (le premier aromate de chacun d'abord)
+        matcher = get_matcher(self.knowledge_base)
+        aromates = []
+        for ing in ingredients.split(","):
+            found = matcher.scan(ing).labels("aromate")
+            aromates.extend(a for a in aromates_list if a in found)
 
         # 3. Construire requête SIMPLE comme un humain
         query_parts = []
@@ -2721,8 +2692,8 @@ class AgentFromagerHF:
         query = " ".join(query_parts)
 
         # 4. Log pour debug
-        print(f"🔍 Requête construite: '{query}'")
-        print(f"   Détails: lait={lait_detecte}, aromates={aromates}")
+        logger.info("Requête construite: '%s'", query)
+        logger.debug("Détails: lait=%s, aromates=%s", lait_detecte, aromates)
 
         return query
 
@@ -2731,38 +2702,22 @@ class AgentFromagerHF:
         if not ingredients:
             return None
 
-        ingredients_lower = ingredients.lower()
-
-        # Recherche directe
-        if "brebis" in ingredients_lower:
-            return "brebis"
-        elif "chèvre" in ingredients_lower or "chevre" in ingredients_lower:
-            return "chèvre"
-        elif "vache" in ingredients_lower:
-            return "vache"
-        elif "bufflonne" in ingredients_lower:
-            return "bufflonne"
-
-        # Recherche dans "lait de X"
-        if "lait de brebis" in ingredients_lower:
-            return "brebis"
-        elif "lait de chèvre" in ingredients_lower:
-            return "chèvre"
-        elif "lait de vache" in ingredients_lower:
-            return "vache"
-
-        return None
+        return get_matcher(self.knowledge_base).scan(ingredients).first(
+            "lait", ["brebis", "chèvre", "vache", "bufflonne"]
+        )
 
     def _try_serpapi_search(self, query, max_results):
+        """Façade synchrone de _try_serpapi_search_async"""
+        return run_sync(self._try_serpapi_search_async(query, max_results))
+
+    async def _try_serpapi_search_async(self, query, max_results):
         """Utilise SerpAPI (nécessite clé API)"""
         try:
             serpapi_key = os.environ.get("SERPAPI_KEY")
             if not serpapi_key:
-                print("   ⚠️ SerpAPI: pas de clé API définie")
+                logger.warning("SerpAPI: pas de clé API définie")
                 return []
 
-            import requests
-
             params = {
                 "engine": "google",
                 "q": query,
@@ -2772,9 +2727,12 @@ class AgentFromagerHF:
                 "num": max_results,
             }
 
-            response = requests.get(
+            if not await get_rate_limiter().acquire_async("engine:serpapi", max_wait=ENGINE_MAX_WAIT):
+                return []
+            response = await http_client().get(
                 "https://serpapi.com/search", params=params, timeout=15
             )
+            get_rate_limiter().observe("engine:serpapi", response)
 
             if response.status_code == 200:
                 data = response.json()
@@ -2796,24 +2754,25 @@ class AgentFromagerHF:
                 return recipes
 
         except Exception as e:
-            print(f"   ⚠️ SerpAPI error: {e}")
+            logger.warning("SerpAPI error: %s", e)
 
         return []
 
     def _try_google_custom_search(self, query, max_results):
+        """Façade synchrone de _try_google_custom_search_async"""
+        return run_sync(self._try_google_custom_search_async(query, max_results))
+
+    async def _try_google_custom_search_async(self, query, max_results):
         """Utilise Google Custom Search JSON API"""
         try:
             google_api_key = os.environ.get("GOOGLE_API_KEY")
             google_cse_id = os.environ.get("GOOGLE_CSE_ID")
 
             if not google_api_key or not google_cse_id:
-                print("   ⚠️ Google CSE: pas de clés API définies")
+                logger.warning("Google CSE: pas de clés API définies")
                 return []
 
-            import requests
-            from urllib.parse import quote
-
-            url = f"https://www.googleapis.com/customsearch/v1"
+            url = "https://www.googleapis.com/customsearch/v1"
             params = {
                 "key": google_api_key,
                 "cx": google_cse_id,
@@ -2823,7 +2782,10 @@ class AgentFromagerHF:
                 "gl": "fr",
             }
 
-            response = requests.get(url, params=params, timeout=15)
+            if not await get_rate_limiter().acquire_async("engine:google_cse", max_wait=ENGINE_MAX_WAIT):
+                return []
+            response = await http_client().get(url, params=params, timeout=15)
+            get_rate_limiter().observe("engine:google_cse", response)
 
             if response.status_code == 200:
                 data = response.json()
@@ -2845,17 +2807,19 @@ class AgentFromagerHF:
                 return recipes
 
         except Exception as e:
-            print(f"   ⚠️ Google CSE error: {e}")
+            logger.warning("Google CSE error: %s", e)
 
         return []
 
     def _try_duckduckgo_html(self, query, max_results):
+        """Façade synchrone de _try_duckduckgo_html_async"""
+        return run_sync(self._try_duckduckgo_html_async(query, max_results))
+
+    async def _try_duckduckgo_html_async(self, query, max_results):
         """Fallback: DuckDuckGo HTML scraping"""
         try:
-            import requests
             from bs4 import BeautifulSoup
             from urllib.parse import quote
-            import time
 
             url = f"https://html.duckduckgo.com/html/?q={quote(query)}"
 
@@ -2865,10 +2829,12 @@ class AgentFromagerHF:
                 "Accept-Language": "fr-FR,fr;q=0.9",
             }
 
-            # Attendre pour paraître humain
-            time.sleep(2)
+            # Espacement partagé entre utilisateurs : attente seulement si le seau est vide
+            if not await get_rate_limiter().acquire_async("engine:ddg_html", max_wait=ENGINE_MAX_WAIT):
+                return []
 
-            response = requests.get(url, headers=headers, timeout=15)
+            response = await http_client().get(url, headers=headers, timeout=15)
+            get_rate_limiter().observe("engine:ddg_html", response)
 
             if response.status_code == 200:
                 soup = BeautifulSoup(response.text, "html.parser")
@@ -2934,39 +2900,29 @@ class AgentFromagerHF:
                         )
 
                     except Exception as e:
-                        print(f"      ⚠️ DDG parse error: {e}")
+                        logger.warning("DDG parse error: %s", e)
                         continue
 
                 return recipes
 
         except Exception as e:
-            print(f"   ⚠️ DuckDuckGo error: {e}")
+            logger.warning("DuckDuckGo error: %s", e)
 
         return []
 
     def _clean_web_results(self, recipes, ingredients):
         """Nettoie et filtre les résultats web pour garder UNIQUEMENT les recettes de FROMAGE"""
         
-        # Mots-clés OBLIGATOIRES pour qu'une recette soit considérée comme du fromage
-        fromage_keywords = [
-            'fromage', 'cheese', 'mozzarella', 'cheddar', 'brie', 'camembert',
-            'roquefort', 'comté', 'gruyère', 'emmental', 'parmesan',
-            'chèvre', 'brebis', 'vache', 'bufflonne',
-            'lait caillé', 'caillé', 'présure', 'affinage', 'croûte',
-            'pâte molle', 'pâte pressée', 'pâte persillée',
-            'faisselle', 'ricotta', 'mascarpone', 'cottage', 'feta'
-        ]
-        
-        # Mots-clés INTERDITS (recettes qui NE SONT PAS du fromage)
-        forbidden_keywords = [
-            'tarte', 'gâteau', 'cake', 'cookie', 'biscuit', 'crêpe', 'pancake',
-            'pain', 'brioche', 'viennoiserie', 'pâtisserie',
-            'chocolat', 'marron', 'châtaigne', 'fruit', 'confiture',
-            'viande', 'poisson', 'poulet', 'boeuf', 'porc',
-            'salade', 'soupe', 'potage', 'légume',
-            'dessert', 'glace', 'sorbet', 'mousse au chocolat',
-            'crème brûlée', 'flan', 'tiramisu'
+        # Mots-clés fromage / INTERDITS : vocabulaires partagés (fromage_matcher)
+        matcher = get_matcher(self.knowledge_base)
+
+        # Ingrédients demandés : petit automate construit une fois pour tout le lot
+        ingredients_demandes = [
+            ing.strip() for ing in ingredients.lower().split(",") if len(ing.strip()) > 3
         ]
+        ingredients_matcher = KeywordMatcher(
+            {"ingredient": {str(i): [ing] for i, ing in enumerate(ingredients_demandes)}}
+        )
         
         cleaned = []
         seen_urls = set()
@@ -2992,46 +2948,44 @@ class AgentFromagerHF:
                     recipe.get("title", "") + " " + recipe.get("description", "")
                 ).lower()
                 
+                hits = matcher.scan(recipe_text)
+
                 # ✅ FILTRE 1 : Vérifier qu'il y a AU MOINS un mot-clé fromage
-                has_fromage_keyword = any(keyword in recipe_text for keyword in fromage_keywords)
+                has_fromage_keyword = hits.has("fromage")
                 
                 # ❌ FILTRE 2 : Vérifier qu'il n'y a AUCUN mot interdit
-                has_forbidden_keyword = any(keyword in recipe_text for keyword in forbidden_keywords)
+                has_forbidden_keyword = hits.has("interdit")
                 
                 # ❌ REJETER si pas de mot fromage OU si mot interdit
                 if not has_fromage_keyword or has_forbidden_keyword:
-                    print(f"   ❌ REJETÉ: {recipe.get('title', '')[:60]} (pas du fromage)")
+                    logger.debug("REJETÉ: %s (pas du fromage)", recipe.get('title', '')[:60])
                     continue
                 
                 # ✅ C'est bien une recette de fromage !
                 
                 # Calculer score de pertinence
-                ingredients_lower = ingredients.lower()
                 score = recipe.get("score", 5)
 
                 # Bonus pour correspondance avec ingrédients demandés
-                for ing in ingredients_lower.split(","):
-                    ing = ing.strip()
-                    if len(ing) > 3 and ing in recipe_text:
-                        score += 1
+                score += len(ingredients_matcher.scan(recipe_text).labels("ingredient"))
 
                 recipe["score"] = min(10, score)
                 cleaned.append(recipe)
 
             except Exception as e:
-                print(f"⚠️ Clean error: {e}")
+                logger.warning("Clean error: %s", e)
                 continue
 
         # Trier par score
         cleaned.sort(key=lambda x: x.get("score", 0), reverse=True)
         
-        print(f"   ✅ {len(cleaned)} recettes de fromage validées (sur {len(recipes)} initiales)")
+        logger.debug("%s recettes de fromage validées (sur %s initiales)", len(cleaned), len(recipes))
 
         return cleaned
 
     def _get_fallback_with_real_urls(self, ingredients, cheese_type, max_results):
         """Fallback avec de VRAIES URLs de sites de recettes"""
-        print("🔄 Fallback avec URLs réelles...")
+        logger.info("Fallback avec URLs réelles...")
 
         # Sites réels de recettes de fromage
         real_recipes = [
@@ -3112,7 +3066,7 @@ class AgentFromagerHF:
 
     def _get_smart_fallback(self, ingredients, cheese_type, max_results):
         """Fallback intelligent qui FILTRE par type de lait"""
-        print(f"🧠 Fallback PERSONNALISÉ pour: {ingredients}")
+        logger.info("Fallback PERSONNALISÉ pour: %s", ingredients)
 
         # Analyser PRÉCISÉMENT les ingrédients
         ing_list = [i.strip().lower() for i in ingredients.split(",")]
@@ -3148,7 +3102,7 @@ class AgentFromagerHF:
                         lait_detecte = "bufflonne"
                     break
 
-        print(f"   🥛 Lait détecté: {lait_detecte or 'non spécifié'}")
+        logger.debug("Lait détecté: %s", lait_detecte or 'non spécifié')
 
         # Base de recettes ADAPTÉES par type de lait
         lait_specific_recipes = {
@@ -3259,9 +3213,7 @@ class AgentFromagerHF:
         # Sélectionner les recettes ADAPTÉES
         if lait_detecte and lait_detecte in lait_specific_recipes:
             relevant_recipes = lait_specific_recipes[lait_detecte]
-            print(
-                f"   🎯 {len(relevant_recipes)} recettes spécifiques pour {lait_detecte}"
-            )
+            logger.debug("%s recettes spécifiques pour %s", len(relevant_recipes), lait_detecte)
         else:
             # Fallback générique (mais filtré)
             relevant_recipes = []
@@ -3320,15 +3272,11 @@ class AgentFromagerHF:
                     lait_final.add("vache")
 
             if len(lait_final) > 1:
-                print(
-                    f"   ⚠️ Attention: mélange de laits dans les résultats: {lait_final}"
-                )
+                logger.warning("Attention: mélange de laits dans les résultats: %s", lait_final)
             else:
-                print(
-                    f"   ✅ Cohérence: tous les résultats sont au lait de {lait_detecte}"
-                )
+                logger.debug("Cohérence: tous les résultats sont au lait de %s", lait_detecte)
 
-        print(f"✅ Fallback: {len(final)} recettes COHÉRENTES")
+        logger.info("Fallback: %s recettes COHÉRENTES", len(final))
         return final
 
     def _deduplicate_recipes(self, recipes):
@@ -3353,7 +3301,7 @@ class AgentFromagerHF:
 
     def _generate_similar_recipes(self, ingredients, cheese_type, count):
         """Génère des recettes similaires avec des sources VARIÉES"""
-        print(f"   🧠 Génération de {count} recettes variées...")
+        logger.debug("Génération de %s recettes variées...", count)
 
         similar_recipes = []
 
@@ -3493,10 +3441,13 @@ class AgentFromagerHF:
         # ===== MOTEURS DE RECHERCHE INDIVIDUELS =====
 
     def _search_google(self, query, max_results=5):
+        """Façade synchrone de _search_google_async"""
+        return run_sync(self._search_google_async(query, max_results))
+
+    async def _search_google_async(self, query, max_results=5):
         """Recherche Google via SerpAPI"""
         try:
-            print(f"🔍 DEBUG Google - Query: {query}")
-            print(f"🔑 DEBUG Google - API Key présente: {bool(self.serpapi_key)}")
+            logger.debug("Google - query=%r, clé API présente=%s", query, bool(self.serpapi_key))
             
             params = {
                 "q": query,
@@ -3504,23 +3455,27 @@ class AgentFromagerHF:
                 "api_key": self.serpapi_key
             }
             
-            print(f"📤 DEBUG Google - Params: {params}")
+            # Jamais la clé API en clair dans les logs
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Google - params=%s", redact(params))
             
-            response = requests.get(
+            if not await get_rate_limiter().acquire_async("engine:serpapi", max_wait=ENGINE_MAX_WAIT):
+                return []
+            response = await http_client().get(
                 "https://serpapi.com/search",
                 params=params,
                 timeout=10
             )
+            get_rate_limiter().observe("engine:serpapi", response)
             
-            print(f"📥 DEBUG Google - Status: {response.status_code}")
-            print(f"📥 DEBUG Google - Response text (100 chars): {response.text[:100]}")
+            logger.debug("Google - status=%s", response.status_code)
             
             # ===== INITIALISER recipes ICI, AVANT TOUTE UTILISATION =====
             recipes = []
             
             if response.status_code == 200:
                 data = response.json()
-                print(f"🔍 DEBUG - Clés dans response: {list(data.keys())}")
+                logger.debug("Google - clés de la réponse: %s", list(data.keys()))
 
                 # Parser les résultats organiques de Google
                 if 'organic_results' in data:
@@ -3550,32 +3505,36 @@ class AgentFromagerHF:
                             }
                             
                             recipes.append(recipe)
-                            print(f"  ✅ Ajouté: {title[:50]}")
+                            logger.debug("Google - ajouté: %.50s", title)
                         else:
-                            print(f"  ⏭️ Ignoré (hors sujet): {title[:50]}")
+                            logger.debug("Google - ignoré (hors sujet): %.50s", title)
                         
                         # Arrêter si on a assez
                         if len(recipes) >= max_results:
                             break
             
-            print(f"🎯 Google retourne {len(recipes)} recettes")
+            logger.info("Google retourne %d recettes", len(recipes))
             return recipes
             
         except Exception as e:
-            print(f"⚠️ Google error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.warning("Google error: %s", e, exc_info=True)
             return []
     
     def _search_ecosia(self, query, max_results):
+        """Façade synchrone de _search_ecosia_async"""
+        return run_sync(self._search_ecosia_async(query, max_results))
+
+    async def _search_ecosia_async(self, query, max_results):
         """Recherche Ecosia ULTRA simple"""
         try:
             from urllib.parse import quote
-            import requests
 
             url = f"https://www.ecosia.org/search?q={quote(query)}"
 
-            response = requests.get(url, timeout=10)
+            if not await get_rate_limiter().acquire_async("engine:ecosia", max_wait=ENGINE_MAX_WAIT):
+                return []
+            response = await http_client().get(url, timeout=10)
+            get_rate_limiter().observe("engine:ecosia", response)
 
             if response.status_code == 200:
                 # Ecosia a un HTML simple
@@ -3618,20 +3577,26 @@ class AgentFromagerHF:
                 return recipes
 
         except Exception as e:
-            print(f"⚠️ Ecosia error: {e}")
+            logger.warning("Ecosia error: %s", e)
 
         return []
 
     def _search_simple_ddg(self, query, max_results):
+        """Façade synchrone de _search_simple_ddg_async"""
+        return run_sync(self._search_simple_ddg_async(query, max_results))
+
+    async def _search_simple_ddg_async(self, query, max_results):
         """DuckDuckGo ULTRA simple qui fonctionne"""
         try:
             from urllib.parse import quote
-            import requests
 
             # Version TEXT seulement (pas HTML)
             url = f"https://api.duckduckgo.com/?q={quote(query)}&format=json&no_html=1&skip_disambig=1"
 
-            response = requests.get(url, timeout=10)
+            if not await get_rate_limiter().acquire_async("engine:ddg_api", max_wait=ENGINE_MAX_WAIT):
+                return []
+            response = await http_client().get(url, timeout=10)
+            get_rate_limiter().observe("engine:ddg_api", response)
 
             if response.status_code == 200:
                 data = response.json()
@@ -3665,7 +3630,7 @@ class AgentFromagerHF:
                 return recipes
 
         except Exception as e:
-            print(f"⚠️ DDG API error: {e}")
+            logger.warning("DDG API error: %s", e)
 
         return []
 
@@ -3758,21 +3723,21 @@ class AgentFromagerHF:
 
     def search_web_recipes_fallback(self, ingredients, cheese_type, max_results=6):
         """Fallback robuste avec différentes stratégies"""
-        print("🔄 Activation du mode fallback")
+        logger.info("Activation du mode fallback")
 
         try:
             # Stratégie 1: Recherche très simple
             simple_results = self._search_simple(ingredients, cheese_type, max_results)
             if simple_results:
-                print(f"✅ Fallback simple: {len(simple_results)} résultats")
+                logger.info("Fallback simple: %s résultats", len(simple_results))
                 return simple_results
 
             # Stratégie 2: Retourner des recettes statiques de la base
-            print("⚠️ Utilisation de la base statique")
+            logger.warning("Utilisation de la base statique")
             return self._get_static_fallback_recipes(ingredients, cheese_type)
 
         except Exception as e:
-            print(f"❌ Erreur fallback: {e}")
+            logger.warning("Erreur fallback: %s", e)
             return []
 
     def _clean_description(self, description: str) -> str:
@@ -3830,8 +3795,7 @@ class AgentFromagerHF:
     def _download_history_from_hf(self):
         """Télécharge l'historique depuis HF Dataset"""
         if not self.api:
-            print("⚠️  Pas de token HF - historique local uniquement")
-            self.history = []
+            logger.warning("Pas de token HF - historique local uniquement")
             return
 
         try:
@@ -3845,22 +3809,26 @@ class AgentFromagerHF:
             with open(downloaded_path, "r", encoding="utf-8") as src:
                 history = json.load(src)
 
-            with open(self.recipes_file, "w", encoding="utf-8") as dst:
-                json.dump(history, dst, indent=2, ensure_ascii=False)
+            get_store().write(self.recipes_file, history, on_write=get_stats(self.recipes_file).hook())
 
-            print(f"✅ Historique chargé : {len(history)} recettes")
+            logger.info("Historique chargé : %s recettes", len(history))
 
         except Exception as e:
-            print(f"ℹ️  Pas d'historique existant: {e}")
-            with open(self.recipes_file, "w", encoding="utf-8") as f:
-                json.dump([], f)
+            logger.info("Pas d'historique existant: %s", e)
+            # Ne jamais écraser un historique déjà présent (autre réplique, redémarrage)
+            get_store().update(
+                self.recipes_file, lambda current: (None if current else [], None),
+                on_write=get_stats(self.recipes_file).hook(),
+            )
 
+    @traced("hf.upload")
     def _upload_history_to_hf(self):
         """Upload l'historique vers HF Dataset"""
         if not self.api:
-            print("⚠️  Pas de token HF - sauvegarde locale uniquement")
+            logger.warning("Pas de token HF - sauvegarde locale uniquement")
             return False
 
+        upload_start = time.perf_counter()
         try:
             self.api.upload_file(
                 path_or_fileobj=self.recipes_file,
@@ -3869,131 +3837,127 @@ class AgentFromagerHF:
                 repo_type="dataset",
                 commit_message=f"Update: {datetime.now().strftime('%Y-%m-%d %H:%M')}",
             )
-            print("✅ Historique synchronisé avec HF")
+            HF_UPLOAD_SECONDS.observe(time.perf_counter() - upload_start, outcome="success")
+            logger.info("Historique synchronisé avec HF")
             return True
         except Exception as e:
-            print(f"❌ Erreur upload HF: {e}")
+            HF_UPLOAD_SECONDS.observe(time.perf_counter() - upload_start, outcome="error")
+            logger.warning("Erreur upload HF: %s", e)
             return False
 
     def _load_history(self):
-        """Charge l'historique depuis le fichier local"""
-        if os.path.exists(self.recipes_file):
-            try:
-                with open(self.recipes_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
+        """Charge l'historique depuis le stockage (miroir local rafraîchi si partagé)"""
+        try:
+            return get_store().read(self.recipes_file)
+        except Exception:
+            return []
+
+    @property
+    def history(self):
+        """Historique courant, relu dans le stockage (jamais copié sur l'agent partagé)"""
+        return self._load_history()
     
+    @traced("history.save")
     def _save_to_history(self, ingredients, cheese_type, constraints, recipe):
         """Sauvegarde dans l'historique LOCAL ET HF"""
         try:
-            history = self._load_history()
             cheese_name = self._extract_cheese_name(recipe)
-            print(f"📝 Tentative de sauvegarde: '{cheese_name}'")
-            
-            # ===== VÉRIFIER SI CE NOM EXISTE DÉJÀ =====
-            existing_names = [entry.get('cheese_name') for entry in history]
-            
-            print(f"📋 Recettes existantes: {existing_names}")
-            
-            # ===== OPTION 1 : REMPLACER L'ANCIENNE VERSION =====
-            if cheese_name in existing_names:
-                print(f"⚠️ '{cheese_name}' existe déjà → REMPLACEMENT de l'ancienne version")
-                # Supprimer l'ancienne entrée avec ce nom
-                history = [entry for entry in history if entry.get('cheese_name') != cheese_name]
-                print(f"   ✅ Ancienne version supprimée")
+            logger.info("Tentative de sauvegarde: '%s'", cheese_name)
+
+            def apply(history):
+                # ===== VÉRIFIER SI CE NOM EXISTE DÉJÀ =====
+                existing_names = [entry.get('cheese_name') for entry in history]
             
-            # ===== GÉNÉRATION D'ID UNIQUE =====
-            import time
-            new_id = int(time.time() * 1000)
-            print(f"🆔 Nouvel ID: {new_id}")
+                logger.debug("Recettes existantes: %s", existing_names)
             
-            # ===== CRÉATION DE L'ENTRÉE =====
-            entry = {
-                "id": new_id,
-                "date": datetime.now().isoformat(),
-                "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M"),
-                "cheese_name": cheese_name,
-                "ingredients": ingredients,
-                "type": cheese_type,
-                "constraints": constraints,
-                "recipe_complete": recipe,
-                "recipe_preview": recipe[:300] + "..." if len(recipe) > 300 else recipe
-            }
+                # ===== OPTION 1 : REMPLACER L'ANCIENNE VERSION =====
+                replaced = []
+                if cheese_name in existing_names:
+                    logger.debug("'%s' existe déjà → REMPLACEMENT de l'ancienne version", cheese_name)
+                    # Supprimer l'ancienne entrée avec ce nom
+                    replaced = [entry for entry in history if entry.get('cheese_name') == cheese_name]
+                    history = [entry for entry in history if entry.get('cheese_name') != cheese_name]
+                    logger.debug("Ancienne version supprimée")
             
-            # ===== SAUVEGARDE LOCALE =====
-            history.append(entry)
-            history = history[-100:]
+                # ===== GÉNÉRATION D'ID UNIQUE =====
+                new_id = int(time.time() * 1000)
+                # Deux sauvegardes dans la même milliseconde : l'id reste unique
+                new_id = max([new_id] + [e.get('id', 0) + 1 for e in history if isinstance(e.get('id'), int)])
+                logger.debug("Nouvel ID: %s", new_id)
             
-            print(f"💾 Sauvegarde dans {self.recipes_file}")
-            print(f"📊 Taille finale de l'historique: {len(history)}")
+                # ===== CRÉATION DE L'ENTRÉE =====
+                entry = {
+                    "id": new_id,
+                    "date": datetime.now().isoformat(),
+                    "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M"),
+                    "cheese_name": cheese_name,
+                    "ingredients": ingredients,
+                    "type": cheese_type,
+                    "constraints": constraints,
+                    "recipe_complete": recipe,
+                    "recipe_preview": recipe[:300] + "..." if len(recipe) > 300 else recipe
+                }
             
-            with open(self.recipes_file, "w", encoding="utf-8") as f:
-                json.dump(history, f, indent=2, ensure_ascii=False)
+                # ===== SAUVEGARDE LOCALE =====
+                history.append(entry)
+                replaced.extend(history[:-100])
+                history = history[-100:]
             
-            self.history = history
+                logger.debug("Sauvegarde dans %s", self.recipes_file)
+                logger.debug("Taille finale de l'historique: %s", len(history))
+                return history, (history, entry, replaced)
+
+            # Lecture-modification-écriture sous le verrou du stockage : aucun
+            # processus ni réplique concurrent ne perd d'écriture
+            _, entry, replaced = get_store().update(
+                self.recipes_file, apply,
+                on_write=get_stats(self.recipes_file).hook(lambda result: ([result[1]], result[2])),
+            )
             
             # ===== SAUVEGARDE DANS complete_knowledge_base.json =====
-            # REMPLACER par ça (inline) :
-            import os
-        
             kb_file = "complete_knowledge_base.json"
 
-            # Charger KB existante
-            kb = []
-            if os.path.exists(kb_file):
-                try:
-                    with open(kb_file, 'r', encoding='utf-8') as f:
-                        kb = json.load(f)
-                except:
-                    kb = []
-                    
-            kb = [entry for entry in kb if entry.get("title") != cheese_name]
-            
-            # Ajouter la nouvelle recette
-            kb.append({
-                "title": cheese_name,
-                "description": f"Recette {cheese_type}",
-                "source_type": "user_generated",
-                "lait": self._extract_lait_from_text(' '.join(ingredients)),
-                "type_pate": cheese_type,
-                "score": 10,
-                "difficulte": "Personnalisée",
-                "ingredients": ingredients,
-                "etapes": self._extract_steps_from_recipe(recipe),
-                "date_creation": entry["date"],
-                "generated_at": entry["date"]
-            })
-
-            # Sauvegarder
-            with open(kb_file, 'w', encoding='utf-8') as f:
-                json.dump(kb, f, indent=2, ensure_ascii=False)
-
-            print(f"✅ Ajouté à complete_knowledge_base.json")
+            # Remplacer la recette du même nom (écriture atomique, clé vérifiée à l'insertion)
+            try:
+                get_compactor(kb_file).append_unique([{
+                    "title": cheese_name,
+                    "description": f"Recette {cheese_type}",
+                    "source_type": "user_generated",
+                    "lait": self._extract_lait_from_text(' '.join(ingredients)),
+                    "type_pate": cheese_type,
+                    "score": 10,
+                    "difficulte": "Personnalisée",
+                    "ingredients": ingredients,
+                    "etapes": self._extract_steps_from_recipe(recipe),
+                    "date_creation": entry["date"],
+                    "generated_at": entry["date"]
+                }], drop=lambda kb_entry: kb_entry.get("title") == cheese_name)
+                logger.info("Ajouté à complete_knowledge_base.json")
+            except Exception as e:
+                logger.warning("Ajout à complete_knowledge_base.json échoué: %s", e)
                         
             # ===== UPLOAD VERS HUGGINGFACE (avec retry) =====
             for i in range(3):
                 sync_success = self._upload_history_to_hf()
                 if sync_success:
-                    print(f"✅ Recette #{entry['id']} sauvegardée et synchronisée HF")
+                    logger.info("Recette #%s sauvegardée et synchronisée HF", entry['id'])
                     break
-                print(f"⚠️ Tentative HF {i+1}/3...")
+                logger.warning("Tentative HF %s/3...", i+1)
                 time.sleep(1)
             else:
-                print(f"⚠️ Recette sauvegardée localement (HF échoué)")
+                logger.warning("Recette sauvegardée localement (HF échoué)")
             
-            print(f"✅ SAUVEGARDE TERMINÉE: '{cheese_name}'")
+            logger.info("SAUVEGARDE TERMINÉE: '%s'", cheese_name)
             return True
             
         except Exception as e:
-            print(f"❌ Erreur sauvegarde: {e}")
+            logger.warning("Erreur sauvegarde: %s", e)
             import traceback
             traceback.print_exc()
             return False
     
     def clean_complete_kb_duplicates(self):
-        """Nettoie les doublons dans complete_knowledge_base.json"""
+        """Nettoie les doublons dans complete_knowledge_base.json (compaction atomique)"""
         import os
     
         
@@ -4002,40 +3966,14 @@ class AgentFromagerHF:
         if not os.path.exists(kb_file):
             return "❌ Fichier complete_knowledge_base.json introuvable"
         
-        # Charger
-        with open(kb_file, 'r', encoding='utf-8') as f:
-            all_recipes = json.load(f)
-        
-        print(f"🔍 {len(all_recipes)} recettes chargées")
-        
-        # CLÉ UNIQUE = titre + date (normalisée)
-        seen = set()
-        cleaned = []
-        duplicates = 0
-        
-        for r in all_recipes:
-            title = r.get('title', '').strip().lower()
-            date_raw = r.get('generated_at') or r.get('date_creation') or r.get('date', '')
-            date_clean = date_raw[:16] if len(date_raw) >= 16 else date_raw
-            
-            key = f"{title}|{date_clean}"
-            
-            if key not in seen:
-                cleaned.append(r)
-                seen.add(key)
-            else:
-                duplicates += 1
-                print(f"🗑️ SUPPRIMÉ: {title} ({date_clean})")
-        
-        # SAUVEGARDER
-        with open(kb_file, 'w', encoding='utf-8') as f:
-            json.dump(cleaned, f, indent=2, ensure_ascii=False)
+        before, after = get_compactor(kb_file).compact()
+        logger.info("%s recettes chargées", before)
         
         return f"""✅ **NETTOYAGE TERMINÉ !**
 
-    Avant: {len(all_recipes)} recettes
-    Après: {len(cleaned)} recettes
-    **{duplicates} DOUBLONS SUPPRIMÉS** 🎉"""
+    Avant: {before} recettes
+    Après: {after} recettes
+    **{before - after} DOUBLONS SUPPRIMÉS** 🎉"""
 
         
         
@@ -4141,17 +4079,15 @@ class AgentFromagerHF:
 
     def get_recipe_by_id(self, recipe_id):
         """Récupère une recette complète par son ID"""
-        history = self.get_history()
-        for entry in history:
-            if entry["id"] == int(recipe_id):
-                return entry["recipe_complete"]
+        text = get_history_index(self.recipes_file).get_text(recipe_id)
+        if text is not None:
+            return text
         return "❌ Recette non trouvée"
 
     def clear_history(self):
         """Efface l'historique LOCAL ET HF"""
         try:
-            with open(self.recipes_file, "w", encoding="utf-8") as f:
-                json.dump([], f)
+            get_store().write(self.recipes_file, [], on_write=get_stats(self.recipes_file).hook())
 
             if self.api:
                 self._upload_history_to_hf()
@@ -4172,12 +4108,9 @@ class AgentFromagerHF:
         if not ingredients_text or not ingredients_text.strip():
             return False, "⚠️ Vous devez entrer au moins un ingrédient !"
 
-        ingredients_lower = ingredients_text.lower()
+        hits = get_matcher(self.knowledge_base).scan(ingredients_text)
 
-        has_milk = any(
-            word in ingredients_lower
-            for word in ["lait", "milk", "vache", "chèvre", "brebis", "bufflonne"]
-        )
+        has_milk = hits.has("lait_mot") or hits.has("lait")
 
         if not has_milk:
             return (
@@ -4185,10 +4118,7 @@ class AgentFromagerHF:
                 "❌ Il faut du lait pour faire du fromage !\n💡 Ajoutez : lait de vache, chèvre, brebis...",
             )
 
-        has_coagulant = any(
-            word in ingredients_lower
-            for word in ["présure", "presure", "citron", "vinaigre", "acide"]
-        )
+        has_coagulant = hits.has("coagulant")
 
         if not has_coagulant:
             return (
@@ -4210,59 +4140,18 @@ class AgentFromagerHF:
         text_clean = text_lower.replace('-', ' ').replace("'", ' ').strip()
         text_clean = ' '.join(text_clean.split())  # Normaliser espaces
         
-        print(f"🔍 _extract_lait_from_text() input: '{text}'")
-        print(f"🔍 _extract_lait_from_text() cleaned: '{text_clean}'")
+        # ✅ Un seul passage sur le texte (fromage_matcher)
+        # Ordre important : brebis > chèvre > bufflonne > vache
+        lait_type = get_matcher(self.knowledge_base).scan(text_clean).first(
+            "lait", ["brebis", "chèvre", "bufflonne", "vache"]
+        )
 
-        lait_patterns = {
-            "brebis": [
-                "brebis", 
-                "mouton", 
-                "ovin", 
-                "sheep", 
-                "lait de brebis",
-                "laitdebrebis",  # Sans espaces
-                "lait brebis",
-            ],
-            "chevre": [  # ✅ ATTENTION: clé sans accent pour cohérence
-                "chèvre",
-                "chevre",
-                "caprin",
-                "goat",
-                "lait de chèvre",
-                "lait de chevre",
-                "laitdechevre",
-                "lait chevre",
-                "lait chèvre",
-            ],
-            "vache": [
-                "vache", 
-                "bovin", 
-                "cow", 
-                "lait de vache",
-                "laitdevache",
-                "lait vache",
-            ],
-            "bufflonne": [
-                "bufflonne", 
-                "buffle", 
-                "buffalo", 
-                "lait de bufflonne",
-                "laitdebufflonne",
-                "lait bufflonne",
-            ],
-        }
+        logger.debug("_extract_lait_from_text(%r) → %s", text, lait_type)
 
-        # ✅ Priorité aux patterns les plus spécifiques EN PREMIER
-        # Ordre important : brebis > chèvre > bufflonne > vache
-        for lait_type in ["brebis", "chevre", "bufflonne", "vache"]:
-            patterns = lait_patterns[lait_type]
-            for pattern in patterns:
-                if pattern in text_clean:
-                    print(f"✅ MATCH TROUVÉ: '{pattern}' → {lait_type}")
-                    return lait_type
-
-        print(f"❌ Aucun type de lait détecté dans: '{text}'")
-        return None
+        # ✅ ATTENTION: clé sans accent pour cohérence
+        if lait_type == "chèvre":
+            return "chevre"
+        return lait_type
     
     def _validate_combination(self, lait: str, type_pate: str) -> tuple:
         """
@@ -4373,17 +4262,19 @@ class AgentFromagerHF:
         
         return "Essayez un autre type de fromage plus adapté à votre lait."
 
+    @traced("generate_recipe")
     def generate_recipe(
         self, 
         ingredients: str, 
         cheese_type: str,
         constraints: str = "", 
         creativity: int = 1,
-        profile: str = "🧀 Amateur"
+        profile: str = "🧀 Amateur",
+        reuse_variant: bool = False
     ) -> str:
         """Génère une recette adaptée au profil utilisateur"""
     
-        print(f"🧀 Génération pour: {ingredients} | Type: {cheese_type} | Profil: {profile}")
+        logger.info("Génération pour: %s | Type: %s | Profil: %s", ingredients, cheese_type, profile)
         
         # Stocker le profil actuel pour les fonctions internes
         self.current_profile = profile
@@ -4394,11 +4285,23 @@ class AgentFromagerHF:
         if not valid:
             return message
         
+        # ===== CACHE DE GÉNÉRATION =====
+        cache_key = generation_cache.make_key(
+            ingredients, cheese_type, constraints, creativity, profile=profile
+        )
+        if generation_cache.should_reuse(creativity, reuse_variant):
+            cached = generation_cache.get(cache_key)
+            set_attribute("cache_hit", cached is not None)
+            record_cache("generation", cached is not None)
+            if cached is not None:
+                logger.info("Recette servie depuis le cache de génération")
+                return cached
+        
         ingredients_list = [ing.strip() for ing in ingredients.split(',')]  # ← DÉFINIR ICI !
         
         # ===== DÉTECTER LE LAIT =====
         lait = self._extract_lait_from_text(' '.join(ingredients_list))
-        print(f"   🥛 Lait détecté: {lait}")
+        logger.debug("Lait détecté: %s", lait)
         
         # ===== CHOISIR UN TYPE DIFFÉRENT SELON PROFIL =====
         cheese_type_clean = cheese_type  # Valeur par défaut
@@ -4446,7 +4349,7 @@ class AgentFromagerHF:
     2. Votre type de fromage (choisissez-en un compatible)
     """
         
-        print(f"   🎯 Type final: {cheese_type_clean}")
+        logger.debug("Type final: %s", cheese_type_clean)
         
         #### fin des validations ####
         
@@ -4470,6 +4373,7 @@ class AgentFromagerHF:
         
         # Sauvegarder dans l'historique
         self._save_to_history(ingredients_list, cheese_type_clean, constraints, adapted_recipe)
+        generation_cache.put(cache_key, adapted_recipe)
         
         return adapted_recipe    
     
@@ -4920,15 +4824,19 @@ en molécules aromatiques. Plus long = goût plus prononcé.
 
         
     def _generate_unique_recipe_hybrid(
-        self, ingredients, cheese_type, constraints, creativity, profile=None
+        self, ingredients, cheese_type, constraints, creativity, profile=None, plan=None
     ):
-        """Génère une recette UNIQUE avec système unifié V2"""
-        print(f"🎲 Génération avec système unifié V2: profil={profile}, créativité={creativity}")
+        """Génère une recette UNIQUE avec système unifié V2
+
+        Créativité >= 2 avec un plan : les résultats de la recherche canonique
+        (ceux de l'onglet web) servent de références au LLM.
+        """
+        logger.info("Génération avec système unifié V2: profil=%s, créativité=%s", profile, creativity)
         
         # Debug des paramètres reçus
-        print(f"🔍 DEBUG: ingredients={ingredients}")
-        print(f"🔍 DEBUG: cheese_type={cheese_type}")
-        print(f"🔍 DEBUG: profile={profile}")
+        logger.debug("ingredients=%s", ingredients)
+        logger.debug("cheese_type=%s", cheese_type)
+        logger.debug("profile=%s", profile)
         
         # Convertir ingredients en liste si nécessaire
         if isinstance(ingredients, str):
@@ -4936,44 +4844,20 @@ en molécules aromatiques. Plus long = goût plus prononcé.
         else:
             ingredients_list = ingredients
         
-        print(f"🔍 DEBUG: ingredients_list converti={ingredients_list}")
-        
-        # Extraire le type de lait depuis les ingrédients
-        lait = None
-        laits_possibles = ['vache', 'chèvre', 'chevre', 'brebis', 'bufflonne']
+        logger.debug("ingredients_list converti=%s", ingredients_list)
         
-        for ing in ingredients_list:
-            ing_lower = ing.lower()
-            for type_lait in laits_possibles:
-                if type_lait in ing_lower:
-                    # Normaliser
-                    if type_lait in ['chèvre', 'chevre']:
-                        lait = 'chèvre'
-                    elif type_lait == 'vache':
-                        lait = 'vache'
-                    elif type_lait == 'brebis':
-                        lait = 'brebis'
-                    elif type_lait == 'bufflonne':
-                        lait = 'bufflonne'
-                    break
-            if lait:
-                break
+        # Extraire le type de lait depuis les ingrédients (premier lait cité)
+        lait = get_matcher(self.knowledge_base).scan(', '.join(ingredients_list)).first("lait")
         
         # Si pas de lait détecté, utiliser vache par défaut
         if not lait:
-            # ✅ Vérifier ENCORE une fois avec la fonction spécialisée
-            lait = self._extract_lait_from_text(' '.join(ingredients_list))
-            
-            if not lait:
-                # ⚠️ Vraiment aucun lait trouvé, demander à l'utilisateur
-                print(f"⚠️ ATTENTION: Aucun type de lait détecté dans '{', '.join(ingredients_list)}'")
-                print(f"   Types attendus: 'lait de vache', 'lait de chèvre', 'lait de brebis', 'lait de bufflonne'")
-                print(f"   Utilisation par défaut: vache")
-                lait = 'vache'
-            else:
-                print(f"✅ Type de lait détecté via _extract_lait_from_text: {lait}")
+            # ⚠️ Vraiment aucun lait trouvé, demander à l'utilisateur
+            logger.warning("ATTENTION: Aucun type de lait détecté dans '%s'", ', '.join(ingredients_list))
+            logger.debug("Types attendus: 'lait de vache', 'lait de chèvre', 'lait de brebis', 'lait de bufflonne'")
+            logger.debug("Utilisation par défaut: vache")
+            lait = 'vache'
 
-        print(f"🔍 DEBUG: Type de lait final utilisé: {lait}")
+        logger.debug("Type de lait final utilisé: %s", lait)
         
 
         # ✅ CORRECT - Passer les deux paramètres
@@ -4982,7 +4866,7 @@ en molécules aromatiques. Plus long = goût plus prononcé.
         # Maintenant on peut utiliser generator
         if creativity == 0:
             # Base statique uniquement (pas de LLM)
-            print("🔍 DEBUG: Appel du générateur._generate_from_static_knowledge()")
+            logger.debug("Appel du générateur._generate_from_static_knowledge()")
             recipe_data = generator._generate_from_static_knowledge(
                 ingredients=ingredients_list,
                 cheese_type=cheese_type,
@@ -4992,21 +4876,22 @@ en molécules aromatiques. Plus long = goût plus prononcé.
             )
         else:
             # Niveaux 1, 2, 3 : LLM avec scraping
-            print("🔍 DEBUG: Appel du générateur._generate_with_llm_and_knowledge()")
+            logger.debug("Appel du générateur._generate_with_llm_and_knowledge()")
             recipe_data = generator._generate_with_llm_and_knowledge(
                 ingredients=ingredients_list,
                 cheese_type=cheese_type,
                 lait=lait,
                 profile=profile,
                 constraints=constraints,
-                creativity_level=creativity
+                creativity_level=creativity,
+                plan=plan if creativity >= 2 else None
             )
         
-        print(f"🔍 DEBUG: Recette générée: {recipe_data.get('title') if recipe_data else 'None'}")
+        logger.debug("Recette générée: %s", recipe_data.get('title') if recipe_data else 'None')
         
         # Vérifier si la recette a été générée
         if not recipe_data:
-            print("⚠️ Le générateur a retourné None, impossible de continuer")
+            logger.warning("Le générateur a retourné None, impossible de continuer")
             return "❌ Erreur: Impossible de générer la recette avec le LLM"
         
         # Formater en texte
@@ -5590,6 +5475,7 @@ Génère le support pédagogique."""
         return f"╔══╗\n║ 🎓 {cheese_name.upper()} ║\n╚══╝\n\n{base_recipe}\n\nSupport formation"
 
     
+    @traced("generate_recipe_creative")
     def generate_recipe_creative(
         self,
         ingredients,
@@ -5600,17 +5486,22 @@ Génère le support pédagogique."""
         affinage_duration,
         spice_intensity,
         experience_level=None,
+        reuse_variant=False,
+        plan=None,
     ):
-        """Génère une recette avec mode créatif et micro-choix UNIQUE avec une image"""
+        """Génère une recette avec mode créatif et micro-choix UNIQUE avec une image
+
+        plan : recherche canonique de la requête (SearchPlan), partagée avec les résultats web
+        """
 
-        print(f"🧀 Génération créative UNIQUE avec:")
-        print(f"  - Ingrédients: {ingredients}")
-        print(f"  - Type: {cheese_type}")
-        print(f"  - Créativité: {creativity_level}")
-        print(f"  - Texture: {texture_preference}")
-        print(f"  - Affinage: {affinage_duration}")
-        print(f"  - Épices: {spice_intensity}")
-        print(f"  - Niveau: {experience_level}")
+        logger.debug("Génération créative UNIQUE avec:")
+        logger.debug("Ingrédients: %s", ingredients)
+        logger.debug("Type: %s", cheese_type)
+        logger.debug("Créativité: %s", creativity_level)
+        logger.debug("Texture: %s", texture_preference)
+        logger.debug("Affinage: %s", affinage_duration)
+        logger.debug("Épices: %s", spice_intensity)
+        logger.debug("Niveau: %s", experience_level)
         
         # ===== GÉNÉRER UNE BASE DE RECETTE DIFFÉRENTE SELON LE PROFIL =====
         
@@ -5655,6 +5546,26 @@ Génère le support pédagogique."""
             if not valid:
                 return message
             
+            # ===== CACHE DE GÉNÉRATION =====
+            # Créativité 0 : toujours réutilisé ; modes LLM : seulement si demandé
+            cache_key = generation_cache.make_key(
+                ingredients,
+                cheese_type,
+                constraints,
+                creativity_level,
+                texture_preference,
+                affinage_duration,
+                spice_intensity,
+                experience_level,
+            )
+            if generation_cache.should_reuse(creativity_level, reuse_variant):
+                cached = generation_cache.get(cache_key)
+                set_attribute("cache_hit", cached is not None)
+                record_cache("generation", cached is not None)
+                if cached is not None:
+                    logger.info("Recette servie depuis le cache de génération")
+                    return cached
+            
             ingredients_list = [ing.strip() for ing in ingredients.split(',')]
             
             # Déterminer le type si non spécifié
@@ -5694,7 +5605,8 @@ Génère le support pédagogique."""
                 cheese_type_clean, 
                 constraints,
                 creativity_level,
-                experience_level or "🧀 Amateur"
+                experience_level or "🧀 Amateur",
+                plan=plan
             )
             
             # Appliquer les micro-choix
@@ -5709,7 +5621,7 @@ Génère le support pédagogique."""
             # ===== NOUVEAU : GÉNÉRATION D'IMAGE AVEC KIE_API_KEY =====
             if hasattr(self, 'kie_enabled') and self.kie_enabled:
                 try:
-                    print("\n🖼️ Génération d'image du fromage avec KIE...")
+                    logger.info("Génération d'image du fromage avec KIE...")
                     
                     # Extraire le nom du fromage de la recette
                     cheese_name = self._extract_cheese_name(recipe)
@@ -5731,7 +5643,7 @@ Génère le support pédagogique."""
                     
                     # Ajouter l'image à la recette si succès
                     if image_result.get("success") and image_result.get("image_url"):
-                        print(f"✅ Image générée: {image_result['image_url'][:50]}...")
+                        logger.info("Image générée: %s...", image_result['image_url'][:50])
                         
                         # Ajouter l'image en markdown à la fin de la recette
                         recipe += "\n\n---\n\n"
@@ -5739,23 +5651,24 @@ Génère le support pédagogique."""
                         recipe += f"![{cheese_name}]({image_result['image_url']})\n\n"
                         recipe += "*Image générée par intelligence artificielle*\n"
                     else:
-                        print(f"⚠️ Image non générée: {image_result.get('error', 'Erreur inconnue')}")
+                        logger.warning("Image non générée: %s", image_result.get('error', 'Erreur inconnue'))
                 
                 except Exception as e:
-                    print(f"⚠️ Erreur génération image (non bloquante): {e}")
+                    logger.warning("Erreur génération image (non bloquante): %s", e)
                     # Ne pas bloquer la génération de recette si l'image échoue
             else:
-                print("ℹ️ KIE_API_KEY non configurée, pas de génération d'image")
+                logger.info("KIE_API_KEY non configurée, pas de génération d'image")
             # ===== FIN GÉNÉRATION D'IMAGE =====
             
             # Sauvegarder
             self._save_to_history(ingredients_list, cheese_type_clean, constraints, recipe)
+            generation_cache.put(cache_key, recipe)
             
             return recipe
         
         except Exception as e:
             error_msg = f"❌ Erreur lors de la génération de la recette : {str(e)}"
-            print(error_msg)
+            logger.error("%s", error_msg, exc_info=True)
             import traceback
             traceback.print_exc()
             return error_msg
@@ -6093,7 +6006,7 @@ Génère le support pédagogique."""
         """Détermine le type de fromage basé sur les ingrédients de manière INTELLIGENTE"""
         ingredients_str = " ".join(ingredients_list).lower()
 
-        print(f"🔍 Analyse ingrédients pour type: {ingredients_str}")
+        logger.info("Analyse ingrédients pour type: %s", ingredients_str)
 
         # 1. Détecter le lait
         lait = self._extract_lait_from_text(ingredients_str)
@@ -6454,18 +6367,25 @@ Adaptations suggérées selon vos contraintes.
         # ===== MÉTHODES DE CHAT LLM =====
 
     def _test_ollama_connection(self):
-        """Teste la connexion à Ollama (local)"""
+        """Teste la connexion à Ollama (local) : serveur joignable et modèle installé, sans le charger"""
         try:
-            response = requests.post(
-                self.ollama_url,
-                json={"model": self.ollama_model, "prompt": "test", "stream": False},
-                timeout=3,
-            )
-            return response.status_code == 200
-        except:
+            response = requests.get(f"{self.ollama_url}/api/tags", timeout=2)
+            if response.status_code != 200:
+                return False
+            if not ollama_has_model(response.json(), self.ollama_model):
+                print(f"ℹ️ Ollama: modèle {self.ollama_model} absent (ollama pull {self.ollama_model})")
+                return False
+            return True
+        except (requests.RequestException, ValueError):
             return False
 
     def chat_with_llm(self, user_message: str, conversation_history=None, temperature=0.7, max_tokens=8192) -> str:
+        """Façade synchrone de chat_with_llm_async"""
+        return run_sync(self.chat_with_llm_async(user_message, conversation_history, temperature, max_tokens))
+
+    @traced("llm.chat")
+    @timed(CHAT_SECONDS)
+    async def chat_with_llm_async(self, user_message: str, conversation_history=None, temperature=0.7, max_tokens=8192) -> str:
         """
         Dialogue avec le LLM
         Args:
@@ -6474,109 +6394,79 @@ Adaptations suggérées selon vos contraintes.
             temperature: Température de génération (0.0 à 1.0)
             max_tokens: Nombre maximum de tokens à générer
         
-        Chat intelligent avec fallback sur plusieurs fournisseurs gratuits
-        Priorité: 1. OpenRouter → 2. Google AI → 3. Ollama → 4. Hugging Face → 5. Fallback local
+        Chat intelligent avec fallback sur plusieurs fournisseurs (registre fromage_llm)
+        Priorité: 1. OpenRouter → 2. Google AI → 3. Together AI → 4. Ollama → 5. DeepSeek → 6. Hugging Face → Fallback local
         """
         try:
-            print(f"💬 Question reçue: '{user_message[:100]}...'")
-            print(f"🎛️ Paramètres: temperature={temperature}, max_tokens={max_tokens}")
-
-            # DEBUG: État des LLMs (avec vérification d'attributs pour éviter les erreurs)
-            print("🔍 ÉTAT LLMs - ", end="")
-            if hasattr(self, "openrouter_enabled"):
-                print(f"OpenRouter: {self.openrouter_enabled}, ", end="")
-            if hasattr(self, "google_ai_enabled"):
-                print(f"Google AI: {self.google_ai_enabled}, ", end="")
-            if hasattr(self, "ollama_enabled"):
-                print(f"Ollama: {self.ollama_enabled}, ", end="")
-            if hasattr(self, "together_enabled"):
-                print(f"Together: {self.together_enabled}")
-            print()
-
-            # ===== TENTATIVE AVEC LES LLMS =====
-
-            # 1. OPENROUTER (priorité haute - gratuit avec quotas)
-            if hasattr(self, "openrouter_enabled") and self.openrouter_enabled:
-                try:
-                    print("  🤖 Tentative OpenRouter...")
-                    if hasattr(self, "_chat_openrouter"):
-                        response = self._chat_openrouter(user_message, conversation_history, temperature, max_tokens)
-                        if response and response.strip():
-                            print(f"  ✅ Réponse OpenRouter ({len(response)} caractères)")
-                            return response
-                    else:
-                        print("  ⚠️ Méthode _chat_openrouter manquante!")
-                except Exception as e:
-                    print(f"  ⚠️ OpenRouter échoué: {type(e).__name__} - {e}")
+            logger.info("Question reçue: '%s...'", user_message[:100])
+            logger.info("Paramètres: temperature=%s, max_tokens=%s", temperature, max_tokens)
 
-            # 2. GOOGLE AI / GEMINI
-            if hasattr(self, "google_ai_enabled") and self.google_ai_enabled:
-                try:
-                    print("  🤖 Tentative Google AI...")
-                    if hasattr(self, "_chat_google_ai"):
-                        response = self._chat_google_ai(user_message, conversation_history, temperature, max_tokens)
-                        if response and response.strip():
-                            print(f"  ✅ Réponse Google AI ({len(response)} caractères)")
-                            return response
-                except Exception as e:
-                    print(f"  ⚠️ Google AI échoué: {type(e).__name__} - {e}")
+            # DEBUG: État des LLMs
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("État LLMs - %s", ", ".join(
+                    f"{p.label}: {p.configured}" for p in self.llm_registry.all()
+                ))
 
-            # 3. TOGETHER AI
-            if hasattr(self, "together_enabled") and self.together_enabled:
+            # ===== TENTATIVE AVEC LES LLMS (registre, par rang) =====
+            for provider in self.llm_registry.available():
                 try:
-                    print("  🤖 Tentative Together AI...")
-                    if hasattr(self, "_chat_together_ai"):
-                        response = self._chat_together_ai(user_message, conversation_history, temperature, max_tokens)
-                        if response and response.strip():
-                            print(f"  ✅ Réponse Together AI ({len(response)} caractères)")
-                            return response
+                    logger.debug("Tentative %s...", provider.label)
+                    with span("llm.provider", provider=provider.name), \
+                            LLM_PROVIDER_SECONDS.time(provider=provider.name):
+                        async with provider.slot():
+                            response = await provider.complete(
+                                user_message, conversation_history, temperature, max_tokens
+                            )
+                    if response and response.strip():
+                        logger.debug("Réponse %s (%s caractères)", provider.label, len(response))
+                        return response
+                    provider.record_error("", "empty")
+                except LaneBusy:
+                    # Fournisseur saturé : le suivant répond plutôt que d'attendre
+                    provider.record_error("", "busy")
+                    logger.warning("%s saturé, fournisseur suivant", provider.label)
                 except Exception as e:
-                    print(f"  ⚠️ Together AI échoué: {type(e).__name__} - {e}")
+                    provider.record_error("", "exception")
+                    logger.warning("%s échoué: %s - %s", provider.label, type(e).__name__, e)
 
-            # 4. OLLAMA (local)
-            if hasattr(self, "ollama_enabled") and self.ollama_enabled:
-                try:
-                    print("  🤖 Tentative Ollama...")
-                    if hasattr(self, "_chat_ollama"):
-                        response = self._chat_ollama(user_message, conversation_history, temperature, max_tokens)
-                        if response and response.strip():
-                            print(f"  ✅ Réponse Ollama ({len(response)} caractères)")
-                            return response
-                except Exception as e:
-                    print(f"  ⚠️ Ollama échoué: {type(e).__name__} - {e}")
-
-            # 5. DEEPSEEK
-            if hasattr(self, "deepseek_enabled") and self.deepseek_enabled:
-                try:
-                    print("  🤖 Tentative DeepSeek...")
-                    if hasattr(self, "_chat_deepseek"):
-                        response = self._chat_deepseek(user_message, conversation_history, temperature, max_tokens)
-                        if response and response.strip():
-                            print(f"  ✅ Réponse DeepSeek ({len(response)} caractères)")
-                            return response
-                except Exception as e:
-                    print(f"  ⚠️ DeepSeek échoué: {type(e).__name__} - {e}")
-
-            # 6. HUGGING FACE
-            if hasattr(self, "hf_inference_enabled") and self.hf_inference_enabled:
-                try:
-                    print("  🤖 Tentative Hugging Face...")
-                    if hasattr(self, "_chat_huggingface"):
-                        response = self._chat_huggingface(user_message, conversation_history, temperature, max_tokens)
-                        if response and response.strip():
-                            print(f"  ✅ Réponse Hugging Face ({len(response)} caractères)")
-                            return response
-                except Exception as e:
-                    print(f"  ⚠️ Hugging Face échoué: {type(e).__name__} - {e}")
-
-            # 7. FALLBACK LOCAL (toujours disponible)
-            print("  🧠 Tous les LLMs ont échoué → fallback local")
+            # FALLBACK LOCAL (toujours disponible)
+            logger.debug("Tous les LLMs ont échoué → fallback local")
             return self._fallback_chat_response(user_message)
         
         except Exception as e:
-            print(f"❌ Erreur critique dans chat_with_llm: {e}")
+            logger.error("Erreur critique dans chat_with_llm: %s", e, exc_info=True)
             return self._fallback_chat_response(user_message)
-    
+
+    async def chat_with_llm_stream_async(self, user_message: str, conversation_history=None, temperature=0.7, max_tokens=8192):
+        """Comme chat_with_llm_async, la réponse arrive par fragments au fil de la génération"""
+        logger.info("Question reçue (flux): '%s...'", user_message[:100])
+        for provider in self.llm_registry.available():
+            produced = False
+            try:
+                logger.debug("Tentative %s (flux)...", provider.label)
+                with LLM_PROVIDER_SECONDS.time(provider=provider.name):
+                    async with provider.slot():
+                        async for chunk in provider.stream(
+                            user_message, conversation_history, temperature, max_tokens
+                        ):
+                            produced = True
+                            yield chunk
+                if produced:
+                    return
+                provider.record_error("", "empty")
+            except LaneBusy:
+                provider.record_error("", "busy")
+                logger.warning("%s saturé, fournisseur suivant", provider.label)
+            except Exception as e:
+                provider.record_error("", "exception")
+                logger.warning("%s échoué: %s - %s", provider.label, type(e).__name__, e)
+                # Réponse déjà entamée : on la laisse telle quelle plutôt que d'en mélanger deux
+                if produced:
+                    return
+
+        logger.debug("Tous les LLMs ont échoué → fallback local")
+        yield self._fallback_chat_response(user_message)
+
     def _get_cheese_context(self, question: str) -> str:
         """Extrait des infos de la base pour aider le LLM"""
         # Recherche simple
@@ -6590,131 +6480,6 @@ Adaptations suggérées selon vos contraintes.
             return "Les fromages de chèvre incluent Crottin de Chavignol, Sainte-Maure, etc. Tous au lait de chèvre."
         return None
 
-    def chat_with_together_ai(self, user_message, conversation_history=None):
-        """Utilise Together AI (gratuit avec 25$ de crédit)"""
-        try:
-            api_key = os.environ.get("TOGETHER_API_KEY")
-            if not api_key:
-                return None
-
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-            }
-
-            messages = [
-                {
-                    "role": "system",
-                    "content": "Tu es un expert fromager français. Réponds avec précision et passion.",
-                }
-            ]
-
-            if conversation_history:
-                messages.extend(conversation_history[-5:])
-
-            messages.append({"role": "user", "content": user_message})
-
-            payload = {
-                "model": "mistralai/Mixtral-8x7B-Instruct-v0.1",
-                "messages": messages,
-                "max_tokens": 2000,
-                "temperature": 0.7,
-                "top_p": 0.9,
-            }
-
-            response = requests.post(
-                "https://api.together.xyz/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30,
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
-            else:
-                print(f"❌ Together AI error: {response.status_code}")
-                return None
-
-        except Exception as e:
-            print(f"❌ Together AI exception: {e}")
-            return None
-
-    def _chat_huggingface(
-        self, user_message: str, conversation_history: Optional[List[Dict]] = None
-    ) -> str:
-        """Utilise Hugging Face Inference API"""
-        try:
-            print(f"    🔑 HF Token: {self.hf_token[:10]}...")
-
-            headers = {"Authorization": f"Bearer {self.hf_token}"}
-
-            prompt = """<s>[INST] Tu es un expert fromager français. Réponds aux questions de manière précise et amicale. [/INST]"""
-
-            if conversation_history:
-                for msg in conversation_history[-3:]:
-                    if msg["role"] == "user":
-                        prompt += f"<s>[INST] {msg['content']} [/INST]"
-                    else:
-                        prompt += f" {msg['content']}</s>"
-
-            prompt += f"<s>[INST] {user_message} [/INST]"
-
-            payload = {
-                "inputs": prompt,
-                "parameters": {
-                    "max_new_tokens": 300,
-                    "temperature": 0.7,
-                    "top_p": 0.95,
-                    "do_sample": True,
-                },
-            }
-
-            # MODÈLES GRATUITS DISPONIBLES (essayez-les) :
-            models = [
-                "mistralai/Mistral-7B-Instruct-v0.2",  # Très bon modèle français
-                "google/flan-t5-xl",  # Plus léger
-                "HuggingFaceH4/zephyr-7b-alpha",  # Version alpha si beta échoue
-                "microsoft/phi-2",  # Petit mais efficace
-            ]
-
-            for model in models:
-                try:
-                    print(f"    🤖 Essai modèle: {model}")
-                    response = requests.post(
-                        f"https://api-inference.huggingface.co/models/{model}",
-                        headers=headers,
-                        json=payload,
-                        timeout=60,
-                    )
-
-                    print(f"    📡 HF Status pour {model}: {response.status_code}")
-
-                    if response.status_code == 200:
-                        result = response.json()
-                        if isinstance(result, list) and len(result) > 0:
-                            text = result[0].get("generated_text", "")
-                            if "[/INST]" in text:
-                                parts = text.split("[/INST]")
-                                if len(parts) > 1:
-                                    return parts[-1].strip()
-                            return text
-                        return "❌ Format inattendu"
-                    elif response.status_code == 503:
-                        print(f"    ⏳ Modèle {model} en cours de chargement...")
-                        continue
-
-                except Exception as e:
-                    print(f"    ⚠️ Erreur avec {model}: {e}")
-                    continue
-
-            return "❌ Tous les modèles HF ont échoué"
-
-        except Exception as e:
-            error_msg = f"❌ Exception Hugging Face: {str(e)}"
-            print(f"    {error_msg}")
-            return error_msg
-
     def _fallback_chat_response(self, user_message: str) -> str:
         """Réponse de fallback à partir de la base de connaissances"""
 
@@ -7082,116 +6847,6 @@ Adaptations suggérées selon vos contraintes.
 
         return response
 
-    def _chat_openrouter(self, user_message: str, conversation_history=None, temperature=0.7, max_tokens=20000):
-        """Utilise OpenRouter API avec des modèles GRATUITS qui fonctionnent"""
-        try:
-            print(f"    🔑 OpenRouter Key détectée")
-            print(f"    🎛️ Paramètres: temperature={temperature}, max_tokens={max_tokens}")
-
-            headers = {
-                "Authorization": f"Bearer {self.openrouter_api_key}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "https://github.com/volubyl/fromager",
-            }
-
-            # Construire les messages
-            messages = [
-                {
-                    "role": "system",
-                    "content": """Tu es "Maître Fromager Pierre", expert français avec 40 ans d'expérience.
-    Tu es chaleureux, pédagogique et passionné. Réponds EN FRANÇAIS avec précision et enthousiasme.
-    Sois concis mais complet. Utilise des emojis fromagers occasionnellement 🧀.""",
-                }
-            ]
-
-            # Ajouter l'historique si disponible
-            if conversation_history:
-                for msg in conversation_history[-3:]:  # Garder 3 derniers messages
-                    messages.append({"role": msg["role"], "content": msg["content"]})
-
-            # Ajouter le nouveau message
-            messages.append({"role": "user", "content": user_message})
-
-            # MODÈLES GRATUITS QUI FONCTIONNENT VRAIMENT SUR OPENROUTER
-            free_models = [
-                "mistralai/mistral-7b-instruct",  # ✅ Bon pour JSON structuré
-                "meta-llama/llama-3.2-3b-instruct",
-                "microsoft/phi-3-mini-4k-instruct",
-                "google/gemma-2-2b-it",
-                        ]
-
-            # Essayer chaque modèle jusqu'à ce qu'un fonctionne
-            for model in free_models:
-                try:
-                    print(f"    🤖 Essai modèle: {model}")
-
-                    payload = {
-                        "model": model,
-                        "messages": messages,
-                        "temperature": temperature,  # ✅ CORRIGÉ : utilise le paramètre
-                        "max_tokens": max_tokens,    # ✅ CORRIGÉ : utilise le paramètre
-                        "stream": False,
-                        "seed": 42  # ✅ Seed fixe pour reproductibilité
-                    }
-
-                    response = requests.post(
-                        "https://openrouter.ai/api/v1/chat/completions",
-                        headers=headers,
-                        json=payload,
-                        timeout=60,  # Augmenté pour les longues réponses
-                    )
-
-                    print(
-                        f"    📡 Status pour {model.split('/')[-1]}: {response.status_code}"
-                    )
-
-                    if response.status_code == 200:
-                        result = response.json()
-                        if "choices" in result and len(result["choices"]) > 0:
-                            response_text = result["choices"][0]["message"]["content"]
-                            print(
-                                f"    ✅ Réponse obtenue avec {model.split('/')[-1]} ({len(response_text)} caractères)"
-                            )
-                            return response_text
-
-                    elif response.status_code == 402:
-                        print(
-                            f"    💸 Modèle {model.split('/')[-1]} nécessite des crédits"
-                        )
-                        continue  # Essayer le modèle suivant
-
-                    elif response.status_code == 404:
-                        print(f"    🔍 Modèle {model.split('/')[-1]} non disponible")
-                        continue  # Essayer le modèle suivant
-
-                    else:
-                        print(
-                            f"    ❌ Erreur {response.status_code} pour {model.split('/')[-1]}"
-                        )
-                        try:
-                            error_detail = response.json()
-                            print(f"    📄 Détail erreur: {error_detail}")
-                        except:
-                            pass
-                        continue
-
-                except requests.exceptions.Timeout:
-                    print(f"    ⏱️ Timeout pour {model.split('/')[-1]}")
-                    continue
-
-                except Exception as e:
-                    print(
-                        f"    ⚠️ Exception avec {model.split('/')[-1]}: {type(e).__name__} - {e}"
-                    )
-                    continue
-
-            print("    ❌ Aucun modèle OpenRouter n'a fonctionné")
-            return None
-
-        except Exception as e:
-            print(f"    ❌ Exception OpenRouter globale: {type(e).__name__} - {e}")
-            return None
-    
         # Fin de la classe
 
 
@@ -7230,14 +6885,20 @@ def update_profile_description(profile):
 
     return demo
 
+@traced("generate_all", root=True)
+@timed(GENERATION_SECONDS, entrypoint="generate_all")
 def generate_all(
-    ingredients, cheese_type, constraints, creativity, texture, affinage, spice, profile
+    ingredients, cheese_type, constraints, creativity, texture, affinage, spice, profile,
+    reuse_variant=False,
 ):
     """Génère recette + recherche web + ACTUALISE automatiquement l'historique"""
-    global recipe_map  # ✅ Déjà présent
-    
     try:
-        print("🚀 Début de generate_all")
+        logger.info("Début de generate_all")
+        set_attribute("cheese_type", cheese_type)
+        set_attribute("creativity", creativity)
+
+        # Recherche canonique de la saisie (valeur brute du menu) : une seule pour tout le clic
+        plan = SearchPlan(ingredients, cheese_type)
 
         # 1. GÉNÉRER LA RECETTE (sauvegarde automatique dans generate_recipe_creative)
         recipe = agent.generate_recipe_creative(
@@ -7249,20 +6910,20 @@ def generate_all(
             affinage,
             spice,
             profile,
+            reuse_variant=reuse_variant,
+            plan=plan,
         )
 
-        print("✅ Recette générée")
+        logger.info("Recette générée")
 
         # 2. RECHERCHE WEB
         try:
             web_recipes = agent.search_web_recipes(
-                ingredients, cheese_type, max_results=6
-            )
-            print(
-                f"✅ Recherche web: {len(web_recipes) if web_recipes else 0} résultats"
+                ingredients, cheese_type, max_results=6, plan=plan
             )
+            logger.info("Recherche web: %s résultats", len(web_recipes) if web_recipes else 0)
         except Exception as e:
-            print(f"⚠️ Erreur recherche web: {e}")
+            logger.warning("Erreur recherche web: %s", e)
             web_recipes = []
 
         # 3. CONSTRUIRE HTML DES RÉSULTATS WEB
@@ -7290,21 +6951,23 @@ def generate_all(
                 """
 
         # ===== 4. ACTUALISATION AUTOMATIQUE DE L'HISTORIQUE =====
-        print("🔄 Actualisation automatique de l'historique...")
+        logger.info("Actualisation automatique de l'historique...")
 
         # A. Forcer le rechargement de l'historique
-        agent.history = agent.get_history()  # ✅ CHANGÉ : _load_history -> get_history
+        with span("history.refresh"):
+            # Copie locale, sans toucher l'état partagé de l'agent (sessions simultanées)
+            history = agent.get_history()  # ✅ CHANGÉ : _load_history -> get_history
 
         # B. Créer un résumé mis à jour
         from datetime import datetime
 
         summary = "╔══════════════════════════════════════════════════════════╗\n"
-        summary += f"║   📚 HISTORIQUE MIS À JOUR ({len(agent.history)} recettes)   \n"
+        summary += f"║   📚 HISTORIQUE MIS À JOUR ({len(history)} recettes)   \n"
         summary += "╚══════════════════════════════════════════════════════════╝\n\n"
 
-        if agent.history:
+        if history:
             # Afficher les 3 dernières recettes
-            for i, entry in enumerate(agent.history[-6:][::-1], 1):
+            for i, entry in enumerate(history[-6:][::-1], 1):
                 cheese_name = entry.get("cheese_name", "Sans nom")
                 date_str = entry.get("timestamp", "")
                 if not date_str and "date" in entry:
@@ -7322,12 +6985,12 @@ def generate_all(
                 )
                 # Récupérer le profil
                 profile = entry.get("profile", "Profil inconnu")
-        # C. Préparer les choix du dropdown + REMPLIR recipe_map
+        # C. Préparer les choix du dropdown + REMPLIR recipe_map (état de la session)
         choices = []
-        recipe_map = {}  # ✅ NOUVEAU : Réinitialiser le recipe_map
+        recipe_map = {}
         
-        if agent.history:
-            for i, entry in enumerate(agent.history[-20:][::-1], 1):
+        if history:
+            for i, entry in enumerate(history[-20:][::-1], 1):
                 cheese_name = entry.get("cheese_name", "Sans nom")
                 date_str = entry.get("timestamp", "")
                 recipe_id = entry.get("id")  # ✅ NOUVEAU : Récupérer l'ID
@@ -7348,25 +7011,23 @@ def generate_all(
                 
                 choices.append(choice_text)
                 
-                # ✅ NOUVEAU : Remplir le recipe_map
                 recipe_map[choice_text] = recipe_id
-                print(f"📝 Ajouté au recipe_map: '{choice_text}' -> {recipe_id}")
 
         # D. Ajouter un message spécial pour la nouvelle recette
-        if agent.history:
-            last = agent.history[-1]
+        if history:
+            last = history[-1]
             summary += f"✨ **NOUVELLE RECETTE AJOUTÉE :** {last.get('cheese_name', 'Nouveau fromage')}\n"
             summary += f"   📍 Disponible dans la liste déroulante\n\n"
 
         # E. Si pas de recettes
-        if not agent.history:
+        if not history:
             summary += "📭 Aucune recette sauvegardée.\n"
             summary += "💡 Votre recette vient d'être créée et apparaîtra ici !\n\n"
 
-        print(f"✅ Historique actualisé: {len(agent.history)} recettes")
-        print(f"✅ Recipe_map mis à jour: {len(recipe_map)} entrées")  # ✅ NOUVEAU
+        logger.info("Historique actualisé: %s recettes", len(history))
+        logger.info("Recipe_map mis à jour: %s entrées", len(recipe_map))  # ✅ NOUVEAU
 
-        # ===== 5. RETOURNER TOUT (6 ÉLÉMENTS) =====
+        # ===== 5. RETOURNER TOUT (6 ÉLÉMENTS + recipe_map de la session) =====
         choices_with_placeholder = ["→ Sélectionner parmi les recettes"] + choices
         
         return (
@@ -7376,10 +7037,11 @@ def generate_all(
             summary,
             gr.update(choices=choices_with_placeholder, value="→ Sélectionner parmi les recettes"),
             "",
+            recipe_map,
         )
 
     except Exception as e:
-        print(f"❌ Erreur generate_all: {e}")
+        logger.error("Erreur generate_all: %s", e, exc_info=True)
         import traceback
         traceback.print_exc()
 
@@ -7390,6 +7052,7 @@ def generate_all(
             "❌ Erreur lors de la génération",
             gr.update(choices=["→ Erreur de chargement"]),  # ✅ CHANGÉ : [] -> gr.update
             "",
+            {},
         )
         
 # ===== Enrichissement de la base de connaissance ========
@@ -7431,7 +7094,7 @@ Il fonctionne automatiquement quand vous générez une recette :
         system = HybridKnowledgeSystem(agent)
         
         # Configuration légère pour commencer
-        print("🚀 Démarrage enrichissement...")
+        logger.info("Démarrage enrichissement...")
         
         # 1. Scraping de quelques URLs
         urls = [
@@ -7452,8 +7115,8 @@ Il fonctionne automatiquement quand vous générez une recette :
         unique = system._deduplicate_recipes(all_recipes)
         
       
-        with open("complete_knowledge_base.json", 'w', encoding='utf-8') as f:
-            json.dump(unique, f, indent=2, ensure_ascii=False)
+        kb_file = "complete_knowledge_base.json"
+        get_store().write(kb_file, unique, on_write=get_stats(kb_file).hook())
         
         result = f"""✅ ENRICHISSEMENT TERMINÉ !
 
@@ -7497,10 +7160,8 @@ Traceback :
 
 def view_knowledge_base():
     """Affiche le contenu de la base enrichie avec TOUS les détails"""
-    import os
-   
-    
-    if not os.path.exists("complete_knowledge_base.json"):
+    kb_file = "complete_knowledge_base.json"
+    if get_store().version(kb_file) is None and not os.path.exists(kb_file):
         return """
         <div style="padding: 40px; text-align: center; background: #FFF8E1; border-radius: 12px;">
             <div style="font-size: 48px; margin-bottom: 20px;">📭</div>
@@ -7511,8 +7172,7 @@ def view_knowledge_base():
         """
     
     try:
-        with open("complete_knowledge_base.json", 'r', encoding='utf-8') as f:
-            recipes = json.load(f)
+        recipes = get_store().read(kb_file)
         
         # Statistiques
         by_lait = {}
@@ -7727,56 +7387,237 @@ def view_knowledge_base():
         """ 
 
 
-def view_dynamic_recipes(filter_lait=None):
-    """Affiche TOUTES les recettes : statiques + dynamiques"""
+# ===== CARTES DE L'ONGLET "RECETTES DYNAMIQUES" =====
+
+# Version du gabarit HTML des cartes : l'incrémenter invalide les fragments en cache
+DYNAMIC_CARD_TEMPLATE_VERSION = 1
+
+# Fragments HTML des cartes, indexés par (id ou empreinte du contenu, version du gabarit)
+card_fragment_cache = GenerationCache(
+    max_size=int(os.getenv("CARD_FRAGMENT_CACHE_SIZE", "2000")), ttl=0
+)
+
+# Emoji map étendu avec variations et synonymes
+LAIT_EMOJI_MAP = {
+    'vache': '🐄',
+    'vaches': '🐄',
+    'bovin': '🐄',
+    'bovine': '🐄',
+    'lait de vache': '🐄',
+    
+    'chèvre': '🐐',
+    'chevre': '🐐',  # Sans accent
+    'chèvres': '🐐',
+    'chevres': '🐐',
+    'caprin': '🐐',
+    'caprine': '🐐',
+    'lait de chèvre': '🐐',
+    'lait de chevre': '🐐',
+    
+    'brebis': '🐑',
+    'ovin': '🐑',
+    'ovine': '🐑',
+    'mouton': '🐑',
+    'lait de brebis': '🐑',
+    
+    'bufflonne': '🐃',
+    'buffle': '🐃',
+    'bufflonnes': '🐃',
+    'buffles': '🐃',
+    'bubalus': '🐃',
+    'lait de bufflonne': '🐃',
+    
+    'mixte': '🥛',
+    'mélange': '🥛',
+    'melange': '🥛',
+    'plusieurs laits': '🥛',
+    
+    # Autres animaux (si jamais utilisés)
+    'chamelle': '🐪',
+    'chameau': '🐪',
+    'ânesse': '🫏',
+    'anesse': '🫏',
+    'jument': '🐴',
+    'renne': '🦌',
+    'yak': '🦬',
+}
+
+# Couleur de fond selon le type de lait
+LAIT_COLOR_MAP = {
+    '🐄': {'bg': '#FFF3E0', 'border': '#FFE0B2', 'text': '#E65100'},  # Orange - vache
+    '🐐': {'bg': '#F3E5F5', 'border': '#E1BEE7', 'text': '#7B1FA2'},  # Violet - chèvre
+    '🐑': {'bg': '#E8F5E9', 'border': '#C8E6C9', 'text': '#2E7D32'},  # Vert - brebis
+    '🐃': {'bg': '#E3F2FD', 'border': '#BBDEFB', 'text': '#1565C0'},  # Bleu - bufflonne
+    '🥛': {'bg': '#FAFAFA', 'border': '#E0E0E0', 'text': '#424242'},  # Gris - mixte
+    '❓': {'bg': '#FFF9C4', 'border': '#FFF59D', 'text': '#F57F17'},  # Jaune - inconnu
+}
+
+
+def _dynamic_card_key(recipe):
+    """Clé du fragment : id de la recette, sinon empreinte de son contenu"""
+    recipe_id = recipe.get('id')
+    if recipe_id is None:
+        payload = json.dumps(recipe, sort_keys=True, ensure_ascii=False, default=str)
+        recipe_id = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    return (recipe_id, DYNAMIC_CARD_TEMPLATE_VERSION)
+
+
+def _render_dynamic_recipe_card(recipe):
+    """HTML d'une carte recette (mis en cache par card_fragment_cache)"""
+    title = recipe.get('title', 'Sans titre')
+    description = recipe.get('description', 'Pas de description')
+    lait = recipe.get('lait', 'non spécifié')
+    type_pate = recipe.get('type_pate', 'non spécifié')
+    source_type = recipe.get('source_type', 'unknown')
+    requested_ingredients = recipe.get('requested_ingredients', '')
+    
+    # ===== DATE (UNE SEULE FOIS) =====
+    generated_at = recipe.get('generated_at') or recipe.get('date_creation') or recipe.get('date')
+    if generated_at:
+        try:
+            dt = datetime.fromisoformat(str(generated_at).replace('Z', '+00:00'))
+            date_str = dt.strftime('%d/%m/%Y %H:%M')
+        except Exception as e:
+            date_str = str(generated_at)[:19] if len(str(generated_at)) > 19 else str(generated_at)
+    else:
+        date_str = 'Date inconnue'
+    
+    # ===== URL (UNE SEULE FOIS) =====
+    recipe_url = recipe.get('url') or recipe.get('source_url') or recipe.get('link') or recipe.get('source')
+    if recipe_url in ["", "None", None]:
+        recipe_url = None
+    
+    # ===== STYLE ET ICÔNES =====
+    bg_color = '#E8F5E9' if source_type == 'scraped' else '#E3F2FD'
+    icon = '🔗' if recipe_url else ('🌐' if source_type == 'scraped' else '🤖')
+    lait_emoji = LAIT_EMOJI_MAP.get(lait, '❓')
+    
+    # ===== INGRÉDIENTS ET ÉTAPES =====
+    ingredients = recipe.get('ingredients', [])
+    etapes = recipe.get('etapes', [])
+    
+    # ===== PRÉPARER LE LIEN HTML =====
+    if recipe_url:
+        link_html = f"""
+            <div style="margin-bottom: 12px;">
+                <a href="{recipe_url}" target="_blank" 
+                style="display: inline-block; padding: 8px 16px; background: linear-gradient(45deg, #4CAF50, #45a049); 
+                        color: white; text-decoration: none; border-radius: 20px; font-size: 14px; font-weight: bold;
+                        box-shadow: 0 2px 4px rgba(76,175,80,0.3);">
+                    🚀 Accéder à la recette complète
+                </a>
+            </div>
+        """
+    else:
+        link_html = ""
+    
+    # ===== DÉBUT CARTE RECETTE =====
+    html = f"""
+        <div style="background: {bg_color}; padding: 20px; margin-bottom: 20px; border-radius: 12px; border-left: 5px solid #1976D2; box-shadow: 0 2px 4px rgba(0,0,0,0.1); width: 100%; box-sizing: border-box;">
+            <div style="margin-bottom: 15px;">
+                <div style="font-weight: bold; font-size: 18px; color: #1565C0; margin-bottom: 8px;">
+                    {icon} {title}
+                </div>
+                {link_html}
+                <div style="color: #666; font-size: 14px; font-style: italic;">
+                    {description}
+                </div>
+            </div>
+            <div style="background: rgba(255,255,255,0.6); padding: 12px; border-radius: 8px; margin-bottom: 12px; width: 100%; box-sizing: border-box;">
+                <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 10px; width: 100%;">
+                    <div><strong>📅 Généré le:</strong> {date_str}</div>
+                    <div><strong>Type de lait:</strong> {lait_emoji} {lait}</div>
+                    <div><strong>Type de pâte:</strong> {type_pate}</div>
+                    <div><strong>Source:</strong> {source_type}</div>
+                </div>
+                <div style="margin-top: 10px; padding: 10px; background: rgba(255,235,59,0.2); border-radius: 6px; width: 100%; box-sizing: border-box;">
+                    <strong>🧪 Ingrédients demandés:</strong> {requested_ingredients}
+                </div>
+            </div>
+    """
+    
+    # ===== INGRÉDIENTS =====
+    if ingredients and len(ingredients) > 0:
+        html += """
+            <div style="margin-top: 15px; padding: 12px; background: rgba(255,255,255,0.7); border-radius: 8px;">
+                <strong style="color: #1976D2;">🥛 Ingrédients:</strong>
+                <ul style="margin: 8px 0; padding-left: 20px;">
+        """
+        for ing in ingredients[:10]:
+            html += f'<li style="margin: 4px 0; color: #555;">{ing}</li>'
+        if len(ingredients) > 10:
+            html += f'<li style="color: #999; font-style: italic;">... et {len(ingredients) - 10} autres</li>'
+        html += """
+                </ul>
+            </div>
+        """
+    
+    # ===== ÉTAPES =====
+    if etapes and len(etapes) > 0:
+        html += """
+            <div style="margin-top: 15px; padding: 12px; background: rgba(255,255,255,0.7); border-radius: 8px;">
+                <strong style="color: #1976D2;">📋 Étapes:</strong>
+                <ol style="margin: 8px 0; padding-left: 20px;">
+        """
+        # TOUTES les étapes au lieu de [:8]
+        for etape in etapes:
+            html += f'<li style="margin: 6px 0; color: #555;">{etape}</li>'
+        html += """
+                </ol>
+            </div>
+        """
+    
+    # ===== FIN CARTE RECETTE (IMPORTANT !) =====
+    html += """
+        </div>
+    """
+    
+    return html
+
+
+# Recettes affichées par page dans l'onglet "Recettes dynamiques"
+DYNAMIC_PAGE_SIZE = 20
+
+
+def view_dynamic_recipes(filter_lait=None, filter_type_pate=None, sort_key="recent", page=1, page_size=DYNAMIC_PAGE_SIZE):
+    """Affiche les recettes statiques + dynamiques, page par page"""
+    html, _ = _render_dynamic_recipes(filter_lait, filter_type_pate, sort_key, page, page_size)
+    return html
+
+
+def dynamic_recipes_page(filter_lait=None, filter_type_pate=None, sort_key="recent", page=1, page_size=DYNAMIC_PAGE_SIZE):
+    """Handler Gradio : HTML de la page + numéro de page effectivement affiché"""
+    return _render_dynamic_recipes(filter_lait, filter_type_pate, sort_key, page, page_size)
+
+
+def _render_dynamic_recipes(filter_lait, filter_type_pate, sort_key, page, page_size):
+    """Rendu HTML de la page demandée uniquement (filtres appliqués via l'index)"""
     import os
    
     from datetime import datetime
     
+    try:
+        page_size = max(1, int(page_size or DYNAMIC_PAGE_SIZE))
+    except (TypeError, ValueError):
+        page_size = DYNAMIC_PAGE_SIZE
+    try:
+        page = max(1, int(page or 1))
+    except (TypeError, ValueError):
+        page = 1
     
     # 1. DÉFINIR LES FICHIERS
     history_file = "unified_recipes_history.json"
     static_file = "complete_knowledge_base.json"
     
-    # ✅ 2. VÉRIFIER SI FICHIERS EXISTENT ← AJOUTÉ ICI
-    has_static = os.path.exists(static_file)      # ← AJOUTÉ
-    has_dynamic = os.path.exists(history_file)    # ← AJOUTÉ
+    # ✅ 2. VÉRIFIER SI LES DOCUMENTS EXISTENT (stockage partagé, ou fichier local pas encore importé)
+    store = get_store()
+    has_static = store.version(static_file) is not None or os.path.exists(static_file)
+    has_dynamic = store.version(history_file) is not None or os.path.exists(history_file)
     
-    # ✅ NETTOYAGE AUTOMATIQUE AU CHARGEMENT - VERSION ULTRA-STRICTE
-    if os.path.exists(history_file):
-        with open(history_file, 'r', encoding='utf-8') as f:
-            all_recipes_raw = json.load(f)
-        
-        # Dédupliquer avec clé basée sur date + titre
-        seen = set()
-        cleaned = []
-        duplicates_count = 0
-        
-        for r in all_recipes_raw:
-            # Récupérer la date et le titre
-            date = r.get('generated_at') or r.get('date_creation') or r.get('date', '')
-            title = r.get('title', '').strip()
-            
-            # Clé unique : date (jusqu'à la minute) + titre
-            date_minute = date[:16] if len(date) >= 16 else date  # Format: 2026-02-12T18:44
-            recipe_key = f"{date_minute}|{title}"
-            
-            if recipe_key not in seen:
-                cleaned.append(r)
-                seen.add(recipe_key)
-            else:
-                duplicates_count += 1
-                print(f"🗑️ Doublon supprimé: {title} - {date}")
-        
-        # Réécrire si des doublons détectés
-        if duplicates_count > 0:
-            with open(history_file, 'w', encoding='utf-8') as f:
-                json.dump(cleaned, f, ensure_ascii=False, indent=2)
-            print(f"🧹 {duplicates_count} doublons supprimés automatiquement")
-            print(f"✅ {len(cleaned)} recettes conservées")
+    # Lecture seule : les doublons sont refusés à l'insertion et retirés par le compacteur
     
     if not has_static and not has_dynamic:
-        return """
+        return ("""
         <div style="padding: 40px; text-align: center; background: #E3F2FD; border-radius: 12px;">
             <div style="font-size: 48px; margin-bottom: 20px;">📭</div>
             <h3 style="color: #1565C0;">Aucune recette générée pour le moment</h3>
@@ -7785,39 +7626,15 @@ def view_dynamic_recipes(filter_lait=None):
                 Le système hybride dynamique créera des recettes adaptées à vos ingrédients.
             </p>
         </div>
-        """
-    all_recipes = []
+        """, 1)
     
     try:
-        # 3. CHARGER STATIQUES (si existe)
-        if has_static:
-            try:
-                with open(static_file, 'r', encoding='utf-8') as f:
-                    static_recipes = json.load(f)
-                    for r in static_recipes:
-                        r['is_static'] = True
-                    all_recipes.extend(static_recipes)
-            except:
-                pass  # Ignore erreurs statiques
-        
-        # 4. CHARGER DYNAMIQUES (priorité)
-        if has_dynamic:
-            try:
-                with open(history_file, 'r', encoding='utf-8') as f:
-                    dynamic_recipes = json.load(f)
-                    for r in dynamic_recipes:
-                        if r.get('title'):  # Juste un titre = OK
-                            r['is_static'] = False
-                            all_recipes.append(r)
-            except:
-                pass
-        
-        if not all_recipes:
-            return "<h3>❌ Erreur chargement</h3>"
+        # 3. CHARGER STATIQUES + DYNAMIQUES (index rechargé seulement si les documents changent)
+        total_recipes = len(dynamic_recipe_index)
         
         # Si aucune recette valide
-        if len(all_recipes) == 0:
-            return """
+        if total_recipes == 0:
+            return ("""
             <div style="padding: 40px; text-align: center; background: #FFF3E0; border-radius: 12px;">
                 <div style="font-size: 48px; margin-bottom: 20px;">⚠️</div>
                 <h3 style="color: #F57C00;">Aucune recette valide trouvée</h3>
@@ -7826,19 +7643,22 @@ def view_dynamic_recipes(filter_lait=None):
                     Générez une nouvelle recette pour commencer !
                 </p>
             </div>
-            """
+            """, 1)
         
-        # Filtrer par type de lait si demandé
-        if filter_lait and filter_lait != "Tous":
-            recipes = [r for r in all_recipes if r.get('lait') == filter_lait]
-        else:
-            recipes = all_recipes
+        # 4. FILTRER (lait, type de pâte) + TRIER + PAGINER via l'index
+        recipes, filtered_count, page, page_count = dynamic_recipe_index.page(
+            filter_lait, filter_type_pate, sort_key, page=page, page_size=page_size
+        )
+        offset = (page - 1) * page_size
         
-        # Statistiques
-        by_lait = {}
-        for r in all_recipes:
-            lait = r.get('lait', 'non spécifié')
-            by_lait[lait] = by_lait.get(lait, 0) + 1
+        # Statistiques (compteurs maintenus à chaque sauvegarde)
+        by_lait = get_stats(static_file).by('lait')
+        for lait, count in get_stats(history_file).by('lait').items():
+            by_lait[lait] = by_lait.get(lait, 0) + count
+        
+        filter_label = filter_lait or 'Tous'
+        if filter_type_pate and filter_type_pate != "Tous":
+            filter_label += f" • {filter_type_pate}"
         
         # Construire HTML
         html = f"""
@@ -7852,86 +7672,30 @@ def view_dynamic_recipes(filter_lait=None):
                 <div style="display: grid; grid-template-columns: repeat(2, 1fr); gap: 20px; margin-bottom: 20px;">
                     <div style="text-align: center; background: #E3F2FD; padding: 20px; border-radius: 8px;">
                         <div style="font-size: 48px; font-weight: bold; color: #1565C0;">
-                            {len(all_recipes)}
+                            {total_recipes}
                         </div>
                         <div style="color: #666; font-size: 14px;">Recettes totales</div>
                     </div>
                     <div style="text-align: center; background: #C8E6C9; padding: 20px; border-radius: 8px;">
                         <div style="font-size: 48px; font-weight: bold; color: #2E7D32;">
-                            {len(recipes)}
+                            {filtered_count}
                         </div>
-                        <div style="color: #666; font-size: 14px;">Filtrées ({filter_lait or 'Tous'})</div>
+                        <div style="color: #666; font-size: 14px;">Filtrées ({filter_label})</div>
                     </div>
                 </div>
                 
                 <div style="display: grid; grid-template-columns: repeat(3, 1fr); gap: 15px;">
         """
         
-        # Stats par type de lait
-        # Emoji map étendu avec variations et synonymes
-        emoji_map = {
-            'vache': '🐄',
-            'vaches': '🐄',
-            'bovin': '🐄',
-            'bovine': '🐄',
-            'lait de vache': '🐄',
-            
-            'chèvre': '🐐',
-            'chevre': '🐐',  # Sans accent
-            'chèvres': '🐐',
-            'chevres': '🐐',
-            'caprin': '🐐',
-            'caprine': '🐐',
-            'lait de chèvre': '🐐',
-            'lait de chevre': '🐐',
-            
-            'brebis': '🐑',
-            'ovin': '🐑',
-            'ovine': '🐑',
-            'mouton': '🐑',
-            'lait de brebis': '🐑',
-            
-            'bufflonne': '🐃',
-            'buffle': '🐃',
-            'bufflonnes': '🐃',
-            'buffles': '🐃',
-            'bubalus': '🐃',
-            'lait de bufflonne': '🐃',
-            
-            'mixte': '🥛',
-            'mélange': '🥛',
-            'melange': '🥛',
-            'plusieurs laits': '🥛',
-            
-            # Autres animaux (si jamais utilisés)
-            'chamelle': '🐪',
-            'chameau': '🐪',
-            'ânesse': '🫏',
-            'anesse': '🫏',
-            'jument': '🐴',
-            'renne': '🦌',
-            'yak': '🦬',
-        }
-
         # Normaliser la clé et rechercher l'emoji
         for lait, count in sorted(by_lait.items(), key=lambda x: x[1], reverse=True):
             # Normaliser : minuscules et sans espaces superflus
             lait_normalized = (lait or "").lower().strip()
             
             # Chercher l'emoji
-            emoji = emoji_map.get(lait_normalized, '❓')
-            
-            # Couleur de fond selon le type de lait
-            color_map = {
-                '🐄': {'bg': '#FFF3E0', 'border': '#FFE0B2', 'text': '#E65100'},  # Orange - vache
-                '🐐': {'bg': '#F3E5F5', 'border': '#E1BEE7', 'text': '#7B1FA2'},  # Violet - chèvre
-                '🐑': {'bg': '#E8F5E9', 'border': '#C8E6C9', 'text': '#2E7D32'},  # Vert - brebis
-                '🐃': {'bg': '#E3F2FD', 'border': '#BBDEFB', 'text': '#1565C0'},  # Bleu - bufflonne
-                '🥛': {'bg': '#FAFAFA', 'border': '#E0E0E0', 'text': '#424242'},  # Gris - mixte
-                '❓': {'bg': '#FFF9C4', 'border': '#FFF59D', 'text': '#F57F17'},  # Jaune - inconnu
-            }
+            emoji = LAIT_EMOJI_MAP.get(lait_normalized, '❓')
             
-            colors = color_map.get(emoji, color_map['❓'])
+            colors = LAIT_COLOR_MAP.get(emoji, LAIT_COLOR_MAP['❓'])
             
             html += f"""
                 <div style="background: {colors['bg']}; padding: 15px; border-radius: 8px; text-align: center; border: 2px solid {colors['border']};">
@@ -7942,124 +7706,28 @@ def view_dynamic_recipes(filter_lait=None):
             """
 
         # FERMER LA SECTION STATS ET OUVRIR LA SECTION RECETTES
-        html += """
+        html += f"""
                 </div>
             </div>
             
             <div style="background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 8px rgba(0,0,0,0.1);">
                 <h3 style="color: #1976D2; margin-top: 0;">📖 Recettes générées</h3>
+                <div style="color: #666; font-size: 14px; margin-bottom: 12px;">
+                    Page {page}/{page_count} • recettes {offset + 1 if filtered_count else 0}-{offset + len(recipes)} sur {filtered_count}
+                </div>
                 <div style="max-height: 600px; overflow-y: auto; width: 100%;">
         """
 
-        # Afficher les recettes (les plus récentes en premier)
-        for i, recipe in enumerate(reversed(recipes), 1):
-            title = recipe.get('title', 'Sans titre')
-            description = recipe.get('description', 'Pas de description')
-            lait = recipe.get('lait', 'non spécifié')
-            type_pate = recipe.get('type_pate', 'non spécifié')
-            source_type = recipe.get('source_type', 'unknown')
-            requested_ingredients = recipe.get('requested_ingredients', '')
-            
-            # ===== DATE (UNE SEULE FOIS) =====
-            generated_at = recipe.get('generated_at') or recipe.get('date_creation') or recipe.get('date')
-            if generated_at:
-                try:
-                    dt = datetime.fromisoformat(str(generated_at).replace('Z', '+00:00'))
-                    date_str = dt.strftime('%d/%m/%Y %H:%M')
-                except Exception as e:
-                    date_str = str(generated_at)[:19] if len(str(generated_at)) > 19 else str(generated_at)
-            else:
-                date_str = 'Date inconnue'
-            
-            # ===== URL (UNE SEULE FOIS) =====
-            recipe_url = recipe.get('url') or recipe.get('source_url') or recipe.get('link') or recipe.get('source')
-            if recipe_url in ["", "None", None]:
-                recipe_url = None
-            
-            # ===== STYLE ET ICÔNES =====
-            bg_color = '#E8F5E9' if source_type == 'scraped' else '#E3F2FD'
-            icon = '🔗' if recipe_url else ('🌐' if source_type == 'scraped' else '🤖')
-            lait_emoji = emoji_map.get(lait, '❓')
-            
-            # ===== INGRÉDIENTS ET ÉTAPES =====
-            ingredients = recipe.get('ingredients', [])
-            etapes = recipe.get('etapes', [])
-            
-            # ===== PRÉPARER LE LIEN HTML =====
-            if recipe_url:
-                link_html = f"""
-                    <div style="margin-bottom: 12px;">
-                        <a href="{recipe_url}" target="_blank" 
-                        style="display: inline-block; padding: 8px 16px; background: linear-gradient(45deg, #4CAF50, #45a049); 
-                                color: white; text-decoration: none; border-radius: 20px; font-size: 14px; font-weight: bold;
-                                box-shadow: 0 2px 4px rgba(76,175,80,0.3);">
-                            🚀 Accéder à la recette complète
-                        </a>
-                    </div>
-                """
-            else:
-                link_html = ""
-            
-            # ===== DÉBUT CARTE RECETTE =====
-            html += f"""
-                <div style="background: {bg_color}; padding: 20px; margin-bottom: 20px; border-radius: 12px; border-left: 5px solid #1976D2; box-shadow: 0 2px 4px rgba(0,0,0,0.1); width: 100%; box-sizing: border-box;">
-                    <div style="margin-bottom: 15px;">
-                        <div style="font-weight: bold; font-size: 18px; color: #1565C0; margin-bottom: 8px;">
-                            {icon} {title}
-                        </div>
-                        {link_html}
-                        <div style="color: #666; font-size: 14px; font-style: italic;">
-                            {description}
-                        </div>
-                    </div>
-                    <div style="background: rgba(255,255,255,0.6); padding: 12px; border-radius: 8px; margin-bottom: 12px; width: 100%; box-sizing: border-box;">
-                        <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 10px; width: 100%;">
-                            <div><strong>📅 Généré le:</strong> {date_str}</div>
-                            <div><strong>Type de lait:</strong> {lait_emoji} {lait}</div>
-                            <div><strong>Type de pâte:</strong> {type_pate}</div>
-                            <div><strong>Source:</strong> {source_type}</div>
-                        </div>
-                        <div style="margin-top: 10px; padding: 10px; background: rgba(255,235,59,0.2); border-radius: 6px; width: 100%; box-sizing: border-box;">
-                            <strong>🧪 Ingrédients demandés:</strong> {requested_ingredients}
-                        </div>
-                    </div>
-            """
-            
-            # ===== INGRÉDIENTS =====
-            if ingredients and len(ingredients) > 0:
-                html += """
-                    <div style="margin-top: 15px; padding: 12px; background: rgba(255,255,255,0.7); border-radius: 8px;">
-                        <strong style="color: #1976D2;">🥛 Ingrédients:</strong>
-                        <ul style="margin: 8px 0; padding-left: 20px;">
-                """
-                for ing in ingredients[:10]:
-                    html += f'<li style="margin: 4px 0; color: #555;">{ing}</li>'
-                if len(ingredients) > 10:
-                    html += f'<li style="color: #999; font-style: italic;">... et {len(ingredients) - 10} autres</li>'
-                html += """
-                        </ul>
-                    </div>
-                """
-            
-            # ===== ÉTAPES =====
-            if etapes and len(etapes) > 0:
-                html += """
-                    <div style="margin-top: 15px; padding: 12px; background: rgba(255,255,255,0.7); border-radius: 8px;">
-                        <strong style="color: #1976D2;">📋 Étapes:</strong>
-                        <ol style="margin: 8px 0; padding-left: 20px;">
-                """
-                # TOUTES les étapes au lieu de [:8]
-                for etape in etapes:
-                    html += f'<li style="margin: 6px 0; color: #555;">{etape}</li>'
-                html += """
-                        </ol>
-                    </div>
-                """
-            
-            # ===== FIN CARTE RECETTE (IMPORTANT !) =====
-            html += """
-                </div>
-            """
+        # Afficher uniquement la page visible (ordre donné par l'index)
+        # Cartes immuables une fois sauvegardées : fragments HTML réutilisés
+        for recipe in recipes:
+            key = _dynamic_card_key(recipe)
+            card_html = card_fragment_cache.get(key)
+            record_cache("card_fragment", card_html is not None)
+            if card_html is None:
+                card_html = _render_dynamic_recipe_card(recipe)
+                card_fragment_cache.put(key, card_html)
+            html += card_html
         
         # Fermer les divs finales
         html += """
@@ -8068,7 +7736,7 @@ def view_dynamic_recipes(filter_lait=None):
         </div>
         """
         
-        return html
+        return html, page
         
     except Exception as e:
         import traceback
@@ -8081,7 +7749,22 @@ def view_dynamic_recipes(filter_lait=None):
 {traceback.format_exc()}
             </pre>
         </div>
-        """       
+        """, page
+
+# ===== VOIES DE CONCURRENCE =====
+def lane_busy(outputs=1, message_index=0):
+    """Réponse « occupé » d'une voie saturée : message + sorties inchangées"""
+    def busy(message):
+        try:
+            gr.Warning(message)
+        except Exception:
+            pass
+        if outputs == 1:
+            return message
+        values = [gr.update() for _ in range(outputs)]
+        values[message_index] = message
+        return tuple(values)
+    return busy
 
 # CREATE INTERFACE GRADIO
 # ===== create_interface AVEC AUTHENTIFICATION =====
@@ -8102,12 +7785,13 @@ def create_interface():
     fromage_theme = create_fromage_theme()
 
     # ===== FONCTION IMAGE (définie AVANT gr.Blocks) =====
-    def generate_and_display_image(description, style, size):
+    async def generate_and_display_image(description, style, size):
         """Génère l'image et retourne le chemin pour Gradio"""
         if not description or not description.strip():
             return None, "❌ Veuillez entrer une description"
 
-        message, image = agent.generate_cheese_image_kie(description, style)
+        # Polling KIE sur la boucle de Gradio : aucun thread occupé pendant l'attente
+        message, image = await agent.generate_cheese_image_kie_async(description, style)
         
         if image is not None:
             return image, message
@@ -8245,6 +7929,11 @@ def create_interface():
                             label="🌶️ Épices",
                         )
 
+                    reuse_variant_checkbox = gr.Checkbox(
+                        value=False,
+                        label="♻️ Réutiliser la dernière variante (créativité 1-3) au lieu d'en forcer une nouvelle",
+                    )
+
                     generate_all_btn = gr.Button(
                         "✨ Générer la recette",
                         variant="primary",
@@ -8278,13 +7967,7 @@ def create_interface():
             def load_history():
                 """Charge l'historique"""
                 try:
-                    if hasattr(agent, "history") and agent.history:
-                        history = agent.history
-                    elif os.path.exists(agent.recipes_file):
-                        with open(agent.recipes_file, "r", encoding="utf-8") as f:
-                            history = json.load(f)
-                    else:
-                        return "📭 Aucune recette sauvegardée", []
+                    history = agent.get_history()
 
                     if not history:
                         return "📭 Aucune recette sauvegardée", []
@@ -8333,12 +8016,8 @@ def create_interface():
                     num_str = choice.split(".")[0].strip()
                     position = int(num_str)
 
-                    if hasattr(agent, "history") and agent.history:
-                        history = agent.history
-                    elif os.path.exists(agent.recipes_file):
-                        with open(agent.recipes_file, "r", encoding="utf-8") as f:
-                            history = json.load(f)
-                    else:
+                    history = agent.get_history()
+                    if not history:
                         return "❌ Historique introuvable"
 
                     reversed_history = history[-20:][::-1]
@@ -8356,11 +8035,7 @@ def create_interface():
                 """Efface l'historique"""
                 try:
                     recipes_file = "recipes_history.json"
-                    with open(recipes_file, "w", encoding="utf-8") as f:
-                        json.dump([], f)
-
-                    if hasattr(agent, "history"):
-                        agent.history = []
+                    get_store().write(recipes_file, [], on_write=get_stats(recipes_file).hook())
 
                     return "✅ Historique effacé", [], ""
                 except Exception as e:
@@ -8375,8 +8050,6 @@ def create_interface():
                 """Efface et reset"""
                 return agent_clear_history()
 
-            fallback_cache = None
-
             # ===== ONGLETS =====
             with gr.Tabs():
 
@@ -8415,20 +8088,83 @@ def create_interface():
                             choices=["Tous", "vache", "chèvre", "brebis", "bufflonne"],
                             value="Tous"
                         )
+                        filter_type_pate_dropdown = gr.Dropdown(
+                            label="Filtrer par type de pâte",
+                            choices=["Tous"] + dynamic_recipe_index.type_pate_values(),
+                            value="Tous"
+                        )
+                        sort_dropdown = gr.Dropdown(
+                            label="Trier par",
+                            choices=[(label, key) for key, label in SORT_KEYS.items()],
+                            value="recent"
+                        )
                         refresh_btn = gr.Button("🔄 Actualiser", variant="secondary")
 
+                    with gr.Row():
+                        prev_page_btn = gr.Button("⬅️ Page précédente", size="sm")
+                        page_number = gr.Number(label="Page", value=1, precision=0, minimum=1)
+                        page_size_dropdown = gr.Dropdown(
+                            label="Recettes par page",
+                            choices=[10, 20, 50, 100],
+                            value=DYNAMIC_PAGE_SIZE
+                        )
+                        next_page_btn = gr.Button("Page suivante ➡️", size="sm")
+
                     dynamic_recipes_output = gr.HTML(label="Recettes dynamiques")
 
-                    filter_lait_dropdown.change(
-                        fn=view_dynamic_recipes,
-                        inputs=[filter_lait_dropdown],
-                        outputs=dynamic_recipes_output
+                    dynamic_inputs = [
+                        filter_lait_dropdown, filter_type_pate_dropdown,
+                        sort_dropdown, page_number, page_size_dropdown,
+                    ]
+                    dynamic_outputs = [dynamic_recipes_output, page_number]
+
+                    def _first_page(lait, type_pate, sort_key, page, page_size):
+                        """Un changement de filtre / tri / taille repart de la page 1"""
+                        return dynamic_recipes_page(lait, type_pate, sort_key, 1, page_size)
+
+                    def _prev_page(lait, type_pate, sort_key, page, page_size):
+                        return dynamic_recipes_page(lait, type_pate, sort_key, (page or 1) - 1, page_size)
+
+                    def _next_page(lait, type_pate, sort_key, page, page_size):
+                        return dynamic_recipes_page(lait, type_pate, sort_key, (page or 1) + 1, page_size)
+
+                    # Lectures rapides : voie "ui", jamais derrière une génération ou une image
+                    ui_busy = lane_busy(outputs=2)
+
+                    for control in (filter_lait_dropdown, filter_type_pate_dropdown, sort_dropdown, page_size_dropdown):
+                        control.change(
+                            fn=in_lane("ui", ui_busy)(_first_page),
+                            inputs=dynamic_inputs,
+                            outputs=dynamic_outputs,
+                            **event_options("ui")
+                        )
+
+                    page_number.submit(
+                        fn=in_lane("ui", ui_busy)(dynamic_recipes_page),
+                        inputs=dynamic_inputs,
+                        outputs=dynamic_outputs,
+                        **event_options("ui")
+                    )
+
+                    prev_page_btn.click(
+                        fn=in_lane("ui", ui_busy)(_prev_page),
+                        inputs=dynamic_inputs,
+                        outputs=dynamic_outputs,
+                        **event_options("ui")
+                    )
+
+                    next_page_btn.click(
+                        fn=in_lane("ui", ui_busy)(_next_page),
+                        inputs=dynamic_inputs,
+                        outputs=dynamic_outputs,
+                        **event_options("ui")
                     )
 
                     refresh_btn.click(
-                        fn=view_dynamic_recipes,
-                        inputs=[filter_lait_dropdown],
-                        outputs=dynamic_recipes_output
+                        fn=in_lane("ui", ui_busy)(dynamic_recipes_page),
+                        inputs=dynamic_inputs,
+                        outputs=dynamic_outputs,
+                        **event_options("ui")
                     )
 
                 # ONGLET 4 : Chat
@@ -8459,11 +8195,18 @@ def create_interface():
                         btn_wine = gr.Button("🍷 Accord vin", size="sm")
                         btn_clear_chat = gr.Button("🗑️ Effacer", size="sm")
 
-                    def process_question(question, history):
+                    async def process_question(question, history):
                         if not question or not question.strip():
-                            return history, "", ""
+                            yield history, "", ""
+                            return
+
+                        # Réponse affichée au fil de la génération (premier fragment = latence perçue)
+                        response = ""
+                        async for chunk in agent.chat_with_llm_stream_async(question, []):
+                            response += chunk
+                            partial = history + [f"👤 **Vous:** {question}", f"🧀 **Maître Fromager:** {response}"]
+                            yield history, "\n\n".join(partial), ""
 
-                        response = agent.chat_with_llm(question, [])
                         history.append(f"👤 **Vous:** {question}")
                         history.append(f"🧀 **Maître Fromager:** {response}")
                         history.append("─" * 50)
@@ -8472,7 +8215,7 @@ def create_interface():
                             history = history[-15:]
 
                         display_text = "\n\n".join(history)
-                        return history, display_text, ""
+                        yield history, display_text, ""
 
                     def get_quick_question(btn_text):
                         questions = {
@@ -8485,16 +8228,21 @@ def create_interface():
                     def clear_conversation():
                         return [], "", ""
 
+                    # Voie "chat" : la question reste dans le champ si la voie est saturée
+                    chat_in_lane = in_lane("chat", lane_busy(outputs=3, message_index=1))(process_question)
+
                     send_btn.click(
-                        fn=process_question,
+                        fn=chat_in_lane,
                         inputs=[user_input, chat_history],
                         outputs=[chat_history, chat_display, user_input],
+                        **event_options("chat")
                     )
 
                     user_input.submit(
-                        fn=process_question,
+                        fn=chat_in_lane,
                         inputs=[user_input, chat_history],
                         outputs=[chat_history, chat_display, user_input],
+                        **event_options("chat")
                     )
 
                     btn_problem.click(fn=lambda: get_quick_question("🚨 Problème"), outputs=[user_input])
@@ -8570,9 +8318,10 @@ def create_interface():
 
                     # ===== CONNEXION BOUTON IMAGE (dans le tab, après les composants) =====
                     generate_image_btn.click(
-                        fn=generate_and_display_image,
+                        fn=in_lane("image", lane_busy(outputs=2, message_index=1))(generate_and_display_image),
                         inputs=[image_description, image_style, image_size],
-                        outputs=[generated_image, image_status]
+                        outputs=[generated_image, image_status],
+                        **event_options("image")
                     )
 
 
@@ -8582,9 +8331,9 @@ def create_interface():
                 with gr.Tab("🕒 Historique"):
                     gr.Markdown("### 📚 Historique de vos recettes")
 
-                    # ===== VARIABLES =====
-                    recipe_map = {}
-                    stats_visible = False
+                    # ===== ÉTAT DE LA SESSION (un par utilisateur) =====
+                    recipe_map_state = gr.State({})
+                    stats_visible_state = gr.State(False)
 
                     # ===== COMPTEUR =====
                     counter_card = gr.HTML("""
@@ -8651,63 +8400,51 @@ def create_interface():
                             )
 
                     # ===== FONCTIONS HISTORIQUE =====
-                    stats_visible = False
-
-                    def toggle_stats():
-                        """Toggle propre entre 2 états seulement"""
-                        global stats_visible
+                    def toggle_stats(stats_visible):
+                        """Toggle propre entre 2 états seulement (état de la session)"""
                         stats_visible = not stats_visible
 
                         if stats_visible:
-                            print("📊 Affichage des statistiques")
+                            logger.debug("Affichage des statistiques")
                             result = show_stats()
                             return [
                                 result,
-                                gr.update(value="👁️‍🗨️ Cacher", variant="stop")
+                                gr.update(value="👁️‍🗨️ Cacher", variant="stop"),
+                                stats_visible,
                             ]
                         else:
-                            print("👁️‍🗨️ Cache les statistiques")
+                            logger.debug("Cache les statistiques")
                             return [
                                 "<div style='padding: 20px; text-align: center; color: #666;'>Cliquez sur 'Compter' pour voir les statistiques</div>",
-                                gr.update(value="🔢 Statistiques", variant="secondary")
+                                gr.update(value="🔢 Statistiques", variant="secondary"),
+                                stats_visible,
                             ]
 
                     def get_fallback_count():
                         """Retourne le nombre RÉEL de recettes de référence"""
                         try:
-                            global fallback_cache
-
-                            if fallback_cache is None:
-                                fallback_cache = agent._get_absolute_fallback("", "", 1000)
-
-                            real_count = len(fallback_cache)
-                            print(f"📊 Nombre réel de recettes de référence: {real_count}")
+                            real_count = get_reference_stats(agent).count()
+                            logger.debug("Nombre réel de recettes de référence: %d", real_count)
                             return real_count
 
                         except Exception as e:
-                            print(f"❌ Erreur get_fallback_count: {e}")
+                            logger.warning("Erreur get_fallback_count: %s", e)
                             return 0
 
                     def update_interface():
-                        """Actualise TOUTE l'interface - COMPTE RÉEL"""
-                        global stats_visible
-                        
-                         # Reset complet
-                        stats_visible = False
-                        recipe_map = {}  # 🔥 IMPORTANT : Reset du mapping
+                        """Actualise TOUTE l'interface - COMPTE RÉEL (réinitialise l'état de la session)"""
+                        recipe_map = {}
 
                         try:
-                            print("🔄 Début update_interface")
+                            logger.debug("Début update_interface")
 
                             history = agent.get_history()
                             fallback_count = get_fallback_count()
 
-                            print(f"📊 Histoire réelle: {len(history)} entrées")
-                            print(f"📊 Contenu histoire:")
-                            for i, entry in enumerate(history):
-                                print(f"  [{i}] ID: {entry.get('id')}, Nom: {entry.get('cheese_name', 'N/A')}")
+                            logger.debug("Historique réel: %d entrées", len(history))
 
                             total = len(history) + fallback_count
+                            cache_stats = generation_cache.stats()
                             counter_html = f"""
                             <div style="
                                 background: linear-gradient(135deg, #6a11cb 0%, #2575fc 100%);
@@ -8725,6 +8462,9 @@ def create_interface():
                                     <span>•</span>
                                     <span id="reference-count">{fallback_count} réf</span>
                                 </div>
+                                <div style="font-size: 11px; opacity: 0.8; margin-top: 6px;">
+                                    ♻️ Cache : {cache_stats['hits']} hits • {cache_stats['misses']} miss
+                                </div>
                             </div>
                             """
                             # résumé texte
@@ -8744,21 +8484,6 @@ def create_interface():
                             
                             #  Construction du dropdow avec mapping
                             choices = []
-                            # global recipe_map
-                            print("\n" + "="*60)
-                            print("🔍 DEBUG UPDATE_INTERFACE")
-                            print("="*60)
-                            print(f"Historique brut: {type(history)}, longueur: {len(history) if history else 0}")
-                            
-                            if history:
-                                print("\n5 premières entrées:")
-                                for i, entry in enumerate(history[:5]):
-                                    print(f"  [{i}] ID: {entry.get('id')}, Nom: {entry.get('cheese_name')}")
-                            
-                            print(f"\nrecipe_map avant: {len(recipe_map)} entrées")
-                            recipe_map = {}
-
-                            print(f"🎯 Création dropdown à partir de {len(history)} entrées")
 
                             for entry in reversed(history):
                                 entry_id = entry.get('id')
@@ -8770,17 +8495,15 @@ def create_interface():
                                 if display_text not in recipe_map:
                                     choices.append(display_text)
                                     recipe_map[display_text] = entry_id
-                                    print(f"   ➕ Ajouté: {display_text}")
                                 else:
-                                    print(f"   ⚠️ Doublon ignoré: {display_text}")
-
-                            print(f"✅ Dropdown créé avec {len(choices)} choix uniques")
+                                    logger.debug("Doublon ignoré dans le menu: %s", display_text)
 
                             choices_with_placeholder = ["→ Sélectionner parmi les recettes"] + choices
 
-                            print(f"✅ Interface: {len(history)} perso + {fallback_count} réf = {total} total")
-                            print(f"recipe_map après: {len(recipe_map)} entrées")
-                            print("="*60 + "\n")
+                            logger.info(
+                                "Historique: %d perso + %d réf = %d total (%d choix)",
+                                len(history), fallback_count, total, len(choices)
+                            )
 
                             return [
                                 counter_html,
@@ -8790,10 +8513,12 @@ def create_interface():
                                     value="→ Sélectionner parmi les recettes"
                                 ),
                                 "Actualisez puis sélectionnez une recette...",
+                                recipe_map,
+                                False,
                             ]
 
                         except Exception as e:
-                            print(f"❌ Erreur update_interface: {e}")
+                            logger.warning("Erreur update_interface: %s", e)
                             import traceback
                             traceback.print_exc()
 
@@ -8805,25 +8530,20 @@ def create_interface():
                                     value="→ Sélectionner parmi les recettes"
                                 ),
                                 f"❌ Erreur lors du chargement",
+                                {},
+                                False,
                             ]
 
                     def show_stats():
                         """Affiche les statistiques RÉELLES"""
                         try:
-                            print("📊 Début show_stats")
-
-                            history = agent.get_history()
-                            global fallback_cache
+                            logger.debug("Début show_stats")
 
-                            if fallback_cache is None:
-                                fallback_cache = agent._get_absolute_fallback("", "", 1000)
-
-                            fallback_count = len(fallback_cache)
-
-                            lait_stats = {}
-                            for recipe in fallback_cache:
-                                lait = recipe.get('lait', 'mixte')
-                                lait_stats[lait] = lait_stats.get(lait, 0) + 1
+                            # Compteurs maintenus à chaque sauvegarde : aucune relecture des fichiers
+                            history_count = get_stats(agent.recipes_file).count()
+                            references = get_reference_stats(agent)
+                            fallback_count = references.count()
+                            lait_stats = references.by('lait')
 
                             stats_html = f"""
                             <div style="padding: 20px; background: #f8f9fa; border-radius: 10px;">
@@ -8831,7 +8551,7 @@ def create_interface():
                                 
                                 <div style="display: flex; gap: 20px; margin-bottom: 20px;">
                                     <div style="flex: 1; background: white; padding: 15px; border-radius: 8px; text-align: center;">
-                                        <div style="font-size: 32px; color: #4CAF50; font-weight: bold;">{len(history)}</div>
+                                        <div style="font-size: 32px; color: #4CAF50; font-weight: bold;">{history_count}</div>
                                         <div style="font-size: 12px; color: #666;">Vos créations</div>
                                     </div>
                                     <div style="flex: 1; background: white; padding: 15px; border-radius: 8px; text-align: center;">
@@ -8839,7 +8559,7 @@ def create_interface():
                                         <div style="font-size: 12px; color: #666;">Références</div>
                                     </div>
                                     <div style="flex: 1; background: white; padding: 15px; border-radius: 8px; text-align: center;">
-                                        <div style="font-size: 32px; color: #FF9800; font-weight: bold;">{len(history) + fallback_count}</div>
+                                        <div style="font-size: 32px; color: #FF9800; font-weight: bold;">{history_count + fallback_count}</div>
                                         <div style="font-size: 12px; color: #666;">Total</div>
                                     </div>
                                 </div>
@@ -8849,7 +8569,7 @@ def create_interface():
                             """
 
                             for lait, count in lait_stats.items():
-                                lait_name = lait if lait else 'mixte'
+                                lait_name = lait if lait != NON_SPECIFIE else 'mixte'
                                 emoji = {'vache': '🐄', 'chèvre': '🐐', 'brebis': '🐑', 'bufflonne': '🐃'}.get(lait, '🥛')
                                 stats_html += f"""
                                 <div style="padding: 10px; background: white; border-radius: 6px; text-align: center; min-width: 100px;">
@@ -8859,10 +8579,7 @@ def create_interface():
                                 </div>
                                 """
 
-                            source_stats = {}
-                            for recipe in fallback_cache:
-                                source = recipe.get('source', 'inconnue')
-                                source_stats[source] = source_stats.get(source, 0) + 1
+                            source_stats = references.by('source_type')
 
                             stats_html += """
                                 </div>
@@ -8879,9 +8596,69 @@ def create_interface():
                                 </div>
                                 """
 
+                            # Recettes dynamiques : lait, type de pâte, source, profil, 7 derniers jours
+                            dynamic = get_stats("unified_recipes_history.json").snapshot()
+                            stats_html += f"""
+                                </div>
+                                
+                                <h4 style="margin-bottom: 10px;">🎯 Recettes dynamiques ({dynamic['total']})</h4>
+                                <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(180px, 1fr)); gap: 10px;">
+                            """
+
+                            dimension_titles = [
+                                ('lait', '🥛 Lait'),
+                                ('type_pate', '🧀 Type de pâte'),
+                                ('source_type', '🌐 Source'),
+                                ('profile', '👤 Profil'),
+                            ]
+                            for dimension, dimension_title in dimension_titles:
+                                top = sorted(dynamic[dimension].items(), key=lambda x: x[1], reverse=True)[:5]
+                                stats_html += f"""
+                                <div style="background: white; padding: 10px; border-radius: 6px;">
+                                    <div style="font-weight: bold; margin-bottom: 5px;">{dimension_title}</div>
+                                """
+                                for value, count in top:
+                                    stats_html += f"""
+                                    <div style="display: flex; justify-content: space-between; font-size: 13px;">
+                                        <span>{value}</span><span style="font-weight: bold;">{count}</span>
+                                    </div>
+                                    """
+                                stats_html += "</div>"
+
+                            last_days = sorted(
+                                (item for item in dynamic['day'].items() if item[0] != NON_SPECIFIE), reverse=True
+                            )[:7]
+                            stats_html += """
+                                </div>
+                                <div style="margin-top: 10px; background: white; padding: 10px; border-radius: 6px; font-size: 13px;">
+                                    <strong>📅 7 derniers jours :</strong>
+                            """
+                            stats_html += " • ".join(f"{day} : {count}" for day, count in last_days) or "aucune recette"
+
+                            cache_stats = generation_cache.stats()
                             stats_html += f"""
                                 </div>
                                 
+                                <h4 style="margin-bottom: 10px;">♻️ Cache de génération</h4>
+                                <div style="display: flex; gap: 10px; flex-wrap: wrap;">
+                                    <div style="padding: 10px; background: white; border-radius: 6px; text-align: center; min-width: 100px;">
+                                        <div style="font-size: 20px; font-weight: bold; color: #4CAF50;">{cache_stats['hits']}</div>
+                                        <div style="font-size: 12px; color: #666;">Hits</div>
+                                    </div>
+                                    <div style="padding: 10px; background: white; border-radius: 6px; text-align: center; min-width: 100px;">
+                                        <div style="font-size: 20px; font-weight: bold; color: #F44336;">{cache_stats['misses']}</div>
+                                        <div style="font-size: 12px; color: #666;">Miss</div>
+                                    </div>
+                                    <div style="padding: 10px; background: white; border-radius: 6px; text-align: center; min-width: 100px;">
+                                        <div style="font-size: 20px; font-weight: bold;">{cache_stats['hit_ratio']:.0%}</div>
+                                        <div style="font-size: 12px; color: #666;">Taux de hit</div>
+                                    </div>
+                                    <div style="padding: 10px; background: white; border-radius: 6px; text-align: center; min-width: 100px;">
+                                        <div style="font-size: 20px; font-weight: bold;">{cache_stats['size']}/{cache_stats['max_size']}</div>
+                                        <div style="font-size: 12px; color: #666;">Entrées</div>
+                                    </div>
+                                </div>
+                                
                                 <div style="margin-top: 20px; padding: 15px; background: white; border-radius: 8px; text-align: center; border: 1px solid #e0e0e0;">
                                     <div style="font-size: 14px; color: #666;">Base de connaissances fromagère</div>
                                     <div style="font-size: 16px; font-weight: bold; color: #333; margin-top: 5px;">
@@ -8891,27 +8668,25 @@ def create_interface():
                             </div>
                             """
 
-                            print(f"✅ Stats: {fallback_count} recettes de référence")
+                            logger.info("Stats: %s recettes de référence", fallback_count)
                             return stats_html
 
                         except Exception as e:
-                            print(f"❌ Erreur show_stats: {e}")
+                            logger.warning("Erreur show_stats: %s", e)
                             return f"<div style='color: red; padding: 20px;'>❌ Erreur: {str(e)}</div>"
 
                     def show_fallback():
                         """Affiche TOUTES les recettes de référence"""
                         try:
-                            print("📖 Début show_fallback")
+                            logger.debug("Début show_fallback")
 
-                            global fallback_cache
-                            if fallback_cache is None:
-                                fallback_cache = agent._get_absolute_fallback("", "", 1000)
+                            references = get_reference_recipes(agent)
 
-                            real_count = len(fallback_cache)
-                            print(f"   📊 Affichage de {real_count} recettes")
+                            real_count = len(references)
+                            logger.debug("Affichage de %s recettes", real_count)
 
                             lait_groups = {}
-                            for recipe in fallback_cache:
+                            for recipe in references:
                                 lait = recipe.get('lait', 'mixte')
                                 if lait not in lait_groups:
                                     lait_groups[lait] = []
@@ -8972,26 +8747,24 @@ def create_interface():
                             </div>
                             """
 
-                            print(f"✅ Affiché: {real_count} recettes, {len(lait_groups)} types de lait")
+                            logger.info(
+                                "Affiché: %s recettes, %s types de lait",
+                                real_count, len(lait_groups),
+                            )
                             return html
 
                         except Exception as e:
-                            print(f"❌ Erreur show_fallback: {e}")
+                            logger.warning("Erreur show_fallback: %s", e)
                             return f"<div style='color: red; padding: 20px;'>❌ Erreur: {str(e)}</div>"
 
                     def clear_all():
-                        """Efface l'historique - VERSION CORRIGÉE"""
-                        global stats_visible, recipe_map
-                        
-                        stats_visible = False
-                        recipe_map = {}
-                        
+                        """Efface l'historique - VERSION CORRIGÉE (réinitialise l'état de la session)"""
                         try:
-                            print("🗑️ Début clear_all")
+                            logger.debug("Début clear_all")
                             result = agent.clear_history()
-                            print(f"✅ Historique effacé: {result}")
+                            logger.info("Historique effacé: %s", result)
                             
-                            # Retourner les bonnes valeurs pour les 3 outputs
+                            # Retourner les bonnes valeurs pour les 3 outputs + état de la session
                             return [
                                 "✅ Historique effacé !",  # history_summary
                                 gr.update(
@@ -8999,10 +8772,12 @@ def create_interface():
                                     value="→ Sélectionner parmi les recettes"
                                 ),  # recipe_dropdown
                                 "",  # recipe_display
+                                {},  # recipe_map_state
+                                False,  # stats_visible_state
                             ]
                             
                         except Exception as e:
-                            print(f"❌ Erreur clear_all: {e}")
+                            logger.warning("Erreur clear_all: %s", e)
                             return [
                                 f"❌ Erreur: {str(e)}",
                                 gr.update(
@@ -9010,9 +8785,11 @@ def create_interface():
                                     value="→ Sélectionner parmi les recettes"
                                 ),
                                 f"Erreur: {str(e)}",
+                                {},
+                                False,
                             ]
                             
-                    def on_recipe_select(selected):
+                    def on_recipe_select(selected, recipe_map):
                         """Quand une recette est sélectionnée - VERSION CORRIGÉE"""
                         
                         # Gestion du placeholder
@@ -9026,112 +8803,107 @@ def create_interface():
                             selected = selected[0]
                         
                         try:
-                            global recipe_map
                             recipe_id = None
                             
-                            # Méthode 1 : Via recipe_map (prioritaire)
-                            if selected in recipe_map:
+                            # Méthode 1 : Via recipe_map de la session (prioritaire)
+                            if recipe_map and selected in recipe_map:
                                 recipe_id = recipe_map[selected]
-                                print(f"✅ Trouvé via recipe_map: ID {recipe_id}")
+                                logger.debug("Trouvé via recipe_map: ID %s", recipe_id)
                             else:
                                 # Méthode 2 : Extraction depuis le texte "1. Nom (date)"
                                 import re
                                 match = re.match(r'^(\d+)\.', str(selected))
                                 if match:
                                     recipe_id = int(match.group(1))
-                                    print(f"✅ ID extrait: {recipe_id}")
+                                    logger.debug("ID extrait: %s", recipe_id)
                                 else:
                                     return f"❌ Format invalide: {selected}"
                             
-                            # Recherche dans l'historique
-                            history = agent.get_history()
+                            # Recherche par id (index rechargé seulement si le fichier change)
+                            history_index = get_history_index(agent.recipes_file)
                             
-                            # Normalisation de l'ID pour comparaison
-                            recipe_id_str = str(recipe_id)
+                            recipe_text = history_index.get_text(recipe_id)
+                            if recipe_text is not None:
+                                return recipe_text
                             
-                            for entry in history:
-                                entry_id = entry.get('id')
-                                entry_id_str = str(entry_id)
-                                
-                                # Comparaison flexible (int ou string)
-                                if entry_id_str == recipe_id_str:
-                                    # Recherche du contenu dans l'ordre de priorité
-                                    for key in ['recipe_complete', 'recipe', 'content', 'response']:
-                                        if key in entry and entry[key]:
-                                            print(f"✅ Contenu trouvé dans '{key}'")
-                                            return entry[key]
-                                    
-                                    # Si aucune clé trouvée
-                                    return f"⚠️ Recette #{recipe_id} sans contenu\n\nClés disponibles: {list(entry.keys())}"
+                            entry = history_index.get(recipe_id)
+                            if entry is not None:
+                                # Si aucune clé trouvée
+                                return f"⚠️ Recette #{recipe_id} sans contenu\n\nClés disponibles: {list(entry.keys())}"
                             
                             # Aucune correspondance
-                            return f"❌ Recette #{recipe_id} introuvable\n\nIDs disponibles: {[e.get('id') for e in history[:10]]}"
+                            return f"❌ Recette #{recipe_id} introuvable\n\nIDs disponibles: {history_index.ids()[:10]}"
                         
                         except Exception as e:
                             import traceback
                             error_details = traceback.format_exc()
-                            print(f"❌ ERREUR: {error_details}")
+                            logger.error("ERREUR: %s", error_details)
                             return f"❌ Erreur: {str(e)}"
                     # ===== CONNEXIONS HISTORIQUE =====
                     history_btn.click(
-                        fn=update_interface,
+                        fn=in_lane("ui", lane_busy(outputs=6, message_index=1))(update_interface),
                         inputs=[],
                         outputs=[
                             counter_card,
                             history_summary,
                             recipe_dropdown,
                             recipe_display,
+                            recipe_map_state,
+                            stats_visible_state,
                         ],
                         queue=False  # 🔥 IMPORTANT : Exécution immédiate
                     )
 
                     count_btn.click(
-                        fn=toggle_stats,
-                        inputs=[],
+                        fn=in_lane("ui", lane_busy(outputs=3))(toggle_stats),
+                        inputs=[stats_visible_state],
                         outputs=[
                             stats_display,
                             count_btn,
+                            stats_visible_state,
                         ],
                         queue=False
                     )
 
                     clear_btn.click(
-                        fn=clear_all,
+                        fn=in_lane("ui", lane_busy(outputs=5))(clear_all),
                         inputs=[],
                         outputs=[
                             history_summary,
                             recipe_dropdown,
                             recipe_display,
+                            recipe_map_state,
+                            stats_visible_state,
                         ],
                         queue=False
                     )
 
                     show_fallback_btn.click(
-                        fn=show_fallback,
+                        fn=in_lane("ui", lane_busy())(show_fallback),
                         inputs=[],
                         outputs=[stats_display],
                         queue=False
                     )
 
                     recipe_dropdown.change(
-                        fn=on_recipe_select,
-                        inputs=[recipe_dropdown],
+                        fn=in_lane("ui", lane_busy())(on_recipe_select),
+                        inputs=[recipe_dropdown, recipe_map_state],
                         outputs=[recipe_display],
                         queue=False
                     )
 
                     # ===== INITIALISATION =====
                     def init_on_load():
-                        """Initialise l'interface au chargement"""
-                        global stats_visible
-                        stats_visible = False
-                        print("⚡ Initialisation Historique")
+                        """Initialise l'interface au chargement (état neuf pour chaque session)"""
+                        logger.debug("Initialisation Historique")
                         result = update_interface()
                         return [
                             "",
                             "",
                             "→ Sélectionner parmi les recettes",
-                            ""
+                            "",
+                            {},
+                            False,
                         ]
 
                     demo.load(
@@ -9142,6 +8914,8 @@ def create_interface():
                             history_summary,
                             recipe_dropdown,
                             recipe_display,
+                            recipe_map_state,
+                            stats_visible_state,
                         ],
                         queue=False
                     )
@@ -9157,7 +8931,11 @@ def create_interface():
                         placeholder="Cliquez pour charger...",
                     )
 
-                    knowledge_btn.click(fn=agent.get_knowledge_summary, outputs=knowledge_output)
+                    knowledge_btn.click(
+                        fn=in_lane("ui", lane_busy())(agent.get_knowledge_summary),
+                        outputs=knowledge_output,
+                        **event_options("ui")
+                    )
 
                 # ONGLET 8 : Maintenance
                 with gr.Tab("⚙️ Maintenance"):
@@ -9173,7 +8951,7 @@ def create_interface():
 
             # ===== BOUTON GÉNÉRATION PRINCIPALE =====
             generate_all_btn.click(
-                fn=generate_all,
+                fn=in_lane("generate", lane_busy(outputs=7))(generate_all),
                 inputs=[
                     ingredients_input,
                     cheese_type_input,
@@ -9183,6 +8961,7 @@ def create_interface():
                     affinage_slider,
                     spice_choice,
                     profile_selector,
+                    reuse_variant_checkbox,
                 ],
                 outputs=[
                     recipe_output,
@@ -9191,7 +8970,9 @@ def create_interface():
                     history_summary,
                     recipe_dropdown,
                     recipe_display,
+                    recipe_map_state,
                 ],
+                **event_options("generate")
             )
 
             # ===== BOUTON DÉCONNEXION =====
@@ -10057,7 +9838,16 @@ if __name__ == "__main__":
     # Créer et lancer l'interface qui retourne demo
     interface = create_interface()
     if interface:
+        # Compaction périodique des fichiers de recettes (hors du chemin de lecture)
+        history_compactor.start()
+        kb_compactor.start()
+        # L'état par utilisateur vit dans des gr.State : plusieurs événements en parallèle.
+        # Les voies (fromage_lanes) bornent chaque classe d'événements ; le pool de
+        # threads doit pouvoir les contenir toutes en même temps.
+        interface.queue(default_concurrency_limit=int(os.getenv("GRADIO_CONCURRENCY_LIMIT", "16")))
         interface.launch(
+        prevent_thread_lock=True,  # Monter /metrics avant de bloquer
+        max_threads=lane_max_threads(),
         share=False,
         server_name="0.0.0.0",
         server_port=7860,
@@ -10071,5 +9861,11 @@ if __name__ == "__main__":
         <meta property="og:type" content="website">
         """
         )
+        # Métriques Prometheus à côté de l'interface (même port), sinon port dédié
+        if mount_metrics(interface.app):
+            print("📈 Métriques exposées sur http://0.0.0.0:7860/metrics")
+        else:
+            start_metrics_server(int(os.getenv("METRICS_PORT", "9464")))
+        interface.block_thread()
     else:
         print("❌ Erreur: create_interface() a retourné None")
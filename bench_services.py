@@ -0,0 +1,411 @@
+"""
+SERVICES SIMULÉS - Doublures locales des API externes pour les benchmarks
+==========================================================================
+
+Un serveur HTTP local (ThreadingHTTPServer) répond à la place de :
+- SerpAPI (serpapi.com/search, JSON organic_results),
+- Ecosia et DuckDuckGo HTML / API instantanée,
+- pages de recettes (tout autre domaine : marmiton, 750g...),
+- OpenRouter (/api/v1/chat/completions) et Ollama (/api/tags, /api/chat
+  en JSON ou en flux NDJSON, /api/generate),
+- KIE (createTask, recordInfo, puis téléchargement de l'image).
+
+`redirect_requests(services)` détourne toutes les requêtes `requests` et
+`httpx` du processus vers ce serveur : https://serpapi.com/search?q=... devient
+http://127.0.0.1:<port>/serpapi.com/search?q=... ; le code de l'application
+tourne donc sans modification ni accès réseau.
+
+Chaque service a un profil (latence, gigue, taux et type d'erreur) :
+    error_status = 0 -> connexion fermée sans réponse (ConnectionError côté client)
+"""
+
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Dict, Iterable, Optional
+from urllib.parse import parse_qs, quote, urlsplit
+
+
+# Domaine -> nom du service simulé (le reste = pages de recettes)
+HOST_SERVICES = {
+    "serpapi.com": "serpapi",
+    "www.ecosia.org": "ecosia",
+    "html.duckduckgo.com": "ddg",
+    "api.duckduckgo.com": "ddg",
+    "duckduckgo.com": "ddg",
+    "openrouter.ai": "openrouter",
+    "localhost:11434": "ollama",
+    "api.kie.ai": "kie",
+    "kie.images": "kie",
+}
+
+SERVICES = ("serpapi", "ecosia", "ddg", "pages", "openrouter", "ollama", "kie")
+
+# Domaines des pages de recettes renvoyées par les moteurs simulés
+RECIPE_DOMAINS = (
+    "www.marmiton.org", "www.750g.com", "cuisine.journaldesfemmes.fr",
+    "www.cuisineaz.com", "chefsimon.com", "www.ptitchef.com",
+)
+
+
+class ServiceProfile:
+    """Latence et erreurs injectées pour un service"""
+
+    def __init__(
+        self,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def delay(self) -> float:
+        jitter = random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def to_dict(self) -> Dict:
+        return dict(vars(self))
+
+
+# ===== CONTENUS SIMULÉS =====
+
+def _results(query: str, count: int):
+    """Résultats de recherche déterministes pour une requête"""
+    rng = random.Random(query)
+    results = []
+    for i in range(count):
+        domain = rng.choice(RECIPE_DOMAINS)
+        slug = f"fromage-maison-{rng.randrange(100000)}"
+        results.append({
+            "title": f"Recette fromage maison n°{i + 1} - {query[:40]}",
+            "url": f"https://{domain}/recettes/{slug}",
+            "snippet": "Une recette de fromage facile : lait, présure, sel, égouttage et affinage.",
+        })
+    return results
+
+
+def _recipe_page(path: str) -> str:
+    title = path.rstrip("/").rsplit("/", 1)[-1].replace("-", " ").capitalize() or "Recette fromage"
+    return f"""<html><head><title>{title}</title>
+<meta name="description" content="Recette de fromage maison au lait de vache, simple et rapide.">
+</head><body><h1>{title}</h1>
+<p>Un fromage frais maison, prêt en 24 heures.</p>
+<h2>Ingrédients</h2><ul><li>2 L de lait entier</li><li>2 ml de présure</li><li>10 g de sel</li></ul>
+<h2>Préparation</h2><ol><li>Chauffer le lait à 32°C.</li><li>Ajouter la présure et laisser cailler 1 h.</li>
+<li>Trancher le caillé et égoutter 12 h.</li><li>Saler et mouler.</li></ol>
+</body></html>"""
+
+
+_RECIPE_JSON = {
+    "title": "Fromage frais maison",
+    "description": "Fromage frais au lait de vache",
+    "lait": "vache",
+    "type_pate": "Fromage frais",
+    "ingredients": ["2 L lait entier", "2 ml présure", "10 g sel"],
+    "etapes": ["Chauffer le lait à 32°C", "Emprésurer et cailler 1 h", "Égoutter 12 h", "Saler et mouler"],
+    "duree_totale": "24 h",
+    "difficulte": "Facile",
+}
+
+_RECIPE_TEXT = (
+    "🧀 FROMAGE FRAIS MAISON\n\n"
+    "INGRÉDIENTS :\n- 2 L de lait entier\n- 2 ml de présure\n- 10 g de sel\n\n"
+    "ÉTAPES :\n1. Chauffer le lait à 32°C\n2. Ajouter la présure, cailler 1 h\n"
+    "3. Trancher le caillé, égoutter 12 h\n4. Saler et mouler\n"
+)
+
+
+def _llm_answer(prompt: str) -> str:
+    """JSON si le prompt en demande, texte de recette sinon"""
+    if "JSON" in prompt or "json" in prompt:
+        return json.dumps(_RECIPE_JSON, ensure_ascii=False)
+    return _RECIPE_TEXT
+
+
+_PNG_CACHE = []
+
+
+def _png_bytes() -> bytes:
+    if not _PNG_CACHE:
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new("RGB", (64, 64), (240, 220, 160)).save(buffer, format="PNG")
+        _PNG_CACHE.append(buffer.getvalue())
+    return _PNG_CACHE[0]
+
+
+# ===== SERVEUR =====
+
+class StandInServices:
+    """Serveur local unique pour tous les services simulés"""
+
+    def __init__(self, profiles: Optional[Dict[str, ServiceProfile]] = None, kie_pending_polls: int = 0):
+        self.profiles = {name: ServiceProfile() for name in SERVICES}
+        self.profiles.update(profiles or {})
+        self.kie_pending_polls = kie_pending_polls
+
+        self._tasks: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.requests_count: Dict[str, int] = {name: 0 for name in SERVICES}
+        self.errors_count: Dict[str, int] = {name: 0 for name in SERVICES}
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> "StandInServices":
+        services = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                services._handle(self, "GET")
+
+            def do_POST(self):
+                services._handle(self, "POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="stand-in-services", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"requests": dict(self.requests_count), "errors": dict(self.errors_count)}
+
+    # ===== ROUTAGE =====
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str):
+        _, _, rest = handler.path.partition("/")
+        netloc, _, remainder = rest.partition("/")
+        split = urlsplit("/" + remainder)
+        path, query = split.path, parse_qs(split.query)
+
+        body = {}
+        length = int(handler.headers.get("Content-Length") or 0)
+        if length:
+            raw = handler.rfile.read(length)
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                body = {}
+
+        service = HOST_SERVICES.get(netloc, "pages")
+        profile = self.profiles[service]
+        with self._lock:
+            self.requests_count[service] += 1
+
+        time.sleep(profile.delay())
+        if profile.error_rate and random.random() < profile.error_rate:
+            with self._lock:
+                self.errors_count[service] += 1
+            if profile.error_status == 0:
+                handler.close_connection = True
+                return
+            self._send(handler, profile.error_status, {"error": "injected"})
+            return
+
+        route = getattr(self, f"_route_{service}")
+        status, payload, content_type = route(netloc, path, query, body)
+        self._send(handler, status, payload, content_type)
+
+    @staticmethod
+    def _send(handler, status: int, payload, content_type: str = "application/json"):
+        if isinstance(payload, bytes):
+            data = payload
+        elif isinstance(payload, str):
+            data = payload.encode("utf-8")
+        else:
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _route_serpapi(self, netloc, path, query, body):
+        q = query.get("q", [""])[0]
+        num = int(query.get("num", ["10"])[0])
+        organic = [{"title": r["title"], "link": r["url"], "snippet": r["snippet"]} for r in _results(q, num)]
+        return 200, {"organic_results": organic}, "application/json"
+
+    def _route_ecosia(self, netloc, path, query, body):
+        q = query.get("q", [""])[0]
+        links = "".join(
+            f'<div class="result"><a class="result-title js-result-title" href="{r["url"]}">{r["title"]}</a></div>'
+            for r in _results(q, 10)
+        )
+        return 200, f"<html><body>{links}</body></html>", "text/html; charset=utf-8"
+
+    def _route_ddg(self, netloc, path, query, body):
+        q = query.get("q", [""])[0]
+        if netloc == "api.duckduckgo.com":
+            topics = [{"Text": r["title"], "FirstURL": r["url"]} for r in _results(q, 6)]
+            return 200, {"RelatedTopics": topics}, "application/json"
+        blocks = "".join(
+            f'<div class="result"><a class="result__a" href="{r["url"]}">{r["title"]}</a>'
+            f'<a class="result__url" href="//duckduckgo.com/l/?uddg={quote(r["url"], safe="")}">{r["url"]}</a>'
+            f'<a class="result__snippet">{r["snippet"]}</a></div>'
+            for r in _results(q, 20)
+        )
+        return 200, f"<html><body>{blocks}</body></html>", "text/html; charset=utf-8"
+
+    def _route_pages(self, netloc, path, query, body):
+        return 200, _recipe_page(path), "text/html; charset=utf-8"
+
+    def _route_openrouter(self, netloc, path, query, body):
+        messages = body.get("messages") or [{"content": ""}]
+        content = _llm_answer(str(messages[-1].get("content", "")))
+        return 200, {
+            "id": uuid.uuid4().hex,
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        }, "application/json"
+
+    def _route_ollama(self, netloc, path, query, body):
+        if path.startswith("/api/tags"):
+            return 200, {"models": [{"name": body.get("model", "qwen2.5:7b")}]}, "application/json"
+        if path.startswith("/api/chat"):
+            messages = body.get("messages")
+            if not messages:
+                # Messages vides : simple chargement du modèle (préchargement)
+                done = {"model": body.get("model"), "message": {"role": "assistant", "content": ""},
+                        "done_reason": "load", "done": True}
+                return 200, done, "application/json"
+            content = _llm_answer(str(messages[-1].get("content", "")))
+            if body.get("stream"):
+                # NDJSON : un fragment par mot, puis la ligne finale done=true
+                words = content.split(" ")
+                lines = [
+                    json.dumps({"message": {"role": "assistant", "content": word + " "}, "done": False}, ensure_ascii=False)
+                    for word in words[:-1]
+                ]
+                lines.append(json.dumps({"message": {"role": "assistant", "content": words[-1]}, "done": False}, ensure_ascii=False))
+                lines.append(json.dumps({"message": {"role": "assistant", "content": ""}, "done": True}))
+                return 200, "\n".join(lines) + "\n", "application/x-ndjson"
+            return 200, {"message": {"role": "assistant", "content": content}, "done": True}, "application/json"
+        return 200, {"response": _llm_answer(str(body.get("prompt", ""))), "done": True}, "application/json"
+
+    def _route_kie(self, netloc, path, query, body):
+        if netloc == "kie.images":
+            return 200, _png_bytes(), "image/png"
+        if path.endswith("/createTask"):
+            task_id = uuid.uuid4().hex
+            with self._lock:
+                self._tasks[task_id] = 0
+            return 200, {"code": 200, "data": {"taskId": task_id}}, "application/json"
+        if path.endswith("/recordInfo"):
+            task_id = query.get("taskId", [""])[0]
+            with self._lock:
+                if task_id not in self._tasks:
+                    return 200, {"code": 404, "msg": "task not found"}, "application/json"
+                self._tasks[task_id] += 1
+                polls = self._tasks[task_id]
+            if polls <= self.kie_pending_polls:
+                return 200, {"code": 200, "data": {"taskId": task_id, "state": "generating"}}, "application/json"
+            result = json.dumps({"resultUrls": [f"https://kie.images/{task_id}.png"]})
+            return 200, {"code": 200, "data": {"taskId": task_id, "state": "success", "resultJson": result}}, "application/json"
+        return 404, {"code": 404}, "application/json"
+
+
+# ===== DÉTOURNEMENT DE `requests` ET `httpx` =====
+
+def redirect_requests(services: StandInServices, passthrough: Iterable[str] = ()):
+    """
+    Envoie toutes les requêtes HTTP du processus vers les services simulés
+    (`requests` et clients `httpx`, synchrones ou asynchrones)
+
+    Args:
+        passthrough: hôtes (host:port) joints directement, ex: l'app Gradio testée
+
+    Returns:
+        La fonction d'annulation
+    """
+    import httpx
+    import requests
+
+    base = services.base_url
+    direct = {urlsplit(base).netloc, *passthrough}
+    original = requests.sessions.Session.request
+    original_send = httpx.Client.send
+    original_send_async = httpx.AsyncClient.send
+
+    def redirected(url: str) -> str:
+        split = urlsplit(url)
+        if split.netloc and split.netloc not in direct:
+            url = f"{base}/{split.netloc}{split.path or '/'}"
+            if split.query:
+                url += f"?{split.query}"
+        return url
+
+    def request(self, method, url, *args, **kwargs):
+        return original(self, method, redirected(url), *args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        request.url = httpx.URL(redirected(str(request.url)))
+        return original_send(self, request, *args, **kwargs)
+
+    async def send_async(self, request, *args, **kwargs):
+        request.url = httpx.URL(redirected(str(request.url)))
+        return await original_send_async(self, request, *args, **kwargs)
+
+    requests.sessions.Session.request = request
+    httpx.Client.send = send
+    httpx.AsyncClient.send = send_async
+
+    def restore():
+        requests.sessions.Session.request = original
+        httpx.Client.send = original_send
+        httpx.AsyncClient.send = original_send_async
+
+    return restore
+
+
+def parse_profiles(latency: str = "", errors: str = "", jitter_ratio: float = 0.2) -> Dict[str, ServiceProfile]:
+    """
+    Profils depuis la ligne de commande
+
+    Args:
+        latency: "serpapi=80,openrouter=400" (ms ; "*" = tous les services)
+        errors: "openrouter=0.2:402,ddg=0.1:0" (taux[:statut])
+    """
+    profiles = {name: ServiceProfile() for name in SERVICES}
+
+    def _items(spec):
+        for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+            name, _, value = item.partition("=")
+            targets = SERVICES if name == "*" else (name,)
+            for target in targets:
+                if target not in profiles:
+                    raise ValueError(f"Service inconnu: {target} (services: {', '.join(SERVICES)})")
+                yield profiles[target], value
+
+    for profile, value in _items(latency):
+        profile.latency_ms = float(value)
+        profile.jitter_ms = profile.latency_ms * jitter_ratio
+    for profile, value in _items(errors):
+        rate, _, status = value.partition(":")
+        profile.error_rate = float(rate)
+        if status:
+            profile.error_status = int(status)
+    return profiles
@@ -0,0 +1,270 @@
+"""
+BENCHMARK DE BOUT EN BOUT - generate_all, recherche, générateur, chat
+======================================================================
+
+Mesure les chemins complets de l'application contre les services simulés de
+bench_services (SerpAPI, Ecosia/DDG, pages de recettes, OpenRouter/Ollama,
+KIE), avec latence et erreurs injectables, à une concurrence donnée.
+
+Le benchmark tourne dans un répertoire de travail temporaire (les fichiers
+d'historique ne touchent pas ceux du projet) et écrit un rapport JSON :
+percentiles de latence, débit et taux d'erreur par cible, pour comparer
+deux exécutions.
+
+Usage :
+    python benchmark_e2e.py --targets generate_all,search,generator,chat \\
+        --iterations 20 --concurrency 4 \\
+        --latency "*=20,openrouter=300" --errors "openrouter=0.1:402" \\
+        --output bench_e2e.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from bench_services import StandInServices, parse_profiles, redirect_requests
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Clés factices : activent les chemins SerpAPI / OpenRouter / KIE vers les doublures
+BENCH_ENV = {
+    "SERPAPI_KEY": "bench-serpapi",
+    "OPENROUTER_API_KEY": "bench-openrouter-key",
+    "KIE_API_KEY": "bench-kie-key",
+}
+# Fournisseurs sans doublure : désactivés pour ne jamais sortir du poste
+DISABLED_ENV = (
+    "HF_TOKEN", "GOOGLE_AI_API_KEY", "TOGETHER_API_KEY", "DEEPSEEK_API_KEY",
+    "GOOGLE_API_KEY", "GOOGLE_CSE_ID",
+)
+
+INGREDIENT_SETS = (
+    "lait de vache, présure, sel",
+    "lait de chèvre, présure, sel, herbes",
+    "lait de brebis, ferments, sel",
+    "lait entier, citron, sel",
+    "lait de vache, ferments lactiques, présure, poivre",
+)
+CHEESE_TYPES = ("Fromage frais", "Pâte molle", "Pâte pressée non cuite")
+
+DEFAULT_TARGETS = ("generate_all", "search", "generator", "chat")
+
+
+# ===== STATISTIQUES =====
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentile par interpolation linéaire sur une liste triée"""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(durations: List[float], errors: int, wall_time: float) -> Dict:
+    """Latences (ms), débit et erreurs d'une série d'appels"""
+    values = sorted(d * 1000 for d in durations)
+    calls = len(values)
+    return {
+        "calls": calls,
+        "errors": errors,
+        "error_rate": round(errors / calls, 4) if calls else 0.0,
+        "throughput_rps": round((calls - errors) / wall_time, 3) if wall_time > 0 else 0.0,
+        "wall_time_s": round(wall_time, 3),
+        "latency_ms": {
+            "min": round(values[0], 2) if values else 0.0,
+            "mean": round(sum(values) / calls, 2) if calls else 0.0,
+            "p50": round(percentile(values, 50), 2),
+            "p90": round(percentile(values, 90), 2),
+            "p95": round(percentile(values, 95), 2),
+            "p99": round(percentile(values, 99), 2),
+            "max": round(values[-1], 2) if values else 0.0,
+        },
+    }
+
+
+# ===== EXÉCUTION =====
+
+def run_target(call: Callable[[int], object], iterations: int, concurrency: int, warmup: int = 0) -> Dict:
+    """Exécute `call(i)` iterations fois sur `concurrency` threads et résume"""
+    for i in range(warmup):
+        try:
+            call(-1 - i)
+        except Exception:
+            pass
+
+    def timed_call(i):
+        start = time.perf_counter()
+        try:
+            call(i)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        outcomes = list(pool.map(timed_call, range(iterations)))
+    wall_time = time.perf_counter() - start
+
+    durations = [d for d, _ in outcomes]
+    failures = [err for _, err in outcomes if err]
+    summary = summarize(durations, len(failures), wall_time)
+    summary["concurrency"] = concurrency
+    if failures:
+        summary["sample_errors"] = sorted(set(failures))[:5]
+    return summary
+
+
+def build_targets(app_module, generator_module, creativity: int) -> Dict[str, Callable[[int], object]]:
+    """Appels mesurés ; les entrées varient avec l'indice pour ne pas mesurer que des hits de cache"""
+    agent = app_module.agent
+
+    def inputs(i):
+        rng = random.Random(i)
+        return rng.choice(INGREDIENT_SETS), rng.choice(CHEESE_TYPES)
+
+    def generate_all(i):
+        ingredients, cheese_type = inputs(i)
+        return app_module.generate_all(
+            ingredients, cheese_type, "", creativity, "Équilibré", 4, "Neutre", "🧀 Amateur",
+        )
+
+    def search(i):
+        ingredients, cheese_type = inputs(i)
+        return agent.search_web_recipes(ingredients, cheese_type, max_results=6)
+
+    def generator(i):
+        ingredients, cheese_type = inputs(i)
+        gen = generator_module.UnifiedRecipeGeneratorV2(agent=agent)
+        return gen.generate_recipe(
+            [ing.strip() for ing in ingredients.split(",")], cheese_type, creativity=max(1, creativity),
+        )
+
+    def chat(i):
+        ingredients, _ = inputs(i)
+        return agent.chat_with_llm(f"Comment réussir un fromage avec {ingredients} ? (#{i})")
+
+    def image(i):
+        return agent.generate_cheese_image_kie(f"Fromage artisanal #{i}", "photo réaliste")
+
+    return {
+        "generate_all": generate_all,
+        "search": search,
+        "generator": generator,
+        "chat": chat,
+        "image": image,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def load_app(workdir: str):
+    """Importe app et le générateur dans le répertoire de travail du benchmark"""
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    for key in DISABLED_ENV:
+        os.environ.pop(key, None)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    os.chdir(workdir)
+
+    import app as app_module
+    import unified_recipe_generator_v2_with_batch as generator_module
+    return app_module, generator_module
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de bout en bout avec services simulés")
+    parser.add_argument("--targets", default=",".join(DEFAULT_TARGETS),
+                        help="Cibles : generate_all,search,generator,chat,image")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--creativity", type=int, default=1)
+    parser.add_argument("--latency", default="", help='Latences en ms, ex: "*=20,openrouter=300"')
+    parser.add_argument("--jitter", type=float, default=0.2, help="Gigue relative à la latence (0.2 = ±20%%)")
+    parser.add_argument("--errors", default="", help='Erreurs injectées, ex: "openrouter=0.1:402,ddg=0.05:0"')
+    parser.add_argument("--kie-pending-polls", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="Répertoire de travail (défaut: temporaire)")
+    parser.add_argument("--output", default="bench_e2e.json")
+    parser.add_argument("--verbose", action="store_true", help="Garder les sorties de l'application")
+    args = parser.parse_args(argv)
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    profiles = parse_profiles(args.latency, args.errors, args.jitter)
+    output = os.path.abspath(args.output)
+
+    services = StandInServices(profiles, kie_pending_polls=args.kie_pending_polls).start()
+    restore = redirect_requests(services)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="fromager-bench-")
+    print(f"🧪 Services simulés sur {services.base_url} — répertoire {workdir}")
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    results = {}
+    try:
+        with quiet:
+            app_module, generator_module = load_app(workdir)
+            calls = build_targets(app_module, generator_module, args.creativity)
+        for target in targets:
+            if target not in calls:
+                print(f"⚠️ Cible inconnue ignorée: {target}")
+                continue
+            print(f"⏱️ {target} : {args.iterations} appels, concurrence {args.concurrency}...")
+            with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO()):
+                results[target] = run_target(calls[target], args.iterations, args.concurrency, args.warmup)
+            latency = results[target]["latency_ms"]
+            print(
+                f"   p50 {latency['p50']:.0f} ms • p95 {latency['p95']:.0f} ms • "
+                f"{results[target]['throughput_rps']} req/s • erreurs {results[target]['errors']}"
+            )
+    finally:
+        restore()
+        services.stop()
+
+    report = {
+        "kind": "e2e",
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                "iterations": args.iterations,
+                "concurrency": args.concurrency,
+                "warmup": args.warmup,
+                "creativity": args.creativity,
+                "kie_pending_polls": args.kie_pending_polls,
+            },
+            "profiles": {name: profile.to_dict() for name, profile in profiles.items()},
+        },
+        "results": results,
+        "services": services.stats(),
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"📄 Rapport écrit: {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""
+MICRO-BENCHMARKS - Fonctions CPU des chemins chauds, avec références stockées
+==============================================================================
+
+Chronomètre (stdlib timeit, meilleur de N répétitions) les fonctions pures :
+_extract_lait_from_text, _clean_web_results, _normalize_url,
+_deduplicate_recipes, _extract_cheese_name, _extract_steps_from_recipe,
+RecipeFormatter.format_to_text, _generate_from_static_knowledge, ainsi que
+view_dynamic_recipes et clean_all_duplicates sur des magasins synthétiques
+de 1k / 10k / 100k recettes.
+
+Pour les familles dimensionnées, l'exposant de croissance entre deux tailles
+(log(t2/t1) / log(n2/n1)) est calculé : ~1 = linéaire, ~2 = quadratique.
+
+Commandes :
+    python benchmark_micro.py run [--save main] [--sizes 1000,10000,100000]
+    python benchmark_micro.py compare main [--threshold 0.25]
+    python benchmark_micro.py list
+
+Les références sont écrites dans bench_baselines/micro_<nom>.json ; `compare`
+relance la suite et sort en erreur (code 1) si une fonction ralentit au-delà
+du seuil ou si un exposant de croissance dépasse --max-exponent.
+
+La référence `main` fournie a été mesurée sur la machine notée dans
+meta.machine ; sur une machine différente, enregistrer d'abord sa propre
+référence (`run --save <nom>`) avant de comparer.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from bench_services import StandInServices, redirect_requests
+from benchmark_e2e import REPO_DIR, _git_commit, load_app
+
+
+BASELINE_DIR = os.path.join(REPO_DIR, "bench_baselines")
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+LAITS = ("vache", "chèvre", "brebis", "bufflonne", None)
+TYPES_PATE = ("Fromage frais", "Pâte molle", "Pâte pressée non cuite", "Pâte persillée", None)
+DOMAINS = ("www.marmiton.org", "www.750g.com", "cuisine.journaldesfemmes.fr", "chefsimon.com")
+
+
+# ===== DONNÉES SYNTHÉTIQUES =====
+
+def synthetic_recipes(count: int, duplicate_ratio: float = 0.0, seed: int = 42) -> List[Dict]:
+    """Recettes au format de unified_recipes_history.json (avec doublons optionnels)"""
+    rng = random.Random(seed)
+    recipes = []
+    for i in range(count):
+        if recipes and rng.random() < duplicate_ratio:
+            recipes.append(dict(rng.choice(recipes)))
+            continue
+        lait = rng.choice(LAITS)
+        recipes.append({
+            "title": f"🧀 Fromage maison {i} au lait de {lait or 'mélange'}",
+            "description": "Fromage artisanal, caillé lactique, égouttage lent.",
+            "lait": lait,
+            "type_pate": rng.choice(TYPES_PATE),
+            "ingredients": ["2 L lait", "2 ml présure", "10 g sel"],
+            "etapes": ["Chauffer", "Emprésurer", "Égoutter", "Saler"],
+            "source_type": rng.choice(("scraped", "llm", "static")),
+            "profile": "🧀 Amateur",
+            "score": rng.randint(5, 10),
+            "generated_at": datetime(2026, 1 + i % 12, 1 + i % 28, i % 24, i % 60).isoformat(),
+        })
+    return recipes
+
+
+def synthetic_web_results(count: int = 200, seed: int = 7) -> List[Dict]:
+    """Résultats web bruts : URLs avec paramètres de tracking, doublons et hors-sujet"""
+    rng = random.Random(seed)
+    results = []
+    for i in range(count):
+        slug = rng.randrange(count // 2)  # ~50 % de doublons d'URL
+        tracking = rng.choice(("", "?utm_source=ddg&utm_medium=web", "?ref=home#top", "?id=3&campaign=x"))
+        title = rng.choice((
+            f"Recette fromage de chèvre maison {slug}",
+            f"Faire son fromage frais au lait de vache {slug}",
+            f"Robot cuiseur : pâte à pizza {slug}",
+            f"Mozzarella maison facile {slug}",
+        ))
+        results.append({
+            "title": title,
+            "url": f"https://{rng.choice(DOMAINS)}/recettes/fromage-{slug}{tracking}",
+            "description": "Lait de chèvre, présure, sel : caillage, moulage et affinage.",
+            "score": rng.randint(5, 9),
+        })
+    return results
+
+
+def synthetic_recipe_text(steps: int = 25) -> str:
+    """Texte de recette au format de l'agent (cadre ║ et titre en ligne 2)"""
+    lines = [
+        "╔══════════════════════════════════════════════╗",
+        "║                                              ║",
+        "║ 📋 Tomme des Prés Fleuris (#4821)            ║",
+        "╚══════════════════════════════════════════════╝",
+        "",
+        "🥛 INGRÉDIENTS",
+        "- 4 L de lait cru de vache",
+        "- 1 ml de présure",
+        "• 20 g de sel",
+        "",
+        "📝 ÉTAPES",
+    ]
+    lines.extend(f"{i}. Étape {i} : maintenir 32°C et brasser doucement le caillé." for i in range(1, steps + 1))
+    lines.extend(["", "💡 Conseil : affiner 6 semaines à 12°C, 90 % d'humidité."])
+    return "\n".join(lines)
+
+
+# ===== CAS =====
+
+class Case:
+    """
+    Fonction chronométrée
+
+    `setup` (non chronométré) est appelé une fois avant la mesure ;
+    `prepare` (non chronométré) avant chaque exécution, qui est alors unique.
+    """
+
+    def __init__(self, name: str, func: Callable[[], object], size: Optional[int] = None,
+                 family: Optional[str] = None, setup: Optional[Callable[[], None]] = None,
+                 prepare: Optional[Callable[[], None]] = None):
+        self.name = name
+        self.func = func
+        self.size = size
+        self.family = family
+        self.setup = setup
+        self.prepare = prepare
+
+
+def build_cases(app_module, generator_module, sizes) -> List[Case]:
+    agent = app_module.agent
+    generator = generator_module.UnifiedRecipeGeneratorV2(agent=agent)
+
+    web_results = synthetic_web_results()
+    urls = [r["url"] for r in web_results[:100]]
+    recipe_text = synthetic_recipe_text()
+    lait_texts = [f"{r['title']} {r['description']}" for r in web_results[:50]]
+    static_args = (["lait de chèvre", "présure", "sel"], "Fromage frais", "chèvre", "🧀 Amateur", "")
+    with contextlib.redirect_stdout(io.StringIO()):
+        static_recipe = generator._generate_from_static_knowledge(*static_args)
+
+    cases = [
+        Case("_extract_lait_from_text x50", lambda: [agent._extract_lait_from_text(t) for t in lait_texts]),
+        Case("_clean_web_results (200)", lambda: agent._clean_web_results(
+            [dict(r) for r in web_results], "lait de chèvre, présure, sel")),
+        Case("_normalize_url x100", lambda: [agent._normalize_url(u) for u in urls]),
+        Case("_deduplicate_recipes (200)", lambda: agent._deduplicate_recipes(list(web_results))),
+        Case("_extract_cheese_name", lambda: agent._extract_cheese_name(recipe_text)),
+        Case("_extract_steps_from_recipe", lambda: agent._extract_steps_from_recipe(recipe_text)),
+        Case("RecipeFormatter.format_to_text",
+             lambda: generator_module.RecipeFormatter.format_to_text(dict(static_recipe))),
+        Case("_generate_from_static_knowledge", lambda: generator._generate_from_static_knowledge(*static_args)),
+    ]
+
+    history_file = "unified_recipes_history.json"
+
+    def write_store(records):
+        with open(history_file, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False)
+
+    for size in sizes:
+        store = synthetic_recipes(size)
+        with_duplicates = synthetic_recipes(size, duplicate_ratio=0.2)
+
+        def warm_store(records=store):
+            # Magasin écrit puis index chargé : on ne mesure que le rendu de la page
+            write_store(records)
+            app_module.view_dynamic_recipes()
+
+        # Vue chaude (index déjà chargé) puis rechargement après écriture du fichier
+        cases.append(Case(f"view_dynamic_recipes[{size}]", app_module.view_dynamic_recipes,
+                          size=size, family="view_dynamic_recipes", setup=warm_store))
+        cases.append(Case(f"view_dynamic_recipes_reload[{size}]", app_module.view_dynamic_recipes,
+                          size=size, family="view_dynamic_recipes_reload",
+                          prepare=lambda records=store: write_store(records)))
+        cases.append(Case(f"clean_all_duplicates[{size}]", agent.clean_all_duplicates,
+                          size=size, family="clean_all_duplicates",
+                          prepare=lambda records=with_duplicates: write_store(records)))
+    return cases
+
+
+# ===== MESURE =====
+
+def measure(case: Case, repeat: int, min_time: float) -> Dict:
+    """Meilleur temps et médiane par appel (secondes)"""
+    if case.setup is not None:
+        case.setup()
+    if case.prepare is None:
+        timer = timeit.Timer(case.func)
+        loops, _ = timer.autorange()
+        loops = max(loops, int(math.ceil(loops * min_time / 0.2)))
+        runs = [t / loops for t in timer.repeat(repeat=repeat, number=loops)]
+    else:
+        # Préparation entre chaque appel : une exécution par mesure
+        runs = []
+        for _ in range(repeat):
+            case.prepare()
+            start = timeit.default_timer()
+            case.func()
+            runs.append(timeit.default_timer() - start)
+        loops = 1
+    runs.sort()
+    return {
+        "best_s": runs[0],
+        "median_s": runs[len(runs) // 2],
+        "loops": loops,
+        "repeat": repeat,
+        "size": case.size,
+        "family": case.family,
+    }
+
+
+def growth_exponents(results: Dict[str, Dict]) -> Dict[str, List[Dict]]:
+    """Exposant de croissance entre tailles successives de chaque famille"""
+    families: Dict[str, List] = {}
+    for name, result in results.items():
+        if result.get("family") and result.get("size"):
+            families.setdefault(result["family"], []).append((result["size"], result["best_s"]))
+
+    exponents = {}
+    for family, points in families.items():
+        points.sort()
+        exponents[family] = [
+            {
+                "from": n1,
+                "to": n2,
+                "exponent": round(math.log(t2 / t1) / math.log(n2 / n1), 2) if t1 > 0 and t2 > 0 else None,
+            }
+            for (n1, t1), (n2, t2) in zip(points, points[1:])
+        ]
+    return exponents
+
+
+def machine_info() -> Dict:
+    """Machine de la mesure : une référence n'est comparable que sur une machine équivalente"""
+    cpu = platform.processor()
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            cpu = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu)
+    except OSError:
+        pass
+    return {"platform": platform.platform(), "cpu": cpu, "cpu_count": os.cpu_count()}
+
+
+def run_suite(sizes, repeat: int, min_time: float, only: Optional[str] = None, verbose: bool = False) -> Dict:
+    services = StandInServices().start()
+    restore = redirect_requests(services)
+    workdir = tempfile.mkdtemp(prefix="fromager-micro-")
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    results = {}
+    try:
+        with quiet:
+            app_module, generator_module = load_app(workdir)
+            cases = build_cases(app_module, generator_module, sizes)
+        for case in cases:
+            if only and only not in case.name:
+                continue
+            with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO()):
+                results[case.name] = measure(case, repeat, min_time)
+            print(f"  {case.name:<45} {results[case.name]['best_s'] * 1e3:10.3f} ms")
+    finally:
+        restore()
+        services.stop()
+
+    return {
+        "kind": "micro",
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "machine": machine_info(),
+            "sizes": list(sizes),
+            "repeat": repeat,
+        },
+        "results": results,
+        "growth": growth_exponents(results),
+    }
+
+
+# ===== RÉFÉRENCES =====
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINE_DIR, f"micro_{name}.json")
+
+
+def save_baseline(report: Dict, name: str) -> str:
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = baseline_path(name)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def compare_reports(baseline: Dict, current: Dict, threshold: float, max_exponent: float) -> List[str]:
+    """Régressions (ralentissement > seuil relatif, ou croissance super-linéaire)"""
+    regressions = []
+    print(f"\n{'Cas':<45} {'réf. ms':>10} {'actuel ms':>10} {'écart':>8}")
+    for name, current_result in current["results"].items():
+        reference = baseline["results"].get(name)
+        now_ms = current_result["best_s"] * 1e3
+        if reference is None:
+            print(f"{name:<45} {'-':>10} {now_ms:10.3f} {'nouveau':>8}")
+            continue
+        ref_ms = reference["best_s"] * 1e3
+        delta = (now_ms - ref_ms) / ref_ms if ref_ms else 0.0
+        flag = " ⚠️" if delta > threshold else ""
+        print(f"{name:<45} {ref_ms:10.3f} {now_ms:10.3f} {delta:+8.1%}{flag}")
+        if delta > threshold:
+            regressions.append(f"{name}: {ref_ms:.3f} ms -> {now_ms:.3f} ms ({delta:+.1%})")
+
+    for family, steps in current.get("growth", {}).items():
+        for step in steps:
+            if step["exponent"] is not None and step["exponent"] > max_exponent:
+                regressions.append(
+                    f"{family}: croissance x^{step['exponent']} entre {step['from']} et {step['to']} recettes"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks des fonctions CPU")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p):
+        p.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+        p.add_argument("--repeat", type=int, default=5)
+        p.add_argument("--min-time", type=float, default=0.2, help="Durée minimale d'une mesure (s)")
+        p.add_argument("--only", default=None, help="Ne lancer que les cas contenant ce texte")
+        p.add_argument("--output", default=None, help="Rapport JSON de l'exécution")
+        p.add_argument("--verbose", action="store_true")
+
+    run_parser = sub.add_parser("run", help="Lancer la suite")
+    common(run_parser)
+    run_parser.add_argument("--save", default=None, help="Enregistrer comme référence sous ce nom")
+
+    compare_parser = sub.add_parser("compare", help="Relancer et comparer à une référence")
+    common(compare_parser)
+    compare_parser.add_argument("baseline", help="Nom de la référence (bench_baselines/micro_<nom>.json)")
+    compare_parser.add_argument("--threshold", type=float, default=0.25, help="Ralentissement toléré (0.25 = 25 %%)")
+    compare_parser.add_argument("--max-exponent", type=float, default=1.5, help="Croissance maximale tolérée")
+
+    sub.add_parser("list", help="Lister les références")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        if os.path.isdir(BASELINE_DIR):
+            for filename in sorted(os.listdir(BASELINE_DIR)):
+                if filename.startswith("micro_") and filename.endswith(".json"):
+                    print(filename[len("micro_"):-len(".json")])
+        return 0
+
+    baseline = None
+    if args.command == "compare":
+        path = baseline_path(args.baseline)
+        if not os.path.exists(path):
+            print(f"❌ Référence introuvable: {path}")
+            return 2
+        with open(path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    print(f"⏱️ Micro-benchmarks (tailles {sizes}, {args.repeat} répétitions)")
+    report = run_suite(sizes, args.repeat, args.min_time, args.only, args.verbose)
+
+    for family, steps in report["growth"].items():
+        for step in steps:
+            print(f"  📈 {family} {step['from']} -> {step['to']} : exposant {step['exponent']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.command == "run" and args.save:
+        print(f"💾 Référence enregistrée: {save_baseline(report, args.save)}")
+        return 0
+
+    if baseline is not None:
+        regressions = compare_reports(baseline, report, args.threshold, args.max_exponent)
+        if regressions:
+            print("\n❌ Régressions :")
+            for line in regressions:
+                print(f"   - {line}")
+            return 1
+        print("\n✅ Aucune régression")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
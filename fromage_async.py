@@ -0,0 +1,129 @@
+"""
+CŒUR D'E/S ASYNCHRONE - Boucle asyncio partagée et client HTTP asynchrone
+==========================================================================
+
+Moteurs de recherche, scraping, fournisseurs LLM et polling KIE passent
+par un client HTTP asynchrone (httpx.AsyncClient, un par boucle, pool de
+connexions partagé) : une attente réseau n'occupe plus de thread, et un
+seul processus peut garder des centaines d'appels en cours.
+
+Deux façons d'appeler le cœur asynchrone :
+- depuis un handler Gradio `async def` : `await agent.xxx_async(...)`,
+  directement sur la boucle de Gradio ;
+- depuis du code synchrone (generate_all, générateur, scripts) : les
+  méthodes historiques (`chat_with_llm`, `search_web_recipes`,
+  `generate_cheese_image_kie`...) sont de fines façades `run_sync(...)`
+  qui exécutent la coroutine sur la boucle d'E/S dédiée du processus
+  (thread « fromage-io ») et attendent son résultat. Le contexte de la
+  requête (trace en cours) suit la coroutine.
+
+Réglages par variables d'environnement :
+    HTTP_MAX_CONNECTIONS  connexions simultanées par boucle (défaut 200)
+    HTTP_TIMEOUT          délai par défaut d'un appel en secondes (défaut 30)
+    IO_BLOCKING_THREADS   threads pour le code bloquant lancé depuis la boucle (défaut 64)
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import threading
+import weakref
+from typing import Any, Coroutine, Optional
+
+import httpx
+
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+IO_BLOCKING_THREADS = int(os.getenv("IO_BLOCKING_THREADS", "64"))
+
+
+# ===== BOUCLE D'E/S DÉDIÉE =====
+
+_io_loop: Optional[asyncio.AbstractEventLoop] = None
+_io_thread: Optional[threading.Thread] = None
+_io_lock = threading.Lock()
+
+
+def _run_io_loop(loop: asyncio.AbstractEventLoop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_io_loop() -> asyncio.AbstractEventLoop:
+    """Boucle asyncio du processus, dans son propre thread (démarrée au premier appel)"""
+    global _io_loop, _io_thread
+    if _io_loop is None:
+        with _io_lock:
+            if _io_loop is None:
+                loop = asyncio.new_event_loop()
+                # asyncio.to_thread depuis la boucle : code bloquant (générateur, fichiers)
+                loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+                    max_workers=IO_BLOCKING_THREADS, thread_name_prefix="fromage-io-block"
+                ))
+                _io_thread = threading.Thread(target=_run_io_loop, args=(loop,), name="fromage-io", daemon=True)
+                _io_thread.start()
+                _io_loop = loop
+    return _io_loop
+
+
+def run_sync(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """Exécute une coroutine sur la boucle d'E/S et attend son résultat (façades synchrones)"""
+    loop = get_io_loop()
+    if threading.current_thread() is _io_thread:
+        coro.close()
+        # Attendre ici bloquerait la boucle qui doit exécuter la coroutine
+        raise RuntimeError("run_sync appelé depuis la boucle d'E/S : utilisez la version async")
+
+    # La tâche copie le contexte courant : trace en cours de l'appelant
+    ctx = contextvars.copy_context()
+    result: concurrent.futures.Future = concurrent.futures.Future()
+    tasks = []
+
+    def start():
+        task = ctx.run(loop.create_task, coro)
+        tasks.append(task)
+
+        def done(finished: asyncio.Task):
+            if finished.cancelled():
+                result.cancel()
+            elif finished.exception() is not None:
+                result.set_exception(finished.exception())
+            else:
+                result.set_result(finished.result())
+
+        task.add_done_callback(done)
+
+    loop.call_soon_threadsafe(start)
+    try:
+        return result.result(timeout)
+    except concurrent.futures.TimeoutError:
+        for task in tasks:
+            loop.call_soon_threadsafe(task.cancel)
+        raise
+
+
+# ===== CLIENT HTTP ASYNCHRONE =====
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def http_client() -> httpx.AsyncClient:
+    """Client HTTP de la boucle courante (pool de connexions partagé par toutes ses tâches)"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(loop)
+            if client is None:
+                client = _clients[loop] = httpx.AsyncClient(
+                    timeout=httpx.Timeout(HTTP_TIMEOUT, connect=10.0),
+                    limits=httpx.Limits(
+                        max_connections=HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=min(HTTP_MAX_CONNECTIONS, 50),
+                    ),
+                    follow_redirects=True,
+                )
+    return client
@@ -0,0 +1,253 @@
+"""
+VOIES DE CONCURRENCE - Ordonnancement des événements Gradio par classe
+=======================================================================
+
+Chaque classe d'événement a sa propre voie, avec un nombre d'exécutions
+simultanées et une profondeur de file bornés :
+- ui       : lectures rapides (historique, statistiques, pagination),
+- chat     : questions au Maître Fromager,
+- generate : génération complète de recette (generate_all),
+- image    : tâches d'image KIE (jusqu'à ~150 s de polling).
+
+Une voie saturée ne bloque que ses propres événements : une image en
+cours de polling n'affame jamais le chat d'un autre utilisateur. Au-delà
+de la file (ou après l'attente maximale), l'événement est refusé
+immédiatement avec une réponse « occupé » au lieu de rester en attente.
+
+Les handlers `async def` attendent leur place sans bloquer la boucle de
+Gradio (`slot_async`, même file et mêmes limites que les handlers
+synchrones).
+
+Réglages par variables d'environnement, par voie :
+    LANE_<NOM>_CONCURRENCY, LANE_<NOM>_QUEUE, LANE_<NOM>_WAIT (secondes)
+"""
+
+import asyncio
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, Optional
+
+from fromage_logging import get_logger
+from fromage_metrics import LANE_REJECTED, LANE_WAIT_SECONDS
+
+logger = get_logger("lanes")
+
+
+# nom -> (exécutions simultanées, profondeur de file, attente maximale en secondes)
+DEFAULT_LANES = {
+    "ui": (8, 32, 5.0),
+    "chat": (4, 16, 30.0),
+    "generate": (3, 8, 60.0),
+    "image": (2, 4, 30.0),
+}
+
+ASYNC_POLL_INTERVAL = 0.05  # Sondage d'une place libre par les handlers async (secondes)
+
+BUSY_MESSAGE = (
+    "⏳ Le Maître Fromager est très sollicité en ce moment. "
+    "Réessayez dans quelques instants."
+)
+
+
+class LaneBusy(Exception):
+    """Voie saturée : file pleine ou attente maximale dépassée"""
+
+    def __init__(self, lane: str, reason: str):
+        super().__init__(f"Voie '{lane}' saturée ({reason})")
+        self.lane = lane
+        self.reason = reason
+
+
+class Lane:
+    """Sémaphore borné + file d'attente limitée pour une classe d'événements"""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.concurrency = max(1, int(concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = max(0.0, float(max_wait))
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        """Événements admis au plus (en cours + en file)"""
+        return self.concurrency + self.max_queue
+
+    def _reject(self, reason: str):
+        with self._lock:
+            self._rejected += 1
+        LANE_REJECTED.inc(lane=self.name, reason=reason)
+        raise LaneBusy(self.name, reason)
+
+    def _enqueue(self):
+        """Entrée en file d'attente ; lève LaneBusy si la file est pleine"""
+        with self._lock:
+            queue_full = self._waiting >= self.max_queue
+            if not queue_full:
+                self._waiting += 1
+        if queue_full:
+            self._reject("queue_full")
+
+    def _dequeue(self):
+        with self._lock:
+            self._waiting -= 1
+
+    @contextmanager
+    def _running_slot(self, start: float):
+        """Place obtenue : exécution comptée, place rendue à la sortie"""
+        LANE_WAIT_SECONDS.observe(time.perf_counter() - start, lane=self.name)
+        with self._lock:
+            self._running += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._slots.release()
+
+    @contextmanager
+    def slot(self):
+        """Réserve une place d'exécution ; lève LaneBusy si la voie est saturée"""
+        start = time.perf_counter()
+        acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            self._enqueue()
+            try:
+                acquired = self._slots.acquire(timeout=self.max_wait)
+            finally:
+                self._dequeue()
+            if not acquired:
+                self._reject("timeout")
+        with self._running_slot(start):
+            yield
+
+    @asynccontextmanager
+    async def slot_async(self):
+        """Comme slot(), l'attente en file ne bloque pas la boucle asyncio"""
+        start = time.perf_counter()
+        acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            self._enqueue()
+            try:
+                deadline = start + self.max_wait
+                while not acquired and time.perf_counter() < deadline:
+                    await asyncio.sleep(ASYNC_POLL_INTERVAL)
+                    acquired = self._slots.acquire(blocking=False)
+            finally:
+                self._dequeue()
+            if not acquired:
+                self._reject("timeout")
+        with self._running_slot(start):
+            yield
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "lane": self.name,
+                "concurrency": self.concurrency,
+                "max_queue": self.max_queue,
+                "max_wait": self.max_wait,
+                "running": self._running,
+                "waiting": self._waiting,
+                "rejected": self._rejected,
+            }
+
+
+def _lane_from_env(name: str, defaults) -> Lane:
+    concurrency, max_queue, max_wait = defaults
+    prefix = f"LANE_{name.upper()}_"
+    return Lane(
+        name,
+        int(os.getenv(prefix + "CONCURRENCY", concurrency)),
+        int(os.getenv(prefix + "QUEUE", max_queue)),
+        float(os.getenv(prefix + "WAIT", max_wait)),
+    )
+
+
+_lanes: Dict[str, Lane] = {name: _lane_from_env(name, cfg) for name, cfg in DEFAULT_LANES.items()}
+_lanes_lock = threading.Lock()
+
+
+def get_lane(name: str) -> Lane:
+    """Voie partagée par son nom (créée avec les réglages 'ui' si inconnue)"""
+    with _lanes_lock:
+        lane = _lanes.get(name)
+        if lane is None:
+            lane = _lanes[name] = _lane_from_env(name, DEFAULT_LANES["ui"])
+        return lane
+
+
+def lanes_snapshot() -> Dict[str, Dict]:
+    with _lanes_lock:
+        lanes = list(_lanes.values())
+    return {lane.name: lane.snapshot() for lane in lanes}
+
+
+def max_threads(headroom: int = 8) -> int:
+    """Threads nécessaires pour que toutes les voies tiennent en même temps"""
+    with _lanes_lock:
+        lanes = list(_lanes.values())
+    return sum(lane.capacity for lane in lanes) + headroom
+
+
+def event_options(name: str) -> Dict:
+    """Arguments d'un événement Gradio en file : groupe propre à la voie.
+
+    La limite Gradio est levée : c'est la voie qui borne les exécutions et
+    refuse immédiatement au-delà de sa file, au lieu d'une attente sans fin.
+    """
+    return {"concurrency_id": name, "concurrency_limit": None}
+
+
+def in_lane(name: str, busy: Optional[Callable[[str], object]] = None):
+    """Décorateur : exécute la fonction dans la voie, `busy(message)` si saturée"""
+    def decorator(func):
+        if inspect.isasyncgenfunction(func):
+            # Handler Gradio en flux : la place est tenue jusqu'au dernier fragment
+            @functools.wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                lane = get_lane(name)
+                try:
+                    async with lane.slot_async():
+                        async for item in func(*args, **kwargs):
+                            yield item
+                except LaneBusy as e:
+                    logger.warning("%s", e)
+                    yield BUSY_MESSAGE if busy is None else busy(BUSY_MESSAGE)
+            return async_gen_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                lane = get_lane(name)
+                try:
+                    async with lane.slot_async():
+                        return await func(*args, **kwargs)
+                except LaneBusy as e:
+                    logger.warning("%s", e)
+                    if busy is None:
+                        return BUSY_MESSAGE
+                    return busy(BUSY_MESSAGE)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            lane = get_lane(name)
+            try:
+                with lane.slot():
+                    return func(*args, **kwargs)
+            except LaneBusy as e:
+                logger.warning("%s", e)
+                if busy is None:
+                    return BUSY_MESSAGE
+                return busy(BUSY_MESSAGE)
+        return wrapper
+    return decorator
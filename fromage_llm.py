@@ -0,0 +1,793 @@
+"""
+FOURNISSEURS LLM - Registre de backends à interface commune
+============================================================
+
+Chaque fournisseur implémente la même interface asynchrone :
+    complete(message, historique, température, max_tokens) -> texte ou None
+    stream(...)  -> fragments de texte au fil de la génération
+    health()     -> True si le service répond
+et déclare ses limites : exécutions simultanées, délai par défaut d'un
+appel, niveau de coût (local < free < credits < paid) et rang dans la
+cascade.
+
+Les classes s'enregistrent avec `@register_provider` ; `build_registry(agent)`
+crée un fournisseur par classe, actif si l'agent l'a configuré (clé API ou
+service local détecté). chat_with_llm parcourt `registry.available()` par
+rang : un fournisseur saturé (file pleine) passe immédiatement la main au
+suivant au lieu de retenir la cascade.
+
+Réglages par variables d'environnement, par fournisseur :
+    LLM_<NOM>_CONCURRENCY  appels simultanés
+    LLM_<NOM>_TIMEOUT      délai d'un appel HTTP (secondes)
+    LLM_<NOM>_MODEL        modèle(s), séparés par des virgules
+    LLM_<NOM>_RANK         rang dans la cascade (ex. LLM_OLLAMA_RANK=1 : local d'abord)
+
+Ollama (déploiement sur site) : le modèle est préchargé en arrière-plan au
+démarrage puis gardé en mémoire (`keep_alive`) ; les appels simultanés
+sont bornés aux requêtes parallèles du serveur.
+    OLLAMA_HOST             adresse du serveur (défaut http://localhost:11434)
+    OLLAMA_KEEP_ALIVE       durée de maintien en mémoire (défaut 30m, -1 = toujours)
+    OLLAMA_NUM_PARALLEL     appels simultanés (défaut 1, comme le serveur)
+    OLLAMA_PRELOAD_TIMEOUT  délai du chargement initial (défaut 300 s)
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Type
+from urllib.parse import urlsplit
+
+import httpx
+
+from fromage_async import get_io_loop, http_client
+from fromage_lanes import Lane, LaneBusy
+from fromage_logging import get_logger
+from fromage_metrics import LLM_PROVIDER_ERRORS
+from fromage_ratelimit import PROVIDER_MAX_WAIT, get_rate_limiter
+from fromage_tracing import span
+
+logger = get_logger("llm")
+
+
+COST_TIERS = ("local", "free", "credits", "paid")
+QUEUE_WAIT = 5.0  # Attente maximale d'une place chez un fournisseur avant de passer au suivant
+
+SYSTEM_PROMPT = (
+    'Tu es "Maître Fromager Pierre", expert français avec 40 ans d\'expérience.\n'
+    "Tu es chaleureux, pédagogique et passionné. Réponds EN FRANÇAIS avec précision et enthousiasme.\n"
+    "Sois concis mais complet. Utilise des emojis fromagers occasionnellement 🧀."
+)
+
+
+_lanes: Dict[str, Lane] = {}
+_lanes_lock = threading.Lock()
+
+
+def _provider_lane(name: str, concurrency: int, max_queue: int) -> Lane:
+    """Voie du fournisseur, partagée par tous les agents du processus"""
+    with _lanes_lock:
+        lane = _lanes.get(name)
+        if lane is None:
+            lane = _lanes[name] = Lane(f"llm:{name}", concurrency, max_queue, QUEUE_WAIT)
+        return lane
+
+
+class LLMProvider:
+    """Interface commune d'un fournisseur LLM et ses limites déclarées"""
+
+    name = ""
+    label = ""
+    rank = 100               # Ordre dans la cascade (croissant)
+    cost_tier = "free"
+    concurrency = 4
+    max_queue = 8
+    timeout = 60.0
+    models: List[str] = []
+    enabled_attr = ""        # Attribut d'activation sur l'agent (clé présente, service détecté)
+    history_window = 3
+    max_output_tokens: Optional[int] = None
+    system_prompt = SYSTEM_PROMPT
+
+    def __init__(self, agent):
+        self.agent = agent
+        prefix = f"LLM_{self.name.upper()}_"
+        self.concurrency = int(os.getenv(prefix + "CONCURRENCY", self.concurrency))
+        self.timeout = float(os.getenv(prefix + "TIMEOUT", self.timeout))
+        self.rank = int(os.getenv(prefix + "RANK", self.rank))
+        models = os.getenv(prefix + "MODEL")
+        if models:
+            self.models = [m.strip() for m in models.split(",") if m.strip()]
+        self.lane = _provider_lane(self.name, self.concurrency, self.max_queue)
+
+    @property
+    def configured(self) -> bool:
+        return bool(getattr(self.agent, self.enabled_attr, False))
+
+    @property
+    def rate_key(self) -> str:
+        return f"provider:{self.name}"
+
+    def output_tokens(self, max_tokens: int) -> int:
+        if self.max_output_tokens is None:
+            return max_tokens
+        return min(max_tokens, self.max_output_tokens)
+
+    def build_messages(self, user_message: str, conversation_history=None) -> List[Dict]:
+        """Prompt système + derniers échanges + question (format chat OpenAI)"""
+        messages = [{"role": "system", "content": self.system_prompt}]
+        for msg in (conversation_history or [])[-self.history_window:]:
+            messages.append({"role": msg["role"], "content": msg["content"]})
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    async def complete(self, user_message: str, conversation_history=None,
+                       temperature: float = 0.7, max_tokens: int = 2048) -> Optional[str]:
+        """Réponse complète, None si aucun modèle n'a répondu"""
+        raise NotImplementedError
+
+    async def stream(self, user_message: str, conversation_history=None,
+                     temperature: float = 0.7, max_tokens: int = 2048) -> AsyncIterator[str]:
+        """Fragments de la réponse ; par défaut la réponse complète en un seul fragment"""
+        text = await self.complete(user_message, conversation_history, temperature, max_tokens)
+        if text:
+            yield text
+
+    async def health(self) -> bool:
+        return self.configured
+
+    @asynccontextmanager
+    async def slot(self):
+        """Place d'exécution chez le fournisseur ; LaneBusy si sa file est pleine"""
+        async with self.lane.slot_async():
+            yield
+
+    async def acquire_rate(self) -> bool:
+        return await get_rate_limiter().acquire_async(self.rate_key, max_wait=PROVIDER_MAX_WAIT)
+
+    def record_error(self, model: str, reason: str):
+        LLM_PROVIDER_ERRORS.inc(provider=self.name, model=model, reason=reason)
+
+    def snapshot(self) -> Dict:
+        return {
+            "name": self.name,
+            "label": self.label,
+            "rank": self.rank,
+            "configured": self.configured,
+            "cost_tier": self.cost_tier,
+            "concurrency": self.concurrency,
+            "timeout": self.timeout,
+            "models": list(self.models),
+            "lane": self.lane.snapshot(),
+        }
+
+
+# ===== ENREGISTREMENT =====
+
+_provider_types: Dict[str, Type[LLMProvider]] = {}
+
+
+def register_provider(cls: Type[LLMProvider]) -> Type[LLMProvider]:
+    """Décorateur de classe : ajoute le fournisseur à ceux créés par build_registry"""
+    if cls.cost_tier not in COST_TIERS:
+        raise ValueError(f"Niveau de coût inconnu pour {cls.name}: {cls.cost_tier}")
+    _provider_types[cls.name] = cls
+    return cls
+
+
+class ProviderRegistry:
+    """Fournisseurs d'un agent, triés par rang"""
+
+    def __init__(self, providers: List[LLMProvider]):
+        self._providers = {p.name: p for p in sorted(providers, key=lambda p: p.rank)}
+
+    def get(self, name: str) -> Optional[LLMProvider]:
+        return self._providers.get(name)
+
+    def all(self) -> List[LLMProvider]:
+        return list(self._providers.values())
+
+    def available(self, max_cost_tier: Optional[str] = None) -> List[LLMProvider]:
+        """Fournisseurs configurés, dans l'ordre de la cascade (filtrés par coût maximal)"""
+        limit = COST_TIERS.index(max_cost_tier) if max_cost_tier else len(COST_TIERS)
+        return [
+            p for p in self._providers.values()
+            if p.configured and COST_TIERS.index(p.cost_tier) <= limit
+        ]
+
+    async def health(self) -> Dict[str, bool]:
+        providers = self.available()
+        results = await asyncio.gather(*(p.health() for p in providers), return_exceptions=True)
+        return {p.name: result is True for p, result in zip(providers, results)}
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {name: p.snapshot() for name, p in self._providers.items()}
+
+
+def build_registry(agent) -> ProviderRegistry:
+    """Un fournisseur par classe enregistrée, lié à la configuration de l'agent"""
+    return ProviderRegistry([cls(agent) for cls in _provider_types.values()])
+
+
+# ===== API COMPATIBLES OPENAI (chat/completions) =====
+
+class OpenAICompatibleProvider(LLMProvider):
+    """POST {base_url}/chat/completions, modèles essayés dans l'ordre"""
+
+    base_url = ""
+    api_key_attr = ""
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {getattr(self.agent, self.api_key_attr, '')}",
+            "Content-Type": "application/json",
+        }
+
+    def payload(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> Dict:
+        return {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": self.output_tokens(max_tokens),
+            "stream": False,
+        }
+
+    async def _post(self, model: str, payload: Dict) -> Optional[httpx.Response]:
+        """Un appel limité en débit et tracé ; None si le débit ou le réseau l'empêche"""
+        short = model.split("/")[-1]
+        try:
+            with span("llm.model", provider=self.name, model=model) as model_span:
+                response = await http_client().post(
+                    f"{self.base_url}/chat/completions",
+                    headers=self.headers(), json=payload, timeout=self.timeout,
+                )
+                model_span.set("status", response.status_code)
+        except httpx.TimeoutException:
+            self.record_error(model, "timeout")
+            logger.debug("Timeout pour %s", short)
+            return None
+        except httpx.HTTPError as e:
+            self.record_error(model, "exception")
+            logger.warning("Exception avec %s: %s - %s", short, type(e).__name__, e)
+            return None
+        get_rate_limiter().observe(self.rate_key, response)
+        logger.debug("Status pour %s: %s", short, response.status_code)
+        return response
+
+    def _report_status(self, model: str, response: httpx.Response):
+        short = model.split("/")[-1]
+        status = response.status_code
+        if status == 402:
+            self.record_error(model, "402")
+            logger.debug("Modèle %s nécessite des crédits", short)
+        elif status == 404:
+            self.record_error(model, "404")
+            logger.debug("Modèle %s non disponible", short)
+        else:
+            self.record_error(model, f"http_{status}")
+            logger.warning("Erreur %s pour %s: %s", status, short, response.text[:200])
+
+    async def complete(self, user_message, conversation_history=None, temperature=0.7, max_tokens=2048):
+        messages = self.build_messages(user_message, conversation_history)
+        for model in self.models:
+            logger.debug("Essai modèle: %s", model)
+            # Quota partagé par tous les modèles du compte
+            if not await self.acquire_rate():
+                break
+            response = await self._post(model, self.payload(model, messages, temperature, max_tokens))
+            if response is None:
+                continue
+            if response.status_code != 200:
+                self._report_status(model, response)
+                continue
+            try:
+                text = response.json()["choices"][0]["message"]["content"]
+            except (ValueError, KeyError, IndexError, TypeError):
+                text = None
+            if text and text.strip():
+                logger.debug("Réponse obtenue avec %s (%s caractères)", model.split('/')[-1], len(text))
+                return text
+            self.record_error(model, "empty")
+
+        logger.warning("Aucun modèle %s n'a fonctionné", self.label)
+        return None
+
+    async def stream(self, user_message, conversation_history=None, temperature=0.7, max_tokens=2048):
+        """Server-Sent Events : `data: {choices[0].delta.content}` jusqu'à `data: [DONE]`"""
+        messages = self.build_messages(user_message, conversation_history)
+        for model in self.models:
+            if not await self.acquire_rate():
+                return
+            payload = self.payload(model, messages, temperature, max_tokens)
+            payload["stream"] = True
+            produced = False
+            try:
+                async with http_client().stream(
+                    "POST", f"{self.base_url}/chat/completions",
+                    headers=self.headers(), json=payload, timeout=self.timeout,
+                ) as response:
+                    get_rate_limiter().observe(self.rate_key, response)
+                    if response.status_code != 200:
+                        await response.aread()
+                        self._report_status(model, response)
+                        continue
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                        except (ValueError, KeyError, IndexError):
+                            continue
+                        if delta:
+                            produced = True
+                            yield delta
+            except httpx.HTTPError as e:
+                self.record_error(model, "timeout" if isinstance(e, httpx.TimeoutException) else "exception")
+                logger.warning("Flux %s interrompu (%s): %s", self.label, model, type(e).__name__)
+                if produced:
+                    return
+                continue
+            if produced:
+                return
+            self.record_error(model, "empty")
+
+    async def health(self) -> bool:
+        if not self.configured:
+            return False
+        try:
+            response = await http_client().get(f"{self.base_url}/models", headers=self.headers(), timeout=5)
+        except httpx.HTTPError:
+            return False
+        return response.status_code == 200
+
+
+@register_provider
+class OpenRouterProvider(OpenAICompatibleProvider):
+    """OpenRouter : modèles gratuits avec quotas"""
+
+    name = "openrouter"
+    label = "OpenRouter"
+    rank = 10
+    cost_tier = "free"
+    concurrency = 4
+    timeout = 60.0
+    enabled_attr = "openrouter_enabled"
+    api_key_attr = "openrouter_api_key"
+    base_url = "https://openrouter.ai/api/v1"
+    models = [
+        "mistralai/mistral-7b-instruct",  # ✅ Bon pour JSON structuré
+        "meta-llama/llama-3.2-3b-instruct",
+        "microsoft/phi-3-mini-4k-instruct",
+        "google/gemma-2-2b-it",
+    ]
+
+    def headers(self):
+        headers = super().headers()
+        headers["HTTP-Referer"] = "https://github.com/volubyl/fromager"
+        return headers
+
+    def payload(self, model, messages, temperature, max_tokens):
+        payload = super().payload(model, messages, temperature, max_tokens)
+        payload["seed"] = 42  # Seed fixe pour reproductibilité
+        return payload
+
+
+@register_provider
+class TogetherProvider(OpenAICompatibleProvider):
+    """Together AI (crédit gratuit de 25$)"""
+
+    name = "together"
+    label = "Together AI"
+    rank = 30
+    cost_tier = "credits"
+    concurrency = 8
+    timeout = 30.0
+    enabled_attr = "together_enabled"
+    api_key_attr = "together_api_key"
+    base_url = "https://api.together.xyz/v1"
+    models = ["mistralai/Mixtral-8x7B-Instruct-v0.1"]
+    history_window = 5
+    max_output_tokens = 2000
+    system_prompt = "Tu es un expert fromager français. Réponds avec précision et passion."
+
+    def payload(self, model, messages, temperature, max_tokens):
+        payload = super().payload(model, messages, temperature, max_tokens)
+        payload["top_p"] = 0.9
+        return payload
+
+
+@register_provider
+class DeepSeekProvider(OpenAICompatibleProvider):
+    """DeepSeek (API payante)"""
+
+    name = "deepseek"
+    label = "DeepSeek"
+    rank = 50
+    cost_tier = "paid"
+    concurrency = 4
+    timeout = 60.0
+    enabled_attr = "deepseek_enabled"
+    api_key_attr = "deepseek_api_key"
+    base_url = "https://api.deepseek.com"
+    models = ["deepseek-chat"]
+    max_output_tokens = 8192
+
+
+# ===== GOOGLE AI (GEMINI) =====
+
+@register_provider
+class GoogleAIProvider(LLMProvider):
+    """Gemini via l'API Generative Language (generateContent / streamGenerateContent)"""
+
+    name = "google_ai"
+    label = "Google AI"
+    rank = 20
+    cost_tier = "free"
+    concurrency = 4
+    timeout = 60.0
+    enabled_attr = "google_ai_enabled"
+    base_url = "https://generativelanguage.googleapis.com/v1beta"
+    models = ["gemini-2.0-flash", "gemini-1.5-flash"]
+
+    def headers(self) -> Dict[str, str]:
+        return {"x-goog-api-key": getattr(self.agent, "google_ai_api_key", "") or "", "Content-Type": "application/json"}
+
+    def payload(self, user_message, conversation_history, temperature, max_tokens) -> Dict:
+        contents = []
+        for msg in (conversation_history or [])[-self.history_window:]:
+            role = "model" if msg["role"] == "assistant" else "user"
+            contents.append({"role": role, "parts": [{"text": msg["content"]}]})
+        contents.append({"role": "user", "parts": [{"text": user_message}]})
+        return {
+            "systemInstruction": {"parts": [{"text": self.system_prompt}]},
+            "contents": contents,
+            "generationConfig": {"temperature": temperature, "maxOutputTokens": self.output_tokens(max_tokens)},
+        }
+
+    @staticmethod
+    def _text(data: Dict) -> str:
+        try:
+            parts = data["candidates"][0]["content"]["parts"]
+        except (KeyError, IndexError, TypeError):
+            return ""
+        return "".join(part.get("text", "") for part in parts)
+
+    async def complete(self, user_message, conversation_history=None, temperature=0.7, max_tokens=2048):
+        payload = self.payload(user_message, conversation_history, temperature, max_tokens)
+        for model in self.models:
+            logger.debug("Essai modèle: %s", model)
+            if not await self.acquire_rate():
+                break
+            try:
+                with span("llm.model", provider=self.name, model=model) as model_span:
+                    response = await http_client().post(
+                        f"{self.base_url}/models/{model}:generateContent",
+                        headers=self.headers(), json=payload, timeout=self.timeout,
+                    )
+                    model_span.set("status", response.status_code)
+            except httpx.HTTPError as e:
+                self.record_error(model, "timeout" if isinstance(e, httpx.TimeoutException) else "exception")
+                logger.warning("Exception avec %s: %s - %s", model, type(e).__name__, e)
+                continue
+            get_rate_limiter().observe(self.rate_key, response)
+            logger.debug("Status pour %s: %s", model, response.status_code)
+            if response.status_code != 200:
+                self.record_error(model, f"http_{response.status_code}")
+                continue
+            text = self._text(response.json())
+            if text.strip():
+                return text
+            self.record_error(model, "empty")
+        return None
+
+    async def stream(self, user_message, conversation_history=None, temperature=0.7, max_tokens=2048):
+        payload = self.payload(user_message, conversation_history, temperature, max_tokens)
+        for model in self.models:
+            if not await self.acquire_rate():
+                return
+            produced = False
+            try:
+                async with http_client().stream(
+                    "POST", f"{self.base_url}/models/{model}:streamGenerateContent",
+                    params={"alt": "sse"}, headers=self.headers(), json=payload, timeout=self.timeout,
+                ) as response:
+                    get_rate_limiter().observe(self.rate_key, response)
+                    if response.status_code != 200:
+                        self.record_error(model, f"http_{response.status_code}")
+                        continue
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        try:
+                            text = self._text(json.loads(line[5:]))
+                        except ValueError:
+                            continue
+                        if text:
+                            produced = True
+                            yield text
+            except httpx.HTTPError as e:
+                self.record_error(model, "timeout" if isinstance(e, httpx.TimeoutException) else "exception")
+                if produced:
+                    return
+                continue
+            if produced:
+                return
+
+    async def health(self) -> bool:
+        if not self.configured:
+            return False
+        try:
+            response = await http_client().get(f"{self.base_url}/models", headers=self.headers(), timeout=5)
+        except httpx.HTTPError:
+            return False
+        return response.status_code == 200
+
+
+# ===== OLLAMA (LOCAL) =====
+
+OLLAMA_DEFAULT_HOST = "http://localhost:11434"
+# Durée pendant laquelle Ollama garde le modèle en mémoire après chaque appel ("-1" = toujours)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_PRELOAD_TIMEOUT = float(os.getenv("OLLAMA_PRELOAD_TIMEOUT", "300"))
+
+_preloads: Dict[str, Future] = {}
+_preloads_lock = threading.Lock()
+
+
+def ollama_host() -> str:
+    """OLLAMA_HOST (avec ou sans schéma, comme pour le serveur Ollama), sinon localhost:11434"""
+    host = os.getenv("OLLAMA_HOST", "").strip().rstrip("/") or OLLAMA_DEFAULT_HOST
+    if "://" not in host:
+        host = f"http://{host}"
+    return host
+
+
+def ollama_has_model(tags: Dict, model: str) -> bool:
+    """Le modèle figure dans la réponse de GET /api/tags ("qwen2.5" = "qwen2.5:latest")"""
+    wanted = model if ":" in model else f"{model}:latest"
+    names = {m.get("name") or m.get("model") for m in (tags or {}).get("models", [])}
+    return wanted in names or model in names
+
+
+@register_provider
+class OllamaProvider(LLMProvider):
+    """Ollama local (/api/chat) : modèle gardé chaud (keep_alive), réponses en flux NDJSON"""
+
+    name = "ollama"
+    label = "Ollama"
+    rank = 40
+    cost_tier = "local"
+    # Aligné sur les requêtes parallèles du serveur Ollama : au-delà, elles attendraient chez lui
+    concurrency = int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+    max_queue = 4
+    timeout = 120.0
+    enabled_attr = "ollama_enabled"
+
+    def __init__(self, agent):
+        if getattr(agent, "ollama_model", None):
+            self.models = [agent.ollama_model]
+        super().__init__(agent)
+        # Hôte de agent.ollama_url (sans chemin d'API éventuel), sinon OLLAMA_HOST
+        url = urlsplit(getattr(agent, "ollama_url", "") or ollama_host())
+        self.host = f"{url.scheme}://{url.netloc}"
+        self.keep_alive = OLLAMA_KEEP_ALIVE
+
+    def payload(self, model: str, messages: List[Dict], temperature: float, max_tokens: int,
+                stream: bool = False) -> Dict:
+        return {
+            "model": model,
+            "messages": messages,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": {"temperature": temperature, "num_predict": self.output_tokens(max_tokens)},
+        }
+
+    def _report_status(self, model: str, response: httpx.Response):
+        if response.status_code == 404:
+            self.record_error(model, "404")
+            logger.debug("Modèle %s absent d'Ollama (ollama pull %s)", model, model)
+        else:
+            self.record_error(model, f"http_{response.status_code}")
+            logger.warning("Erreur Ollama %s pour %s: %s", response.status_code, model, response.text[:200])
+
+    async def complete(self, user_message, conversation_history=None, temperature=0.7, max_tokens=2048):
+        messages = self.build_messages(user_message, conversation_history)
+        for model in self.models:
+            try:
+                with span("llm.model", provider=self.name, model=model) as model_span:
+                    response = await http_client().post(
+                        f"{self.host}/api/chat",
+                        json=self.payload(model, messages, temperature, max_tokens), timeout=self.timeout,
+                    )
+                    model_span.set("status", response.status_code)
+            except httpx.HTTPError as e:
+                self.record_error(model, "timeout" if isinstance(e, httpx.TimeoutException) else "exception")
+                logger.warning("Ollama injoignable: %s - %s", type(e).__name__, e)
+                return None
+            if response.status_code != 200:
+                self._report_status(model, response)
+                continue
+            try:
+                text = response.json().get("message", {}).get("content")
+            except ValueError:
+                text = None
+            if text and text.strip():
+                return text
+            self.record_error(model, "empty")
+        return None
+
+    async def stream(self, user_message, conversation_history=None, temperature=0.7, max_tokens=2048):
+        """NDJSON : une ligne {message.content, done} par fragment, jusqu'à done=true"""
+        messages = self.build_messages(user_message, conversation_history)
+        for model in self.models:
+            produced = False
+            try:
+                async with http_client().stream(
+                    "POST", f"{self.host}/api/chat",
+                    json=self.payload(model, messages, temperature, max_tokens, stream=True),
+                    timeout=self.timeout,
+                ) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        self._report_status(model, response)
+                        continue
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        try:
+                            chunk = json.loads(line)
+                        except ValueError:
+                            continue
+                        if chunk.get("error"):
+                            self.record_error(model, "error")
+                            logger.warning("Ollama (%s): %s", model, chunk['error'])
+                            break
+                        content = (chunk.get("message") or {}).get("content")
+                        if content:
+                            produced = True
+                            yield content
+                        if chunk.get("done"):
+                            break
+            except httpx.HTTPError as e:
+                self.record_error(model, "timeout" if isinstance(e, httpx.TimeoutException) else "exception")
+                logger.warning("Flux Ollama interrompu (%s): %s", model, type(e).__name__)
+            if produced:
+                return
+            self.record_error(model, "empty")
+
+    async def health(self) -> bool:
+        """Serveur joignable et modèle installé (GET /api/tags ne charge aucun modèle)"""
+        try:
+            response = await http_client().get(f"{self.host}/api/tags", timeout=2)
+            return response.status_code == 200 and ollama_has_model(response.json(), self.models[0])
+        except (httpx.HTTPError, ValueError):
+            return False
+
+    async def preload(self) -> bool:
+        """Charge le modèle en mémoire sans rien générer (/api/chat sans message)"""
+        model = self.models[0]
+        start = time.monotonic()
+        logger.info("Ollama: préchargement de %s...", model)
+        # La place est tenue pendant le chargement : les questions passent au fournisseur suivant
+        # plutôt que d'attendre un démarrage à froid
+        try:
+            async with self.slot():
+                response = await http_client().post(
+                    f"{self.host}/api/chat",
+                    json={"model": model, "messages": [], "keep_alive": self.keep_alive},
+                    timeout=OLLAMA_PRELOAD_TIMEOUT,
+                )
+        except (LaneBusy, httpx.HTTPError) as e:
+            logger.warning("Ollama: préchargement de %s impossible (%s)", model, type(e).__name__)
+            return False
+        if response.status_code != 200:
+            self._report_status(model, response)
+            return False
+        logger.info(
+            "Ollama: %s chargé en %.1fs (keep_alive %s)",
+            model, time.monotonic() - start, self.keep_alive,
+        )
+        return True
+
+    def preload_in_background(self) -> Future:
+        """Lance preload() sur la boucle d'E/S, une seule fois par hôte et modèle dans le processus"""
+        key = f"{self.host}/{self.models[0]}"
+        with _preloads_lock:
+            if key not in _preloads:
+                _preloads[key] = asyncio.run_coroutine_threadsafe(self.preload(), get_io_loop())
+        return _preloads[key]
+
+
+# ===== HUGGING FACE INFERENCE =====
+
+@register_provider
+class HuggingFaceProvider(LLMProvider):
+    """Hugging Face Inference API (prompt [INST], modèles gratuits)"""
+
+    name = "huggingface"
+    label = "Hugging Face"
+    rank = 60
+    cost_tier = "free"
+    concurrency = 2
+    timeout = 60.0
+    enabled_attr = "hf_inference_enabled"
+    max_output_tokens = 300
+    system_prompt = "Tu es un expert fromager français. Réponds aux questions de manière précise et amicale."
+    models = [
+        "mistralai/Mistral-7B-Instruct-v0.2",  # Très bon modèle français
+        "google/flan-t5-xl",  # Plus léger
+        "HuggingFaceH4/zephyr-7b-alpha",  # Version alpha si beta échoue
+        "microsoft/phi-2",  # Petit mais efficace
+    ]
+
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {getattr(self.agent, 'hf_token', '')}"}
+
+    def prompt(self, user_message: str, conversation_history=None) -> str:
+        prompt = f"<s>[INST] {self.system_prompt} [/INST]"
+        for msg in (conversation_history or [])[-self.history_window:]:
+            if msg["role"] == "user":
+                prompt += f"<s>[INST] {msg['content']} [/INST]"
+            else:
+                prompt += f" {msg['content']}</s>"
+        return prompt + f"<s>[INST] {user_message} [/INST]"
+
+    async def complete(self, user_message, conversation_history=None, temperature=0.7, max_tokens=2048):
+        payload = {
+            "inputs": self.prompt(user_message, conversation_history),
+            "parameters": {
+                "max_new_tokens": self.output_tokens(max_tokens),
+                "temperature": temperature,
+                "top_p": 0.95,
+                "do_sample": True,
+            },
+        }
+        for model in self.models:
+            logger.debug("Essai modèle: %s", model)
+            if not await self.acquire_rate():
+                break
+            try:
+                with span("llm.model", provider=self.name, model=model) as model_span:
+                    response = await http_client().post(
+                        f"https://api-inference.huggingface.co/models/{model}",
+                        headers=self.headers(), json=payload, timeout=self.timeout,
+                    )
+                    model_span.set("status", response.status_code)
+            except httpx.HTTPError as e:
+                self.record_error(model, "timeout" if isinstance(e, httpx.TimeoutException) else "exception")
+                logger.warning("Erreur avec %s: %s", model, e)
+                continue
+            get_rate_limiter().observe(self.rate_key, response)
+            logger.debug("HF Status pour %s: %s", model, response.status_code)
+
+            if response.status_code == 503:
+                logger.warning("Modèle %s en cours de chargement...", model)
+                self.record_error(model, "loading")
+                continue
+            if response.status_code != 200:
+                self.record_error(model, f"http_{response.status_code}")
+                continue
+            result = response.json()
+            if isinstance(result, list) and result:
+                text = result[0].get("generated_text", "")
+                # Le texte généré reprend le prompt : garder la dernière réponse
+                return text.split("[/INST]")[-1].strip() if "[/INST]" in text else text
+            self.record_error(model, "format")
+        return None
+
+    async def health(self) -> bool:
+        if not self.configured:
+            return False
+        try:
+            response = await http_client().get(
+                "https://huggingface.co/api/whoami-v2", headers=self.headers(), timeout=5
+            )
+        except httpx.HTTPError:
+            return False
+        return response.status_code == 200
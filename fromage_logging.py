@@ -0,0 +1,137 @@
+"""
+JOURNALISATION - Loggers structurés par module
+===============================================
+
+Remplace les print() des chemins chauds par des loggers `logging` :
+- un logger par module (fromager.app, fromager.generator, ...),
+- formatage paresseux (logger.debug("... %s", valeur) : rien n'est
+  formaté si le niveau DEBUG est désactivé),
+- messages DEBUG échantillonnés et limités en débit par gabarit,
+- sortie texte lisible ou JSON (une ligne par événement).
+
+Configuration par variables d'environnement :
+    LOG_LEVEL              (défaut INFO)
+    LOG_FORMAT             (text | json, défaut text)
+    LOG_DEBUG_SAMPLE_RATE  (défaut 1.0 = tous les messages DEBUG)
+    LOG_RATE_LIMIT         (défaut 20 messages par gabarit et par minute, 0 = illimité)
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+
+ROOT_LOGGER = "fromager"
+
+# Clés masquées dans les paramètres journalisés
+SECRET_KEYS = ("api_key", "apikey", "key", "token", "authorization", "password", "secret")
+
+# Attributs standard d'un LogRecord (le reste = champs structurés passés via extra=)
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+# ===== FORMATS =====
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par événement, champs `extra` inclus"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+# ===== ÉCHANTILLONNAGE / LIMITE DE DÉBIT =====
+
+class RateLimitFilter(logging.Filter):
+    """Limite les messages répétitifs (par gabarit) et échantillonne le DEBUG"""
+
+    def __init__(self, per_minute: int = 20, debug_sample_rate: float = 1.0):
+        super().__init__()
+        self.per_minute = per_minute
+        self.debug_sample_rate = debug_sample_rate
+        self._windows: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if record.levelno <= logging.DEBUG and self.debug_sample_rate < 1.0:
+            if random.random() >= self.debug_sample_rate:
+                return False
+        if not self.per_minute:
+            return True
+
+        # Gabarit non formaté : tous les appels d'une même ligne partagent la fenêtre
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= 60:
+                suppressed = window[1] - self.per_minute if window and window[1] > self.per_minute else 0
+                self._windows[key] = [now, 1]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            window[1] += 1
+            return window[1] <= self.per_minute
+
+
+# ===== CONFIGURATION =====
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None):
+    """Installe le handler du logger racine `fromager` (idempotent)"""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+        fmt = (fmt or os.getenv("LOG_FORMAT", "text")).lower()
+
+        handler = logging.StreamHandler(sys.stdout)
+        if fmt == "json":
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s", "%H:%M:%S"))
+        handler.addFilter(RateLimitFilter(
+            per_minute=int(os.getenv("LOG_RATE_LIMIT", "20")),
+            debug_sample_rate=float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0")),
+        ))
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(getattr(logging, level, logging.INFO))
+        root.addHandler(handler)
+        root.propagate = False
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger du module `name` (fromager.<name>)"""
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def redact(params: Optional[Dict]) -> Dict:
+    """Copie des paramètres avec les secrets masqués (clés API, jetons...)"""
+    return {
+        key: ("***" if any(secret in str(key).lower() for secret in SECRET_KEYS) and value else value)
+        for key, value in (params or {}).items()
+    }
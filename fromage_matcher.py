@@ -0,0 +1,250 @@
+"""
+MATCHER MULTI-MOTIFS - Détection lait / aromates / mots-clés
+=============================================================
+
+Automate d'Aho-Corasick construit UNE SEULE FOIS à partir des vocabulaires
+de la base de connaissances. Un seul passage sur le texte renvoie toutes
+les occurrences par catégorie : lait, aromate, coagulant, fromage, interdit.
+
+Sémantique des anciens `mot in texte` (recherche de sous-chaînes, texte
+mis en minuscules), sans relire le texte pour chaque mot-clé. Exception :
+les motifs de lait doivent commencer un mot ("ovin" ne se trouve pas dans
+"bovin" ; les pluriels "vaches", "ovins" restent reconnus).
+"""
+
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+
+# ===== VOCABULAIRES DE BASE =====
+
+# Lait : libellé canonique -> motifs ("lait de brebis" est couvert par "brebis" ;
+# les formes collées "laitdebrebis" ne commencent pas par le mot, d'où leur motif)
+LAIT_PATTERNS = {
+    "brebis": ["brebis", "mouton", "ovin", "sheep", "laitdebrebis"],
+    "chèvre": ["chèvre", "chevre", "caprin", "goat", "laitdechevre", "laitdechèvre"],
+    "vache": ["vache", "bovin", "cow", "laitdevache"],
+    "bufflonne": ["bufflonne", "buffle", "buffalo", "laitdebufflonne"],
+}
+
+# Fromages typiques qui trahissent le lait utilisé
+LAIT_INDICES = {
+    "brebis": ["manchego", "pecorino", "roquefort"],
+    "chèvre": ["crottin", "sainte-maure", "bûche"],
+    "vache": ["camembert", "brie", "comté"],
+    "bufflonne": ["mozzarella di bufala"],
+}
+
+# Mots génériques désignant du lait
+LAIT_MOTS = ["lait", "milk"]
+
+# Catégories dont les motifs doivent commencer un mot
+WORD_START_CATEGORIES = ("lait", "lait_indice")
+
+COAGULANTS = {
+    "présure": ["présure", "presure"],
+    "citron": ["citron"],
+    "vinaigre": ["vinaigre"],
+    "acide": ["acide"],
+}
+
+AROMATES_MOTS_CLES = [
+    "thym", "romarin", "basilic", "origan", "ail", "poivre", "cumin",
+    "ciboulette", "persil", "aneth", "estragon", "menthe", "paprika",
+    "curry", "piment", "herbes", "lavande", "noix", "olive",
+    "tomate séchée", "cendre", "truffe",
+]
+
+FROMAGE_MOTS_CLES = [
+    'fromage', 'cheese', 'mozzarella', 'cheddar', 'brie', 'camembert',
+    'roquefort', 'comté', 'gruyère', 'emmental', 'parmesan',
+    'chèvre', 'brebis', 'vache', 'bufflonne',
+    'lait caillé', 'caillé', 'présure', 'affinage', 'croûte',
+    'pâte molle', 'pâte pressée', 'pâte persillée',
+    'faisselle', 'ricotta', 'mascarpone', 'cottage', 'feta'
+]
+
+MOTS_INTERDITS = [
+    'tarte', 'gâteau', 'cake', 'cookie', 'biscuit', 'crêpe', 'pancake',
+    'pain', 'brioche', 'viennoiserie', 'pâtisserie',
+    'chocolat', 'marron', 'châtaigne', 'fruit', 'confiture',
+    'viande', 'poisson', 'poulet', 'boeuf', 'porc',
+    'salade', 'soupe', 'potage', 'légume',
+    'dessert', 'glace', 'sorbet', 'mousse au chocolat',
+    'crème brûlée', 'flan', 'tiramisu'
+]
+
+
+# ===== RÉSULTAT D'UN PASSAGE =====
+
+class MatchResult:
+    """Occurrences trouvées, regroupées par catégorie"""
+
+    __slots__ = ("hits",)
+
+    def __init__(self):
+        # catégorie -> [(position, libellé, motif)] dans l'ordre du texte
+        self.hits: Dict[str, List[Tuple[int, str, str]]] = {}
+
+    def has(self, category: str) -> bool:
+        """True si au moins un motif de la catégorie est présent"""
+        return bool(self.hits.get(category))
+
+    def labels(self, category: str) -> List[str]:
+        """Libellés distincts, dans l'ordre d'apparition"""
+        seen = []
+        for _, label, _ in self.hits.get(category, []):
+            if label not in seen:
+                seen.append(label)
+        return seen
+
+    def first(self, category: str, priority: Optional[List[str]] = None) -> Optional[str]:
+        """Premier libellé trouvé, ou le plus prioritaire si `priority` est donné"""
+        found = self.labels(category)
+        if not found:
+            return None
+        if priority:
+            for label in priority:
+                if label in found:
+                    return label
+            return None
+        return found[0]
+
+
+# ===== AUTOMATE =====
+
+class KeywordMatcher:
+    """Automate d'Aho-Corasick multi-catégories"""
+
+    def __init__(self, vocabularies: Dict[str, Dict[str, List[str]]], word_start: Tuple[str, ...] = ()):
+        """
+        Args:
+            vocabularies: {catégorie: {libellé: [motifs]}}
+            word_start: catégories dont les motifs doivent commencer un mot
+        """
+        self._word_start = frozenset(word_start)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, str, str]]] = [[]]
+
+        for category, labels in vocabularies.items():
+            for label, patterns in labels.items():
+                for pattern in patterns:
+                    pattern = pattern.lower().strip()
+                    if pattern:
+                        self._add(pattern, (category, label, pattern))
+
+        self._build_fail_links()
+
+    def _add(self, pattern: str, output: Tuple[str, str, str]):
+        node = 0
+        for char in pattern:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        if output not in self._out[node]:
+            self._out[node].append(output)
+
+    def _build_fail_links(self):
+        queue = deque([0])
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                if node:
+                    fallback = self._fail[node]
+                    while fallback and char not in self._goto[fallback]:
+                        fallback = self._fail[fallback]
+                    self._fail[child] = self._goto[fallback].get(char, 0)
+                # Hériter des sorties du lien d'échec (motifs suffixes)
+                self._out[child] = self._out[child] + [
+                    o for o in self._out[self._fail[child]] if o not in self._out[child]
+                ]
+
+    def scan(self, text: str) -> MatchResult:
+        """
+        Un seul passage sur le texte, toutes catégories confondues
+
+        >>> get_matcher().scan("lait bovin, présure").labels("lait")
+        ['vache']
+        """
+        result = MatchResult()
+        if not text:
+            return result
+
+        goto, fail, out = self._goto, self._fail, self._out
+        lowered = text.lower()
+        node = 0
+        for i, char in enumerate(lowered):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                for category, label, pattern in out[node]:
+                    start = i - len(pattern) + 1
+                    if category in self._word_start and start and lowered[start - 1].isalnum():
+                        continue
+                    result.hits.setdefault(category, []).append((start, label, pattern))
+
+        for hits in result.hits.values():
+            hits.sort(key=lambda h: h[0])
+        return result
+
+
+# ===== CONSTRUCTION DEPUIS LA BASE DE CONNAISSANCES =====
+
+def _kb_terms(items) -> List[str]:
+    """'Basilic (doux, fromages frais)' -> 'basilic'"""
+    terms = []
+    for item in items or []:
+        if isinstance(item, str):
+            term = item.split("(")[0].strip().lower()
+            if term:
+                terms.append(term)
+    return terms
+
+
+def build_vocabularies(knowledge_base: Optional[Dict] = None) -> Dict[str, Dict[str, List[str]]]:
+    """Assemble les vocabulaires statiques + ceux de la base de connaissances"""
+    aromates = {mot: [mot] for mot in AROMATES_MOTS_CLES}
+    coagulants = {label: list(patterns) for label, patterns in COAGULANTS.items()}
+
+    kb = knowledge_base or {}
+    for items in kb.get("epices_et_aromates", {}).values():
+        for term in _kb_terms(items):
+            aromates.setdefault(term, [term])
+    for term in _kb_terms(kb.get("ingredients_base", {}).get("Coagulant")):
+        coagulants.setdefault(term, [term])
+
+    return {
+        "lait": {label: list(p) for label, p in LAIT_PATTERNS.items()},
+        "lait_indice": {label: list(p) for label, p in LAIT_INDICES.items()},
+        "lait_mot": {mot: [mot] for mot in LAIT_MOTS},
+        "coagulant": coagulants,
+        "aromate": aromates,
+        "fromage": {mot: [mot] for mot in FROMAGE_MOTS_CLES},
+        "interdit": {mot: [mot] for mot in MOTS_INTERDITS},
+    }
+
+
+_matchers: Dict[Optional[int], KeywordMatcher] = {}
+_matchers_lock = threading.Lock()
+
+
+def get_matcher(knowledge_base: Optional[Dict] = None) -> KeywordMatcher:
+    """Retourne le matcher partagé (construit une seule fois par base)"""
+    key = id(knowledge_base) if knowledge_base else None
+    matcher = _matchers.get(key)
+    if matcher is None:
+        with _matchers_lock:
+            matcher = _matchers.get(key)
+            if matcher is None:
+                matcher = KeywordMatcher(build_vocabularies(knowledge_base), WORD_START_CATEGORIES)
+                _matchers[key] = matcher
+    return matcher
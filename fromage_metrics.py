@@ -0,0 +1,314 @@
+"""
+MÉTRIQUES - Exposition Prometheus (/metrics) des latences, caches et fournisseurs
+==================================================================================
+
+Compteurs et histogrammes en mémoire, sans dépendance, rendus au format
+texte Prometheus (version 0.0.4) :
+- latences bout en bout (génération, chat), par moteur de recherche et par
+  fournisseur LLM,
+- erreurs par fournisseur / modèle (402, 404, timeout...),
+- succès du scraping par domaine, hits/misses des caches,
+- durées des envois HF et des tâches d'image KIE,
+- attente et refus par voie de concurrence (fromage_lanes),
+- attente et 429 par seau de jetons (fromage_ratelimit),
+- appels coalescés par groupe (fromage_singleflight).
+
+`mount_metrics(app)` ajoute la route GET /metrics à l'application
+FastAPI/Starlette qui sert Gradio ; `start_metrics_server(port)` est une
+alternative autonome (http.server) si le montage est impossible.
+"""
+
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+
+# Bornes par défaut (secondes) : des appels LLM rapides aux générations complètes
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+# ===== TYPES DE MÉTRIQUES =====
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Compteur monotone par combinaison de labels"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """Histogramme cumulatif (buckets + somme + nombre) par combinaison de labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Mesure la durée du bloc (observée même en cas d'exception)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._values.get(self._key(labels))
+        return series[2] if series else 0
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        lines = []
+        for key, (bucket_counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                labels = _format_labels(self.labelnames, key, (("le", repr(float(bound))),))
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.labelnames, key, (("le", "+Inf"),))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            plain = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{plain} {total}")
+            lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+class Registry:
+    """Ensemble des métriques exposées"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# ===== MÉTRIQUES DE L'APPLICATION =====
+
+GENERATION_SECONDS = registry.histogram(
+    "fromager_generation_seconds", "Durée bout en bout d'une génération", ["entrypoint"]
+)
+CHAT_SECONDS = registry.histogram(
+    "fromager_chat_seconds", "Durée d'un appel chat_with_llm (cascade complète)"
+)
+SEARCH_ENGINE_SECONDS = registry.histogram(
+    "fromager_search_engine_seconds", "Durée d'une recherche par moteur", ["engine"]
+)
+SEARCH_ENGINE_RESULTS = registry.counter(
+    "fromager_search_engine_results_total", "Recettes retournées par moteur", ["engine"]
+)
+LLM_PROVIDER_SECONDS = registry.histogram(
+    "fromager_llm_provider_seconds", "Durée d'un appel par fournisseur LLM", ["provider"]
+)
+LLM_PROVIDER_ERRORS = registry.counter(
+    "fromager_llm_provider_errors_total",
+    "Erreurs par fournisseur et modèle (402, 404, timeout, http_xxx, exception)",
+    ["provider", "model", "reason"],
+)
+SCRAPE_TOTAL = registry.counter(
+    "fromager_scrape_total", "Tentatives de scraping par domaine et résultat", ["domain", "outcome"]
+)
+CACHE_REQUESTS = registry.counter(
+    "fromager_cache_requests_total", "Accès aux caches (hit / miss)", ["cache", "result"]
+)
+HF_UPLOAD_SECONDS = registry.histogram(
+    "fromager_hf_upload_seconds", "Durée des envois de l'historique vers Hugging Face", ["outcome"]
+)
+KIE_TASK_SECONDS = registry.histogram(
+    "fromager_kie_task_seconds", "Durée d'une tâche d'image KIE (création -> image)", ["outcome"],
+    buckets=(1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 150, 180),
+)
+
+LANE_WAIT_SECONDS = registry.histogram(
+    "fromager_lane_wait_seconds", "Attente d'une place dans une voie de concurrence", ["lane"]
+)
+LANE_REJECTED = registry.counter(
+    "fromager_lane_rejected_total", "Événements refusés (voie saturée)", ["lane", "reason"]
+)
+
+RATE_LIMIT_WAIT_SECONDS = registry.histogram(
+    "fromager_rate_limit_wait_seconds", "Attente imposée par un seau de jetons", ["bucket"]
+)
+RATE_LIMIT_THROTTLED = registry.counter(
+    "fromager_rate_limit_throttled_total", "Réponses 429/503 reçues (limite apprise)", ["bucket"]
+)
+
+SINGLEFLIGHT_CALLS = registry.counter(
+    "fromager_singleflight_calls_total",
+    "Appels coalescés : leader = exécution réelle, follower = résultat partagé", ["group", "role"],
+)
+
+
+# ===== AIDES =====
+
+def timed(histogram: Histogram, **labels):
+    """Décorateur : observe la durée de la fonction dans l'histogramme"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with histogram.time(**labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def url_domain(url: str) -> str:
+    """Domaine d'une URL sans www. (label borné : pas de chemin ni de requête)"""
+    try:
+        host = urlparse(url).netloc.lower()
+    except Exception:
+        return "invalide"
+    return host[4:] if host.startswith("www.") else host or "invalide"
+
+
+def render_metrics() -> str:
+    return registry.render()
+
+
+# ===== EXPOSITION HTTP =====
+
+def mount_metrics(app, path: str = "/metrics") -> bool:
+    """Ajoute GET /metrics à une application FastAPI/Starlette (avant les routes Gradio)"""
+    try:
+        from starlette.responses import Response
+        from starlette.routing import Route
+    except ImportError:
+        return False
+
+    async def metrics_endpoint(request):
+        return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+    # En tête de liste : prioritaire sur les routes génériques de Gradio
+    app.router.routes.insert(0, Route(path, metrics_endpoint, methods=["GET"]))
+    return True
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> Optional[threading.Thread]:
+    """Serveur /metrics autonome dans un thread (repli sans Starlette)"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_metrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        print(f"⚠️ Serveur de métriques indisponible sur le port {port}: {e}")
+        return None
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return thread
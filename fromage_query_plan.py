@@ -0,0 +1,164 @@
+"""
+PLANIFICATION DES RECHERCHES - Une recherche canonique par requête utilisateur
+===============================================================================
+
+Un clic sur « Générer » pouvait consulter les moteurs plusieurs fois pour la
+même intention : le générateur (_find_recipe_urls -> DuckDuckGo, avec sa
+propre requête) et l'onglet des résultats web (_search_web_recipes_classic,
+avec une autre requête).
+
+Le plan de recherche construit UNE requête canonique à partir des
+ingrédients et du type de fromage, exécute la cascade de moteurs une seule
+fois et garde l'ensemble des résultats :
+- pour la requête en cours : generate_all crée le plan à partir de la saisie
+  brute (ingrédients + valeur du menu, avant le type déduit du profil) et le
+  transmet explicitement (`plan=`) à la génération et aux résultats web ;
+- dans un cache partagé à durée de vie (SEARCH_PLAN_TTL secondes, défaut
+  600, 0 = désactivé), pour les requêtes suivantes identiques.
+
+Les appels simultanés d'un même plan sont coalescés (fromage_singleflight),
+qu'ils viennent du code synchrone (`results`) ou asynchrone (`results_async`).
+"""
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fromage_logging import get_logger
+from fromage_metrics import record_cache
+from fromage_singleflight import get_group
+from fromage_tracing import set_attribute
+
+logger = get_logger("query_plan")
+
+
+PLAN_RESULTS = 8         # Résultats demandés à chaque moteur (jusqu'au double collecté)
+PLAN_CACHE_SIZE = 256
+AI_CHOICE = "Laissez l'IA choisir ou pas !"
+
+# (requête, nombre minimal) -> liste de résultats {title, url, description, source, score, engine}
+SearchFunc = Callable[[str, int], List[Dict]]
+AsyncSearchFunc = Callable[[str, int], Awaitable[List[Dict]]]
+
+
+def normalize_ingredients(ingredients) -> List[str]:
+    """Liste ou chaîne "a, b" -> ingrédients en minuscules, sans doublons, ordre conservé"""
+    if isinstance(ingredients, str):
+        ingredients = ingredients.split(",")
+    seen = []
+    for ingredient in ingredients or []:
+        value = " ".join(str(ingredient).lower().split())
+        if value and value not in seen:
+            seen.append(value)
+    return seen
+
+
+def canonical_query(ingredients, cheese_type: str) -> str:
+    """Requête unique : "recette fromage [type] ingrédients" (sans virgules)"""
+    parts = ["recette fromage"]
+    if cheese_type and cheese_type != AI_CHOICE:
+        parts.append(cheese_type)
+    parts.extend(normalize_ingredients(ingredients))
+    return " ".join(parts).replace(",", " ")
+
+
+def plan_key(ingredients, cheese_type: str) -> Tuple:
+    """Même plan quel que soit l'ordre des ingrédients"""
+    cheese = "" if not cheese_type or cheese_type == AI_CHOICE else cheese_type.strip().lower()
+    return tuple(sorted(normalize_ingredients(ingredients))), cheese
+
+
+class _PlanCache:
+    """Résultats de recherche par plan, LRU borné avec durée de vie"""
+
+    def __init__(self, ttl: float, max_entries: int = PLAN_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[List[Dict]]:
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, results = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return results
+
+    def put(self, key: Tuple, results: List[Dict]):
+        # Un plan sans résultat n'est pas mémorisé : le suivant retentera les moteurs
+        if self.ttl <= 0 or not results:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+plan_cache = _PlanCache(float(os.getenv("SEARCH_PLAN_TTL", "600")))
+
+
+class SearchPlan:
+    """Recherche canonique d'une requête utilisateur, exécutée au plus une fois"""
+
+    def __init__(self, ingredients, cheese_type: str):
+        self.query = canonical_query(ingredients, cheese_type)
+        self.key = plan_key(ingredients, cheese_type)
+        self._results: Optional[List[Dict]] = None
+        self._lock = threading.Lock()
+
+    def results(self, run_search: SearchFunc) -> List[Dict]:
+        """Résultats du plan (copie modifiable) ; lance la recherche au premier appel"""
+        with self._lock:
+            if self._results is None:
+                cached = plan_cache.get(self.key)
+                record_cache("search_plan", cached is not None)
+                if cached is None:
+                    logger.info("Recherche canonique : %s", self.query)
+                    cached = get_group("search_plan").do(self.key, run_search, self.query, PLAN_RESULTS)
+                    plan_cache.put(self.key, cached)
+                else:
+                    logger.info("Recherche canonique (réutilisée) : %s", self.query)
+                self._results = cached
+            set_attribute("search.query", self.query)
+            return copy.deepcopy(self._results)
+
+    async def results_async(self, run_search: AsyncSearchFunc) -> List[Dict]:
+        """Comme results(), sans tenir le verrou pendant la recherche (coalescée par single-flight)"""
+        with self._lock:
+            results = self._results
+        if results is None:
+            results = plan_cache.get(self.key)
+            record_cache("search_plan", results is not None)
+            if results is None:
+                logger.info("Recherche canonique : %s", self.query)
+                results = await get_group("search_plan").do_async(self.key, run_search, self.query, PLAN_RESULTS)
+                plan_cache.put(self.key, results)
+            else:
+                logger.info("Recherche canonique (réutilisée) : %s", self.query)
+            with self._lock:
+                if self._results is None:
+                    self._results = results
+                results = self._results
+        set_attribute("search.query", self.query)
+        return copy.deepcopy(results)
+
+    def urls(self, run_search: SearchFunc) -> List[str]:
+        return [r["url"] for r in self.results(run_search) if r.get("url")]
+
+
+def search_plan(ingredients, cheese_type: str, plan: Optional[SearchPlan] = None) -> SearchPlan:
+    """Plan transmis par l'appelant s'il y en a un, sinon un plan ponctuel (cache partagé)"""
+    if plan is not None:
+        return plan
+    return SearchPlan(ingredients, cheese_type)
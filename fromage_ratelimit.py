@@ -0,0 +1,297 @@
+"""
+LIMITEUR DE DÉBIT - Seaux de jetons par moteur, fournisseur et domaine
+=======================================================================
+
+Un seau par clé, partagé par tous les threads du processus :
+    engine:<moteur>       moteurs de recherche (serpapi, ecosia, ddg_html...)
+    provider:<fournisseur> API LLM (openrouter, together, huggingface...)
+    domain:<domaine>      sites de recettes scrapés
+
+`acquire(clé)` ne fait attendre que si le seau est vide (aucune pause fixe
+quand on est sous le quota) ; les jetons sont réservés sous verrou, donc
+plusieurs utilisateurs simultanés se partagent le débit au lieu de le
+dépasser ensemble.
+
+`observe(clé, réponse)` apprend la limite réelle : sur 429 (ou 503 avec
+Retry-After), le seau est suspendu pendant la durée indiquée et son débit
+divisé par deux ; chaque succès le fait ensuite remonter progressivement
+vers le débit configuré.
+
+Réglages par clé via RATE_LIMITS, ex : "engine:ecosia=0.5/2,domain:*=2/4"
+(jetons par seconde / capacité).
+
+`prepaid(clé)` : un appelant qui a déjà pris le jeton (admission d'un job de
+génération par lot) en fait profiter le premier acquire() de la même clé
+dans son contexte, qui ne le paie pas une seconde fois.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from fromage_logging import get_logger
+from fromage_metrics import RATE_LIMIT_THROTTLED, RATE_LIMIT_WAIT_SECONDS
+
+logger = get_logger("ratelimit")
+
+
+# clé -> (jetons par seconde, capacité) ; "<type>:*" = défaut du type
+DEFAULT_LIMITS: Dict[str, Tuple[float, float]] = {
+    "engine:serpapi": (1.0, 3),
+    "engine:google_cse": (1.0, 3),
+    "engine:ecosia": (0.5, 2),
+    "engine:ddg_api": (1.0, 2),
+    "engine:ddg_html": (0.5, 1),
+    "engine:*": (1.0, 2),
+    "provider:openrouter": (20 / 60, 5),
+    "provider:google_ai": (15 / 60, 3),
+    "provider:together": (60 / 60, 10),
+    "provider:huggingface": (30 / 60, 5),
+    "provider:deepseek": (60 / 60, 10),
+    "provider:*": (2.0, 10),
+    "domain:*": (1.0, 3),
+    "*": (1.0, 2),
+}
+
+THROTTLE_STATUSES = (429, 503)
+DEFAULT_BACKOFF = 5.0   # Pause sans Retry-After (doublée à chaque 429 consécutif)
+MAX_BACKOFF = 300.0
+MIN_RATE_RATIO = 0.1    # Le débit appris ne descend pas sous 10 % du débit configuré
+RECOVERY = 1.1          # Remontée du débit à chaque succès
+
+# Attente maximale avant d'abandonner l'appel (moteur suivant, modèle suivant, URL suivante)
+ENGINE_MAX_WAIT = 10.0
+PROVIDER_MAX_WAIT = 30.0
+DOMAIN_MAX_WAIT = 10.0
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Retry-After en secondes (nombre ou date HTTP), None si absent/illisible"""
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Seau de jetons à réservation : l'attente est calculée sous verrou, dormie hors verrou"""
+
+    def __init__(self, rate: float, capacity: float, name: str = ""):
+        self.name = name
+        self.base_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._backoff = DEFAULT_BACKOFF
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        # Aucun jeton ne s'accumule pendant une suspension (429)
+        start = max(self._updated, self._paused_until)
+        if self.rate > 0 and now > start:
+            self._tokens = min(self.capacity, self._tokens + (now - start) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """Réserve un jeton ; retourne l'attente nécessaire, None si elle dépasse max_wait"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            # Fin de la suspension éventuelle, puis espacement des jetons déjà réservés
+            wait = max(0.0, self._paused_until - now) + max(0.0, -self._tokens / self.rate)
+            if max_wait is not None and wait > max_wait:
+                self._tokens += 1
+                return None
+            return wait
+
+    def acquire(self, max_wait: Optional[float] = None) -> bool:
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        RATE_LIMIT_WAIT_SECONDS.observe(wait, bucket=self.name)
+        return True
+
+    async def acquire_async(self, max_wait: Optional[float] = None) -> bool:
+        """Comme acquire(), l'attente ne bloque pas la boucle asyncio"""
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        RATE_LIMIT_WAIT_SECONDS.observe(wait, bucket=self.name)
+        return True
+
+    def throttled(self, retry_after: Optional[float] = None):
+        """429 reçu : suspension (Retry-After ou recul exponentiel) + débit divisé par deux"""
+        with self._lock:
+            if retry_after is None:
+                retry_after = self._backoff
+                self._backoff = min(MAX_BACKOFF, self._backoff * 2)
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + retry_after)
+            self.rate = max(self.base_rate * MIN_RATE_RATIO, self.rate / 2)
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+
+    def succeeded(self):
+        """Succès : le débit remonte progressivement vers le débit configuré"""
+        if self.rate >= self.base_rate and self._backoff == DEFAULT_BACKOFF:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.base_rate, self.rate * RECOVERY)
+            self._backoff = DEFAULT_BACKOFF
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": round(self.rate, 4),
+                "base_rate": round(self.base_rate, 4),
+                "capacity": self.capacity,
+                "tokens": round(self._tokens, 2),
+                "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            }
+
+
+def _parse_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """ "engine:ecosia=0.5/2,domain:*=2" -> {clé: (débit, capacité)} """
+    limits = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        key, value = item.split("=", 1)
+        rate, _, capacity = value.partition("/")
+        try:
+            limits[key.strip()] = (float(rate), float(capacity or max(1.0, float(rate))))
+        except ValueError:
+            logger.warning("RATE_LIMITS ignoré: %s", item)
+    return limits
+
+
+# Clés dont le jeton est déjà pris dans ce contexte (consommées au premier acquire)
+_prepaid: contextvars.ContextVar = contextvars.ContextVar("rate_prepaid", default=None)
+
+
+@contextmanager
+def prepaid(key: str):
+    """Le prochain acquire(key) du contexte utilise le jeton déjà pris par l'appelant"""
+    token = _prepaid.set({key})
+    try:
+        yield
+    finally:
+        _prepaid.reset(token)
+
+
+def _take_prepaid(key: str) -> bool:
+    # L'ensemble est partagé par les contextes copiés (threads, boucle d'E/S) : un seul usage
+    keys = _prepaid.get()
+    if keys is None or key not in keys:
+        return False
+    keys.discard(key)
+    return True
+
+
+class RateLimiter:
+    """Registre des seaux de jetons du processus"""
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _limit_for(self, key: str) -> Tuple[float, float]:
+        if key in self.limits:
+            return self.limits[key]
+        kind = key.split(":", 1)[0]
+        return self.limits.get(f"{kind}:*", self.limits["*"])
+
+    def bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    rate, capacity = self._limit_for(key)
+                    bucket = self._buckets[key] = TokenBucket(rate, capacity, name=key)
+        return bucket
+
+    def configure(self, key: str, rate: float, capacity: float):
+        """Fixe le débit d'une clé (remplace le seau existant)"""
+        with self._lock:
+            self.limits[key] = (rate, capacity)
+            self._buckets.pop(key, None)
+
+    def acquire(self, key: str, max_wait: Optional[float] = None) -> bool:
+        """Attend un jeton (seulement si le seau est vide) ; False si l'attente dépasse max_wait"""
+        if _take_prepaid(key):
+            return True
+        acquired = self.bucket(key).acquire(max_wait)
+        if not acquired:
+            logger.warning("Limite de débit %s : appel ignoré (attente > %.0fs)", key, max_wait)
+        return acquired
+
+    async def acquire_async(self, key: str, max_wait: Optional[float] = None) -> bool:
+        if _take_prepaid(key):
+            return True
+        acquired = await self.bucket(key).acquire_async(max_wait)
+        if not acquired:
+            logger.warning("Limite de débit %s : appel ignoré (attente > %.0fs)", key, max_wait)
+        return acquired
+
+    def observe(self, key: str, response):
+        """Apprend des réponses : 429/503 suspendent le seau, les succès le font remonter"""
+        status = getattr(response, "status_code", None)
+        if status is None:
+            return
+        bucket = self.bucket(key)
+        headers = getattr(response, "headers", None) or {}
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+        if status == 429 or (status in THROTTLE_STATUSES and retry_after is not None):
+            bucket.throttled(retry_after)
+            RATE_LIMIT_THROTTLED.inc(bucket=key)
+            logger.warning(
+                "%s limité (%s) : pause %ss",
+                key, status, retry_after if retry_after is not None else 'auto',
+            )
+        elif status < 400:
+            bucket.succeeded()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {key: bucket.snapshot() for key, bucket in buckets.items()}
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Limiteur partagé du processus (réglages DEFAULT_LIMITS + RATE_LIMITS)"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(_parse_limits(os.getenv("RATE_LIMITS", "")))
+    return _rate_limiter
@@ -0,0 +1,139 @@
+"""
+SINGLE-FLIGHT - Coalescence des travaux identiques en cours
+============================================================
+
+Quand plusieurs utilisateurs lancent en même temps le même travail (même
+recherche, même URL à scraper, même page à enrichir, même image), un seul
+appel s'exécute (le « leader ») ; les appels identiques arrivés pendant
+son exécution attendent son résultat au lieu de solliciter à nouveau
+SerpAPI, le site ou le LLM.
+
+Rien n'est mis en cache au-delà de l'appel en cours : une fois le leader
+terminé, l'appel suivant repart de zéro (les caches existants s'en
+chargent). Chaque appelant en attente reçoit une copie profonde du
+résultat, qu'il peut modifier sans toucher celui des autres. Une
+exception du leader est relancée chez tous les appelants.
+
+Les coroutines (`do_async`, ou `@coalesce` sur un `async def`) partagent
+les mêmes appels en cours : un appelant asynchrone en attente ne bloque
+aucun thread.
+"""
+
+import asyncio
+import copy
+import functools
+import hashlib
+import inspect
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+from fromage_metrics import SINGLEFLIGHT_CALLS
+from fromage_tracing import set_attribute
+
+
+class SingleFlight:
+    """Appels en cours d'un groupe, indexés par clé"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable):
+        """(futur de l'appel en cours, True si l'appelant en devient le leader)"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        return future, leader
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """Exécute func une seule fois pour les appels simultanés de même clé"""
+        future, leader = self._join(key)
+
+        if not leader:
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role="follower")
+            set_attribute("coalesced", True)
+            return copy.deepcopy(future.result())
+
+        SINGLEFLIGHT_CALLS.inc(group=self.name, role="leader")
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def do_async(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """Comme do() pour une coroutine `func(*args, **kwargs)`"""
+        future, leader = self._join(key)
+
+        if not leader:
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role="follower")
+            set_attribute("coalesced", True)
+            # shield : un appelant annulé n'annule pas l'appel partagé
+            return copy.deepcopy(await asyncio.shield(asyncio.wrap_future(future)))
+
+        SINGLEFLIGHT_CALLS.inc(group=self.name, role="leader")
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_group(name: str) -> SingleFlight:
+    """Groupe partagé du processus (search, scrape, enrich, image...)"""
+    group = _groups.get(name)
+    if group is None:
+        with _groups_lock:
+            group = _groups.get(name)
+            if group is None:
+                group = _groups[name] = SingleFlight(name)
+    return group
+
+
+def text_digest(*parts) -> str:
+    """Empreinte courte d'un texte long (clé de page à enrichir)"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part or "").encode("utf-8", "ignore"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def coalesce(group: str, key: Callable[..., Hashable]):
+    """Décorateur : `key(*args, **kwargs)` (mêmes arguments que la fonction) identifie le travail"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await get_group(group).do_async(key(*args, **kwargs), func, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_group(group).do(key(*args, **kwargs), func, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,279 @@
+"""
+TRAÇAGE - Spans par requête à travers generate_all, recherche, LLM, image
+==========================================================================
+
+Traçage léger sans dépendance :
+- `trace_request(nom)` ouvre la racine d'une requête (identifiant propagé
+  par contextvars dans tous les appels imbriqués, y compris les threads
+  lancés via `in_context`),
+- `span(nom, **attributs)` mesure une phase imbriquée,
+- `@traced(nom)` fait de même pour une fonction entière,
+- `set_attribute(clé, valeur)` annote le span courant (fournisseur, modèle,
+  moteur, URL, cache hit...).
+
+Exporteurs (variable TRACE_EXPORTER) :
+    ""     désactivé (défaut) : spans sans effet, coût quasi nul
+    jsonl  une ligne JSON par span dans TRACE_FILE (défaut traces.jsonl)
+    otlp   OTLP/HTTP JSON vers OTLP_ENDPOINT (défaut http://localhost:4318/v1/traces)
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fromage_logging import get_logger
+
+logger = get_logger("tracing")
+
+SERVICE_NAME = "agent-fromager"
+
+
+# ===== SPANS =====
+
+class Span:
+    """Phase mesurée d'une requête"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end",
+                 "attributes", "status", "_token")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = dict(attributes)
+        self.status = "ok"
+        self._token = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.time_ns()) - self.start) / 1e6
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.time_ns()
+        if exc is not None:
+            self.status = "error"
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        _exporter.export(self)
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start,
+            "end_ns": self.end,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Span utilisé quand le traçage est désactivé"""
+
+    __slots__ = ()
+    trace_id = None
+    span_id = None
+
+    def set(self, key: str, value: Any):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("fromager_span", default=None)
+
+
+# ===== EXPORTEURS =====
+
+class _Exporter:
+    """File d'attente + thread d'export (JSONL ou OTLP/HTTP JSON)"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.enabled = kind in ("jsonl", "otlp")
+        self.path = os.getenv("TRACE_FILE", "traces.jsonl")
+        self.endpoint = os.getenv("OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        if not self.enabled:
+            return
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            return  # Jamais bloquer la requête pour du traçage
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 256:
+                try:
+                    batch.append(self._queue.get(timeout=0.5))
+                except queue.Empty:
+                    break
+            try:
+                if self.kind == "jsonl":
+                    self._write_jsonl(batch)
+                else:
+                    self._post_otlp(batch)
+            except Exception as e:
+                logger.warning("Export des traces (%s) échoué: %s", self.kind, e)
+
+    def _write_jsonl(self, batch: List[Span]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in batch:
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+    @staticmethod
+    def _otlp_value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def _post_otlp(self, batch: List[Span]):
+        import requests
+
+        spans = []
+        for span in batch:
+            item = {
+                # OTLP attend un trace id de 32 caractères hexadécimaux
+                "traceId": span.trace_id.ljust(32, "0"),
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start),
+                "endTimeUnixNano": str(span.end),
+                "attributes": [
+                    {"key": k, "value": self._otlp_value(v)} for k, v in span.attributes.items()
+                ],
+                "status": {"code": 2 if span.status == "error" else 1},
+            }
+            if span.parent_id:
+                item["parentSpanId"] = span.parent_id
+            spans.append(item)
+
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}
+                ]},
+                "scopeSpans": [{"scope": {"name": "fromage_tracing"}, "spans": spans}],
+            }]
+        }
+        requests.post(self.endpoint, json=payload, timeout=5)
+
+
+_exporter = _Exporter(os.getenv("TRACE_EXPORTER", "").lower())
+
+
+# ===== API =====
+
+def tracing_enabled() -> bool:
+    return _exporter.enabled
+
+
+def current_span():
+    return _current_span.get() or _NOOP
+
+
+def current_request_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+def trace_request(name: str, request_id: Optional[str] = None, **attributes):
+    """Racine d'une requête (nouvel identifiant sauf si une trace est déjà en cours)"""
+    if not _exporter.enabled:
+        return _NOOP
+    parent = _current_span.get()
+    if parent is not None:
+        return Span(name, parent.trace_id, parent.span_id, attributes)
+    return Span(name, request_id or uuid.uuid4().hex, None, attributes)
+
+
+def span(name: str, **attributes):
+    """Span imbriqué dans la requête courante (racine implicite si aucune)"""
+    if not _exporter.enabled:
+        return _NOOP
+    parent = _current_span.get()
+    if parent is None:
+        return Span(name, uuid.uuid4().hex, None, attributes)
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+def set_attribute(key: str, value: Any):
+    """Annote le span courant (sans effet hors traçage)"""
+    current = _current_span.get()
+    if current is not None:
+        current.set(key, value)
+
+
+def traced(name: str, root: bool = False, **attributes):
+    """Décorateur : la fonction entière est un span (ou une racine si root=True)"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _exporter.enabled:
+                    return await func(*args, **kwargs)
+                opener = trace_request if root else span
+                with opener(name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _exporter.enabled:
+                return func(*args, **kwargs)
+            opener = trace_request if root else span
+            with opener(name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def in_context(func):
+    """Propage la requête courante dans un thread (executor.submit(in_context(f), ...))"""
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return ctx.copy().run(func, *args, **kwargs)
+    return wrapper
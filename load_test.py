@@ -0,0 +1,320 @@
+"""
+TEST DE CHARGE - Utilisateurs virtuels contre l'API Gradio
+==========================================================
+
+N utilisateurs virtuels (un client gradio_client chacun, donc une session
+chacun) enchaînent les événements de l'interface avec des temps de réflexion
+aléatoires :
+    generate  -> bouton "generate_all_btn"     (/generate_all)
+    chat      -> bouton "send_btn"             (/process_question)
+    image     -> bouton "generate_image_btn"   (/generate_and_display_image)
+    history   -> onglet Historique             (/update_interface)
+
+Pour chaque événement : débit, attente en file (soumission -> début du
+traitement), latence totale et temps de traitement (p50/p90/p95/p99), puis
+une recommandation de dimensionnement par la loi de Little
+(travailleurs occupés = débit x temps de traitement moyen).
+
+Usage :
+    # Lance l'app en local, branchée sur les services simulés, puis la charge
+    python load_test.py --serve --users 20 --duration 120 --latency "*=50,openrouter=800"
+
+    # Contre une instance déjà démarrée
+    python load_test.py --url http://127.0.0.1:7860 --users 20 --duration 120
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bench_services import StandInServices, parse_profiles, redirect_requests
+from benchmark_e2e import CHEESE_TYPES, INGREDIENT_SETS, _git_commit, load_app, percentile
+from fromage_lanes import BUSY_MESSAGE
+
+
+# Événement -> (api_name par défaut, poids par défaut dans le parcours utilisateur)
+EVENTS = {
+    "generate": ("/generate_all", 0.3),
+    "chat": ("/process_question", 0.4),
+    "image": ("/generate_and_display_image", 0.1),
+    "history": ("/update_interface", 0.2),
+}
+
+QUESTIONS = (
+    "Mon fromage a des problèmes, que faire ?",
+    "Donne-moi une recette simple",
+    "Quel vin avec un fromage de chèvre ?",
+    "Pourquoi mon caillé reste-t-il mou ?",
+)
+
+# Au-delà, la file d'attente domine : l'instance est saturée pour cet événement
+SATURATION_QUEUE_P95_S = 1.0
+HEADROOM = 1.5
+
+
+def event_args(event: str, rng: random.Random, creativity: int) -> tuple:
+    """Entrées réalistes de chaque événement (les gr.State sont gérés par le client)"""
+    if event == "generate":
+        return (
+            rng.choice(INGREDIENT_SETS), rng.choice(CHEESE_TYPES), "", creativity,
+            "Équilibré", 4, "Neutre", "🧀 Amateur", False,
+        )
+    if event == "chat":
+        return (rng.choice(QUESTIONS),)
+    if event == "image":
+        return (f"Fromage artisanal affiné n°{rng.randrange(1000)}", "realistic", "1024x1024")
+    return ()
+
+
+# ===== UTILISATEUR VIRTUEL =====
+
+class Sample:
+    __slots__ = ("event", "start", "queue_wait", "latency", "error")
+
+    def __init__(self, event, start, queue_wait, latency, error=None):
+        self.event = event
+        self.start = start
+        self.queue_wait = queue_wait
+        self.latency = latency
+        self.error = error
+
+
+def call_event(client, api_name: str, args: tuple, event: str, poll: float = 0.02) -> Sample:
+    """Soumet un événement et mesure l'attente en file puis la latence totale"""
+    from gradio_client.utils import Status
+
+    start = time.perf_counter()
+    processing_at = None
+    try:
+        job = client.submit(*args, api_name=api_name)
+        while not job.done():
+            if processing_at is None and job.status().code == Status.PROCESSING:
+                processing_at = time.perf_counter()
+            time.sleep(poll)
+        result = job.result()
+        # Voie saturée : réponse « occupé » renvoyée sans erreur HTTP, comptée comme refus
+        values = result if isinstance(result, (list, tuple)) else [result]
+        error = "busy: voie saturée" if BUSY_MESSAGE in values else None
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)[:120]}"
+    end = time.perf_counter()
+    # Événements sans file (queue=False) : pas d'état PROCESSING observé
+    queue_wait = (processing_at or start) - start
+    return Sample(event, start, queue_wait, end - start, error)
+
+
+def virtual_user(user_id: int, url: str, deadline: float, weights: Dict[str, float], api_names: Dict[str, str],
+                 think_time: float, creativity: int, samples: List[Sample], lock: threading.Lock):
+    from gradio_client import Client
+
+    rng = random.Random(user_id)
+    with contextlib.redirect_stdout(io.StringIO()):
+        client = Client(url, verbose=False)
+    events, event_weights = zip(*weights.items())
+
+    # Arrivées étalées : les utilisateurs ne cliquent pas tous à la même seconde
+    time.sleep(rng.uniform(0, think_time))
+    while time.perf_counter() < deadline:
+        event = rng.choices(events, event_weights)[0]
+        sample = call_event(client, api_names[event], event_args(event, rng, creativity), event)
+        with lock:
+            samples.append(sample)
+        # Temps de réflexion exponentiel (lecture de la recette, saisie...), au moins 1 s
+        time.sleep(max(1.0, rng.expovariate(1 / think_time)) if think_time > 0 else 0)
+
+
+# ===== RAPPORT =====
+
+def _distribution(values: List[float]) -> Dict:
+    ordered = sorted(v * 1000 for v in values)
+    return {
+        "mean": round(sum(ordered) / len(ordered), 1) if ordered else 0.0,
+        **{f"p{p}": round(percentile(ordered, p), 1) for p in (50, 90, 95, 99)},
+        "max": round(ordered[-1], 1) if ordered else 0.0,
+    }
+
+
+def summarize_load(samples: List[Sample], duration: float) -> Dict[str, Dict]:
+    per_event: Dict[str, Dict] = {}
+    for event in EVENTS:
+        event_samples = [s for s in samples if s.event == event]
+        if not event_samples:
+            continue
+        ok = [s for s in event_samples if not s.error]
+        processing = [s.latency - s.queue_wait for s in ok]
+        throughput = len(ok) / duration if duration > 0 else 0.0
+        mean_processing = sum(processing) / len(processing) if processing else 0.0
+        busy_workers = throughput * mean_processing  # Loi de Little
+        queue_p95 = percentile(sorted(s.queue_wait for s in ok), 95)
+        per_event[event] = {
+            "calls": len(event_samples),
+            "errors": len(event_samples) - len(ok),
+            "throughput_rps": round(throughput, 3),
+            "queue_wait_ms": _distribution([s.queue_wait for s in ok]),
+            "latency_ms": _distribution([s.latency for s in ok]),
+            "processing_ms": _distribution(processing),
+            "busy_workers": round(busy_workers, 2),
+            "recommended_concurrency": max(1, math.ceil(busy_workers * HEADROOM)),
+            "saturated": queue_p95 > SATURATION_QUEUE_P95_S,
+            "sample_errors": sorted({s.error for s in event_samples if s.error})[:3],
+        }
+    return per_event
+
+
+def sizing_advice(per_event: Dict[str, Dict], users: int) -> List[str]:
+    advice = []
+    total_workers = sum(e["busy_workers"] for e in per_event.values())
+    for event, stats in per_event.items():
+        line = (
+            f"{event}: {stats['busy_workers']} travailleurs occupés en moyenne "
+            f"-> concurrency_limit >= {stats['recommended_concurrency']}"
+        )
+        if stats["saturated"]:
+            line += f" (SATURÉ : attente p95 {stats['queue_wait_ms']['p95']:.0f} ms)"
+        advice.append(line)
+    advice.append(
+        f"Total : {total_workers:.1f} travailleurs occupés pour {users} utilisateurs "
+        f"(~{total_workers / users if users else 0:.2f} par utilisateur actif) -> "
+        f"prévoir {max(1, math.ceil(total_workers * HEADROOM))} threads de travail."
+    )
+    return advice
+
+
+# ===== LANCEMENT DE L'APP SOUS TEST =====
+
+def serve_app(port: int, profiles, concurrency_limit: Optional[int], kie_pending_polls: int):
+    """Démarre l'app dans ce processus, branchée sur les services simulés. Retourne (url, arrêt)."""
+    services = StandInServices(profiles, kie_pending_polls=kie_pending_polls).start()
+    gradio_netloc = f"127.0.0.1:{port}"
+    restore = redirect_requests(services, passthrough=(gradio_netloc, f"localhost:{port}"))
+    workdir = tempfile.mkdtemp(prefix="fromager-load-")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module, _ = load_app(workdir)
+        interface = app_module.create_interface()
+        if concurrency_limit:
+            interface.queue(default_concurrency_limit=concurrency_limit)
+        interface.launch(
+            server_name="127.0.0.1", server_port=port, prevent_thread_lock=True, quiet=True,
+            max_threads=app_module.lane_max_threads(),
+        )
+
+    def stop():
+        interface.close()
+        restore()
+        services.stop()
+
+    print(f"🧪 App sous test sur http://{gradio_netloc} (services simulés {services.base_url}, répertoire {workdir})")
+    return f"http://{gradio_netloc}", stop
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    weights = {event: weight for event, (_, weight) in EVENTS.items()}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        event, _, value = item.partition("=")
+        if event not in EVENTS:
+            raise ValueError(f"Événement inconnu: {event} ({', '.join(EVENTS)})")
+        weights[event] = float(value)
+    return {event: weight for event, weight in weights.items() if weight > 0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge multi-utilisateurs de l'app Gradio")
+    parser.add_argument("--url", default="http://127.0.0.1:7860")
+    parser.add_argument("--serve", action="store_true", help="Lancer l'app localement avec les services simulés")
+    parser.add_argument("--port", type=int, default=7861)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=60, help="Durée de la charge (s)")
+    parser.add_argument("--think-time", type=float, default=5.0, help="Temps de réflexion moyen (s)")
+    parser.add_argument("--mix", default="", help='Poids des événements, ex: "generate=0.5,chat=0.3,image=0,history=0.2"')
+    parser.add_argument("--api-names", default="", help='Surcharges, ex: "chat=/process_question_1"')
+    parser.add_argument("--creativity", type=int, default=1)
+    parser.add_argument("--concurrency-limit", type=int, default=None, help="Avec --serve : default_concurrency_limit")
+    parser.add_argument("--latency", default="", help='Avec --serve : latences simulées, ex: "*=50,openrouter=800"')
+    parser.add_argument("--errors", default="", help='Avec --serve : erreurs injectées, ex: "openrouter=0.1:402"')
+    parser.add_argument("--kie-pending-polls", type=int, default=0)
+    parser.add_argument("--output", default="load_test.json")
+    args = parser.parse_args(argv)
+
+    weights = parse_weights(args.mix)
+    api_names = {event: api_name for event, (api_name, _) in EVENTS.items()}
+    for item in filter(None, (part.strip() for part in args.api_names.split(","))):
+        event, _, api_name = item.partition("=")
+        api_names[event] = api_name
+
+    output = os.path.abspath(args.output)  # Avant --serve, qui change de répertoire
+    url, stop = args.url, None
+    if args.serve:
+        profiles = parse_profiles(args.latency, args.errors)
+        url, stop = serve_app(args.port, profiles, args.concurrency_limit, args.kie_pending_polls)
+
+    samples: List[Sample] = []
+    lock = threading.Lock()
+    print(f"👥 {args.users} utilisateurs virtuels pendant {args.duration:.0f} s sur {url} (mix {weights})")
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(
+            target=virtual_user,
+            args=(i, url, deadline, weights, api_names, args.think_time, args.creativity, samples, lock),
+            name=f"vu-{i}", daemon=True,
+        )
+        for i in range(args.users)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        if stop:
+            stop()
+    # Débit sur la durée réelle (les derniers appels peuvent dépasser l'échéance)
+    elapsed = time.perf_counter() - started
+
+    per_event = summarize_load(samples, elapsed)
+    advice = sizing_advice(per_event, args.users)
+    for event, stats in per_event.items():
+        print(
+            f"  {event:<8} {stats['calls']:>5} appels • {stats['throughput_rps']:.2f} req/s • "
+            f"file p95 {stats['queue_wait_ms']['p95']:.0f} ms • latence p50/p95 "
+            f"{stats['latency_ms']['p50']:.0f}/{stats['latency_ms']['p95']:.0f} ms • erreurs {stats['errors']}"
+        )
+    print("\n📐 Dimensionnement :")
+    for line in advice:
+        print(f"   - {line}")
+
+    report = {
+        "kind": "load",
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "git_commit": _git_commit(),
+            "url": url,
+            "served_locally": args.serve,
+            "users": args.users,
+            "duration_s": round(elapsed, 1),
+            "think_time_s": args.think_time,
+            "mix": weights,
+            "api_names": api_names,
+            "concurrency_limit": args.concurrency_limit,
+        },
+        "events": per_event,
+        "sizing": advice,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"📄 Rapport écrit: {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
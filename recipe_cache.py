@@ -0,0 +1,135 @@
+"""
+CACHE DE GÉNÉRATION - Recettes complètes par entrées normalisées
+=================================================================
+
+Cache LRU + TTL des recettes générées, indexé par le tuple normalisé
+(ingrédients, type, contraintes, créativité, texture, affinage, épices, profil).
+
+- Créativité 0 (base statique, déterministe) : toujours servie depuis le cache.
+- Modes LLM (créativité >= 1) : "réutiliser la dernière variante" ou
+  "forcer une nouvelle variante" au choix de l'utilisateur.
+
+Configuration par variables d'environnement :
+    GENERATION_CACHE_SIZE  (défaut 256 entrées)
+    GENERATION_CACHE_TTL   (défaut 3600 s, 0 = pas d'expiration)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class GenerationCache:
+    """Cache LRU avec expiration, thread-safe"""
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        if max_size is None:
+            max_size = int(os.getenv("GENERATION_CACHE_SIZE", "256"))
+        if ttl is None:
+            ttl = float(os.getenv("GENERATION_CACHE_TTL", "3600"))
+
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.bypass = 0
+
+    # ===== CLÉ =====
+
+    @staticmethod
+    def make_key(
+        ingredients,
+        cheese_type,
+        constraints="",
+        creativity=0,
+        texture=None,
+        affinage=None,
+        spice=None,
+        profile=None,
+    ) -> Tuple:
+        """Tuple normalisé : casse, espaces et ordre des ingrédients ignorés"""
+        if isinstance(ingredients, str):
+            ingredients = ingredients.split(",")
+        ingredients_norm = tuple(
+            sorted(ing.strip().lower() for ing in ingredients if ing and ing.strip())
+        )
+
+        def _norm(value):
+            return " ".join(str(value).lower().split()) if value is not None else None
+
+        return (
+            ingredients_norm,
+            _norm(cheese_type),
+            _norm(constraints) or "",
+            int(creativity or 0),
+            _norm(texture),
+            int(affinage) if affinage is not None else None,
+            _norm(spice),
+            _norm(profile),
+        )
+
+    @staticmethod
+    def is_deterministic(creativity) -> bool:
+        """Créativité 0 = base statique seule, résultat reproductible"""
+        return int(creativity or 0) == 0
+
+    def should_reuse(self, creativity, reuse_variant: bool = False) -> bool:
+        """Doit-on consulter le cache pour cette génération ?"""
+        if self.is_deterministic(creativity) or reuse_variant:
+            return True
+        with self._lock:
+            self.bypass += 1
+        return False
+
+    # ===== ACCÈS =====
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Retourne la valeur en cache (ou None), compte hit/miss"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                stored_at, value = item
+                if self.ttl and time.time() - stored_at > self.ttl:
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key: Tuple, value: Any):
+        """Ajoute / remplace une entrée (la plus récente variante gagne)"""
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Vide le cache (les compteurs sont conservés)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs pour l'onglet Historique"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypass": self.bypass,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+# Instance partagée par tout le processus (toutes les instances d'agent)
+generation_cache = GenerationCache()
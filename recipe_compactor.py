@@ -0,0 +1,228 @@
+"""
+COMPACTEUR DE RECETTES - Dédoublonnage hors du chemin de lecture
+=================================================================
+
+Les fichiers de recettes (unified_recipes_history.json,
+complete_knowledge_base.json) ne sont plus réécrits à la lecture :
+
+- à l'insertion, `append_unique` refuse les entrées dont la clé de
+  dédoublonnage (titre normalisé + date à la minute) existe déjà ;
+- en tâche de fond, `compact` dédoublonne, trie par date et réécrit le
+  fichier de façon atomique (fichier .tmp + os.replace), toutes les
+  `interval` secondes ou après `every_writes` écritures.
+
+Lectures et écritures passent par le stockage partagé (recipe_store) :
+plusieurs processus ou répliques ne perdent aucune écriture.
+
+Configuration par variables d'environnement :
+    COMPACT_INTERVAL      (défaut 600 s, 0 = pas de minuterie)
+    COMPACT_EVERY_WRITES  (défaut 50 écritures, 0 = désactivé)
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fromage_logging import get_logger
+from recipe_stats import get_stats
+from recipe_store import get_store
+
+logger = get_logger("compactor")
+
+
+# Emojis retirés des titres avant comparaison
+_TITLE_EMOJIS = "🤖🧪📅📋🥛🐄🧀✨🎉📊🔍🗑️✅❌"
+
+
+def _recipe_date(recipe: Dict) -> str:
+    return str(recipe.get('generated_at') or recipe.get('date_creation') or recipe.get('date') or '')
+
+
+def recipe_dedup_key(recipe: Dict) -> str:
+    """Clé unique : titre normalisé (sans emojis, casse, espaces) + date à la minute"""
+    title = str(recipe.get('title', ''))
+    for emoji in _TITLE_EMOJIS:
+        title = title.replace(emoji, "")
+    title = " ".join(title.split()).lower()
+
+    date = _recipe_date(recipe)
+    date_minute = date[:16]  # Format: 2026-02-12T18:44
+    return f"{title}|{date_minute}"
+
+
+class RecipeCompactor:
+    """Écritures dédoublonnées + compaction atomique d'un fichier JSON de recettes"""
+
+    def __init__(
+        self,
+        path: str,
+        interval: Optional[float] = None,
+        every_writes: Optional[int] = None,
+    ):
+        if interval is None:
+            interval = float(os.getenv("COMPACT_INTERVAL", "600"))
+        if every_writes is None:
+            every_writes = int(os.getenv("COMPACT_EVERY_WRITES", "50"))
+
+        self.path = path
+        self.interval = interval
+        self.every_writes = every_writes
+
+        self._lock = threading.RLock()
+        self._writes_since_compact = 0
+        self._timer_started = False
+        self._stop = threading.Event()
+        self._pending = threading.Event()
+
+        self.compactions = 0
+        self.removed_total = 0
+
+    # ===== INSERTION =====
+
+    def append_unique(
+        self,
+        records: List[Dict],
+        max_records: Optional[int] = None,
+        drop: Optional[Callable[[Dict], bool]] = None,
+        unique_by: Optional[Callable[[Dict], Any]] = None,
+    ) -> List[Dict]:
+        """
+        Ajoute les recettes dont la clé n'existe pas encore (une seule écriture)
+
+        Args:
+            records: nouvelles recettes
+            max_records: ne garder que les N plus récentes (ex: 100)
+            drop: prédicat des entrées existantes à retirer avant l'ajout
+            unique_by: clé supplémentaire refusée si déjà présente (ex: URL),
+                vérifiée sous le même verrou que l'insertion
+
+        Returns:
+            Les recettes effectivement ajoutées
+        """
+        def apply(existing):
+            removed = []
+            if drop:
+                kept = [r for r in existing if not drop(r)]
+                removed = [r for r in existing if drop(r)]
+                existing = kept
+
+            seen = {recipe_dedup_key(r) for r in existing}
+            seen_extra = {unique_by(r) for r in existing} - {None, ""} if unique_by else set()
+            added = []
+            for record in records:
+                key = recipe_dedup_key(record)
+                extra = unique_by(record) if unique_by else None
+                if key in seen or (extra and extra in seen_extra):
+                    continue
+                seen.add(key)
+                if extra:
+                    seen_extra.add(extra)
+                added.append(record)
+
+            if not added and not removed:
+                return None, (added, removed)
+
+            history = existing + added
+            if max_records and len(history) > max_records:
+                removed.extend(history[:-max_records])
+                history = history[-max_records:]
+            return history, (added, removed)
+
+        with self._lock:
+            # Lecture-modification-écriture sous le verrou du stockage (tous processus),
+            # compteurs mis à jour sous ce même verrou
+            added, removed = get_store().update(
+                self.path, apply, on_write=get_stats(self.path).hook(lambda changes: changes)
+            )
+
+        self.notify_write(len(added))
+        return added
+
+    # ===== COMPACTION =====
+
+    def compact(self) -> Tuple[int, int]:
+        """Dédoublonne, trie par date (stable) et réécrit atomiquement. Retourne (avant, après)."""
+        def apply(records):
+            seen = set()
+            cleaned = []
+            for r in records:
+                key = recipe_dedup_key(r)
+                if key not in seen:
+                    cleaned.append(r)
+                    seen.add(key)
+
+            ordered = sorted(cleaned, key=_recipe_date)
+            return (ordered if ordered != records else None), (records, cleaned, ordered)
+
+        with self._lock:
+            records, cleaned, ordered = get_store().update(self.path, apply, on_write=get_stats(self.path).hook())
+
+            self._writes_since_compact = 0
+            self.compactions += 1
+            self.removed_total += len(records) - len(cleaned)
+
+        removed = len(records) - len(cleaned)
+        if removed:
+            logger.info(
+                "Compaction %s : %s doublons supprimés, %s recettes conservées",
+                self.path, removed, len(cleaned),
+            )
+        return len(records), len(cleaned)
+
+    def notify_write(self, count: int = 1):
+        """Compte les écritures ; déclenche une compaction en arrière-plan au seuil"""
+        if not count:
+            return
+        with self._lock:
+            self._writes_since_compact += count
+            due = self.every_writes and self._writes_since_compact >= self.every_writes
+        if due:
+            self.start()
+            self._pending.set()
+
+    # ===== TÂCHE DE FOND =====
+
+    def start(self):
+        """Lance le thread de compaction (idempotent)"""
+        with self._lock:
+            if self._timer_started:
+                return
+            self._timer_started = True
+        threading.Thread(target=self._run, name=f"compactor-{os.path.basename(self.path)}", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self._pending.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._pending.wait(self.interval if self.interval > 0 else None)
+            self._pending.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.compact()
+            except Exception as e:
+                logger.warning("Compaction %s échouée: %s", self.path, e)
+
+
+_compactors: Dict[str, RecipeCompactor] = {}
+_compactors_lock = threading.Lock()
+
+
+def get_compactor(path: str) -> RecipeCompactor:
+    """Compacteur partagé pour un fichier (un seul verrou par fichier dans le processus)"""
+    key = os.path.abspath(path)
+    compactor = _compactors.get(key)
+    if compactor is None:
+        with _compactors_lock:
+            compactor = _compactors.get(key)
+            if compactor is None:
+                compactor = RecipeCompactor(path)
+                _compactors[key] = compactor
+    return compactor
+
+
+# Compacteurs des deux fichiers de recettes
+history_compactor = get_compactor("unified_recipes_history.json")
+kb_compactor = get_compactor("complete_knowledge_base.json")
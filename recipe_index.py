@@ -0,0 +1,293 @@
+"""
+INDEX DES RECETTES - Pagination et filtres pour l'onglet dynamique
+===================================================================
+
+Charge complete_knowledge_base.json (recettes statiques) et
+unified_recipes_history.json (recettes dynamiques) via le stockage partagé
+(recipe_store), uniquement quand leur version change (fichier local ou
+document SQLite écrit par une autre réplique), et maintient :
+- des index par lait et par type de pâte (positions dans la liste),
+- des ordres de tri pré-calculés par clé (calculés à la demande, puis gardés).
+
+Une requête ne touche donc que les positions filtrées, puis la page visible.
+
+HistoryIdIndex fait de même pour recipes_history.json : dictionnaire
+id -> entrée + petit LRU des textes de recette déjà servis, pour que la
+sélection d'une recette ne relise pas tout l'historique.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from recipe_store import get_store
+
+
+# Clés de tri disponibles (clé -> libellé affiché)
+SORT_KEYS = {
+    "recent": "📅 Plus récentes",
+    "ancien": "🕰️ Plus anciennes",
+    "titre": "🔤 Titre (A-Z)",
+    "score": "⭐ Meilleur score",
+}
+
+
+_NOT_LOADED = object()
+
+
+def _read_versioned(name: str) -> Tuple[List[Dict], Any]:
+    """(recettes, version) du document ; liste vide si illisible"""
+    try:
+        return get_store().read_versioned(name)
+    except Exception:
+        return [], get_store().version(name)
+
+
+def _recipe_score(recipe: Dict) -> float:
+    score = recipe.get('score')
+    return score if isinstance(score, (int, float)) else 0
+
+
+class RecipeIndex:
+    """Recettes statiques + dynamiques indexées, rechargées si les fichiers changent"""
+
+    def __init__(
+        self,
+        static_file: str = "complete_knowledge_base.json",
+        history_file: str = "unified_recipes_history.json",
+    ):
+        self.static_file = static_file
+        self.history_file = history_file
+
+        self._lock = threading.Lock()
+        self._signature = None
+        self.recipes: List[Dict] = []
+        self.by_lait: Dict[str, List[int]] = {}
+        self.by_type_pate: Dict[str, List[int]] = {}
+        self._orders: Dict[str, List[int]] = {}
+
+    # ===== CHARGEMENT =====
+
+    def refresh(self) -> bool:
+        """Recharge si un des documents a changé. Retourne True si rechargé."""
+        store = get_store()
+        signature = (store.version(self.static_file), store.version(self.history_file))
+        if signature == self._signature:
+            return False
+
+        with self._lock:
+            if signature == self._signature:
+                return False
+
+            static, static_version = _read_versioned(self.static_file)
+            dynamic, dynamic_version = _read_versioned(self.history_file)
+
+            recipes = []
+            for r in static:
+                r['is_static'] = True
+                recipes.append(r)
+            for r in dynamic:
+                if r.get('title'):  # Juste un titre = OK
+                    r['is_static'] = False
+                    recipes.append(r)
+
+            by_lait, by_type_pate = {}, {}
+            for position, r in enumerate(recipes):
+                by_lait.setdefault(r.get('lait', 'non spécifié'), []).append(position)
+                by_type_pate.setdefault(r.get('type_pate', 'non spécifié'), []).append(position)
+
+            self.recipes = recipes
+            self.by_lait = by_lait
+            self.by_type_pate = by_type_pate
+            self._orders = {}
+            # Versions effectivement lues : une écriture survenue entre-temps sera rechargée
+            self._signature = (static_version, dynamic_version)
+        return True
+
+    # ===== REQUÊTES =====
+
+    def _order(self, sort_key: str) -> List[int]:
+        """Positions triées selon la clé (mises en cache jusqu'au prochain rechargement)"""
+        order = self._orders.get(sort_key)
+        if order is not None:
+            return order
+
+        positions = range(len(self.recipes))
+        if sort_key == "ancien":
+            order = list(positions)
+        elif sort_key == "titre":
+            order = sorted(positions, key=lambda p: str(self.recipes[p].get('title', '')).lower())
+        elif sort_key == "score":
+            order = sorted(reversed(positions), key=lambda p: -_recipe_score(self.recipes[p]))
+        else:  # "recent" : les plus récentes en premier (ordre d'ajout inversé)
+            order = list(reversed(positions))
+
+        self._orders[sort_key] = order
+        return order
+
+    def _filtered(self, lait: Optional[str], type_pate: Optional[str], sort_key: str) -> List[int]:
+        """Positions filtrées, dans l'ordre du tri demandé"""
+        selected = None
+        for value, index in ((lait, self.by_lait), (type_pate, self.by_type_pate)):
+            if value and value != "Tous":
+                positions = set(index.get(value, []))
+                selected = positions if selected is None else selected & positions
+
+        order = self._order(sort_key if sort_key in SORT_KEYS else "recent")
+        if selected is None:
+            return order
+        return [p for p in order if p in selected]
+
+    def query(
+        self,
+        lait: Optional[str] = None,
+        type_pate: Optional[str] = None,
+        sort_key: str = "recent",
+        offset: int = 0,
+        limit: int = 20,
+    ) -> Tuple[List[Dict], int]:
+        """
+        Retourne (recettes de la tranche, nombre total après filtres)
+
+        Les filtres "Tous"/None sont ignorés ; sinon comparaison exacte.
+        """
+        self.refresh()
+        positions = self._filtered(lait, type_pate, sort_key)
+        return [self.recipes[p] for p in positions[offset:offset + limit]], len(positions)
+
+    def page(
+        self,
+        lait: Optional[str] = None,
+        type_pate: Optional[str] = None,
+        sort_key: str = "recent",
+        page: int = 1,
+        page_size: int = 20,
+    ) -> Tuple[List[Dict], int, int, int]:
+        """
+        Retourne (recettes de la page, total filtré, page affichée, nombre de pages)
+
+        La page demandée est ramenée dans [1, nombre de pages].
+        """
+        self.refresh()
+        positions = self._filtered(lait, type_pate, sort_key)
+        total = len(positions)
+        page_count = max(1, (total + page_size - 1) // page_size)
+        page = min(max(1, page), page_count)
+        offset = (page - 1) * page_size
+        return [self.recipes[p] for p in positions[offset:offset + page_size]], total, page, page_count
+
+    def lait_counts(self) -> Dict[str, int]:
+        self.refresh()
+        return {lait: len(positions) for lait, positions in self.by_lait.items()}
+
+    def type_pate_values(self) -> List[str]:
+        self.refresh()
+        return sorted(str(t) for t in self.by_type_pate if t)
+
+    def __len__(self):
+        self.refresh()
+        return len(self.recipes)
+
+
+# Index partagé par tout le processus
+dynamic_recipe_index = RecipeIndex()
+
+
+# ===== HISTORIQUE PERSONNEL : ACCÈS PAR ID =====
+
+# Champs contenant le texte complet, par ordre de priorité
+RECIPE_TEXT_KEYS = ('recipe_complete', 'recipe', 'content', 'response')
+
+
+class HistoryIdIndex:
+    """Index id -> entrée de l'historique, rechargé si le document change"""
+
+    def __init__(self, path: str = "recipes_history.json", text_cache_size: int = 32):
+        self.path = path
+        self.text_cache_size = max(1, text_cache_size)
+
+        self._lock = threading.Lock()
+        self._signature: Any = _NOT_LOADED  # version None = document absent, à distinguer
+        self._by_id: Dict[str, Dict] = {}
+        self._ids: List = []
+        self._texts: "OrderedDict[str, str]" = OrderedDict()
+
+    def refresh(self) -> bool:
+        """Recharge si le document a changé. Retourne True si rechargé."""
+        signature = get_store().version(self.path)
+        if signature == self._signature:
+            return False
+
+        with self._lock:
+            if signature == self._signature:
+                return False
+
+            history, signature = _read_versioned(self.path)
+
+            by_id = {}
+            ids = []
+            for entry in history:
+                entry_id = entry.get('id')
+                by_id[str(entry_id)] = entry
+                ids.append(entry_id)
+
+            self._by_id = by_id
+            self._ids = ids
+            # Les ids sont uniques (horodatage) : un texte reste valable tant que l'id existe
+            for key in [k for k in self._texts if k not in by_id]:
+                del self._texts[key]
+            self._signature = signature
+        return True
+
+    def get(self, recipe_id) -> Optional[Dict]:
+        """Entrée de l'historique pour cet id (int ou str), ou None"""
+        self.refresh()
+        return self._by_id.get(str(recipe_id))
+
+    def get_text(self, recipe_id) -> Optional[str]:
+        """Texte complet de la recette (LRU), None si absente ou sans contenu"""
+        key = str(recipe_id)
+        self.refresh()
+        with self._lock:
+            text = self._texts.get(key)
+            if text is not None:
+                self._texts.move_to_end(key)
+                return text
+
+        entry = self._by_id.get(key)
+        if entry is None:
+            return None
+        for field in RECIPE_TEXT_KEYS:
+            if entry.get(field):
+                text = entry[field]
+                break
+        else:
+            return None
+
+        with self._lock:
+            self._texts[key] = text
+            while len(self._texts) > self.text_cache_size:
+                self._texts.popitem(last=False)
+        return text
+
+    def ids(self) -> List:
+        self.refresh()
+        return list(self._ids)
+
+
+_history_indexes: Dict[str, HistoryIdIndex] = {}
+_history_indexes_lock = threading.Lock()
+
+
+def get_history_index(path: str = "recipes_history.json") -> HistoryIdIndex:
+    """Index partagé par fichier d'historique (toutes les instances d'agent)"""
+    key = os.path.abspath(path)
+    index = _history_indexes.get(key)
+    if index is None:
+        with _history_indexes_lock:
+            index = _history_indexes.get(key)
+            if index is None:
+                index = HistoryIdIndex(path)
+                _history_indexes[key] = index
+    return index
@@ -0,0 +1,227 @@
+"""
+STATISTIQUES DES RECETTES - Compteurs maintenus à chaque sauvegarde
+====================================================================
+
+Compteurs par lait, type de pâte, source, profil et jour, tenus à jour
+de façon incrémentale à chaque écriture d'un fichier de recettes et
+persistés à côté de lui (recipes_history.json -> recipes_history.stats.json).
+
+Lecture en O(1) : l'onglet Historique n'a plus besoin de relire ni de
+trier les fichiers pour afficher des totaux.
+
+Les écarts d'une écriture sont appliqués sous le verrou du stockage
+(`get_store().update(nom, f, on_write=get_stats(nom).hook(...))`), et
+seulement si les compteurs correspondent à la version lue avant cette
+écriture. Sinon (écriture passée à côté d'eux, autre processus ou
+réplique), ils sont reconstruits une seule fois à partir du document, lu
+via le stockage partagé (recipe_store) et repéré par sa version.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fromage_logging import get_logger
+from recipe_store import WriteHook, get_store
+
+logger = get_logger("stats")
+
+
+# Dimensions comptées pour chaque recette
+DIMENSIONS = ("lait", "type_pate", "source_type", "profile", "day")
+
+NON_SPECIFIE = "non spécifié"
+
+
+def _dimension_values(recipe: Dict) -> Dict[str, str]:
+    """Valeur de chaque dimension pour une recette (clés des différents formats)"""
+    date = str(recipe.get('generated_at') or recipe.get('date_creation') or recipe.get('date') or '')
+    return {
+        "lait": recipe.get('lait') or NON_SPECIFIE,
+        "type_pate": recipe.get('type_pate') or recipe.get('type') or NON_SPECIFIE,
+        "source_type": recipe.get('source_type') or recipe.get('source') or NON_SPECIFIE,
+        "profile": recipe.get('profile') or NON_SPECIFIE,
+        "day": date[:10] or NON_SPECIFIE,
+    }
+
+
+class RecipeStats:
+    """Agrégats d'un fichier de recettes (ou d'une liste en mémoire si path=None)"""
+
+    def __init__(self, store_path: Optional[str] = None):
+        self.store_path = store_path
+        self.stats_path = (
+            os.path.splitext(store_path)[0] + ".stats.json" if store_path else None
+        )
+
+        self._lock = threading.Lock()
+        self._loaded = store_path is None
+        self._signature = None
+        self.total = 0
+        self.counts: Dict[str, Dict[str, int]] = {dim: {} for dim in DIMENSIONS}
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "RecipeStats":
+        """Agrégats en mémoire d'une liste fixe (ex: recettes de référence)"""
+        stats = cls()
+        stats._apply(records, 1)
+        return stats
+
+    # ===== PERSISTANCE =====
+
+    def _store_signature(self):
+        return get_store().version(self.store_path)
+
+    def _load_store(self) -> Tuple[List[Dict], Any]:
+        """(recettes, version) lues ensemble via le stockage partagé"""
+        try:
+            return get_store().read_versioned(self.store_path)
+        except Exception:
+            return [], self._store_signature()
+
+    def _save(self, signature):
+        self._signature = signature
+        if not self.stats_path:
+            return
+        payload = {"signature": self._signature, "total": self.total, "counts": self.counts}
+        try:
+            tmp_file = f"{self.stats_path}.{os.getpid()}.tmp"  # un fichier par processus (répliques sur le même disque)
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_file, self.stats_path)
+        except Exception as e:
+            logger.warning("Sauvegarde des statistiques échouée: %s", e)
+
+    def _load_persisted(self, signature) -> bool:
+        """Compteurs persistés, s'ils correspondent à la version courante du document"""
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return False
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        except Exception:
+            return False
+        if payload.get("signature") != signature:
+            return False
+        self.total = payload.get("total", 0)
+        self.counts = {dim: payload.get("counts", {}).get(dim, {}) for dim in DIMENSIONS}
+        self._signature = signature
+        self._loaded = True
+        return True
+
+    def refresh(self):
+        """Aligne les compteurs sur la version courante du document (relu seulement s'il a changé)"""
+        if self.store_path is None:
+            return
+        signature = self._store_signature()
+        with self._lock:
+            if self._loaded and signature == self._signature:
+                return
+            if not self._loaded and self._load_persisted(signature):
+                return
+        # Lecture hors du verrou : une écriture en cours (hook sous le verrou du stockage) n'attend pas
+        records, signature = self._load_store()
+        with self._lock:
+            self._rebuild(records, signature)
+
+    # ===== MISES À JOUR =====
+
+    def _apply(self, records: Iterable[Dict], delta: int):
+        for recipe in records:
+            self.total += delta
+            for dim, value in _dimension_values(recipe).items():
+                bucket = self.counts[dim]
+                count = bucket.get(value, 0) + delta
+                if count > 0:
+                    bucket[value] = count
+                else:
+                    bucket.pop(value, None)
+
+    def _rebuild(self, records: Iterable[Dict], signature):
+        self.total = 0
+        self.counts = {dim: {} for dim in DIMENSIONS}
+        self._apply(records, 1)
+        self._loaded = True
+        self._save(signature)
+
+    def update(self, added: Iterable[Dict] = (), removed: Iterable[Dict] = (),
+               before=None, after=None, records: Optional[List[Dict]] = None):
+        """
+        Applique les écarts d'une écriture (appelé par hook(), sous le verrou du stockage)
+
+        Args:
+            before/after: versions du document avant et après l'écriture
+            records: contenu écrit, pour reconstruire si `before` ne correspond pas
+        """
+        with self._lock:
+            if self._loaded and before is not None and before == self._signature:
+                self._apply(removed, -1)
+                self._apply(added, 1)
+                self._save(after)
+                return
+        # Compteurs d'une autre version (écriture passée à côté d'eux) : reconstruction
+        if records is None:
+            records, after = self._load_store()
+        with self._lock:
+            self._rebuild(records, after)
+
+    def hook(self, changes: Optional[Callable[[Any], Tuple[Iterable[Dict], Iterable[Dict]]]] = None) -> WriteHook:
+        """
+        on_write pour get_store().update/write sur ce fichier
+
+        `changes(résultat)` -> (recettes ajoutées, recettes retirées) ;
+        sans `changes`, les compteurs sont recalculés sur le contenu écrit.
+        """
+        def on_write(before, after, records, result):
+            if changes is None:
+                with self._lock:
+                    self._rebuild(records, after)
+                return
+            added, removed = changes(result)
+            self.update(added, removed, before=before, after=after, records=records)
+        return on_write
+
+    def rebuild(self, records: Optional[Iterable[Dict]] = None):
+        """Recalcule entièrement depuis `records`, ou depuis le document"""
+        if records is None:
+            records, signature = self._load_store()
+        else:
+            signature = self._store_signature()
+        with self._lock:
+            self._rebuild(records, signature)
+
+    # ===== LECTURE O(1) =====
+
+    def count(self) -> int:
+        self.refresh()
+        with self._lock:
+            return self.total
+
+    def by(self, dimension: str) -> Dict[str, int]:
+        """Compteurs d'une dimension (copie)"""
+        self.refresh()
+        with self._lock:
+            return dict(self.counts.get(dimension, {}))
+
+    def snapshot(self) -> Dict:
+        self.refresh()
+        with self._lock:
+            return {"total": self.total, **{dim: dict(self.counts[dim]) for dim in DIMENSIONS}}
+
+
+_stats: Dict[str, RecipeStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_stats(store_path: str) -> RecipeStats:
+    """Agrégats partagés d'un fichier de recettes (une instance par fichier)"""
+    key = os.path.abspath(store_path)
+    stats = _stats.get(key)
+    if stats is None:
+        with _stats_lock:
+            stats = _stats.get(key)
+            if stats is None:
+                stats = RecipeStats(store_path)
+                _stats[key] = stats
+    return stats
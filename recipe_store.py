@@ -0,0 +1,246 @@
+"""
+STOCKAGE PARTAGÉ - Documents JSON sûrs entre processus et répliques
+====================================================================
+
+Chaque fichier de persistance (recipes_history.json,
+unified_recipes_history.json, complete_knowledge_base.json) est un
+« document » : une liste JSON identifiée par son nom. Toute
+lecture-modification-écriture passe par `store.update(nom, fonction)`,
+exécutée sous un verrou qui couvre tous les processus :
+
+`on_write(avant, après, enregistrements, résultat)` (optionnel) est appelé
+après l'écriture, toujours sous le verrou, avec la version lue avant et
+celle écrite : les compteurs (recipe_stats) suivent ainsi chaque écriture
+sans qu'une autre puisse s'intercaler.
+
+- LocalFileStore (défaut) : verrou de fichier (flock sur `<nom>.lock`)
+  + écriture atomique (fichier temporaire + os.replace). Suffit pour
+  plusieurs workers sur une même machine.
+- SqliteStore : base SQLite sur un volume partagé (transaction
+  BEGIN IMMEDIATE), pour plusieurs répliques derrière un répartiteur.
+  Les fichiers locaux restent des miroirs, rafraîchis à chaque écriture
+  (une lecture n'écrit jamais). Index et compteurs (recipe_index, recipe_stats) lisent via le
+  stockage et se repèrent à `version(nom)` : ils voient les écritures des
+  autres répliques sans attendre qu'un appel local rafraîchisse le miroir.
+
+Configuration par variables d'environnement :
+    STORE_BACKEND      local (défaut) | sqlite
+    STORE_SQLITE_PATH  chemin de la base (défaut fromager_store.sqlite3)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+
+# fonction(enregistrements) -> (nouveaux enregistrements ou None si inchangé, résultat)
+UpdateFunc = Callable[[List[Any]], Tuple[Optional[List[Any]], Any]]
+# (version avant, version après, enregistrements écrits, résultat de la fonction)
+WriteHook = Callable[[Any, Any, List[Any], Any], None]
+
+
+def _check_records(name: str, data) -> List[Any]:
+    if not isinstance(data, list):
+        # Ne jamais écraser un document qui n'est pas une liste de recettes
+        raise ValueError(f"{name} n'est pas une liste de recettes")
+    return data
+
+
+class RecipeStore(ABC):
+    """Interface commune des backends de stockage"""
+
+    def read(self, name: str) -> List[Any]:
+        return self.read_versioned(name)[0]
+
+    @abstractmethod
+    def read_versioned(self, name: str) -> Tuple[List[Any], Any]:
+        """(enregistrements, version) lus ensemble"""
+
+    @abstractmethod
+    def version(self, name: str) -> Any:
+        """Version courante du document (change à chaque écriture), None s'il n'existe pas"""
+
+    @abstractmethod
+    def update(self, name: str, func: UpdateFunc, on_write: Optional[WriteHook] = None) -> Any:
+        """Lecture-modification-écriture atomique ; retourne le résultat de `func`"""
+
+    def write(self, name: str, records: List[Any], on_write: Optional[WriteHook] = None):
+        self.update(name, lambda _: (records, None), on_write)
+
+
+# ===== BACKEND FICHIERS LOCAUX =====
+
+class LocalFileStore(RecipeStore):
+    """Fichiers JSON dans `root`, verrou inter-processus + renommage atomique"""
+
+    def __init__(self, root: str = "."):
+        self.root = root
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    @contextmanager
+    def locked(self, name: str):
+        """Verrou exclusif du document : threads du processus puis autres processus"""
+        with self._locks_lock:
+            thread_lock = self._locks.setdefault(name, threading.Lock())
+        with thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{self.path(name)}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _signature(stat: os.stat_result) -> List[int]:
+        # Chaque écriture crée un nouveau fichier (os.replace) : inode + date + taille
+        return [stat.st_ino, stat.st_mtime_ns, stat.st_size]
+
+    def version(self, name: str) -> Any:
+        try:
+            return self._signature(os.stat(self.path(name)))
+        except OSError:
+            return None
+
+    def read_versioned(self, name: str) -> Tuple[List[Any], Any]:
+        # Sans verrou : le renommage atomique garantit un fichier complet, et la
+        # signature est celle du fichier ouvert, même s'il est remplacé entre-temps
+        try:
+            f = open(self.path(name), "r", encoding="utf-8")
+        except FileNotFoundError:
+            return [], None
+        with f:
+            version = self._signature(os.fstat(f.fileno()))
+            return _check_records(name, json.load(f)), version
+
+    def write_file(self, name: str, records: List[Any]):
+        """Écriture atomique (à appeler sous `locked`)"""
+        path = self.path(name)
+        # Nom temporaire propre au processus : deux workers ne partagent jamais le même
+        tmp_file = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, path)
+
+    def update(self, name: str, func: UpdateFunc, on_write: Optional[WriteHook] = None) -> Any:
+        with self.locked(name):
+            records, before = self.read_versioned(name)
+            new_records, result = func(records)
+            if new_records is not None:
+                self.write_file(name, new_records)
+                if on_write is not None:
+                    on_write(before, self.version(name), new_records, result)
+        return result
+
+
+# ===== BACKEND SQLITE PARTAGÉ =====
+
+class SqliteStore(RecipeStore):
+    """Documents dans une base SQLite partagée, miroirs JSON locaux pour les lecteurs"""
+
+    def __init__(self, db_path: str, root: str = "."):
+        self.db_path = db_path
+        self.mirror = LocalFileStore(root)
+        self._local = threading.local()
+        self._mirrored: Dict[str, int] = {}  # nom -> version écrite dans le miroir
+        self._mirrored_lock = threading.Lock()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "name TEXT PRIMARY KEY, data TEXT NOT NULL, version INTEGER NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Une connexion par thread (autocommit : transactions explicites)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _fetch(self, conn, name: str) -> Tuple[Optional[List[Any]], int]:
+        row = conn.execute("SELECT data, version FROM documents WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None, 0
+        return _check_records(name, json.loads(row[0])), row[1]
+
+    def _refresh_mirror(self, name: str, records: List[Any], version: int):
+        with self._mirrored_lock:
+            if self._mirrored.get(name) == version:
+                return
+        with self.mirror.locked(name):
+            self.mirror.write_file(name, records)
+        with self._mirrored_lock:
+            self._mirrored[name] = version
+
+    def version(self, name: str) -> Any:
+        row = self._connect().execute("SELECT version FROM documents WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def read_versioned(self, name: str) -> Tuple[List[Any], Any]:
+        records, version = self._fetch(self._connect(), name)
+        if records is None:
+            # Pas encore dans la base : le fichier local fait foi jusqu'à la
+            # première écriture, qui l'importera (la lecture n'écrit rien)
+            return self.mirror.read(name), None
+        return records, version
+
+    def update(self, name: str, func: UpdateFunc, on_write: Optional[WriteHook] = None) -> Any:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")  # Un seul écrivain à la fois, toutes répliques confondues
+        try:
+            records, version = self._fetch(conn, name)
+            if records is None:
+                records = self.mirror.read(name)
+            new_records, result = func(records)
+            if new_records is not None:
+                before, version = version or None, version + 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO documents (name, data, version) VALUES (?, ?, ?)",
+                    (name, json.dumps(new_records, ensure_ascii=False), version),
+                )
+                if on_write is not None:
+                    on_write(before, version, new_records, result)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if new_records is not None:
+            self._refresh_mirror(name, new_records, version)
+        return result
+
+
+# ===== INSTANCE PARTAGÉE =====
+
+_store: Optional[RecipeStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> RecipeStore:
+    """Backend de stockage du processus (choisi par STORE_BACKEND)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = os.getenv("STORE_BACKEND", "local").lower()
+                if backend == "sqlite":
+                    db_path = os.getenv("STORE_SQLITE_PATH", "fromager_store.sqlite3")
+                    _store = SqliteStore(db_path)
+                    print(f"🗄️ Stockage partagé SQLite : {db_path}")
+                else:
+                    _store = LocalFileStore()
+    return _store
@@ -0,0 +1,35 @@
+"""
+TESTS - Configuration commune
+=============================
+
+Les modules de l'application sont à la racine du dépôt : on l'ajoute au
+chemin d'import. L'application elle-même est importée une seule fois, dans
+un répertoire temporaire, avec les clés factices du benchmark (aucun appel
+réseau à l'import).
+"""
+
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """Module app importé dans un répertoire de travail vide"""
+    from benchmark_e2e import load_app
+
+    cwd = os.getcwd()
+    workdir = tmp_path_factory.mktemp("app")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            module, _ = load_app(str(workdir))
+    finally:
+        os.chdir(cwd)
+    return module
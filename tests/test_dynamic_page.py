@@ -0,0 +1,35 @@
+"""Rendu paginé de l'onglet des recettes dynamiques"""
+
+import json
+
+
+def _write_history(path, count):
+    recipes = [
+        {"title": f"Recette {i}", "lait": "vache", "type_pate": "pâte molle", "score": i}
+        for i in range(count)
+    ]
+    path.write_text(json.dumps(recipes), encoding="utf-8")
+
+
+def test_header_shows_page_numbers(app_module, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_history(tmp_path / "unified_recipes_history.json", 25)
+
+    html, page = app_module._render_dynamic_recipes("Tous", "Tous", "ancien", 2, 10)
+
+    assert page == 2
+    assert "Page 2/3" in html
+    assert "recettes 11-20 sur 25" in html
+    assert "{page}" not in html
+    assert "Recette 10" in html and "Recette 9" not in html
+
+
+def test_last_page_is_clamped(app_module, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_history(tmp_path / "unified_recipes_history.json", 25)
+
+    html, page = app_module._render_dynamic_recipes("Tous", "Tous", "ancien", 9, 10)
+
+    assert page == 3
+    assert "Page 3/3" in html
+    assert "recettes 21-25 sur 25" in html
@@ -0,0 +1,18 @@
+"""Historique personnel : lu dans le stockage, jamais copié sur l'agent"""
+
+
+def test_history_reads_through_the_store(app_module, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    agent = app_module.agent
+    monkeypatch.setattr(agent, "recipes_file", str(tmp_path / "recipes_history.json"))
+    monkeypatch.setattr(agent, "api", None)
+    monkeypatch.setattr(app_module.time, "sleep", lambda seconds: None)  # tentatives HF
+
+    assert agent.history == []
+    agent._save_to_history(["lait de chèvre", "présure"], "Pâte molle", "", "FROMAGE : Le Test\n\nÉtapes")
+
+    assert "history" not in vars(agent)
+    assert len(agent.history) == 1
+    entry = agent.history[-1]
+    assert entry["ingredients"] == ["lait de chèvre", "présure"]
+    assert agent.get_recipe_by_id(entry["id"]).startswith("FROMAGE : Le Test")
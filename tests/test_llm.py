@@ -0,0 +1,14 @@
+"""Registre des fournisseurs LLM (fromage_llm)"""
+
+from fromage_llm import ollama_has_model
+
+
+def test_ollama_has_model_defaults_to_latest_tag():
+    tags = {"models": [{"name": "qwen2.5:latest"}, {"model": "llama3.1:8b"}]}
+
+    assert ollama_has_model(tags, "qwen2.5")
+    assert ollama_has_model(tags, "qwen2.5:latest")
+    assert ollama_has_model(tags, "llama3.1:8b")
+    assert not ollama_has_model(tags, "llama3.1")
+    assert not ollama_has_model({}, "qwen2.5")
+    assert not ollama_has_model(None, "qwen2.5")
@@ -0,0 +1,56 @@
+"""Détection lait / aromates (fromage_matcher) et anciens jeux de motifs"""
+
+import pytest
+
+from fromage_matcher import get_matcher
+from unified_recipe_generator_v2_with_batch import UnifiedRecipeGeneratorV2
+
+INGREDIENT_LISTS = [
+    ["lait de brebis", "présure", "sel"],
+    ["laitdebrebis", "thym frais"],
+    ["lait de chèvre", "origan", "estragon", "ail"],
+    ["Lait de vache cru", "romarin", "poivre noir", "menthe"],
+    ["lait de bufflonne", "basilic", "tomate séchée"],
+    ["lait", "herbes de Provence", "cendre", "truffe"],
+]
+
+
+@pytest.fixture
+def generator():
+    generator = UnifiedRecipeGeneratorV2.__new__(UnifiedRecipeGeneratorV2)
+    generator.knowledge_base = {
+        "epices_et_aromates": {"herbes": ["Sarriette (fromages de chèvre)", "Origan"]},
+    }
+    return generator
+
+
+def _old_extract_aromates(ingredients):
+    aromates_list = [
+        "thym", "romarin", "basilic", "origan", "ail", "poivre",
+        "cumin", "ciboulette", "persil", "aneth", "estragon"
+    ]
+    ingredients_str = " ".join(ingredients).lower()
+    return [aromate for aromate in aromates_list if aromate in ingredients_str]
+
+
+@pytest.mark.parametrize("ingredients", INGREDIENT_LISTS)
+def test_generator_aromates_match_previous_list(generator, ingredients):
+    assert generator._extract_aromates(ingredients) == _old_extract_aromates(ingredients)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("lait de brebis", ["brebis"]),
+    ("laitdebrebis", ["brebis"]),
+    ("laitdechevre, présure", ["chèvre"]),
+    ("laitdevache", ["vache"]),
+    ("laitdebufflonne", ["bufflonne"]),
+    ("lait bovin, présure", ["vache"]),
+    ("lait de vaches et d'ovins", ["vache", "brebis"]),
+])
+def test_lait_patterns(text, expected):
+    assert get_matcher().scan(text).labels("lait") == expected
+
+
+def test_kb_aromates_are_added(generator):
+    hits = get_matcher(generator.knowledge_base).scan("sarriette et thym")
+    assert hits.labels("aromate") == ["sarriette", "thym"]
@@ -0,0 +1,110 @@
+"""Recherche canonique partagée par la génération et les résultats web (fromage_query_plan)"""
+
+import pytest
+
+import fromage_query_plan
+from fromage_query_plan import AI_CHOICE, SearchPlan, plan_key
+
+
+@pytest.fixture
+def no_plan_cache(monkeypatch):
+    """Sans cache partagé : seules les réutilisations au sein d'un plan comptent"""
+    monkeypatch.setattr(fromage_query_plan.plan_cache, "ttl", 0)
+
+
+@pytest.fixture
+def engine_calls(app_module, monkeypatch):
+    """Cascade de moteurs factice de l'agent, qui compte ses appels"""
+    calls = []
+
+    async def run_search_engines_async(query, min_required):
+        calls.append(query)
+        return [
+            {
+                "title": f"Recette {i}",
+                "url": f"https://exemple.fr/recette-{i}",
+                "description": "Fromage maison",
+                "source": "exemple.fr",
+                "score": 10 - i,
+            }
+            for i in range(8)
+        ]
+
+    monkeypatch.setattr(app_module.agent, "_run_search_engines_async", run_search_engines_async)
+    return calls
+
+
+def test_plan_key_ignores_order_case_and_duplicates():
+    assert plan_key("Lait de chèvre, Thym", "Pâte molle") == plan_key(
+        ["thym ", "lait  de chèvre", "Thym"], " pâte MOLLE"
+    )
+    assert plan_key("lait de vache", AI_CHOICE) == plan_key("lait de vache", "")
+    assert plan_key("lait de vache", "Pâte molle") != plan_key("lait de vache", "Pâte pressée")
+
+
+def test_generate_all_passes_one_plan_keyed_on_raw_input(app_module, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    seen = {}
+
+    def generate_recipe_creative(ingredients, cheese_type, *args, plan=None, **kwargs):
+        seen["generation"] = plan
+        return "Recette"
+
+    def search_web_recipes(ingredients, cheese_type, max_results=6, plan=None):
+        seen["web"] = plan
+        return []
+
+    monkeypatch.setattr(app_module.agent, "generate_recipe_creative", generate_recipe_creative)
+    monkeypatch.setattr(app_module.agent, "search_web_recipes", search_web_recipes)
+
+    app_module.generate_all(
+        "lait de chèvre, thym", AI_CHOICE, "", 2, "Équilibrée", "Moyen", "Moyenne", "🧀 Amateur"
+    )
+
+    assert isinstance(seen["generation"], SearchPlan)
+    assert seen["web"] is seen["generation"]
+    assert seen["web"].key == plan_key("thym, lait de chèvre", AI_CHOICE)
+
+
+def test_generation_and_web_results_share_one_search(app_module, engine_calls, no_plan_cache):
+    from unified_recipe_generator_v2_with_batch import UnifiedRecipeGeneratorV2
+
+    agent = app_module.agent
+    plan = SearchPlan("lait de chèvre, thym", AI_CHOICE)
+
+    # Le générateur reçoit le type déduit du profil : le plan transmis prévaut
+    generator = UnifiedRecipeGeneratorV2.__new__(UnifiedRecipeGeneratorV2)
+    generator.agent = agent
+    urls = generator._find_recipe_urls("autre requête", ["lait de chèvre", "thym"], "Pâte molle", plan)
+    web = agent._search_web_recipes_classic("lait de chèvre, thym", AI_CHOICE, 6, plan=plan)
+
+    assert len(engine_calls) == 1
+    assert {r["url"] for r in web} <= set(urls)
+
+
+def test_creative_generation_receives_the_plan(app_module, monkeypatch, tmp_path):
+    from unified_recipe_generator_v2_with_batch import UnifiedRecipeGeneratorV2
+
+    monkeypatch.chdir(tmp_path)
+    seen = []
+
+    def generate_with_llm(self, *args, plan=None, **kwargs):
+        seen.append(plan)
+        return {"title": "Chèvre au thym", "ingredients": [], "etapes": []}
+
+    monkeypatch.setattr(UnifiedRecipeGeneratorV2, "_generate_with_llm_and_knowledge", generate_with_llm)
+    plan = SearchPlan("lait de chèvre, thym", AI_CHOICE)
+    agent = app_module.agent
+    agent._generate_unique_recipe_hybrid(["lait de chèvre", "thym"], "Pâte molle", "", 2, plan=plan)
+    agent._generate_unique_recipe_hybrid(["lait de chèvre", "thym"], "Pâte molle", "", 1, plan=plan)
+
+    # Créativité 2 : références web du plan ; créativité 1 : pas de recherche
+    assert seen == [plan, None]
+
+
+def test_without_plan_each_call_searches(app_module, engine_calls, no_plan_cache):
+    agent = app_module.agent
+    agent.planned_search_urls("lait de chèvre", AI_CHOICE)
+    agent.planned_search_urls("lait de chèvre", AI_CHOICE)
+
+    assert len(engine_calls) == 2
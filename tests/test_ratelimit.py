@@ -0,0 +1,93 @@
+"""Seaux de jetons partagés (fromage_ratelimit)"""
+
+import pytest
+
+import fromage_ratelimit
+from fromage_ratelimit import DEFAULT_BACKOFF, MIN_RATE_RATIO, RateLimiter, TokenBucket, prepaid
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """Limiteur neuf à la place de l'instance partagée du processus"""
+    fresh = RateLimiter()
+    monkeypatch.setattr(fromage_ratelimit, "_rate_limiter", fresh)
+    return fresh
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Horloge monotone factice, avancée à la main"""
+    now = [1000.0]
+    monkeypatch.setattr(fromage_ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_reserve_spaces_tokens_beyond_capacity(clock):
+    bucket = TokenBucket(rate=1.0, capacity=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(1.0)
+    # Attente trop longue : le jeton n'est pas consommé
+    assert bucket.reserve(max_wait=1.5) is None
+    assert bucket.reserve() == pytest.approx(2.0)
+
+    clock[0] += 10
+    assert bucket.reserve() == 0
+
+
+def test_throttled_pauses_and_halves_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=5)
+
+    bucket.throttled(retry_after=10)
+    assert bucket.rate == 1.0
+    assert bucket.reserve() == pytest.approx(11.0)  # fin de pause + un jeton au débit réduit
+
+    bucket.throttled()
+    bucket.throttled()
+    assert bucket._backoff == DEFAULT_BACKOFF * 4
+    for _ in range(10):
+        bucket.throttled(retry_after=0)
+    assert bucket.rate == pytest.approx(2.0 * MIN_RATE_RATIO)
+
+
+def test_succeeded_recovers_towards_base_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=5)
+    bucket.throttled(retry_after=0)
+
+    for _ in range(20):
+        bucket.succeeded()
+    assert bucket.rate == 2.0
+    assert bucket._backoff == DEFAULT_BACKOFF
+
+
+def test_prepaid_token_is_used_once(limiter):
+    limiter.configure("provider:test", 1.0, 1)
+    assert limiter.acquire("provider:test", max_wait=0)
+
+    with prepaid("provider:test"):
+        assert limiter.acquire("provider:test", max_wait=0)
+        assert not limiter.acquire("provider:test", max_wait=0)
+
+
+def test_batch_job_pays_one_provider_token(limiter):
+    from unified_recipe_generator_v2_with_batch import UnifiedRecipeGeneratorV2
+
+    calls = []
+
+    def generate_recipe(**job):
+        # Premier appel au fournisseur dans le job : jeton d'admission réutilisé
+        calls.append(limiter.acquire("provider:openrouter", max_wait=0))
+        return {"title": "Test"}
+
+    generator = UnifiedRecipeGeneratorV2.__new__(UnifiedRecipeGeneratorV2)
+    generator._job_provider = lambda creativity: "openrouter"
+    generator.generate_recipe = generate_recipe
+
+    results = generator.batch_generate_recipes(
+        [(["lait"], "Pâte molle", "🧀 Amateur", 2)], rate_limits={"openrouter": 60}, save=False
+    )
+
+    assert results[0]["status"] == "ok"
+    assert calls == [True]
+    assert not limiter.acquire("provider:openrouter", max_wait=0)
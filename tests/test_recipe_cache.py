@@ -0,0 +1,45 @@
+"""Cache de génération : clé normalisée, LRU et durée de vie (recipe_cache)"""
+
+import recipe_cache
+from recipe_cache import GenerationCache
+
+
+def test_make_key_ignores_order_case_and_spaces():
+    key = GenerationCache.make_key("Lait de vache,  thym", "Pâte molle", "", 1, profile="🧀 Amateur")
+
+    assert key == GenerationCache.make_key(["thym", "lait de vache "], "pâte  MOLLE", None, "1", profile="🧀 amateur")
+    assert key != GenerationCache.make_key("lait de vache, thym", "Pâte molle", "", 2, profile="🧀 Amateur")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = GenerationCache(max_size=2, ttl=0)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" devient le moins récent
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["size"] == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(recipe_cache.time, "time", lambda: now[0])
+    cache = GenerationCache(max_size=4, ttl=60)
+    cache.put("a", 1)
+
+    now[0] += 59
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_llm_modes_bypass_unless_reuse_requested():
+    cache = GenerationCache(max_size=4, ttl=0)
+
+    assert cache.should_reuse(0)
+    assert cache.should_reuse(2, reuse_variant=True)
+    assert not cache.should_reuse(2)
+    assert cache.stats()["bypass"] == 1
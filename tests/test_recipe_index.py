@@ -0,0 +1,52 @@
+"""Index id -> recette de recipes_history.json"""
+
+import json
+
+from recipe_index import HistoryIdIndex
+
+
+def _write(path, entries):
+    path.write_text(json.dumps(entries), encoding="utf-8")
+
+
+def test_get_text_falls_back_on_older_keys(tmp_path):
+    history = tmp_path / "recipes_history.json"
+    _write(history, [
+        {"id": 1, "recipe_complete": "complète"},
+        {"id": 2, "recipe": "ancienne clé"},
+        {"id": 3, "content": "contenu"},
+        {"id": 4, "name": "sans texte"},
+    ])
+    index = HistoryIdIndex(str(history))
+
+    assert index.get_text(1) == "complète"
+    assert index.get_text("2") == "ancienne clé"
+    assert index.get_text(3) == "contenu"
+    assert index.get_text(4) is None
+    assert index.get_text(99) is None
+
+
+def test_reloads_when_document_changes(tmp_path):
+    history = tmp_path / "recipes_history.json"
+    _write(history, [{"id": 1, "recipe_complete": "v1"}])
+    index = HistoryIdIndex(str(history))
+    assert index.ids() == [1]
+    assert index.get_text(1) == "v1"
+
+    _write(history, [{"id": 2, "recipe_complete": "v2"}])
+
+    assert index.ids() == [2]
+    assert index.get_text(2) == "v2"
+    assert index.get_text(1) is None
+    assert index.get(1) is None
+
+
+def test_text_cache_is_bounded(tmp_path):
+    history = tmp_path / "recipes_history.json"
+    _write(history, [{"id": i, "recipe_complete": f"texte {i}"} for i in range(10)])
+    index = HistoryIdIndex(str(history), text_cache_size=3)
+
+    for i in range(10):
+        assert index.get_text(i) == f"texte {i}"
+
+    assert len(index._texts) == 3
@@ -0,0 +1,73 @@
+"""Statistiques incrémentales des fichiers de recettes (recipe_stats)"""
+
+import pytest
+
+import recipe_store
+from recipe_stats import RecipeStats
+from recipe_store import LocalFileStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    local = LocalFileStore(str(tmp_path))
+    monkeypatch.setattr(recipe_store, "_store", local)
+    return local
+
+
+def _recipe(lait, day):
+    return {"title": f"{lait} {day}", "lait": lait, "generated_at": f"{day}T10:00:00"}
+
+
+def test_hook_applies_only_the_written_changes(store, monkeypatch):
+    stats = RecipeStats("recipes.json")
+    store.write("recipes.json", [_recipe("vache", "2026-01-01")], on_write=stats.hook())
+    assert stats.count() == 1
+
+    def reread():
+        raise AssertionError("relecture complète inattendue")
+
+    monkeypatch.setattr(stats, "_load_store", reread)
+    added = _recipe("chèvre", "2026-01-02")
+    store.update(
+        "recipes.json",
+        lambda records: (records + [added], [added]),
+        on_write=stats.hook(lambda result: (result, [])),
+    )
+
+    assert stats.count() == 2
+    assert stats.by("lait") == {"vache": 1, "chèvre": 1}
+    assert stats.by("day") == {"2026-01-01": 1, "2026-01-02": 1}
+
+
+def test_write_outside_hook_triggers_one_rebuild(store):
+    stats = RecipeStats("recipes.json")
+    store.write("recipes.json", [_recipe("vache", "2026-01-01")], on_write=stats.hook())
+
+    # Écriture d'un autre processus : la version ne correspond plus aux compteurs
+    store.write("recipes.json", [_recipe("brebis", "2026-01-03")])
+
+    assert stats.by("lait") == {"brebis": 1}
+
+
+def test_persisted_counters_are_reused(store):
+    store.write("recipes.json", [_recipe("vache", "2026-01-01")], on_write=RecipeStats("recipes.json").hook())
+
+    fresh = RecipeStats("recipes.json")
+    assert fresh._load_persisted(store.version("recipes.json"))
+    assert fresh.count() == 1
+
+
+def test_removed_recipes_drop_empty_buckets(store):
+    stats = RecipeStats("recipes.json")
+    chevre = _recipe("chèvre", "2026-01-01")
+    store.write("recipes.json", [_recipe("vache", "2026-01-01"), chevre], on_write=stats.hook())
+
+    store.update(
+        "recipes.json",
+        lambda records: ([r for r in records if r != chevre], [chevre]),
+        on_write=stats.hook(lambda result: ([], result)),
+    )
+
+    assert stats.count() == 1
+    assert stats.by("lait") == {"vache": 1}
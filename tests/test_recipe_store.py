@@ -0,0 +1,83 @@
+"""Backends de stockage : verrou, versions, miroir SQLite"""
+
+import json
+import threading
+
+import pytest
+
+from recipe_store import LocalFileStore, RecipeStore, SqliteStore
+
+
+def _append(record):
+    return lambda records: (records + [record], len(records) + 1)
+
+
+def test_base_is_abstract():
+    with pytest.raises(TypeError):
+        RecipeStore()
+
+
+def test_local_update_is_atomic_across_threads(tmp_path):
+    store = LocalFileStore(str(tmp_path))
+    threads = [threading.Thread(target=store.update, args=("doc.json", _append(i))) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(store.read("doc.json")) == list(range(20))
+
+
+def test_local_version_changes_on_write(tmp_path):
+    store = LocalFileStore(str(tmp_path))
+    assert store.version("doc.json") is None
+    assert store.read_versioned("doc.json") == ([], None)
+
+    store.write("doc.json", [1])
+    first = store.version("doc.json")
+    store.write("doc.json", [1, 2])
+
+    records, version = store.read_versioned("doc.json")
+    assert records == [1, 2]
+    assert version == store.version("doc.json") != first
+
+
+def test_on_write_sees_versions_around_the_write(tmp_path):
+    store = LocalFileStore(str(tmp_path))
+    calls = []
+    store.write("doc.json", [1], on_write=lambda *args: calls.append(args))
+    store.update("doc.json", lambda records: (None, "inchangé"), on_write=lambda *args: calls.append(args))
+
+    assert len(calls) == 1
+    before, after, records, result = calls[0]
+    assert before is None and after == store.version("doc.json")
+    assert records == [1] and result is None
+
+
+def test_sqlite_imports_local_file_on_first_write(tmp_path):
+    (tmp_path / "doc.json").write_text(json.dumps(["local"]), encoding="utf-8")
+    store = SqliteStore(str(tmp_path / "store.sqlite3"), root=str(tmp_path))
+
+    assert store.read_versioned("doc.json") == (["local"], None)
+    assert store.version("doc.json") is None
+
+    assert store.update("doc.json", _append("nouveau")) == 2
+    assert store.read_versioned("doc.json") == (["local", "nouveau"], 1)
+
+
+def test_sqlite_reads_never_write_the_mirror(tmp_path):
+    db_path = str(tmp_path / "store.sqlite3")
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    replica_a = SqliteStore(db_path, root=str(tmp_path / "a"))
+    replica_b = SqliteStore(db_path, root=str(tmp_path / "b"))
+
+    replica_b.write("doc.json", ["b"])
+
+    assert replica_a.read("doc.json") == ["b"]
+    assert replica_a.version("doc.json") == 1
+    assert not (tmp_path / "a" / "doc.json").exists()
+    assert json.loads((tmp_path / "b" / "doc.json").read_text(encoding="utf-8")) == ["b"]
+
+    replica_a.update("doc.json", _append("a"))
+    assert json.loads((tmp_path / "a" / "doc.json").read_text(encoding="utf-8")) == ["b", "a"]
@@ -0,0 +1,61 @@
+"""Moteurs de recherche sur le client HTTP asynchrone partagé (fromage_async)"""
+
+import httpx
+import pytest
+
+import fromage_ratelimit
+from fromage_ratelimit import RateLimiter
+
+DDG_HTML = """
+<div class="result">
+  <a class="result__a">Recette fromage de chèvre maison</a>
+  <a class="result__url" href="//duckduckgo.com/l/?uddg=https%3A%2F%2Fexemple.fr%2Fchevre&rut=x">exemple.fr</a>
+  <a class="result__snippet">Un fromage frais au thym</a>
+</div>
+<div class="result">
+  <a class="result__a">Vélo électrique pas cher</a>
+  <a class="result__url" href="https://exemple.fr/velo">exemple.fr</a>
+</div>
+"""
+
+
+@pytest.fixture
+def transport(app_module, monkeypatch):
+    """Client HTTP factice (httpx.MockTransport) qui garde les requêtes reçues"""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.url.host == "serpapi.com":
+            return httpx.Response(200, json={"organic_results": [
+                {"title": "Tomme maison", "link": "https://exemple.fr/tomme", "snippet": "Fromage"},
+            ]})
+        return httpx.Response(200, text=DDG_HTML)
+
+    monkeypatch.setattr(app_module, "http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(fromage_ratelimit, "_rate_limiter", RateLimiter())
+    return requests
+
+
+def test_duckduckgo_html_facade(app_module, transport):
+    results = app_module.agent._try_duckduckgo_html("fromage chèvre", 5)
+
+    assert [r["url"] for r in results] == ["https://exemple.fr/chevre"]
+    assert transport[0].url.host == "html.duckduckgo.com"
+
+
+def test_serpapi_facade(app_module, transport, monkeypatch):
+    monkeypatch.setenv("SERPAPI_KEY", "test")
+    results = app_module.agent._try_serpapi_search("tomme", 3)
+
+    assert results[0]["url"] == "https://exemple.fr/tomme"
+    assert transport[0].url.params["num"] == "3"
+
+
+def test_engine_bucket_is_shared(app_module, transport):
+    """_search_simple interroge le même point d'entrée que _try_duckduckgo_html : même seau"""
+    fromage_ratelimit.get_rate_limiter().configure("engine:ddg_html", 0.001, 1)
+
+    assert app_module.agent._try_duckduckgo_html("fromage", 5)
+    assert not app_module.agent._search_simple("lait de chèvre", "", 5)
+    assert len(transport) == 1
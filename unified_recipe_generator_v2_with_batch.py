@@ -10,15 +10,410 @@ Intègre :
 5. Templates hardcodés
 """
 
+import asyncio
 import json
 import os
 import random
+import threading
 import time
-import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
 from typing import List, Dict, Optional
 
+from fromage_matcher import get_matcher
+from recipe_compactor import get_compactor
+from recipe_store import get_store
+from fromage_logging import get_logger
+from fromage_tracing import in_context, set_attribute, traced
+from fromage_metrics import GENERATION_SECONDS, SCRAPE_TOTAL, record_cache, timed, url_domain
+from fromage_ratelimit import DOMAIN_MAX_WAIT, PROVIDER_MAX_WAIT, get_rate_limiter, prepaid
+from fromage_singleflight import coalesce, text_digest
+from fromage_async import http_client, run_sync
+
+logger = get_logger("generator")
+
+
+def _enrich_flight_key(generator, title, description, url, raw_text):
+    """Même page à enrichir : seul le texte envoyé au LLM compte"""
+    return text_digest(title, description, url, (raw_text or "")[:3000])
+
+# ===============================================================
+# RENDU PDF (partagé entre le processus principal et les workers)
+# ===============================================================
+
+# Gabarit ReportLab mis en cache par processus : styles, TableStyles, mise en
+# page et flowables statiques (polices Helvetica intégrées : aucune police TTF
+# à enregistrer). Seuls les flowables propres à la recette sont créés par PDF.
+_PDF_STYLES = None
+_PDF_LOCK = threading.Lock()
+
+
+def _get_pdf_styles() -> Dict:
+    """Gabarit PDF (styles, tableaux, mise en page), construit une fois par processus"""
+    global _PDF_STYLES
+    if _PDF_STYLES is not None:
+        return _PDF_STYLES
+    
+    with _PDF_LOCK:
+        if _PDF_STYLES is None:
+            _PDF_STYLES = _build_pdf_styles()
+    return _PDF_STYLES
+
+
+def _build_pdf_styles() -> Dict:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, TableStyle
+
+    # Styles
+    styles = getSampleStyleSheet()
+
+    # Style titre principal
+    style_title = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#2C5F2D'),
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold'
+    )
+
+    # Style sous-titre
+    style_subtitle = ParagraphStyle(
+        'CustomSubtitle',
+        parent=styles['Normal'],
+        fontSize=12,
+        textColor=colors.HexColor('#666666'),
+        spaceAfter=20,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Oblique'
+    )
+
+    # Style section
+    style_section = ParagraphStyle(
+        'SectionTitle',
+        parent=styles['Heading2'],
+        fontSize=16,
+        textColor=colors.HexColor('#2C5F2D'),
+        spaceAfter=12,
+        spaceBefore=20,
+        fontName='Helvetica-Bold',
+        borderPadding=5,
+        borderColor=colors.HexColor('#2C5F2D'),
+        borderWidth=0,
+        leftIndent=0
+    )
+
+    # Style corps de texte
+    style_body = ParagraphStyle(
+        'CustomBody',
+        parent=styles['Normal'],
+        fontSize=11,
+        textColor=colors.HexColor('#333333'),
+        spaceAfter=8,
+        alignment=TA_JUSTIFY,
+        leading=16
+    )
+
+    # Style liste
+    style_list = ParagraphStyle(
+        'CustomList',
+        parent=styles['Normal'],
+        fontSize=11,
+        textColor=colors.HexColor('#333333'),
+        leftIndent=20,
+        spaceAfter=6,
+        leading=14
+    )
+
+    # Style pied de page
+    footer_style = ParagraphStyle(
+        'Footer',
+        parent=styles['Normal'],
+        fontSize=9,
+        textColor=colors.HexColor('#999999'),
+        alignment=TA_CENTER,
+        spaceAfter=5
+    )
+
+    # Tableaux
+    table_styles = {
+        'info': TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#E8F5E9')),
+            ('BACKGROUND', (1, 0), (1, -1), colors.white),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#CCCCCC')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('LEFTPADDING', (0, 0), (-1, -1), 10),
+        ]),
+        'ingredients': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FFF9E6')),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E6D8A3')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('LEFTPADDING', (0, 0), (-1, -1), 15),
+        ]),
+        'etape': TableStyle([
+            ('BACKGROUND', (0, 0), (0, 0), colors.HexColor('#2C5F2D')),
+            ('BACKGROUND', (1, 0), (1, 0), colors.HexColor('#F5F5F5')),
+            ('TEXTCOLOR', (0, 0), (0, 0), colors.white),
+            ('TEXTCOLOR', (1, 0), (1, 0), colors.HexColor('#333333')),
+            ('ALIGN', (0, 0), (0, 0), 'CENTER'),
+            ('ALIGN', (1, 0), (1, 0), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (0, 0), 11),
+            ('FONTSIZE', (1, 0), (1, 0), 10),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#CCCCCC')),
+            ('TOPPADDING', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+            ('LEFTPADDING', (1, 0), (1, 0), 12),
+            ('RIGHTPADDING', (1, 0), (1, 0), 12),
+        ]),
+    }
+
+    # Flowables statiques (titres de sections, pied de page)
+    static = {
+        'materiel': Paragraph("🔧 Matériel nécessaire", style_section),
+        'ingredients': Paragraph("🛒 Ingrédients", style_section),
+        'etapes': Paragraph("👨‍🍳 Étapes de fabrication", style_section),
+        'aromatisation': Paragraph("🌿 Aromatisation", style_section),
+        'conseils': Paragraph("💡 Conseils et recommandations", style_section),
+        'exemples': Paragraph("🧀 Exemples de fromages de cette catégorie", style_section),
+        'separateur': Paragraph("─" * 80, footer_style),
+        'signature': Paragraph(
+            "🧀 Fromagerie artisanale et transmission du savoir-faire fromager",
+            footer_style
+        ),
+    }
+
+    return {
+        'title': style_title,
+        'subtitle': style_subtitle,
+        'section': style_section,
+        'body': style_body,
+        'list': style_list,
+        'footer': footer_style,
+        'tables': table_styles,
+        'static': static,
+        'page': {
+            'pagesize': A4,
+            'rightMargin': 2*cm,
+            'leftMargin': 2*cm,
+            'topMargin': 2*cm,
+            'bottomMargin': 2*cm,
+            'author': "Agent Fromager",
+        },
+    }
+
+
+def _static_flowable(name: str):
+    """Copie d'un flowable statique (le markup est déjà analysé, l'état de mise en page est propre)"""
+    import copy
+    return copy.copy(_get_pdf_styles()['static'][name])
+
+
+def _init_pdf_worker():
+    """Initialiseur du pool : charge reportlab et les styles une fois par worker"""
+    _get_pdf_styles()
+
+
+def _render_pdf_chunk(chunk: List) -> List:
+    """Rend un lot de (index, recette, chemin) dans un worker"""
+    results = []
+    for index, recipe, output_path in chunk:
+        try:
+            results.append((index, _render_recipe_pdf(recipe, output_path), None))
+        except Exception as e:
+            results.append((index, None, str(e)))
+    return results
+
+
+def _render_recipe_pdf(recipe: Dict, output_path: str = None, in_memory: bool = False):
+    """Construit le PDF d'une recette (appelé en local ou dans un worker)"""
+    from io import BytesIO
+    from reportlab.lib.units import cm
+    from reportlab.platypus import (
+        SimpleDocTemplate, Paragraph, Spacer, Table, PageBreak
+    )
+
+    # Gabarit (construit une fois par processus)
+    pdf_styles = _get_pdf_styles()
+
+    # Définir la sortie : fichier ou mémoire
+    if in_memory:
+        output = BytesIO()
+    else:
+        if output_path is None:
+            safe_title = "".join(c for c in recipe['title'] if c.isalnum() or c in (' ', '-', '_')).strip()
+            output_path = f"/mnt/user-data/outputs/Recette_{safe_title}_{datetime.now().strftime('%Y%m%d')}.pdf"
+        output = output_path
+
+    # Créer le document
+    doc = SimpleDocTemplate(output, title=recipe['title'], **pdf_styles['page'])
+
+    # Conteneur des éléments
+    story = []
+
+    style_title = pdf_styles['title']
+    style_subtitle = pdf_styles['subtitle']
+    style_section = pdf_styles['section']
+    style_body = pdf_styles['body']
+    style_list = pdf_styles['list']
+    footer_style = pdf_styles['footer']
+
+    # ========== EN-TÊTE ==========
+    # Titre
+    story.append(Paragraph(f"🧀 {recipe['title']}", style_title))
+
+    # Description
+    if recipe.get('description'):
+        story.append(Paragraph(recipe['description'], style_subtitle))
+
+    story.append(Spacer(1, 0.5*cm))
+
+    # ========== INFORMATIONS CLÉS ==========
+    info_data = [
+        ['🥛 Type de lait', recipe.get('lait', 'Non spécifié').capitalize()],
+        ['🧀 Catégorie', recipe.get('type_pate', 'Non spécifié')],
+        ['⏱️ Durée totale', recipe.get('duree_totale', 'Variable')],
+        ['📊 Difficulté', recipe.get('difficulte', 'Moyenne')],
+        ['🌡️ Affinage', recipe.get('temperature_affinage', 'Selon type')],
+    ]
+
+    if recipe.get('profile'):
+        info_data.append(['👤 Profil', recipe['profile']])
+
+    info_table = Table(info_data, colWidths=[6*cm, 11*cm])
+    info_table.setStyle(pdf_styles['tables']['info'])
+
+    story.append(info_table)
+    story.append(Spacer(1, 0.8*cm))
+
+    # ========== MATÉRIEL NÉCESSAIRE ==========
+    if recipe.get('materiel_necessaire'):
+        story.append(_static_flowable('materiel'))
+
+        for item in recipe['materiel_necessaire']:
+            story.append(Paragraph(f"• {item}", style_list))
+
+        story.append(Spacer(1, 0.5*cm))
+
+    # ========== INGRÉDIENTS ==========
+    story.append(_static_flowable('ingredients'))
+
+    ingredients_data = [[Paragraph(f"<b>{ing}</b>", style_body)] for ing in recipe.get('ingredients', [])]
+
+    ingredients_table = Table(ingredients_data, colWidths=[17*cm])
+    ingredients_table.setStyle(pdf_styles['tables']['ingredients'])
+
+    story.append(ingredients_table)
+    story.append(Spacer(1, 0.8*cm))
+
+    # ========== ÉTAPES DE FABRICATION ==========
+    story.append(_static_flowable('etapes'))
+
+    for i, etape in enumerate(recipe.get('etapes', []), 1):
+        # Nettoyer les marqueurs markdown
+        etape_clean = etape.replace('**', '').replace('*', '')
+
+        # Créer un tableau pour chaque étape
+        etape_data = [[
+            Paragraph(f"<b>Étape {i}</b>", style_body),
+            Paragraph(etape_clean, style_body)
+        ]]
+
+        etape_table = Table(etape_data, colWidths=[2.5*cm, 14.5*cm])
+        etape_table.setStyle(pdf_styles['tables']['etape'])
+
+        story.append(etape_table)
+        story.append(Spacer(1, 0.3*cm))
+
+    story.append(Spacer(1, 0.5*cm))
+
+    # ========== TECHNIQUE D'AROMATISATION ==========
+    if recipe.get('technique_aromatisation') and recipe.get('aromates'):
+        story.append(_static_flowable('aromatisation'))
+
+        aromates_text = ", ".join(recipe['aromates'])
+        story.append(Paragraph(f"<b>Aromates utilisés :</b> {aromates_text}", style_body))
+        story.append(Spacer(1, 0.2*cm))
+
+        technique_clean = recipe['technique_aromatisation'].replace('**', '').replace('*', '')
+        story.append(Paragraph(f"<b>Technique :</b> {technique_clean}", style_body))
+        story.append(Spacer(1, 0.5*cm))
+
+    # ========== CONSEILS ==========
+    if recipe.get('conseils'):
+        story.append(PageBreak())
+        story.append(_static_flowable('conseils'))
+
+        conseils_clean = recipe['conseils'].replace('**', '<b>').replace('**', '</b>')
+        conseils_paragraphs = conseils_clean.split('\n\n')
+
+        for para in conseils_paragraphs:
+            if para.strip():
+                # Gérer les listes à puces
+                if para.strip().startswith('•') or para.strip().startswith('-'):
+                    lines = para.split('\n')
+                    for line in lines:
+                        if line.strip():
+                            story.append(Paragraph(line.strip(), style_list))
+                else:
+                    story.append(Paragraph(para.strip(), style_body))
+                story.append(Spacer(1, 0.3*cm))
+
+    # ========== EXEMPLES DE FROMAGES ==========
+    if recipe.get('exemples_fromages'):
+        story.append(Spacer(1, 0.5*cm))
+        story.append(_static_flowable('exemples'))
+        story.append(Paragraph(recipe['exemples_fromages'], style_body))
+
+    # ========== PIED DE PAGE ==========
+    story.append(Spacer(1, 1*cm))
+
+    story.append(_static_flowable('separateur'))
+    story.append(Paragraph(
+        f"📅 Recette générée le {datetime.now().strftime('%d/%m/%Y à %H:%M')} par <b>Agent Fromager</b>",
+        footer_style
+    ))
+    story.append(_static_flowable('signature'))
+
+    if recipe.get('seed'):
+        story.append(Paragraph(
+            f"<i>Seed de recette : {recipe['seed']}</i>",
+            footer_style
+        ))
+
+    # ========== GÉNÉRER LE PDF ==========
+    try:
+        doc.build(story)
+        if in_memory:
+            output.seek(0)
+            logger.info("PDF généré en mémoire : %s", recipe['title'])
+            return output
+        logger.info("PDF généré avec succès : %s", output_path)
+        return output_path
+    except Exception as e:
+        logger.warning("Erreur lors de la génération du PDF : %s", e)
+        raise
+
 
 class UnifiedRecipeGeneratorV2:
     """Générateur unifié avec intégration complète de la base statique"""
@@ -57,13 +452,16 @@ class UnifiedRecipeGeneratorV2:
     # MÉTHODE PRINCIPALE
     # ===============================================================
     
+    @traced("generator.generate_recipe")
+    @timed(GENERATION_SECONDS, entrypoint="generator")
     def generate_recipe(
         self,
         ingredients: List[str],
         cheese_type: str,
         creativity: int = 1,
         profile: str = "🧀 Amateur",
-        constraints: str = ""
+        constraints: str = "",
+        plan=None
     ) -> Dict:
         """
         Génère une recette avec stratégie multi-niveaux
@@ -72,18 +470,18 @@ class UnifiedRecipeGeneratorV2:
         1 = Base statique + Templates
         2 = Base statique + Web scraping + LLM enrichissement  
         3 = Génération LLM pure (+ fallback sur niveaux inférieurs)
+        
+        plan : recherche canonique de la requête (SearchPlan) pour le scraping
         """
         
-        print("\n" + "="*70)
-        print("🧀 GÉNÉRATEUR UNIFIÉ V2 (avec base statique)")
-        print("="*70)
-        print(f"📝 Ingrédients: {', '.join(ingredients)}")
-        print(f"🧀 Type: {cheese_type}")
-        print(f"🎨 Créativité: {creativity}/3")
-        print(f"👤 Profil: {profile}")
+        logger.info("GÉNÉRATEUR UNIFIÉ V2 (avec base statique)")
+        logger.debug("Ingrédients: %s", ', '.join(ingredients))
+        logger.debug("Type: %s", cheese_type)
+        logger.debug("Créativité: %s/3", creativity)
+        logger.debug("Profil: %s", profile)
         
         lait = self._extract_lait(ingredients)
-        print(f"🥛 Lait détecté: {lait or 'non spécifié'}")
+        logger.info("Lait détecté: %s", lait or 'non spécifié')
         
         recipe_data = None
         
@@ -92,8 +490,7 @@ class UnifiedRecipeGeneratorV2:
         # ===========================================================
         
         if creativity >= 3 and self._has_llm_available():
-            print("\n🤖 MODE : GÉNÉRATION LLM PURE (avec contexte base statique)")
-            print("-"*70)
+            logger.info("MODE : GÉNÉRATION LLM PURE (avec contexte base statique)")
             
             try:
                 recipe_data = self._generate_with_llm_and_knowledge(
@@ -105,31 +502,30 @@ class UnifiedRecipeGeneratorV2:
                 )
                 
                 if recipe_data:
-                    print("✅ Recette générée par LLM (enrichie base statique)")
+                    logger.info("Recette générée par LLM (enrichie base statique)")
                     recipe_data['generation_mode'] = 'llm_pure_with_knowledge'
                     
             except Exception as e:
-                print(f"⚠️ Génération LLM échouée : {e}")
+                logger.warning("Génération LLM échouée : %s", e)
         
         # ===========================================================
         # NIVEAU 2 : BASE ENRICHIE + WEB SCRAPING + LLM
         # ===========================================================
         
         if not recipe_data and creativity >= 2:
-            print("\n🌐 MODE : BASE ENRICHIE + WEB + LLM")
-            print("-"*70)
+            logger.info("MODE : BASE ENRICHIE + WEB + LLM")
             
             # Essayer d'abord la base enrichie (complete_knowledge_base.json)
             recipe_data = self._search_enriched_base(ingredients, cheese_type, lait)
             
             if recipe_data:
-                print("✅ Recette trouvée dans base enrichie")
+                logger.info("Recette trouvée dans base enrichie")
                 recipe_data['generation_mode'] = 'enriched_base'
             
             # Sinon essayer le scraping web
             if not recipe_data:
                 try:
-                    scraped = self._scrape_web_recipe(ingredients, cheese_type, lait)
+                    scraped = self._scrape_web_recipe(ingredients, cheese_type, lait, plan)
                     
                     if scraped:
                         # Enrichir avec LLM si disponible
@@ -145,19 +541,18 @@ class UnifiedRecipeGeneratorV2:
                             recipe_data = scraped
                         
                         if recipe_data:
-                            print("✅ Recette scrapée et enrichie")
+                            logger.info("Recette scrapée et enrichie")
                             recipe_data['generation_mode'] = 'web_enriched'
                             
                 except Exception as e:
-                    print(f"⚠️ Scraping échoué : {e}")
+                    logger.warning("Scraping échoué : %s", e)
         
         # ===========================================================
         # NIVEAU 1 : BASE STATIQUE + TEMPLATES
         # ===========================================================
         
         if not recipe_data:
-            print("\n📋 MODE : BASE STATIQUE + TEMPLATES")
-            print("-"*70)
+            logger.info("MODE : BASE STATIQUE + TEMPLATES")
             
             recipe_data = self._generate_from_static_knowledge(
                 ingredients=ingredients,
@@ -168,7 +563,7 @@ class UnifiedRecipeGeneratorV2:
             )
             
             recipe_data['generation_mode'] = 'static_knowledge'
-            print("✅ Recette générée depuis base statique")
+            logger.info("Recette générée depuis base statique")
         
         # ===========================================================
         # FINALISATION
@@ -183,9 +578,7 @@ class UnifiedRecipeGeneratorV2:
         # ❌ NE PLUS SAUVEGARDER ICI (les recettes sont déjà sauvegardées pendant scraping/génération LLM)
         # self._save_to_history(recipe_data)
         
-        print("\n" + "="*70)
-        print(f"✅ RECETTE GÉNÉRÉE (mode: {recipe_data['generation_mode']})")
-        print("="*70)
+        logger.info("RECETTE GÉNÉRÉE (mode: %s)", recipe_data['generation_mode'])
         
         return recipe_data
     
@@ -203,24 +596,23 @@ class UnifiedRecipeGeneratorV2:
         
         enriched_file = "complete_knowledge_base.json"
         
-        if not os.path.exists(enriched_file):
-            print("   ℹ️ Pas de base enrichie (complete_knowledge_base.json)")
+        if get_store().version(enriched_file) is None and not os.path.exists(enriched_file):
+            logger.debug("Pas de base enrichie (complete_knowledge_base.json)")
             return None
         
         try:
-            with open(enriched_file, 'r', encoding='utf-8') as f:
-                enriched_recipes = json.load(f)
+            enriched_recipes = get_store().read(enriched_file)
             
             if not enriched_recipes:
                 return None
             
-            print(f"   📚 Base enrichie : {len(enriched_recipes)} recettes")
+            logger.debug("Base enrichie : %s recettes", len(enriched_recipes))
             
             # Filtrer par lait si spécifié
             if lait:
                 filtered = [r for r in enriched_recipes if r.get('lait') == lait]
                 if filtered:
-                    print(f"   🎯 {len(filtered)} recettes pour lait de {lait}")
+                    logger.debug("%s recettes pour lait de %s", len(filtered), lait)
                     # Prendre la meilleure
                     best = max(filtered, key=lambda x: x.get('score', 0))
                     return best
@@ -230,7 +622,7 @@ class UnifiedRecipeGeneratorV2:
             return best
             
         except Exception as e:
-            print(f"   ⚠️ Erreur lecture base enrichie : {e}")
+            logger.warning("Erreur lecture base enrichie : %s", e)
             return None
     
     # ===============================================================
@@ -256,10 +648,10 @@ class UnifiedRecipeGeneratorV2:
         # ✅ Générer le nom créatif du fromage
         try:
             cheese_name = self._generate_creative_name(cheese_type, ingredients)
-            print(f"🧀 Nom créatif généré: {cheese_name}")
+            logger.info("Nom créatif généré: %s", cheese_name)
         except Exception as e:
             # Fallback si la génération échoue
-            print(f"⚠️ Erreur génération nom: {e}, utilisation nom par défaut")
+            logger.warning("Erreur génération nom: %s, utilisation nom par défaut", e)
             cheese_name = cheese_type.replace("_", " ").title()
             
             random.seed(seed)
@@ -395,339 +787,233 @@ class UnifiedRecipeGeneratorV2:
             'exemples_fromages': type_info.get('exemples', '')
         }
         
-        print(f"   📝 Recette générée : {title}")
-        print(f"   🧀 Type: {cheese_type} | Lait: {lait or 'vache'} | Profil: {profile}")
+        logger.debug("Recette générée : %s", title)
+        logger.debug("Type: %s | Lait: %s | Profil: %s", cheese_type, lait or 'vache', profile)
         
         return recipe
 
-    def generate_recipe_pdf(self, recipe: Dict, output_path: str = None) -> str:
+    def generate_recipe_pdf(self, recipe: Dict, output_path: str = None, in_memory: bool = False):
         """
         Génère un PDF professionnel de la recette de fromage
         
         Args:
             recipe: Dictionnaire contenant les données de la recette
             output_path: Chemin de sortie (optionnel)
+            in_memory: Rendre dans un BytesIO au lieu d'un fichier (streaming HTTP)
         
         Returns:
-            Chemin du fichier PDF généré
+            Chemin du fichier PDF généré, ou BytesIO positionné au début si in_memory
         """
-        from reportlab.lib import colors
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import cm
-        from reportlab.platypus import (
-            SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle,
-            PageBreak, Image, KeepTogether
-        )
-        from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
-        from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
-        import os
-        from datetime import datetime
-        
-        # Définir le chemin de sortie
-        if output_path is None:
-            safe_title = "".join(c for c in recipe['title'] if c.isalnum() or c in (' ', '-', '_')).strip()
-            output_path = f"/mnt/user-data/outputs/Recette_{safe_title}_{datetime.now().strftime('%Y%m%d')}.pdf"
-        
-        # Créer le document
-        doc = SimpleDocTemplate(
-            output_path,
-            pagesize=A4,
-            rightMargin=2*cm,
-            leftMargin=2*cm,
-            topMargin=2*cm,
-            bottomMargin=2*cm,
-            title=recipe['title'],
-            author="Agent Fromager"
-        )
-        
-        # Conteneur des éléments
-        story = []
-        
-        # Styles
-        styles = getSampleStyleSheet()
-        
-        # Style titre principal
-        style_title = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#2C5F2D'),
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        )
-        
-        # Style sous-titre
-        style_subtitle = ParagraphStyle(
-            'CustomSubtitle',
-            parent=styles['Normal'],
-            fontSize=12,
-            textColor=colors.HexColor('#666666'),
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Oblique'
-        )
-        
-        # Style section
-        style_section = ParagraphStyle(
-            'SectionTitle',
-            parent=styles['Heading2'],
-            fontSize=16,
-            textColor=colors.HexColor('#2C5F2D'),
-            spaceAfter=12,
-            spaceBefore=20,
-            fontName='Helvetica-Bold',
-            borderPadding=5,
-            borderColor=colors.HexColor('#2C5F2D'),
-            borderWidth=0,
-            leftIndent=0
-        )
-        
-        # Style corps de texte
-        style_body = ParagraphStyle(
-            'CustomBody',
-            parent=styles['Normal'],
-            fontSize=11,
-            textColor=colors.HexColor('#333333'),
-            spaceAfter=8,
-            alignment=TA_JUSTIFY,
-            leading=16
-        )
-        
-        # Style liste
-        style_list = ParagraphStyle(
-            'CustomList',
-            parent=styles['Normal'],
-            fontSize=11,
-            textColor=colors.HexColor('#333333'),
-            leftIndent=20,
-            spaceAfter=6,
-            leading=14
-        )
-        
-        # ========== EN-TÊTE ==========
-        # Titre
-        story.append(Paragraph(f"🧀 {recipe['title']}", style_title))
-        
-        # Description
-        if recipe.get('description'):
-            story.append(Paragraph(recipe['description'], style_subtitle))
-        
-        story.append(Spacer(1, 0.5*cm))
-        
-        # ========== INFORMATIONS CLÉS ==========
-        info_data = [
-            ['🥛 Type de lait', recipe.get('lait', 'Non spécifié').capitalize()],
-            ['🧀 Catégorie', recipe.get('type_pate', 'Non spécifié')],
-            ['⏱️ Durée totale', recipe.get('duree_totale', 'Variable')],
-            ['📊 Difficulté', recipe.get('difficulte', 'Moyenne')],
-            ['🌡️ Affinage', recipe.get('temperature_affinage', 'Selon type')],
-        ]
+        return _render_recipe_pdf(recipe, output_path, in_memory=in_memory)
+
+
+    def batch_generate_pdfs(
+        self,
+        recipes: List[Dict],
+        output_dir: str = "/mnt/user-data/outputs",
+        processes: int = 1,
+        chunksize: Optional[int] = None
+    ) -> List[str]:
+        """
+        Génère des PDFs pour plusieurs recettes
         
-        if recipe.get('profile'):
-            info_data.append(['👤 Profil', recipe['profile']])
+        Args:
+            recipes: Liste de dictionnaires de recettes
+            output_dir: Répertoire de sortie
+            processes: Nombre de processus (1 = séquentiel, 0 = un par cœur)
+            chunksize: Recettes envoyées à un worker à la fois (auto si None)
         
-        info_table = Table(info_data, colWidths=[6*cm, 11*cm])
-        info_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#E8F5E9')),
-            ('BACKGROUND', (1, 0), (1, -1), colors.white),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#CCCCCC')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('LEFTPADDING', (0, 0), (-1, -1), 10),
-        ]))
+        Returns:
+            Liste des chemins des PDFs générés (dans l'ordre des recettes)
+        """
+        pdf_paths = {}
         
-        story.append(info_table)
-        story.append(Spacer(1, 0.8*cm))
+        for index, pdf_path, error in self.iter_generate_pdfs(recipes, output_dir, processes, chunksize):
+            if pdf_path:
+                pdf_paths[index] = pdf_path
         
-        # ========== MATÉRIEL NÉCESSAIRE ==========
-        if recipe.get('materiel_necessaire'):
-            story.append(Paragraph("🔧 Matériel nécessaire", style_section))
-            
-            for item in recipe['materiel_necessaire']:
-                story.append(Paragraph(f"• {item}", style_list))
-            
-            story.append(Spacer(1, 0.5*cm))
+        logger.info("%s/%s PDFs générés avec succès", len(pdf_paths), len(recipes))
+        return [pdf_paths[i] for i in sorted(pdf_paths)]
+
+    def iter_generate_pdfs(
+        self,
+        recipes: List[Dict],
+        output_dir: str = "/mnt/user-data/outputs",
+        processes: int = 1,
+        chunksize: Optional[int] = None
+    ):
+        """
+        Génère les PDFs et les rend AU FIL DE L'EAU (pour upload/serveur)
         
-        # ========== INGRÉDIENTS ==========
-        story.append(Paragraph("🛒 Ingrédients", style_section))
+        Yields:
+            (index, chemin du PDF ou None, erreur ou None) dans l'ordre de fin
+        """
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
         
-        ingredients_data = [[Paragraph(f"<b>{ing}</b>", style_body)] for ing in recipe.get('ingredients', [])]
+        tasks = []
+        for i, recipe in enumerate(recipes, 1):
+            safe_title = "".join(c for c in recipe['title'] if c.isalnum() or c in (' ', '-', '_')).strip()
+            output_path = os.path.join(output_dir, f"Recette_{i:02d}_{safe_title}.pdf")
+            tasks.append((i - 1, recipe, output_path))
         
-        ingredients_table = Table(ingredients_data, colWidths=[17*cm])
-        ingredients_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FFF9E6')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E6D8A3')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('LEFTPADDING', (0, 0), (-1, -1), 15),
-        ]))
-        
-        story.append(ingredients_table)
-        story.append(Spacer(1, 0.8*cm))
-        
-        # ========== ÉTAPES DE FABRICATION ==========
-        story.append(Paragraph("👨‍🍳 Étapes de fabrication", style_section))
-        
-        for i, etape in enumerate(recipe.get('etapes', []), 1):
-            # Nettoyer les marqueurs markdown
-            etape_clean = etape.replace('**', '').replace('*', '')
-            
-            # Créer un tableau pour chaque étape
-            etape_data = [[
-                Paragraph(f"<b>Étape {i}</b>", style_body),
-                Paragraph(etape_clean, style_body)
-            ]]
-            
-            etape_table = Table(etape_data, colWidths=[2.5*cm, 14.5*cm])
-            etape_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, 0), colors.HexColor('#2C5F2D')),
-                ('BACKGROUND', (1, 0), (1, 0), colors.HexColor('#F5F5F5')),
-                ('TEXTCOLOR', (0, 0), (0, 0), colors.white),
-                ('TEXTCOLOR', (1, 0), (1, 0), colors.HexColor('#333333')),
-                ('ALIGN', (0, 0), (0, 0), 'CENTER'),
-                ('ALIGN', (1, 0), (1, 0), 'LEFT'),
-                ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (0, 0), 11),
-                ('FONTSIZE', (1, 0), (1, 0), 10),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#CCCCCC')),
-                ('TOPPADDING', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-                ('LEFTPADDING', (1, 0), (1, 0), 12),
-                ('RIGHTPADDING', (1, 0), (1, 0), 12),
-            ]))
-            
-            story.append(etape_table)
-            story.append(Spacer(1, 0.3*cm))
+        if processes == 0:
+            processes = os.cpu_count() or 1
+        processes = min(processes, len(tasks)) if tasks else 1
         
-        story.append(Spacer(1, 0.5*cm))
+        # ===== MODE SÉQUENTIEL =====
+        if processes <= 1:
+            for index, recipe, output_path in tasks:
+                logger.info("Génération PDF %s/%s : %s", index + 1, len(tasks), recipe['title'])
+                try:
+                    yield index, _render_recipe_pdf(recipe, output_path), None
+                except Exception as e:
+                    logger.warning("Échec pour '%s' : %s", recipe['title'], e)
+                    yield index, None, str(e)
+            return
         
-        # ========== TECHNIQUE D'AROMATISATION ==========
-        if recipe.get('technique_aromatisation') and recipe.get('aromates'):
-            story.append(Paragraph("🌿 Aromatisation", style_section))
-            
-            aromates_text = ", ".join(recipe['aromates'])
-            story.append(Paragraph(f"<b>Aromates utilisés :</b> {aromates_text}", style_body))
-            story.append(Spacer(1, 0.2*cm))
-            
-            technique_clean = recipe['technique_aromatisation'].replace('**', '').replace('*', '')
-            story.append(Paragraph(f"<b>Technique :</b> {technique_clean}", style_body))
-            story.append(Spacer(1, 0.5*cm))
-        
-        # ========== CONSEILS ==========
-        if recipe.get('conseils'):
-            story.append(PageBreak())
-            story.append(Paragraph("💡 Conseils et recommandations", style_section))
-            
-            conseils_clean = recipe['conseils'].replace('**', '<b>').replace('**', '</b>')
-            conseils_paragraphs = conseils_clean.split('\n\n')
-            
-            for para in conseils_paragraphs:
-                if para.strip():
-                    # Gérer les listes à puces
-                    if para.strip().startswith('•') or para.strip().startswith('-'):
-                        lines = para.split('\n')
-                        for line in lines:
-                            if line.strip():
-                                story.append(Paragraph(line.strip(), style_list))
-                    else:
-                        story.append(Paragraph(para.strip(), style_body))
-                    story.append(Spacer(1, 0.3*cm))
-        
-        # ========== EXEMPLES DE FROMAGES ==========
-        if recipe.get('exemples_fromages'):
-            story.append(Spacer(1, 0.5*cm))
-            story.append(Paragraph("🧀 Exemples de fromages de cette catégorie", style_section))
-            story.append(Paragraph(recipe['exemples_fromages'], style_body))
-        
-        # ========== PIED DE PAGE ==========
-        story.append(Spacer(1, 1*cm))
-        
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=9,
-            textColor=colors.HexColor('#999999'),
-            alignment=TA_CENTER,
-            spaceAfter=5
-        )
+        # ===== MODE POOL DE PROCESSUS =====
+        from concurrent.futures import ProcessPoolExecutor, as_completed
         
-        story.append(Paragraph("─" * 80, footer_style))
-        story.append(Paragraph(
-            f"📅 Recette générée le {datetime.now().strftime('%d/%m/%Y à %H:%M')} par <b>Agent Fromager</b>",
-            footer_style
-        ))
-        story.append(Paragraph(
-            "🧀 Fromagerie artisanale et transmission du savoir-faire fromager",
-            footer_style
-        ))
+        if not chunksize:
+            chunksize = max(1, len(tasks) // (processes * 4))
+        chunks = [tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize)]
         
-        if recipe.get('seed'):
-            story.append(Paragraph(
-                f"<i>Seed de recette : {recipe['seed']}</i>",
-                footer_style
-            ))
+        logger.info("Génération de %s PDFs sur %s processus (%s lots)", len(tasks), processes, len(chunks))
         
-        # ========== GÉNÉRER LE PDF ==========
-        try:
-            doc.build(story)
-            print(f"✅ PDF généré avec succès : {output_path}")
-            return output_path
-        except Exception as e:
-            print(f"❌ Erreur lors de la génération du PDF : {e}")
-            raise
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_pdf_worker) as pool:
+            futures = [pool.submit(_render_pdf_chunk, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                for index, pdf_path, error in future.result():
+                    if error:
+                        logger.warning("Échec pour '%s' : %s", recipes[index]['title'], error)
+                    yield index, pdf_path, error
 
 
-    def batch_generate_pdfs(self, recipes: List[Dict], output_dir: str = "/mnt/user-data/outputs") -> List[str]:
+    # ===============================================================
+    # GÉNÉRATION PAR LOT (catalogues d'ateliers)
+    # ===============================================================
+
+    def batch_generate_recipes(
+        self,
+        jobs: List,
+        max_workers: int = 4,
+        rate_limits: Optional[Dict[str, float]] = None,
+        save: bool = True
+    ) -> List[Dict]:
         """
-        Génère des PDFs pour plusieurs recettes
+        Génère plusieurs recettes en parallèle via generate_recipe()
         
         Args:
-            recipes: Liste de dictionnaires de recettes
-            output_dir: Répertoire de sortie
+            jobs: Liste de jobs (ingredients, cheese_type, profile, creativity),
+                  en tuple/liste ou en dict avec ces clés (+ 'constraints' optionnel)
+            max_workers: Taille maximale du pool de threads
+            rate_limits: Requêtes/minute par fournisseur (0 = illimité), appliquées au
+                         limiteur partagé ; sinon réglages de fromage_ratelimit
+            save: Écrire les recettes dans l'historique en une seule écriture
         
         Returns:
-            Liste des chemins des PDFs générés
+            Liste de résultats dans l'ordre des jobs :
+            {'index', 'status' ('ok'/'error'), 'provider', 'recipe' ou 'error', 'duration'}
         """
-        import os
-        
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        
-        pdf_paths = []
-        
-        for i, recipe in enumerate(recipes, 1):
-            print(f"📄 Génération PDF {i}/{len(recipes)} : {recipe['title']}")
-            
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        
+        normalized = [self._normalize_batch_job(job) for job in jobs]
+        limiter = get_rate_limiter()
+        for provider, rpm in (rate_limits or {}).items():
+            # Même seau que les appels du chat : le lot ne dépasse pas le quota partagé
+            limiter.configure(f"provider:{provider}", rpm / 60.0, 1)
+        
+        def run(index, job):
+            provider = self._job_provider(job['creativity'])
+            rate_key = f"provider:{provider}"
+            start = time.time()
+            if provider != 'static' and not limiter.acquire(rate_key, max_wait=PROVIDER_MAX_WAIT):
+                return {'index': index, 'status': 'error', 'provider': provider,
+                        'error': f"limite de débit {provider}", 'duration': time.time() - start}
             try:
-                safe_title = "".join(c for c in recipe['title'] if c.isalnum() or c in (' ', '-', '_')).strip()
-                output_path = os.path.join(output_dir, f"Recette_{i:02d}_{safe_title}.pdf")
-                
-                pdf_path = self.generate_recipe_pdf(recipe, output_path)
-                pdf_paths.append(pdf_path)
-                
+                # Jeton d'admission réutilisé par le premier appel au fournisseur
+                # (qui observe ensuite la réponse réelle : 429, Retry-After)
+                with prepaid(rate_key):
+                    recipe = self.generate_recipe(
+                        ingredients=job['ingredients'],
+                        cheese_type=job['cheese_type'],
+                        creativity=job['creativity'],
+                        profile=job['profile'],
+                        constraints=job['constraints']
+                    )
+                return {'index': index, 'status': 'ok', 'provider': provider,
+                        'recipe': recipe, 'duration': time.time() - start}
             except Exception as e:
-                print(f"⚠️ Échec pour '{recipe['title']}' : {e}")
-                continue
+                return {'index': index, 'status': 'error', 'provider': provider,
+                        'error': str(e), 'duration': time.time() - start}
+        
+        results = [None] * len(normalized)
+        
+        logger.info("Génération par lot : %s jobs, %s workers", len(normalized), max_workers)
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = [pool.submit(in_context(run), i, job) for i, job in enumerate(normalized)]
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                results[result['index']] = result
+                status = "✅" if result['status'] == 'ok' else "⚠️"
+                logger.info(
+                    "%s %s/%s (job #%s, %.1fs)",
+                    status, done, len(normalized), result['index'], result['duration'],
+                )
+        
+        recipes = [r['recipe'] for r in results if r['status'] == 'ok']
+        if save and recipes:
+            self._save_batch_to_history(recipes)
+        
+        logger.info("%s/%s recettes générées", len(recipes), len(normalized))
+        return results
+
+    def _normalize_batch_job(self, job) -> Dict:
+        """Accepte un tuple (ingredients, cheese_type, profile, creativity) ou un dict"""
+        if isinstance(job, dict):
+            ingredients = job.get('ingredients', [])
+            cheese_type = job.get('cheese_type', 'Fromage frais')
+            profile = job.get('profile', "🧀 Amateur")
+            creativity = job.get('creativity', 1)
+            constraints = job.get('constraints', "")
+        else:
+            ingredients, cheese_type, profile, creativity = list(job)[:4]
+            constraints = ""
         
-        print(f"\n✅ {len(pdf_paths)}/{len(recipes)} PDFs générés avec succès")
-        return pdf_paths
+        if isinstance(ingredients, str):
+            ingredients = [ing.strip() for ing in ingredients.split(',') if ing.strip()]
+        
+        return {
+            'ingredients': list(ingredients),
+            'cheese_type': cheese_type,
+            'profile': profile or "🧀 Amateur",
+            'creativity': int(creativity),
+            'constraints': constraints or ""
+        }
 
+    def _job_provider(self, creativity: int) -> str:
+        """Fournisseur LLM sollicité par un job (même ordre que chat_with_llm)"""
+        if creativity < 2 or not self._has_llm_available():
+            return 'static'
+        registry = getattr(self.agent, 'llm_registry', None)
+        if registry is not None:
+            return registry.available()[0].name
+        for provider in ('openrouter', 'google_ai', 'together', 'ollama'):
+            if getattr(self.agent, f'{provider}_enabled', False):
+                return provider
+        return 'static'
+
+    def _save_batch_to_history(self, recipes: List[Dict]):
+        """Ajoute toutes les recettes du lot à l'historique en UNE écriture"""
+        try:
+            # Doublons (titre + date) refusés à l'insertion, écriture atomique
+            saved = get_compactor(self.history_file).append_unique(recipes)
+            
+            logger.info("%s recettes sauvegardées dans %s", len(saved), self.history_file)
+        except Exception as e:
+            logger.warning("Sauvegarde du lot échouée: %s", e)
 
     # ========== FONCTION D'EXPORT AVEC GÉNÉRATION PDF ==========
     def export_recipe_with_pdf(self, recipe: Dict, format: str = 'both') -> Dict[str, str]:
@@ -757,7 +1043,7 @@ class UnifiedRecipeGeneratorV2:
                 json.dump(recipe, f, ensure_ascii=False, indent=2)
             
             outputs['json'] = json_path
-            print(f"✅ JSON exporté : {json_path}")
+            logger.info("JSON exporté : %s", json_path)
         
         # Export PDF
         if format in ['pdf', 'both']:
@@ -767,7 +1053,7 @@ class UnifiedRecipeGeneratorV2:
                 self.generate_recipe_pdf(recipe, pdf_path)
                 outputs['pdf'] = pdf_path
             except Exception as e:
-                print(f"❌ Erreur PDF : {e}")
+                logger.warning("Erreur PDF : %s", e)
         
         return outputs
 
@@ -789,7 +1075,7 @@ class UnifiedRecipeGeneratorV2:
         if 'exclusions_absolues' in self.knowledge_base['regles_compatibilite']:
             for exclusion in self.knowledge_base['regles_compatibilite']['exclusions_absolues']:
                 if f"type_pate:{cheese_type}" in exclusion['combinaison'] and aromate.lower() in exclusion['combinaison'].lower():
-                    print(f"   ⚠️ Exclusion : {aromate} incompatible avec {cheese_type}")
+                    logger.warning("Exclusion : %s incompatible avec %s", aromate, cheese_type)
                     return False
         
         # Vérifier compatibilité type_pate x aromates
@@ -801,7 +1087,7 @@ class UnifiedRecipeGeneratorV2:
                 if 'aromates_incompatibles' in infos:
                     for incompatible in infos['aromates_incompatibles']:
                         if incompatible.lower() in aromate.lower():
-                            print(f"   ⚠️ {aromate} déconseillé pour {cheese_type}")
+                            logger.warning("%s déconseillé pour %s", aromate, cheese_type)
                             return False
         
         return True
@@ -1191,7 +1477,7 @@ class UnifiedRecipeGeneratorV2:
 
     def _extract_aromates(self, ingredients: List[str]) -> List[str]:
         """Extrait les aromates de la liste d'ingrédients"""
-        aromates = []
+        matcher = get_matcher(self.knowledge_base)
         
         # Liste des mots-clés d'aromates
         aromates_keywords = [
@@ -1200,13 +1486,12 @@ class UnifiedRecipeGeneratorV2:
             'lavande', 'noix', 'olive', 'tomate séchée', 'cendre', 'truffe'
         ]
         
+        # Garder l'ingrédient complet ("thym frais") dès qu'il contient un de ces aromates
+        aromates = []
         for ing in ingredients:
-            ing_lower = ing.lower()
-            for keyword in aromates_keywords:
-                if keyword in ing_lower:
-                    aromates.append(ing)
-                    break
-        
+            found = matcher.scan(ing).labels('aromate')
+            if any(keyword in found for keyword in aromates_keywords):
+                aromates.append(ing)
         return aromates
 
 
@@ -1273,17 +1558,17 @@ class UnifiedRecipeGeneratorV2:
         lait: Optional[str],
         profile: str,
         constraints: str,
-        creativity_level: int = 0 
+        creativity_level: int = 0,
+        plan=None
     ) -> Optional[Dict]:
-        """Génère avec LLM en utilisant le contexte complet de la base statique"""
+        """Génère avec LLM en utilisant le contexte complet de la base statique
+        (+ les titres de la recherche canonique si un plan est fourni)"""
         
         
         
-        print("=" * 80)
-        print("🚨 FONCTION _generate_with_llm_and_knowledge() APPELÉE !")
-        print(f"🚨 Ingrédients reçus : {ingredients}")
-        print(f"🚨 Type de fromage : {cheese_type}")
-        print("=" * 80)
+        logger.debug("FONCTION _generate_with_llm_and_knowledge() APPELÉE !")
+        logger.debug("Ingrédients reçus : %s", ingredients)
+        logger.debug("Type de fromage : %s", cheese_type)
         
         import json
         import time
@@ -1387,28 +1672,41 @@ class UnifiedRecipeGeneratorV2:
         # ✅ VALIDATION CRITIQUE DU LAIT
         if not lait or lait == "vache":
             # Extraire à nouveau depuis ingredients
-            print("⚠️ Tentative de ré-extraction du type de lait depuis les ingrédients...")
+            logger.warning("Tentative de ré-extraction du type de lait depuis les ingrédients...")
             
             ingredients_str = ' '.join([str(ing) for ing in ingredients]).lower()
             
             if 'brebis' in ingredients_str:
                 lait = 'brebis'
-                print(f"✅ Lait corrigé: brebis (trouvé dans '{ingredients_str}')")
+                logger.debug("Lait corrigé: brebis (trouvé dans '%s')", ingredients_str)
             elif 'chèvre' in ingredients_str or 'chevre' in ingredients_str:
                 lait = 'chèvre'
-                print(f"✅ Lait corrigé: chèvre (trouvé dans '{ingredients_str}')")
+                logger.debug("Lait corrigé: chèvre (trouvé dans '%s')", ingredients_str)
             elif 'bufflonne' in ingredients_str or 'buffle' in ingredients_str:
                 lait = 'bufflonne'
-                print(f"✅ Lait corrigé: bufflonne (trouvé dans '{ingredients_str}')")
+                logger.debug("Lait corrigé: bufflonne (trouvé dans '%s')", ingredients_str)
             elif 'vache' in ingredients_str:
                 lait = 'vache'
-                print(f"✅ Lait confirmé: vache (trouvé dans '{ingredients_str}')")
+                logger.debug("Lait confirmé: vache (trouvé dans '%s')", ingredients_str)
             else:
-                print(f"⚠️ Vraiment aucun lait trouvé, utilisation 'vache' par défaut")
+                logger.warning("Vraiment aucun lait trouvé, utilisation 'vache' par défaut")
                 lait = 'vache'
 
-        print(f"🎯 Type de lait FINAL utilisé dans le prompt: {lait}")
+        logger.debug("Type de lait FINAL utilisé dans le prompt: %s", lait)
         
+        # ========== RÉFÉRENCES WEB (plan partagé avec l'onglet des résultats) ==========
+        web_context = ""
+        run_search = getattr(self.agent, '_run_search_engines', None)
+        if plan is not None and run_search is not None:
+            try:
+                references = plan.results(run_search)[:5]
+            except Exception as e:
+                logger.warning("Recherche canonique échouée : %s", e)
+                references = []
+            if references:
+                web_context = "RECETTES DE REFERENCE (web):\n" + "\n".join(
+                    f"- {str(r.get('title', ''))[:80]} ({r.get('source', 'web')})" for r in references
+                )
     
         # ========== CONSTRUIRE LE PROMPT ==========
         prompt = f"""Tu es un maitre fromager expert. Genere UNE recette JSON VALIDE et detaillee.
@@ -1427,6 +1725,8 @@ PROFIL: {profile}
 
 {knowledge_context[:800] if knowledge_context else ""}
 
+{web_context}
+
 REGLES JSON CRITIQUES:
 1. Chaque {{ a son }}, chaque [ a son ]
 2. Virgules ENTRE elements, JAMAIS avant ] ou }}
@@ -1508,8 +1808,8 @@ GENERE MAINTENANT JSON VALIDE:"""
 
         # ========== APPEL AU LLM ==========
         try:
-            print("🔍 DEBUG: Envoi du prompt au LLM...")
-            print(f"🔍 Longueur du prompt: {len(prompt)} caractères")
+            logger.debug("Envoi du prompt au LLM...")
+            logger.debug("Longueur du prompt: %s caractères", len(prompt))
             
             
             response = self.agent.chat_with_llm(
@@ -1517,8 +1817,8 @@ GENERE MAINTENANT JSON VALIDE:"""
                 max_tokens=16384,  # Augmentez cette valeur si nécessaire
                 temperature=0.8
             )
-            print(f"🔍 DEBUG: Réponse LLM reçue ({len(response)} caractères)")
-            print(f"🔍 DEBUG: Premiers 500 caractères: {response[:500]}")
+            logger.debug("Réponse LLM reçue (%s caractères)", len(response))
+            logger.debug("Premiers 500 caractères: %s", response[:500])
             
            
             # Nettoyage de la réponse
@@ -1537,22 +1837,22 @@ GENERE MAINTENANT JSON VALIDE:"""
             
             cleaned = cleaned.strip()
             
-            print(f"🔍 DEBUG: Après retrait markdown ({len(cleaned)} caractères)")
-            print(f"🔍 DEBUG: Premiers 300 caractères:")
-            print(cleaned[:300])
-            print(f"🔍 DEBUG: Derniers 200 caractères:")
-            print(cleaned[-200:])
+            logger.debug("Après retrait markdown (%s caractères)", len(cleaned))
+            logger.debug("Premiers 300 caractères:")
+            logger.debug("%s", cleaned[:300])
+            logger.debug("Derniers 200 caractères:")
+            logger.debug("%s", cleaned[-200:])
             
             # ========== EXTRACTION DU JSON ==========
             start_idx = cleaned.find('{')
             
             if start_idx == -1:
-                print("❌ DEBUG: Aucune accolade ouvrante trouvée dans la réponse")
-                print(f"❌ DEBUG: Contenu complet de 'cleaned':")
-                print(cleaned)
+                logger.warning("Aucune accolade ouvrante trouvée dans la réponse")
+                logger.debug("Contenu complet de 'cleaned':")
+                logger.debug("%s", cleaned)
                 raise ValueError("Aucune accolade ouvrante trouvée dans la réponse")
             
-            print(f"✅ DEBUG: Première accolade trouvée à l'index {start_idx}")
+            logger.debug("Première accolade trouvée à l'index %s", start_idx)
             
             # Compter les accolades pour trouver la fin
             brace_count = 0
@@ -1586,23 +1886,23 @@ GENERE MAINTENANT JSON VALIDE:"""
             
             # Extraire ou compléter le JSON
             if end_idx == -1:
-                print(f"⚠️ DEBUG: JSON incomplet (accolades restantes: {brace_count})")
+                logger.warning("JSON incomplet (accolades restantes: %s)", brace_count)
                 json_str = cleaned[start_idx:]
                 json_str += "\n" + ("}" * brace_count)
-                print(f"🔧 DEBUG: JSON complété avec {brace_count} accolade(s)")
+                logger.debug("JSON complété avec %s accolade(s)", brace_count)
             else:
                 json_str = cleaned[start_idx:end_idx + 1]
-                print(f"✅ DEBUG: JSON complet trouvé")
+                logger.debug("JSON complet trouvé")
             
             # ✅ VÉRIFICATION CRITIQUE
-            print(f"🔍 DEBUG: Longueur de json_str = {len(json_str)}")
-            print(f"🔍 DEBUG: Type de json_str = {type(json_str)}")
-            print(f"🔍 DEBUG: json_str vide ? {len(json_str.strip()) == 0}")
+            logger.debug("Longueur de json_str = %s", len(json_str))
+            logger.debug("Type de json_str = %s", type(json_str))
+            logger.debug("json_str vide ? %s", len(json_str.strip()) == 0)
             
             # ✅ NETTOYAGE AGRESSIF DU JSON
             import re
             
-            print("🧹 Nettoyage agressif du JSON...")
+            logger.debug("Nettoyage agressif du JSON...")
             json_original_length = len(json_str)
             
             # Supprimer TOUS les caractères de formatage markdown
@@ -1632,47 +1932,47 @@ GENERE MAINTENANT JSON VALIDE:"""
             json_str = re.sub(r'  +', ' ', json_str)
             
             chars_removed = json_original_length - len(json_str)
-            print(f"🧹 Nettoyage terminé: {chars_removed} caractères supprimés/modifiés")
-            print(f"🔍 JSON nettoyé ({len(json_str)} caractères)")
+            logger.debug("Nettoyage terminé: %s caractères supprimés/modifiés", chars_removed)
+            logger.debug("JSON nettoyé (%s caractères)", len(json_str))
             
             # Afficher un extrait du JSON nettoyé
-            print(f"🔍 DEBUG: Premiers 300 caractères après nettoyage:")
-            print(json_str[:300])
-            print(f"🔍 DEBUG: Derniers 200 caractères après nettoyage:")
-            print(json_str[-200:])
+            logger.debug("Premiers 300 caractères après nettoyage:")
+            logger.debug("%s", json_str[:300])
+            logger.debug("Derniers 200 caractères après nettoyage:")
+            logger.debug("%s", json_str[-200:])
             
             
             if not json_str or len(json_str.strip()) == 0:
-                print("❌ ERREUR CRITIQUE: json_str est vide !")
-                print(f"❌ start_idx = {start_idx}")
-                print(f"❌ end_idx = {end_idx}")
-                print(f"❌ brace_count = {brace_count}")
-                print(f"❌ Contenu de 'cleaned' autour de start_idx:")
-                print(cleaned[max(0, start_idx-50):min(len(cleaned), start_idx+200)])
+                logger.error("ERREUR CRITIQUE: json_str est vide !")
+                logger.debug("start_idx = %s", start_idx)
+                logger.debug("end_idx = %s", end_idx)
+                logger.debug("brace_count = %s", brace_count)
+                logger.debug("Contenu de 'cleaned' autour de start_idx:")
+                logger.debug("%s", cleaned[max(0, start_idx-50):min(len(cleaned), start_idx+200)])
                 raise ValueError("JSON extrait est vide")
             
-            print(f"🔍 DEBUG: Premiers 500 caractères de json_str:")
-            print(json_str[:500])
-            print(f"🔍 DEBUG: Derniers 300 caractères de json_str:")
-            print(json_str[-300:])
+            logger.debug("Premiers 500 caractères de json_str:")
+            logger.debug("%s", json_str[:500])
+            logger.debug("Derniers 300 caractères de json_str:")
+            logger.debug("%s", json_str[-300:])
             
             # Parser le JSON
             try:
                 recipe_data = json.loads(json_str)
-                print("✅ DEBUG: JSON parsé avec succès !")
+                logger.debug("JSON parsé avec succès !")
                 
                 # ✅ NORMALISER LE SCORE ICI
                 if 'score' in recipe_data:
                     score = recipe_data['score']
                     if isinstance(score, (int, float)) and score > 10:
                         recipe_data['score'] = round(score / 10, 1)
-                        print(f"🔧 Score normalisé: {score} → {recipe_data['score']}")  # ✅ Guillemet ajouté
+                        logger.debug("Score normalisé: %s → %s", score, recipe_data['score'])  # ✅ Guillemet ajouté
                 
                 # Validation
                 required_fields = ['title', 'etapes', 'ingredients']
                 for field in required_fields:
                     if not recipe_data.get(field):
-                        print(f"⚠️ Champ manquant: {field}")
+                        logger.warning("Champ manquant: %s", field)
                 
                 # ✅ AJOUTER LE NIVEAU DE CRÉATIVITÉ
                 recipe_data['creativity_level'] = creativity_level
@@ -1681,9 +1981,9 @@ GENERE MAINTENANT JSON VALIDE:"""
                 return recipe_data
             
             except json.JSONDecodeError as e:
-                print(f"⚠️ DEBUG: Erreur parsing JSON: {e}")
-                print(f"⚠️ Position: ligne {e.lineno}, col {e.colno}, pos {e.pos}")
-                print("🔧 Tentative de réparation automatique...")
+                logger.warning("Erreur parsing JSON: %s", e)
+                logger.warning("Position: ligne %s, col %s, pos %s", e.lineno, e.colno, e.pos)
+                logger.info("Tentative de réparation automatique...")
                 
                 # Tentative 1 : Nettoyage et réparation
                 try:
@@ -1702,20 +2002,20 @@ GENERE MAINTENANT JSON VALIDE:"""
                         from json_repair import repair_json
                         json_repaired = repair_json(json_cleaned)
                         recipe_data = json.loads(json_repaired)
-                        print("✅ JSON réparé avec json-repair !")
+                        logger.info("JSON réparé avec json-repair !")
                         
                         # ✅ NORMALISER LE SCORE ICI (bien indenté maintenant)
                         if 'score' in recipe_data:
                             score = recipe_data['score']
                             if isinstance(score, (int, float)) and score > 10:
                                 recipe_data['score'] = round(score / 10, 1)
-                                print(f"🔧 Score normalisé: {score} → {recipe_data['score']}")
+                                logger.debug("Score normalisé: %s → %s", score, recipe_data['score'])
                         
                         # Validation
                         required_fields = ['title', 'etapes', 'ingredients']
                         for field in required_fields:
                             if not recipe_data.get(field):
-                                print(f"⚠️ Champ manquant: {field}")
+                                logger.warning("Champ manquant: %s", field)
                                 
                         # ✅ AJOUTER LE NIVEAU DE CRÉATIVITÉ
                         recipe_data['creativity_level'] = creativity_level
@@ -1724,23 +2024,24 @@ GENERE MAINTENANT JSON VALIDE:"""
                         return recipe_data
                         
                     except ImportError:
-                        print("⚠️ json-repair non disponible")
+                        logger.warning("json-repair non disponible")
                         
                     except ImportError:
-                        print("⚠️ json-repair non disponible")
+                        logger.warning("json-repair non disponible")
                         
                         # ✅ DEBUG : Afficher le contexte de l'erreur
                         if e.pos and e.pos < len(json_cleaned):
                             start = max(0, e.pos - 200)
                             end = min(len(json_cleaned), e.pos + 200)
-                            print(f"\n🔍 CONTEXTE DE L'ERREUR (pos {e.pos}):")
-                            print("=" * 80)
+                            logger.debug("CONTEXTE DE L'ERREUR (pos %s):", e.pos)
                             context = json_cleaned[start:end]
                             marker_pos = e.pos - start
-                            print(context[:marker_pos] + " <<<ERREUR_ICI>>> " + context[marker_pos:])
-                            print("=" * 80)
+                            logger.debug(
+                                "%s",
+                                context[:marker_pos] + " <<<ERREUR_ICI>>> " + context[marker_pos:],
+                            )
                     except Exception as repair_err:
-                        print(f"⚠️ json-repair a échoué: {repair_err}")
+                        logger.warning("json-repair a échoué: %s", repair_err)
                     
                     # Tentative 2 : Réparation manuelle
                     import re
@@ -1752,7 +2053,7 @@ GENERE MAINTENANT JSON VALIDE:"""
                     json_repaired = re.sub(r',,+', ',', json_repaired)
                     
                     recipe_data = json.loads(json_repaired)
-                    print("✅ JSON réparé manuellement !")
+                    logger.info("JSON réparé manuellement !")
                     
                     # ✅ AJOUTER LE NIVEAU DE CRÉATIVITÉ
                     recipe_data['creativity_level'] = creativity_level
@@ -1763,12 +2064,12 @@ GENERE MAINTENANT JSON VALIDE:"""
                         score = recipe_data['score']
                         if isinstance(score, (int, float)) and score > 10:
                             recipe_data['score'] = round(score / 10, 1)
-                            print(f"🔧 Score normalisé: {score} → {recipe_data['score']}")
+                            logger.debug("Score normalisé: %s → %s", score, recipe_data['score'])
                     
                     return recipe_data
                     
                 except Exception as repair_error:
-                    print(f"❌ Toutes les réparations ont échoué: {repair_error}")
+                    logger.warning("Toutes les réparations ont échoué: %s", repair_error)
                     
                     # Tentative 2 : Réparation manuelle
                     import re
@@ -1780,7 +2081,7 @@ GENERE MAINTENANT JSON VALIDE:"""
                     json_repaired = re.sub(r',,+', ',', json_repaired)
                     
                     recipe_data = json.loads(json_repaired)
-                    print("✅ JSON réparé manuellement !")
+                    logger.info("JSON réparé manuellement !")
                     
                     # ✅ AJOUTER LE NIVEAU DE CRÉATIVITÉ
                     recipe_data['creativity_level'] = creativity_level
@@ -1789,10 +2090,10 @@ GENERE MAINTENANT JSON VALIDE:"""
                     return recipe_data
                     
                 except Exception as repair_error:
-                    print(f"❌ Toutes les réparations ont échoué: {repair_error}")
+                    logger.warning("Toutes les réparations ont échoué: %s", repair_error)
                 
                 # Tentative 3 : FALLBACK - Template statique garanti
-                print("🆘 Utilisation du template de secours...")
+                logger.info("Utilisation du template de secours...")
                 
                 # Construire une recette minimale mais valide
                 recipe_data = {
@@ -1840,8 +2141,8 @@ GENERE MAINTENANT JSON VALIDE:"""
                     recipe_data["aromates"] = aromates
                     recipe_data["technique_aromatisation"] = f"Incorporer {', '.join(aromates)} pendant le brassage du caille"
                 
-                print(f"✅ Template de secours généré: {recipe_data['title']}")
-                print(f"   🔢 {len(recipe_data['etapes'])} étapes")
+                logger.info("Template de secours généré: %s", recipe_data['title'])
+                logger.debug("%s étapes", len(recipe_data['etapes']))
                 
                 # Sauvegarder le JSON problématique pour analyse
                 try:
@@ -1850,7 +2151,7 @@ GENERE MAINTENANT JSON VALIDE:"""
                     with open(save_path, 'w', encoding='utf-8') as f:
                         f.write(f"=== ERREUR ===\n{e}\n\n")
                         f.write(f"=== JSON ORIGINAL ===\n{json_str}\n")
-                    print(f"💾 JSON problématique sauvegardé: {save_path}")
+                    logger.info("JSON problématique sauvegardé: %s", save_path)
                 except:
                     pass
                 
@@ -1859,9 +2160,9 @@ GENERE MAINTENANT JSON VALIDE:"""
                     score = recipe_data['score']
                     if isinstance(score, (int, float)) and score > 10:
                         recipe_data['score'] = round(score / 10, 1)
-                        print(f"🔧 Score normalisé: {score} → {recipe_data['score']}")
+                        logger.debug("Score normalisé: %s → %s", score, recipe_data['score'])
                         
-                print(f"✅ Template de secours généré: {recipe_data['title']}")
+                logger.info("Template de secours généré: %s", recipe_data['title'])
                 
                 return recipe_data
                 
@@ -1885,8 +2186,8 @@ GENERE MAINTENANT JSON VALIDE:"""
             # return data
             
         except json.JSONDecodeError as e:
-            print(f"   ❌ Erreur de parsing JSON : {e}")
-            print(f"   📄 Réponse reçue : {response[:200]}...")
+            logger.warning("Erreur de parsing JSON : %s", e)
+            logger.debug("Réponse reçue : %s...", response[:200])
             return None
         
         
@@ -2006,16 +2307,16 @@ GENERE MAINTENANT JSON VALIDE:"""
     # SCRAPING WEB (comme avant)
     # ===============================================================
     
-    def _scrape_web_recipe(self, ingredients, cheese_type, lait):
+    def _scrape_web_recipe(self, ingredients, cheese_type, lait, plan=None):
         """Scrape PLUSIEURS recettes (6 max) et les sauvegarde toutes"""
         query = self._build_search_query(ingredients, cheese_type, lait)
-        print(f"   🔍 Requête: {query}")
+        logger.debug("Requête: %s", query)
         
-        urls = self._find_recipe_urls(query)
+        urls = self._find_recipe_urls(query, ingredients, cheese_type, plan)
         if not urls:
             return None
         
-        print(f"   🌐 {len(urls)} URLs à tester")
+        logger.debug("%s URLs à tester", len(urls))
         
         scraped_recipes = []
         max_recipes = 6  # ✅ Scraper jusqu'à 6 recettes
@@ -2028,27 +2329,42 @@ GENERE MAINTENANT JSON VALIDE:"""
                 recipe = self._scrape_url(url)
                 if recipe:
                     scraped_recipes.append(recipe)
-                    print(f"   ✅ {len(scraped_recipes)}/{max_recipes} recettes scrapées")
+                    logger.debug("%s/%s recettes scrapées", len(scraped_recipes), max_recipes)
             except Exception as e:
-                print(f"   ⚠️ Erreur scraping {url[:50]}: {e}")
+                logger.warning("Erreur scraping %s: %s", url[:50], e)
                 continue
         
-        print(f"\n   📊 Total scrapé: {len(scraped_recipes)} recettes")
+        logger.debug("Total scrapé: %s recettes", len(scraped_recipes))
         
         # Retourner la première recette (meilleur score) pour la génération
         return scraped_recipes[0] if scraped_recipes else None
     
     def _scrape_url(self, url):
+        """Façade synchrone de _scrape_url_async"""
+        return run_sync(self._scrape_url_async(url))
+
+    @traced("scrape")
+    @coalesce("scrape", lambda self, url: url)
+    async def _scrape_url_async(self, url):
         """Scrape une URL, enrichit avec LLM et sauvegarde"""
+        set_attribute("url", url)
+        set_attribute("cache_hit", url in self.cache)
+        record_cache("scrape", url in self.cache)
         if url in self.cache:
             return self.cache[url]
+        domain = url_domain(url)
         
-        print(f"      🌐 Scraping: {url[:60]}")
+        logger.debug("Scraping: %s", url[:60])
         
         try:
-            response = requests.get(url, timeout=10, headers={
+            # Débit par domaine partagé entre utilisateurs ; URL suivante si le site sature
+            if not await get_rate_limiter().acquire_async(f"domain:{domain}", max_wait=DOMAIN_MAX_WAIT):
+                SCRAPE_TOTAL.inc(domain=domain, outcome="rate_limited")
+                return None
+            response = await http_client().get(url, timeout=10, headers={
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             })
+            get_rate_limiter().observe(f"domain:{domain}", response)
             response.raise_for_status()
             
             soup = BeautifulSoup(response.content, 'html.parser')
@@ -2071,7 +2387,9 @@ GENERE MAINTENANT JSON VALIDE:"""
             raw_html = soup.get_text(separator='\n', strip=True)[:5000]
             
             # ✅ ENRICHIR avec le LLM pour extraire ingrédients/étapes
-            enriched_recipe = self._enrich_scraped_with_llm(
+            # (enrichissement synchrone, LLM via la façade : dans un thread)
+            enriched_recipe = await asyncio.to_thread(
+                self._enrich_scraped_with_llm,
                 title=title_text,
                 description=description,
                 url=url,
@@ -2088,23 +2406,28 @@ GENERE MAINTENANT JSON VALIDE:"""
                 self.cache[url] = enriched_recipe
                 
                 # ✅ SAUVEGARDER dans l'historique dynamique
-                self._save_to_history(enriched_recipe)
-                print(f"      ✅ Sauvegardée: {title_text[:50]}")
+                await asyncio.to_thread(self._save_to_history, enriched_recipe)
+                logger.debug("Sauvegardée: %s", title_text[:50])
+                SCRAPE_TOTAL.inc(domain=domain, outcome="success")
                 
                 return enriched_recipe
             else:
-                print(f"      ⚠️ Enrichissement échoué")
+                logger.warning("Enrichissement échoué")
+                SCRAPE_TOTAL.inc(domain=domain, outcome="enrich_failed")
                 return None
             
         except Exception as e:
-            print(f"      ❌ Erreur: {e}")
+            logger.warning("Erreur: %s", e)
+            SCRAPE_TOTAL.inc(domain=domain, outcome="error")
             return None
     
+    @traced("llm.enrich")
+    @coalesce("enrich", _enrich_flight_key)
     def _enrich_scraped_with_llm(self, title, description, url, raw_text):
         """Enrichit une recette scrapée avec le LLM pour extraire détails"""
         
         if not self._has_llm_available():
-            print(f"      ⚠️ Pas de LLM disponible pour enrichir")
+            logger.warning("Pas de LLM disponible pour enrichir")
             # Retourner une version minimale
             return {
                 'title': title,
@@ -2142,28 +2465,16 @@ GENERE MAINTENANT JSON VALIDE:"""
 Si une info manque dans le texte, utilise null."""
 
         try:
-                        # ===== DEBUG COMPLET =====
-            print("=" * 80)
-            print("🔍 DEBUG AGENT:")
-            print(f"Type de self.agent: {type(self.agent)}")
-            print(f"Contenu de self.agent: {self.agent}")
-            print(f"Attributs de self.agent: {dir(self.agent)}")
-
-            # Vérifier si c'est un dict
+            # Vérifier que self.agent est bien un agent (et pas un dict)
             if isinstance(self.agent, dict):
-                print("⚠️ PROBLÈME: self.agent est un dictionnaire, pas un objet Agent !")
-                print(f"Clés du dictionnaire: {list(self.agent.keys())}")
+                logger.error("self.agent est un dictionnaire, pas un objet Agent (clés: %s)", list(self.agent.keys()))
                 return None
 
             # Vérifier si la méthode existe
             if not hasattr(self.agent, 'chat_with_llm'):
-                print("❌ ERREUR: self.agent n'a pas de méthode 'chat_with_llm'")
-                print(f"Méthodes disponibles: {[m for m in dir(self.agent) if not m.startswith('_')]}")
+                logger.error("self.agent (%s) n'a pas de méthode 'chat_with_llm'", type(self.agent).__name__)
                 return None
 
-            print("✅ self.agent a la méthode chat_with_llm")
-            print("=" * 80)
-
             # Maintenant l'appel
             response = self.agent.chat_with_llm(
                 prompt,
@@ -2185,12 +2496,15 @@ Si une info manque dans le texte, utilise null."""
             json_str = response[start:end]
             enriched = json.loads(json_str)
             
-            print(f"      🤖 Enrichi avec {len(enriched.get('ingredients', []))} ingrédients, {len(enriched.get('etapes', []))} étapes")
+            logger.info(
+                "Enrichi avec %d ingrédients, %d étapes",
+                len(enriched.get('ingredients', [])), len(enriched.get('etapes', []))
+            )
             
             return enriched
             
         except Exception as e:
-            print(f"      ⚠️ Erreur enrichissement LLM: {e}")
+            logger.warning("Erreur enrichissement LLM: %s", e)
             # Retourner version minimale en cas d'erreur
             return {
                 'title': title,
@@ -2265,30 +2579,22 @@ Réponds JSON uniquement (sans markdown):
     # ===============================================================
     
     def _extract_lait(self, ingredients):
-        ingredients_str = " ".join(ingredients).lower()
-        if "brebis" in ingredients_str:
-            return "brebis"
-        elif "chèvre" in ingredients_str or "chevre" in ingredients_str:
-            return "chèvre"
-        elif "bufflonne" in ingredients_str:
-            return "bufflonne"
-        elif "vache" in ingredients_str:
-            return "vache"
-        return None
+        hits = get_matcher(self.knowledge_base).scan(" ".join(ingredients))
+        return hits.first("lait", ["brebis", "chèvre", "bufflonne", "vache"])
     
     def _extract_aromates(self, ingredients):
         aromates_list = [
             "thym", "romarin", "basilic", "origan", "ail", "poivre",
             "cumin", "ciboulette", "persil", "aneth", "estragon"
         ]
-        found = []
-        ingredients_str = " ".join(ingredients).lower()
-        for aromate in aromates_list:
-            if aromate in ingredients_str:
-                found.append(aromate)
-        return found
+        found = get_matcher(self.knowledge_base).scan(" ".join(ingredients)).labels("aromate")
+        return [aromate for aromate in aromates_list if aromate in found]
     
     def _has_llm_available(self):
+        # Tout fournisseur configuré du registre de l'agent compte (Hugging Face, DeepSeek...)
+        registry = getattr(self.agent, 'llm_registry', None)
+        if registry is not None:
+            return bool(registry.available())
         return any([
             getattr(self.agent, 'openrouter_enabled', False),
             getattr(self.agent, 'google_ai_enabled', False),
@@ -2308,17 +2614,27 @@ Réponds JSON uniquement (sans markdown):
         parts.append("maison")
         return " ".join(parts)
     
-    def _find_recipe_urls(self, query):
+    def _find_recipe_urls(self, query, ingredients=None, cheese_type=None, plan=None):
         """Trouve des URLs de recettes (15 max pour avoir au moins 6 qui fonctionnent)"""
+        # Recherche canonique de l'agent : la même que pour l'onglet des résultats web
+        if (ingredients is not None or plan is not None) and hasattr(self.agent, 'planned_search_urls'):
+            try:
+                urls = self.agent.planned_search_urls(ingredients, cheese_type, plan)[:15]
+                if urls:
+                    logger.debug("Recherche canonique: %s URLs", len(urls))
+                    return urls
+            except Exception as e:
+                logger.warning("Recherche canonique échouée: %s", e)
+        
         try:
             if hasattr(self.agent, '_try_duckduckgo_html'):
                 results = self.agent._try_duckduckgo_html(query, 15)  # ✅ Demander 15 résultats
                 if results:
                     urls = [r['url'] for r in results if r.get('url')]
-                    print(f"      🔎 DuckDuckGo: {len(urls)} URLs trouvées")
+                    logger.debug("DuckDuckGo: %s URLs trouvées", len(urls))
                     return urls
         except Exception as e:
-            print(f"      ⚠️ Recherche DuckDuckGo échouée: {e}")
+            logger.warning("Recherche DuckDuckGo échouée: %s", e)
         
         # URLs par défaut ÉTENDUES (au moins 6 par catégorie)
         base_urls = {
@@ -2359,7 +2675,7 @@ Réponds JSON uniquement (sans markdown):
         # Essayer de matcher avec la requête
         for key, urls in base_urls.items():
             if key in query.lower():
-                print(f"      📋 URLs par défaut: {len(urls)} pour '{key}'")
+                logger.debug("URLs par défaut: %s pour '%s'", len(urls), key)
                 return urls
         
         # Si aucun match, retourner un mix de toutes les catégories
@@ -2367,7 +2683,7 @@ Réponds JSON uniquement (sans markdown):
         for urls in base_urls.values():
             all_urls.extend(urls[:2])  # 2 URLs par catégorie
         
-        print(f"      📋 Mix d'URLs génériques: {len(all_urls)}")
+        logger.debug("Mix d'URLs génériques: %s", len(all_urls))
         return all_urls
     
     def _extract_domain(self, url):
@@ -2379,20 +2695,13 @@ Réponds JSON uniquement (sans markdown):
     
     def _save_to_history(self, recipe_data):
         try:
-            history = []
-            if os.path.exists(self.history_file):
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    history = json.load(f)
-            
-            history.append(recipe_data)
-            history = history[-100:]
-            
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(history, f, indent=2, ensure_ascii=False)
-            
-            print(f"💾 Sauvegardé dans {self.history_file}")
+            # Doublons (titre + date) refusés à l'insertion, écriture atomique
+            if get_compactor(self.history_file).append_unique([recipe_data], max_records=100):
+                logger.info("Sauvegardé dans %s", self.history_file)
+            else:
+                logger.info("Doublon ignoré dans %s", self.history_file)
         except Exception as e:
-            print(f"⚠️ Sauvegarde échouée: {e}")
+            logger.warning("Sauvegarde échouée: %s", e)
 
 
 # ===============================================================
@@ -2588,4 +2897,52 @@ class RecipeFormatter:
         ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
         """
             
-        return formatted
\ No newline at end of file
+        return formatted
+
+
+# ===============================================================
+# CLI : GÉNÉRATION PAR LOT
+# ===============================================================
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="Génère un catalogue de recettes à partir d'un fichier de jobs JSON"
+    )
+    parser.add_argument(
+        "jobs_file",
+        help="JSON : liste de [ingrédients, type, profil, créativité] ou d'objets avec ces clés"
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Threads en parallèle (défaut 4)")
+    parser.add_argument("--output", help="Écrit aussi les résultats dans ce fichier JSON")
+    parser.add_argument("--no-save", action="store_true", help="Ne pas écrire dans l'historique")
+    parser.add_argument(
+        "--rate-limit", action="append", default=[], metavar="FOURNISSEUR=RPM",
+        help="Limite par fournisseur, ex: --rate-limit openrouter=10"
+    )
+    args = parser.parse_args()
+    
+    with open(args.jobs_file, 'r', encoding='utf-8') as f:
+        batch_jobs = json.load(f)
+    
+    cli_limits = {}
+    for item in args.rate_limit:
+        provider, _, rpm = item.partition('=')
+        cli_limits[provider.strip()] = float(rpm)
+    
+    # L'agent apporte la base de connaissances et les fournisseurs LLM
+    from app import agent as fromager_agent
+    
+    generator = UnifiedRecipeGeneratorV2(agent=fromager_agent)
+    batch_results = generator.batch_generate_recipes(
+        batch_jobs,
+        max_workers=args.workers,
+        rate_limits=cli_limits,
+        save=not args.no_save
+    )
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(batch_results, f, indent=2, ensure_ascii=False)
+        print(f"📄 Résultats écrits dans {args.output}")